@@ -18,6 +18,7 @@ from .target import Target
 from .memory_map import MemoryType
 from . import exceptions
 from ..flash.loader import FlashEraser
+from ..flash.manifest import FlashManifest
 from ..coresight import (dap, cortex_m, cortex_m_v8m, rom_table)
 from ..debug.svd.loader import (SVDFile, SVDLoader)
 from ..debug.context import DebugContext
@@ -319,11 +320,15 @@ class CoreSightTarget(Target, GraphNode):
         return self.selected_core.resume()
 
     def mass_erase(self):
+        FlashManifest.clear_for_session(self.session)
         if not self.call_delegate('mass_erase', target=self):
             # The default mass erase implementation is to simply perform a chip erase.
             FlashEraser(self.session, FlashEraser.Mode.CHIP).erase()
         return True
 
+    def flush(self):
+        self.dp.flush()
+
     def write_memory(self, addr, value, transfer_size=32):
         return self.selected_core.write_memory(addr, value, transfer_size)
 
@@ -342,6 +347,12 @@ class CoreSightTarget(Target, GraphNode):
     def read_memory_block32(self, addr, size):
         return self.selected_core.read_memory_block32(addr, size)
 
+    def write_memory_bytes(self, addr, data):
+        return self.selected_core.write_memory_bytes(addr, data)
+
+    def read_memory_bytes(self, addr, size):
+        return self.selected_core.read_memory_bytes(addr, size)
+
     def read_core_register(self, id):
         return self.selected_core.read_core_register(id)
 
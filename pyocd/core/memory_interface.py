@@ -14,6 +14,9 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import six
+import struct
+
 from ..utility import conversion
 
 class MemoryInterface(object):
@@ -142,3 +145,92 @@ class MemoryInterface(object):
         if (size > 0):
             self.write8(addr, data[idx])
 
+    def read_memory_bytes(self, addr, size):
+        """! @brief Read a block of unaligned bytes in memory.
+        
+        This is the same as read_memory_block8(), except that the data is returned as a bytearray
+        instead of a list of ints. Large blocks are converted with a single struct call.
+        
+        @return A bytearray of length _size_.
+        """
+        res = bytearray()
+
+        # try to read 8bits data
+        if (size > 0) and (addr & 0x01):
+            res.append(self.read8(addr))
+            size -= 1
+            addr += 1
+
+        # try to read 16bits data
+        if (size > 1) and (addr & 0x02):
+            mem = self.read16(addr)
+            res.append(mem & 0xff)
+            res.append((mem >> 8) & 0xff)
+            size -= 2
+            addr += 2
+
+        # try to read aligned block of 32bits
+        if (size >= 4):
+            mem = self.read_memory_block32(addr, size // 4)
+            res += conversion.u32le_list_to_bytes(mem)
+            size -= 4*len(mem)
+            addr += 4*len(mem)
+
+        if (size > 1):
+            mem = self.read16(addr)
+            res.append(mem & 0xff)
+            res.append((mem >> 8) & 0xff)
+            size -= 2
+            addr += 2
+
+        if (size > 0):
+            res.append(self.read8(addr))
+
+        return res
+
+    def write_memory_bytes(self, addr, data):
+        """! @brief Write a block of unaligned bytes in memory.
+        
+        @param self
+        @param addr Start address.
+        @param data A bytes-like object: bytes, bytearray, or memoryview. A sequence of byte values
+            is also accepted, and is converted to a bytearray first.
+        """
+        if not isinstance(data, (bytes, bytearray, memoryview)):
+            data = bytearray(data)
+        data = memoryview(data)
+        size = len(data)
+        idx = 0
+
+        #try to write 8 bits data
+        if (size > 0) and (addr & 0x01):
+            self.write8(addr, six.indexbytes(data, idx))
+            size -= 1
+            addr += 1
+            idx += 1
+
+        # try to write 16 bits data
+        if (size > 1) and (addr & 0x02):
+            self.write16(addr, struct.unpack_from('<H', data, idx)[0])
+            size -= 2
+            addr += 2
+            idx += 2
+
+        # write aligned block of 32 bits
+        if (size >= 4):
+            data32 = conversion.bytes_to_u32le_list(data[idx:idx + (size & ~0x03)])
+            self.write_memory_block32(addr, data32)
+            addr += size & ~0x03
+            idx += size & ~0x03
+            size -= size & ~0x03
+
+        # try to write 16 bits data
+        if (size > 1):
+            self.write16(addr, struct.unpack_from('<H', data, idx)[0])
+            size -= 2
+            addr += 2
+            idx += 2
+
+        #try to write 8 bits data
+        if (size > 0):
+            self.write8(addr, six.indexbytes(data, idx))
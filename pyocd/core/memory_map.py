@@ -387,11 +387,13 @@ class FlashRegion(MemoryRegion):
     def is_erased(self, d):
         """! @brief Helper method to check if a block of data is erased.
         @param self
-        @param d List of data or bytearray.
+        @param d List of data, or a bytes, bytearray, or memoryview object.
         @retval True The contents of d all match the erased byte value for this flash region.
         @retval False At least one byte in d did not match the erased byte value.
         """
         erasedByte = self.erased_byte_value
+        if isinstance(d, (bytes, bytearray, memoryview)):
+            return memoryview(d) == memoryview(bytearray([erasedByte]) * len(d))
         for b in d:
             if b != erasedByte:
                 return False
@@ -24,6 +24,8 @@ OPTIONS_INFO = {
         "Prevents raising an error if no core were found after CoreSight discovery."),
     'auto_unlock': OptionInfo('auto_unlock', bool, True,
         "Whether to unlock secured target by erasing."),
+    'cache.memory_limit': OptionInfo('cache.memory_limit', int, 1024 * 1024,
+        "Maximum number of bytes of target memory held in each core's memory cache."),
     'chip_erase': OptionInfo('chip_erase', str, "sector",
         "Whether to perform a chip erase or sector erases when programming flash. The value must be"
         " one of \"auto\", \"sector\", or \"chip\"."),
@@ -40,6 +42,20 @@ OPTIONS_INFO = {
     'fast_program': OptionInfo('fast_program', bool, False,
         "Setting this option to True will use CRC checks of existing flash sector contents to "
         "determine whether pages need to be programmed."),
+    'flash.manifest_dir': OptionInfo('flash.manifest_dir', str, None,
+        "Directory in which to keep a manifest of the flash contents written by pyOCD for each "
+        "target, used to skip flash analysis when reprogramming. Relative paths are relative to "
+        "the project directory. Disabled by default."),
+    'flash.manifest_spot_check': OptionInfo('flash.manifest_spot_check', int, 1,
+        "Number of flash sectors found unchanged using the flash manifest that are verified "
+        "against target memory before trusting the manifest."),
+    'flash.manifest_target_id': OptionInfo('flash.manifest_target_id', str, None,
+        "Identifier of the target device used to name its flash manifest instead of the probe's "
+        "unique ID. When set, the manifest is trusted after a spot check without first confirming "
+        "its contents in each session."),
+    'flash.timeout': OptionInfo('flash.timeout', float, None,
+        "Maximum number of seconds to wait for a single flash algorithm operation to complete. "
+        "The target is halted and the operation fails if it takes longer. No timeout by default."),
     'frequency': OptionInfo('frequency', int, 1000000,
         "SWD/JTAG frequency in Hertz."),
     'hide_programming_progress': OptionInfo('hide_programming_progress', bool, False,
@@ -82,6 +98,9 @@ OPTIONS_INFO = {
         "swv_clock option."),
     'gdbserver_port': OptionInfo('gdbserver_port', int, 3333,
         "Base TCP port for the gdbserver."),
+    'gdbserver_packet_size': OptionInfo('gdbserver_packet_size', int, 16384,
+        "Maximum RSP packet size in bytes reported to gdb. Larger packets let gdb read and write "
+        "more memory per request."),
     'persist': OptionInfo('persist', bool, False,
         "If True, the GDB server will not exit after GDB disconnects."),
     'report_core_number': OptionInfo('report_core_number', bool, False,
@@ -94,8 +113,12 @@ OPTIONS_INFO = {
     'serve_local_only': OptionInfo('serve_local_only', bool, True,
         "When this option is True, the GDB server and semihosting telnet ports are only served on "
         "localhost."),
+    'stack_prefetch_size': OptionInfo('stack_prefetch_size', int, 256,
+        "Number of bytes of the stack read into the cache when the target halts."),
     'step_into_interrupt': OptionInfo('step_into_interrupt', bool, False,
         "Enable interrupts when performing step operations."),
+    'streaming_flash': OptionInfo('streaming_flash', bool, False,
+        "Program flash sectors while gdb is still sending the data for a load command."),
     'swv_clock': OptionInfo('swv_clock', int, 1000000,
         "Frequency in Hertz of the SWO baud rate. Default is 1 MHz."),
     'swv_system_clock': OptionInfo('swv_system_clock', int, None,
@@ -30,6 +30,7 @@ except ImportError:
 from .options_manager import OptionsManager
 from ..board.board import Board
 from ..utility.notification import Notifier
+from ..utility.reactor import Reactor
 
 LOG = logging.getLogger(__name__)
 
@@ -128,6 +129,7 @@ class Session(Notifier):
         self._closed = True
         self._inited = False
         self._user_script_proxy = None
+        self._reactor = None
         self._delegate = None
         self._auto_open = auto_open
         self._options = OptionsManager()
@@ -275,6 +277,18 @@ class Session(Notifier):
     def user_script_proxy(self):
         return self._user_script_proxy
     
+    @property
+    def reactor(self):
+        """! @brief The Reactor that serves the session's sockets and periodic tasks.
+
+        The reactor is created and started the first time this property is accessed, and stopped
+        when the session is closed.
+        """
+        if self._reactor is None:
+            self._reactor = Reactor("reactor")
+            self._reactor.start()
+        return self._reactor
+
     @property
     def log_tracebacks(self):
         """! @brief Quick access to debug.traceback option since it is widely used."""
@@ -377,6 +391,10 @@ class Session(Notifier):
         self._closed = True
 
         LOG.debug("uninit session %s", self)
+        if self._reactor is not None:
+            self._reactor.stop()
+            self._reactor = None
+
         if self._inited:
             try:
                 self.board.uninit()
@@ -86,6 +86,7 @@ class Target(MemoryInterface):
     EVENT_POST_RESET = 8
     EVENT_PRE_FLASH_PROGRAM = 9
     EVENT_POST_FLASH_PROGRAM = 10
+    EVENT_THREADS_CHANGED = 11 # source is the thread provider, data is ThreadListChanges
 
     # Run types
     RUN_TYPE_RESUME = 1
@@ -34,6 +34,10 @@ AP_IDR = 0xFC
 MEM_AP_CSW = 0x00
 MEM_AP_TAR = 0x04
 MEM_AP_DRW = 0x0C
+MEM_AP_BD0 = 0x10
+MEM_AP_BD1 = 0x14
+MEM_AP_BD2 = 0x18
+MEM_AP_BD3 = 0x1C
 
 A32 = 0x0c
 APSEL_SHIFT = 24
@@ -238,16 +242,31 @@ class AccessPort(object):
 
     @_locked
     def read_reg(self, addr, now=True):
-        return self.dp.read_ap((self.ap_num << APSEL_SHIFT) | addr, now)
+        return self.dp._read_ap((self.ap_num << APSEL_SHIFT) | addr, now)
 
     @_locked
     def write_reg(self, addr, data):
-        self.dp.write_ap((self.ap_num << APSEL_SHIFT) | addr, data)
+        self.dp._write_ap((self.ap_num << APSEL_SHIFT) | addr, data)
     
     def reset_did_occur(self):
         """! @brief Invoked by the DebugPort to inform APs that a reset was performed."""
         pass
     
+    def issue_pending_reads(self):
+        """! @brief Invoked by the DebugPort when flushing to send any reads the AP has deferred.
+        
+        Faults from deferred reads are then reported by the flush.
+        """
+        pass
+    
+    def invalidate_cache(self):
+        """! @brief Invoked by the DebugPort to inform APs that a transfer error occurred, or that
+            the AP's registers were accessed directly.
+        
+        Any AP register values cached by the AP are no longer reliable after either.
+        """
+        pass
+    
     def lock(self):
         """! @brief Lock the AP from access by other threads."""
         self._lock.acquire()
@@ -272,6 +291,32 @@ class AccessPort(object):
         return "<{}@{:x} type={} apsel={} idr={:08x} rom={:08x}>".format(
             self.__class__.__name__, id(self), self.type_name, self.ap_num, self.idr, self.rom_addr)
 
+class _PendingReads(object):
+    """! @brief Run of consecutive deferred word reads that MEM_AP issues as one block read."""
+
+    def __init__(self, addr, csw):
+        self.addr = addr
+        self.csw = csw
+        self.count = 0
+        self.result_cb = None
+        self._words = None
+        self._error = None
+
+    @property
+    def end(self):
+        return self.addr + self.count * 4
+
+    def result(self, index):
+        if self._error is not None:
+            raise self._error
+        if self._words is None:
+            try:
+                self._words = self.result_cb()
+            except exceptions.Error as error:
+                self._error = error
+                raise
+        return self._words[index]
+
 class MEM_AP(AccessPort, memory_interface.MemoryInterface):
     """! @brief MEM-AP component.
     
@@ -304,6 +349,12 @@ class MEM_AP(AccessPort, memory_interface.MemoryInterface):
         
         ## Cached current CSW value.
         self._cached_csw = -1
+        
+        ## Shadow of the current TAR value, including auto-increment, or -1 if unknown.
+        self._cached_tar = -1
+        
+        ## Run of deferred word reads waiting to be issued as a single block read.
+        self._pending_reads = None
 
         # Default to the smallest size supported by all targets.
         # A size smaller than the supported size will decrease performance
@@ -315,12 +366,19 @@ class MEM_AP(AccessPort, memory_interface.MemoryInterface):
         # then bind our memory interface APIs to its methods. Otherwise use our standard
         # memory interface based on AP register accesses.
         memoryInterface = self.dp.link.get_memory_interface_for_ap(self.ap_num)
+        
+        # Banked data register accesses rely on the shadow TAR, which is not valid if the probe
+        # performs memory transfers on its own.
+        self._supports_banked_access = memoryInterface is None
+        
         if memoryInterface is not None:
             LOG.debug("Using accelerated memory access interface")
             self.write_memory = memoryInterface.write_memory
             self.read_memory = memoryInterface.read_memory
             self.write_memory_block32 = memoryInterface.write_memory_block32
             self.read_memory_block32 = memoryInterface.read_memory_block32
+            self.write_memory_bytes = memoryInterface.write_memory_bytes
+            self.read_memory_bytes = memoryInterface.read_memory_bytes
         else:
             self.write_memory = self._write_memory
             self.read_memory = self._read_memory
@@ -362,6 +420,11 @@ class MEM_AP(AccessPort, memory_interface.MemoryInterface):
     def implemented_hnonsec_mask(self):
         return self._impl_hnonsec
 
+    @property
+    def supports_banked_access(self):
+        """! @brief Whether read_banked32() and write_banked32() may be used."""
+        return self._supports_banked_access
+
     @property
     def hprot(self):
         return self._hprot
@@ -458,16 +521,25 @@ class MEM_AP(AccessPort, memory_interface.MemoryInterface):
 
     @_locked
     def read_reg(self, addr, now=True):
+        # Send deferred reads, from this or any other AP, before the access.
+        self.dp.issue_pending_reads()
         ap_regaddr = addr & APREG_MASK
         if ap_regaddr == MEM_AP_CSW and self._cached_csw != -1 and now:
             return self._cached_csw
-        return super(MEM_AP, self).read_reg(addr, now)
+        if ap_regaddr == MEM_AP_TAR and self._cached_tar != -1 and now:
+            return self._cached_tar
+        result = super(MEM_AP, self).read_reg(addr, now)
+        if ap_regaddr == MEM_AP_DRW:
+            self._advance_tar(1)
+        return result
 
     @_locked
     def write_reg(self, addr, data):
+        # Send deferred reads, from this or any other AP, before the access.
+        self.dp.issue_pending_reads()
         ap_regaddr = addr & APREG_MASK
 
-        # Don't need to write CSW if it's not changing value.
+        # Don't need to write CSW or TAR if it's not changing value.
         if ap_regaddr == MEM_AP_CSW:
             if data == self._cached_csw:
                 if TRACE.isEnabledFor(logging.INFO):
@@ -475,19 +547,63 @@ class MEM_AP(AccessPort, memory_interface.MemoryInterface):
                     TRACE.debug("write_ap:%06d cached (addr=0x%08x) = 0x%08x", num, addr, data)
                 return
             self._cached_csw = data
+        elif ap_regaddr == MEM_AP_TAR:
+            if data == self._cached_tar:
+                if TRACE.isEnabledFor(logging.INFO):
+                    num = self.dp.next_access_number
+                    TRACE.debug("write_ap:%06d cached (addr=0x%08x) = 0x%08x", num, addr, data)
+                return
+            self._cached_tar = data
 
         try:
             super(MEM_AP, self).write_reg(addr, data)
         except exceptions.ProbeError:
-            # Invalidate cached CSW on exception.
-            if ap_regaddr == MEM_AP_CSW:
-                self._cached_csw = -1
+            # Invalidate cached CSW and TAR on exception.
+            self.invalidate_cache()
             raise
+        
+        if ap_regaddr == MEM_AP_DRW:
+            self._advance_tar(1)
+    
+    def _advance_tar(self, count):
+        """! @brief Update the shadow TAR after _count_ DRW transfers.
+        
+        The TAR is only predicted for single auto-increment within one auto-increment page. If
+        the address would leave the page, the wrapping behaviour is implementation defined so
+        the shadow TAR becomes unknown.
+        """
+        if self._cached_tar == -1:
+            return
+        csw = self._cached_csw
+        if csw == -1:
+            self._cached_tar = -1
+            return
+        addrinc = csw & CSW_ADDRINC
+        if addrinc == CSW_NADDRINC:
+            return
+        elif addrinc != CSW_SADDRINC:
+            self._cached_tar = -1
+            return
+        tar = self._cached_tar + count * (1 << (csw & CSW_SIZE))
+        page_mask = ~(self.auto_increment_page_size - 1)
+        if (tar & page_mask) != (self._cached_tar & page_mask):
+            tar = -1
+        self._cached_tar = tar
     
     def reset_did_occur(self):
         """! @copydoc AccessPort.reset_did_occur()"""
         # TODO use notifications to invalidate CSW cache.
+        self._issue_pending_reads()
+        self.invalidate_cache()
+    
+    def issue_pending_reads(self):
+        """! @copydoc AccessPort.issue_pending_reads()"""
+        self._issue_pending_reads()
+    
+    def invalidate_cache(self):
+        """! @copydoc AccessPort.invalidate_cache()"""
         self._cached_csw = -1
+        self._cached_tar = -1
 
     @_locked
     def _write_memory(self, addr, data, transfer_size=32):
@@ -522,8 +638,14 @@ class MEM_AP(AccessPort, memory_interface.MemoryInterface):
         """! @brief Read a memory location.
         
         By default, a word will be read.
+        
+        Deferred word reads of consecutive addresses are coalesced into a single block read. The
+        block is issued when the first result is requested, or when any other access is made
+        through this AP.
         """
         assert (addr & (transfer_size // 8 - 1)) == 0
+        if transfer_size == 32 and not now:
+            return self._queue_read32(addr)
         num = self.dp.next_access_number
         TRACE.debug("read_mem:%06d (addr=0x%08x, size=%d) {", num, addr, transfer_size)
         res = None
@@ -580,6 +702,7 @@ class MEM_AP(AccessPort, memory_interface.MemoryInterface):
         self.write_reg(MEM_AP_TAR, addr)
         try:
             self.link.write_ap_multiple((self.ap_num << APSEL_SHIFT) | MEM_AP_DRW, data)
+            self._advance_tar(len(data))
         except exceptions.TransferFaultError as error:
             # Annotate error with target address.
             self._handle_error(error, num)
@@ -592,30 +715,91 @@ class MEM_AP(AccessPort, memory_interface.MemoryInterface):
         TRACE.debug("_write_block32:%06d }", num)
 
     @_locked
-    def _read_block32(self, addr, size):
+    def _read_block32(self, addr, size, now=True, csw=None):
         """! @brief Read a single transaction's worth of aligned words.
         
         The transaction must not cross the MEM-AP's auto-increment boundary.
+        
+        @param self
+        @param addr Word aligned start address.
+        @param size Number of words to read.
+        @param now If False, a callback is returned that will return the list of words.
+        @param csw Base CSW value to use instead of the current one.
         """
         assert (addr & 0x3) == 0
         num = self.dp.next_access_number
         TRACE.debug("_read_block32:%06d (addr=0x%08x, size=%d) {", num, addr, size)
         # put address in TAR
-        self.write_reg(MEM_AP_CSW, self._csw | CSW_SIZE32)
+        self.write_reg(MEM_AP_CSW, (self._csw if csw is None else csw) | CSW_SIZE32)
         self.write_reg(MEM_AP_TAR, addr)
-        try:
-            resp = self.link.read_ap_multiple((self.ap_num << APSEL_SHIFT) | MEM_AP_DRW, size)
-        except exceptions.TransferFaultError as error:
-            # Annotate error with target address.
+
+        def handle_error(error):
             self._handle_error(error, num)
-            error.fault_address = addr
-            error.fault_length = size * 4
+            if isinstance(error, exceptions.TransferFaultError):
+                # Annotate error with target address.
+                error.fault_address = addr
+                error.fault_length = size * 4
+
+        try:
+            result_cb = self.link.read_ap_multiple((self.ap_num << APSEL_SHIFT) | MEM_AP_DRW, size, now=False)
+            self._advance_tar(size)
+        except exceptions.Error as error:
+            handle_error(error)
             raise
+
+        def read_block32_cb():
+            try:
+                resp = result_cb()
+            except exceptions.Error as error:
+                handle_error(error)
+                raise
+            TRACE.debug("_read_block32:%06d }", num)
+            return resp
+
+        if now:
+            return read_block32_cb()
+        else:
+            return read_block32_cb
+
+    @_locked
+    def _queue_read32(self, addr):
+        """! @brief Add a deferred word read to the run of pending reads.
+        
+        If the address does not continue the current run, or the run would cross an
+        auto-increment page boundary, the current run is issued and a new one is started.
+        
+        @return Callback returning the word read from _addr_.
+        """
+        batch = self._pending_reads
+        page_mask = ~(self.auto_increment_page_size - 1)
+        if (batch is None) or (addr != batch.end) or (batch.csw != self._csw) \
+                or ((addr & page_mask) != (batch.addr & page_mask)):
+            self._issue_pending_reads()
+            batch = self._pending_reads = _PendingReads(addr, self._csw)
+            self.dp.pending_reads_queued(self)
+        index = batch.count
+        batch.count += 1
+        TRACE.debug("read_mem:(addr=0x%08x, size=32) queued", addr)
+
+        def read_mem_cb():
+            if batch is self._pending_reads:
+                self._issue_pending_reads()
+            return batch.result(index)
+        return read_mem_cb
+
+    @_locked
+    def _issue_pending_reads(self):
+        """! @brief Send the pending run of deferred word reads as a single block read."""
+        batch = self._pending_reads
+        if batch is None:
+            return
+        self._pending_reads = None
+        try:
+            batch.result_cb = self._read_block32(batch.addr, batch.count, now=False, csw=batch.csw)
         except exceptions.Error as error:
-            self._handle_error(error, num)
+            # Every read in the batch reports the error.
+            batch._error = error
             raise
-        TRACE.debug("_read_block32:%06d }", num)
-        return resp
 
     @_locked
     def _write_memory_block32(self, addr, data):
@@ -639,19 +823,88 @@ class MEM_AP(AccessPort, memory_interface.MemoryInterface):
         @return An array of word values
         """
         assert (addr & 0x3) == 0
-        resp = []
+        # Queue reads for every page before waiting on the first, so the probe can keep
+        # multiple transactions in flight.
+        result_cbs = []
         while size > 0:
             n = self.auto_increment_page_size - (addr & (self.auto_increment_page_size - 1))
             if size*4 < n:
                 n = (size*4) & 0xfffffffc
-            resp += self._read_block32(addr, n//4)
+            result_cbs.append(self._read_block32(addr, n//4, now=False))
             size -= n//4
             addr += n
+        resp = []
+        for result_cb in result_cbs:
+            resp += result_cb()
         return resp
 
+    @_locked
+    def write_banked32(self, addr, data):
+        """! @brief Write a word through the banked data registers.
+        
+        TAR is set to the 16-byte block containing _addr_ and the word is written to the banked
+        data register selected by address bits [3:2]. Banked accesses do not change TAR, so
+        further accesses to the same block need no TAR writes.
+        """
+        assert (addr & 0x3) == 0
+        num = self.dp.next_access_number
+        TRACE.debug("write_banked:%06d (addr=0x%08x) = 0x%08x", num, addr, data)
+        try:
+            self.write_reg(MEM_AP_CSW, self._csw | CSW_SIZE32)
+            self.write_reg(MEM_AP_TAR, addr & ~0xf)
+            self.write_reg(MEM_AP_BD0 + (addr & 0xc), data)
+        except exceptions.TransferFaultError as error:
+            # Annotate error with target address.
+            self._handle_error(error, num)
+            error.fault_address = addr
+            error.fault_length = 4
+            raise
+        except exceptions.Error as error:
+            self._handle_error(error, num)
+            raise
+
+    @_locked
+    def read_banked32(self, addr, now=True):
+        """! @brief Read a word through the banked data registers.
+        
+        @see write_banked32()
+        """
+        assert (addr & 0x3) == 0
+        num = self.dp.next_access_number
+        TRACE.debug("read_banked:%06d (addr=0x%08x) {", num, addr)
+
+        def handle_error(error):
+            self._handle_error(error, num)
+            if isinstance(error, exceptions.TransferFaultError):
+                # Annotate error with target address.
+                error.fault_address = addr
+                error.fault_length = 4
+
+        try:
+            self.write_reg(MEM_AP_CSW, self._csw | CSW_SIZE32)
+            self.write_reg(MEM_AP_TAR, addr & ~0xf)
+            result_cb = self.read_reg(MEM_AP_BD0 + (addr & 0xc), now=False)
+        except exceptions.Error as error:
+            handle_error(error)
+            raise
+
+        def read_banked_cb():
+            try:
+                res = result_cb()
+            except exceptions.Error as error:
+                handle_error(error)
+                raise
+            TRACE.debug("read_banked:%06d (addr=0x%08x) -> 0x%08x }", num, addr, res)
+            return res
+
+        if now:
+            return read_banked_cb()
+        else:
+            return read_banked_cb
+
     def _handle_error(self, error, num):
         self.dp._handle_error(error, num)
-        self._cached_csw = -1
+        self.invalidate_cache()
 
 class AHB_AP(MEM_AP):
     """! @brief AHB-AP access port subclass.
@@ -278,6 +278,9 @@ class CortexM(Target, CoreSightCoreComponent):
     # Debug Core Register Data Register
     DCRDR = 0xE000EDF8
 
+    # Seconds to wait for S_REGRDY when a core register transfer has to be polled.
+    REGRDY_TIMEOUT = 0.5
+
     # Coprocessor Access Control Register
     CPACR = 0xE000ED88
     CPACR_CP10_CP11_MASK = (3 << 20) | (3 << 22)
@@ -604,6 +607,10 @@ class CortexM(Target, CoreSightCoreComponent):
                 fpu_type = "FPv4-SP"
             LOG.info("FPU present: " + fpu_type)
 
+    def flush(self):
+        """! @brief Flush queued transfers through the DP so errors are handled by it."""
+        self.ap.dp.flush()
+
     def write_memory(self, addr, value, transfer_size=32):
         """! @brief Write a single memory location.
         
@@ -640,6 +647,17 @@ class CortexM(Target, CoreSightCoreComponent):
         """! @brief Write an aligned block of 32-bit words."""
         self.ap.write_memory_block32(addr, data)
 
+    def read_memory_bytes(self, addr, size):
+        """! @brief Read a block of unaligned bytes in memory.
+        @return A bytearray.
+        """
+        data = self.ap.read_memory_bytes(addr, size)
+        return self.bp_manager.filter_memory_unaligned_8(addr, size, data)
+
+    def write_memory_bytes(self, addr, data):
+        """! @brief Write a block of unaligned bytes in memory from a bytes-like object."""
+        self.ap.write_memory_bytes(addr, data)
+
     def read_memory_block32(self, addr, size):
         """! @brief Read an aligned block of 32-bit words."""
         data = self.ap.read_memory_block32(addr, size)
@@ -924,11 +942,8 @@ class CortexM(Target, CoreSightCoreComponent):
         self.reset(reset_type)
 
         # wait until the unit resets
-        with timeout.Timeout(2.0) as t_o:
-            while t_o.check():
-                if self.get_state() not in (Target.TARGET_RESET, Target.TARGET_RUNNING):
-                    break
-                sleep(0.01)
+        timeout.wait_for(lambda: self.get_state() not in (Target.TARGET_RESET, Target.TARGET_RUNNING),
+                            timeout=2.0, max_interval=0.01)
 
         # Make sure the thumb bit is set in XPSR in case the reset handler
         # points to an invalid address.
@@ -1032,72 +1047,33 @@ class CortexM(Target, CoreSightCoreComponent):
             elif is_fpu_register(reg) and (not self.has_fpu):
                 raise ValueError("attempt to read FPU register without FPU")
 
-        # Handle doubles.
-        doubles = [reg for reg in reg_list if is_double_float_register(reg)]
-        hasDoubles = len(doubles) > 0
-        if hasDoubles:
-            originalRegList = reg_list
-            
-            # Strip doubles from reg_list.
-            reg_list = [reg for reg in reg_list if not is_double_float_register(reg)]
-            
-            # Read float regs required to build doubles.
-            singleRegList = []
-            for reg in doubles:
-                singleRegList += (-reg, -reg + 1)
-            singleValues = self.read_core_registers_raw(singleRegList)
-
-        # Begin all reads and writes
-        dhcsr_cb_list = []
-        reg_cb_list = []
+        # Map each register to the DCRSR selectors that contain it. Doubles are read as the two
+        # single float registers they consist of, so all registers are read in one batch.
+        dcrsr_list = []
         for reg in reg_list:
-            if is_cfbp_subregister(reg):
-                reg = CORE_REGISTER['cfbp']
+            if is_double_float_register(reg):
+                dcrsr_list += [-reg, -reg + 1]
+            elif is_cfbp_subregister(reg):
+                dcrsr_list.append(CORE_REGISTER['cfbp'])
             elif is_psr_subregister(reg):
-                reg = CORE_REGISTER['xpsr']
-
-            # write id in DCRSR
-            self.write_memory(CortexM.DCRSR, reg)
-
-            # Technically, we need to poll S_REGRDY in DHCSR here before reading DCRDR. But
-            # we're running so slow compared to the target that it's not necessary.
-            # Read it and assert that S_REGRDY is set
-
-            dhcsr_cb = self.read_memory(CortexM.DHCSR, now=False)
-            reg_cb = self.read_memory(CortexM.DCRDR, now=False)
-            dhcsr_cb_list.append(dhcsr_cb)
-            reg_cb_list.append(reg_cb)
+                dcrsr_list.append(CORE_REGISTER['xpsr'])
+            else:
+                dcrsr_list.append(reg)
 
-        # Read all results
+        # Read all registers in one batch.
+        dcrsr_vals = iter(self._read_core_registers_dcrsr(dcrsr_list))
         reg_vals = []
-        for reg, reg_cb, dhcsr_cb in zip(reg_list, reg_cb_list, dhcsr_cb_list):
-            dhcsr_val = dhcsr_cb()
-            assert dhcsr_val & CortexM.S_REGRDY
-            val = reg_cb()
-
+        for reg in reg_list:
+            val = next(dcrsr_vals)
             # Special handling for registers that are combined into a single DCRSR number.
-            if is_cfbp_subregister(reg):
+            if is_double_float_register(reg):
+                val |= next(dcrsr_vals) << 32
+            elif is_cfbp_subregister(reg):
                 val = (val >> ((-reg - 1) * 8)) & 0xff
             elif is_psr_subregister(reg):
                 val &= sysm_to_psr_mask(reg)
 
             reg_vals.append(val)
-        
-        # Merge double regs back into result list.
-        if hasDoubles:
-            results = []
-            for reg in originalRegList:
-                # Double
-                if is_double_float_register(reg):
-                    doubleIndex = doubles.index(reg)
-                    singleLow = singleValues[doubleIndex * 2]
-                    singleHigh = singleValues[doubleIndex * 2 + 1]
-                    double = (singleHigh << 32) | singleLow
-                    results.append(double)
-                # Other register
-                else:
-                    results.append(reg_vals[reg_list.index(reg)])
-            reg_vals = results
 
         return reg_vals
 
@@ -1140,10 +1116,7 @@ class CortexM(Target, CoreSightCoreComponent):
             elif is_fpu_register(reg) and (not self.has_fpu):
                 raise ValueError("attempt to write FPU register without FPU")
 
-        # Read special register if it is present in the list and
-        # convert doubles to single float register writes.
-        cfbpValue = None
-        xpsrValue = None
+        # Convert doubles to single float register writes.
         reg_data_list = []
         for reg, data in zip(reg_list, data_list):
             if is_double_float_register(reg):
@@ -1152,16 +1125,24 @@ class CortexM(Target, CoreSightCoreComponent):
                 singleLow = data & 0xffffffff
                 singleHigh = (data >> 32) & 0xffffffff
                 reg_data_list += [(-reg, singleLow), (-reg + 1, singleHigh)]
-            elif is_cfbp_subregister(reg) and cfbpValue is None:
-                cfbpValue = self.read_core_register_raw(CORE_REGISTER['cfbp'])
-            elif is_psr_subregister(reg) and xpsrValue is None:
-                xpsrValue = self.read_core_register_raw(CORE_REGISTER['xpsr'])
             else:
-                # Other register, just copy directly.
                 reg_data_list.append((reg, data))
+
+        # Read the special registers that subregister writes are merged into, both in one batch.
+        cfbpValue = None
+        xpsrValue = None
+        merge_list = []
+        if any(is_cfbp_subregister(reg) for reg in reg_list):
+            merge_list.append(CORE_REGISTER['cfbp'])
+        if any(is_psr_subregister(reg) for reg in reg_list):
+            merge_list.append(CORE_REGISTER['xpsr'])
+        if merge_list:
+            merge_vals = dict(zip(merge_list, self._read_core_registers_dcrsr(merge_list)))
+            cfbpValue = merge_vals.get(CORE_REGISTER['cfbp'])
+            xpsrValue = merge_vals.get(CORE_REGISTER['xpsr'])
         
-        # Write out registers
-        dhcsr_cb_list = []
+        # Merge subregisters into their combined register values.
+        dcrsr_data_list = []
         for reg, data in reg_data_list:
             if is_cfbp_subregister(reg):
                 # Mask in the new special register value so we don't modify the other register
@@ -1176,24 +1157,92 @@ class CortexM(Target, CoreSightCoreComponent):
                 data = (xpsrValue & (0xffffffff ^ mask)) | (data & mask)
                 xpsrValue = data
                 reg = CORE_REGISTER['xpsr']
+            dcrsr_data_list.append((reg, data))
+
+        # Write out registers in one batch.
+        self._write_core_registers_dcrsr(dcrsr_data_list)
 
-            # write DCRDR
-            self.write_memory(CortexM.DCRDR, data)
+    def _read_dcb(self, addr, now=True):
+        """! @brief Read one of the DHCSR, DCRSR or DCRDR registers.
+        
+        When the AP allows it, the banked data registers are used so the whole register transfer
+        sequence needs only one TAR write.
+        """
+        if self.ap.supports_banked_access:
+            return self.ap.read_banked32(addr, now)
+        else:
+            return self.ap.read_memory(addr, 32, now)
+
+    def _write_dcb(self, addr, value):
+        """! @brief Write one of the DHCSR, DCRSR or DCRDR registers.
+        @see _read_dcb()
+        """
+        if self.ap.supports_banked_access:
+            self.ap.write_banked32(addr, value)
+        else:
+            self.ap.write_memory(addr, value, 32)
 
-            # write id in DCRSR and flag to start write transfer
-            self.write_memory(CortexM.DCRSR, reg | CortexM.DCRSR_REGWnR)
+    def _wait_for_regrdy(self):
+        """! @brief Poll DHCSR until S_REGRDY is set.
+        @exception TimeoutError
+        """
+        with timeout.Timeout(self.REGRDY_TIMEOUT) as t_o:
+            while t_o.check():
+                if self._read_dcb(CortexM.DHCSR) & CortexM.S_REGRDY:
+                    break
+            else:
+                raise exceptions.TimeoutError("timeout waiting for core register transfer")
 
-            # Technically, we need to poll S_REGRDY in DHCSR here to ensure the
-            # register write has completed.
-            # Read it and assert that S_REGRDY is set
-            dhcsr_cb = self.read_memory(CortexM.DHCSR, now=False)
-            dhcsr_cb_list.append(dhcsr_cb)
+    def _read_core_registers_dcrsr(self, dcrsr_list):
+        """! @brief Read raw core register values given a list of DCRSR register selectors.
+        
+        The DCRSR writes and the DHCSR and DCRDR reads for every register are queued before any
+        result is waited on, so the probe receives the whole set in as few packets as possible.
+        The queued DHCSR value is checked for each register. If S_REGRDY was clear, the DCRDR
+        value is stale, and that register and all following ones are read again, this time
+        polling S_REGRDY before each DCRDR read.
+        """
+        pending = []
+        for reg in dcrsr_list:
+            self._write_dcb(CortexM.DCRSR, reg)
+            pending.append((self._read_dcb(CortexM.DHCSR, now=False),
+                            self._read_dcb(CortexM.DCRDR, now=False)))
+
+        values = []
+        for i, (dhcsr_cb, reg_cb) in enumerate(pending):
+            if not (dhcsr_cb() & CortexM.S_REGRDY):
+                LOG.debug("S_REGRDY clear after reading core register %d; retrying", dcrsr_list[i])
+                for reg in dcrsr_list[i:]:
+                    self._write_dcb(CortexM.DCRSR, reg)
+                    self._wait_for_regrdy()
+                    values.append(self._read_dcb(CortexM.DCRDR))
+                break
+            values.append(reg_cb())
+        return values
 
-        # Make sure S_REGRDY was set for all register
-        # writes
-        for dhcsr_cb in dhcsr_cb_list:
-            dhcsr_val = dhcsr_cb()
-            assert dhcsr_val & CortexM.S_REGRDY
+    def _write_core_registers_dcrsr(self, dcrsr_data_list):
+        """! @brief Write raw core register values given a list of (DCRSR selector, value) pairs.
+        
+        As with _read_core_registers_dcrsr(), all transfers are queued before any DHCSR value is
+        checked. If S_REGRDY was clear after a write, the following DCRDR write may have happened
+        while the transfer was still in progress, so that register and all following ones are
+        written again, polling S_REGRDY around each write.
+        """
+        pending = []
+        for reg, data in dcrsr_data_list:
+            self._write_dcb(CortexM.DCRDR, data)
+            self._write_dcb(CortexM.DCRSR, reg | CortexM.DCRSR_REGWnR)
+            pending.append(self._read_dcb(CortexM.DHCSR, now=False))
+
+        for i, dhcsr_cb in enumerate(pending):
+            if not (dhcsr_cb() & CortexM.S_REGRDY):
+                LOG.debug("S_REGRDY clear after writing core register %d; retrying", dcrsr_data_list[i][0])
+                for reg, data in dcrsr_data_list[i:]:
+                    self._wait_for_regrdy()
+                    self._write_dcb(CortexM.DCRDR, data)
+                    self._write_dcb(CortexM.DCRSR, reg | CortexM.DCRSR_REGWnR)
+                self._wait_for_regrdy()
+                break
 
     def set_breakpoint(self, addr, type=Target.BREAKPOINT_AUTO):
         """! @brief Set a hardware or software breakpoint at a specific location in memory.
@@ -16,7 +16,7 @@
 
 from ..core import exceptions
 from ..probe.debug_probe import DebugProbe
-from .ap import (MEM_AP_CSW, APSEL, APBANKSEL, APREG_MASK, AccessPort)
+from .ap import (MEM_AP_CSW, APSEL, APSEL_SHIFT, APBANKSEL, APREG_MASK, AccessPort)
 from ..utility.sequencer import CallSequence
 import logging
 import logging.handlers
@@ -74,6 +74,8 @@ class DebugPort(object):
         self.valid_aps = None
         self.aps = {}
         self._access_number = 0
+        ## AP with deferred reads that have not been sent to the probe yet.
+        self._pending_reads_ap = None
 
     @property
     def next_access_number(self):
@@ -104,6 +106,9 @@ class DebugPort(object):
         return self.dpidr
 
     def flush(self):
+        # Send reads deferred by an AP, so faults from them are raised here. The AP handles
+        # its own errors.
+        self.issue_pending_reads()
         try:
             self.link.flush()
         except exceptions.ProbeError as error:
@@ -209,7 +214,28 @@ class DebugPort(object):
                 )
         return seq
 
+    def pending_reads_queued(self, ap):
+        """! @brief Invoked by an AP when it starts deferring reads.
+        
+        Reads deferred by any other AP are sent first, so the probe sees accesses in order.
+        """
+        if self._pending_reads_ap is not ap:
+            self.issue_pending_reads()
+            self._pending_reads_ap = ap
+
+    def issue_pending_reads(self):
+        """! @brief Send the reads deferred by an AP.
+        
+        This is called before every DP or AP access, so that no access can be reordered with
+        respect to deferred reads.
+        """
+        ap = self._pending_reads_ap
+        if ap is not None:
+            self._pending_reads_ap = None
+            ap.issue_pending_reads()
+
     def read_dp(self, addr, now=True):
+        self.issue_pending_reads()
         num = self.next_access_number
 
         try:
@@ -235,6 +261,7 @@ class DebugPort(object):
             return read_dp_cb
 
     def write_dp(self, addr, data):
+        self.issue_pending_reads()
         num = self.next_access_number
 
         # Write the DP register.
@@ -248,7 +275,32 @@ class DebugPort(object):
         return True
 
     def write_ap(self, addr, data):
+        """! @brief Write an AP register directly.
+        
+        The access bypasses the AP object, so any register values it caches are invalidated.
+        """
+        self._invalidate_ap_cache(addr)
+        return self._write_ap(addr, data)
+
+    def read_ap(self, addr, now=True):
+        """! @brief Read an AP register directly.
+        
+        The access bypasses the AP object, so any register values it caches are invalidated.
+        """
+        self._invalidate_ap_cache(addr)
+        return self._read_ap(addr, now)
+
+    def _invalidate_ap_cache(self, addr):
+        """! @brief Invalidate register values cached by the AP selected by an AP address."""
+        self.issue_pending_reads()
+        ap = self.aps.get((addr & APSEL) >> APSEL_SHIFT)
+        if ap is not None:
+            ap.invalidate_cache()
+
+    def _write_ap(self, addr, data):
+        """! @brief Write an AP register on behalf of the AP object."""
         assert type(addr) in (six.integer_types)
+        self.issue_pending_reads()
         num = self.next_access_number
 
         try:
@@ -260,8 +312,10 @@ class DebugPort(object):
 
         return True
 
-    def read_ap(self, addr, now=True):
+    def _read_ap(self, addr, now=True):
+        """! @brief Read an AP register on behalf of the AP object."""
         assert type(addr) in (six.integer_types)
+        self.issue_pending_reads()
         num = self.next_access_number
 
         try:
@@ -288,6 +342,9 @@ class DebugPort(object):
 
     def _handle_error(self, error, num):
         TRACE.debug("error:%06d %s", num, error)
+        # AP register values cached by the APs may not have been written.
+        for ap in self.aps.values():
+            ap.invalidate_cache()
         # Clear sticky error for fault errors.
         if isinstance(error, exceptions.TransferFaultError):
             self.clear_sticky_err()
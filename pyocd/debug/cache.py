@@ -25,7 +25,7 @@ from ..coresight.cortex_m import (
 )
 from ..core import exceptions
 from ..utility import conversion
-from intervaltree import (Interval, IntervalTree)
+import bisect
 import logging
 
 LOG = logging.getLogger(__name__)
@@ -41,6 +41,8 @@ class CacheMetrics(object):
         self.misses = 0
         self.reads = 0
         self.writes = 0
+        self.evictions = 0
+        self.evicted_bytes = 0
 
     @property
     def total(self):
@@ -152,7 +154,7 @@ class RegisterCache(object):
                 read_list.append(CORE_REGISTER['xpsr'])
             xpsr_index = read_list.index(CORE_REGISTER['xpsr'])
         self._metrics.misses += len(read_list)
-        values = self._context.read_core_registers_raw(read_list)
+        values = self._context.read_core_registers_raw(read_list) if read_list else []
 
         # Update all CFBP based registers.
         if reading_cfbp:
@@ -215,6 +217,20 @@ class RegisterCache(object):
     def invalidate(self):
         self._reset_cache()
 
+class _CacheExtent(object):
+    """! @brief A contiguous range of cached memory."""
+
+    __slots__ = ('begin', 'data', 'last_use')
+
+    def __init__(self, begin, data):
+        self.begin = begin
+        self.data = data
+        self.last_use = 0
+
+    @property
+    def end(self):
+        return self.begin + len(self.data)
+
 class MemoryCache(object):
     """! @brief Memory cache.
     
@@ -228,18 +244,49 @@ class MemoryCache(object):
     memory region, or a MemoryAccessError will be raised. However, if an access is outside of all regions,
     the access is passed to the underlying context unmodified. When an access is within a region, that
     region's cacheability flag is honoured.
+    
+    Cached data is held in a sorted list of extents, each a contiguous range of memory. Adjacent and
+    overlapping extents are coalesced as data is added, so lookups stay fast however many accesses
+    are made. The total size of the extents is limited; when it is exceeded, the least recently used
+    extents are evicted.
     """
     
-    def __init__(self, context, core):
+    ## Default maximum number of bytes of memory held in the cache.
+    DEFAULT_SIZE_LIMIT = 1024 * 1024
+
+    def __init__(self, context, core, size_limit=None):
+        """! @brief Constructor.
+        @param self
+        @param context The DebugContext used to access target memory.
+        @param core The core whose run state controls invalidation.
+        @param size_limit Maximum number of bytes to cache. If not provided, DEFAULT_SIZE_LIMIT
+            is used.
+        """
         self._context = context
         self._core = core
         self._run_token = -1
+        self._size_limit = size_limit or self.DEFAULT_SIZE_LIMIT
         self._log = LOG.getChild('memcache')
+        self._generation = 0
         self._reset_cache()
 
+    @property
+    def metrics(self):
+        """! @brief CacheMetrics for accesses since the cache was last invalidated."""
+        return self._metrics
+
+    @property
+    def size(self):
+        """! @brief Number of bytes currently cached."""
+        return self._size
+
     def _reset_cache(self):
-        self._cache = IntervalTree()
+        self._extents = []
+        self._begins = []
+        self._size = 0
+        self._use_count = 0
         self._metrics = CacheMetrics()
+        self._generation += 1
 
     def _check_cache(self):
         """! @brief Invalidates the cache if appropriate."""
@@ -252,151 +299,125 @@ class MemoryCache(object):
             self._reset_cache()
             self._run_token = self._core.run_token
 
-    def _get_ranges(self, addr, count):
-        """! @brief Splits a memory address range into cached and uncached subranges.
-        @return Returns a 2-tuple with the first element being a set of Interval objects for each
-          of the cached subranges. The second element is a set of Interval objects for each of the
-          non-cached subranges.
-        """
-        cached = self._cache.overlap(addr, addr + count)
-        uncached = {Interval(addr, addr + count)}
-        for cachedIv in cached:
-            newUncachedSet = set()
-            for uncachedIv in uncached:
-
-                # No overlap.
-                if cachedIv.end < uncachedIv.begin or cachedIv.begin > uncachedIv.end:
-                    newUncachedSet.add(uncachedIv)
-                    continue
-
-                # Begin segment.
-                if cachedIv.begin - uncachedIv.begin > 0:
-                    newUncachedSet.add(Interval(uncachedIv.begin, cachedIv.begin))
+    def _touch(self, extent):
+        self._use_count += 1
+        extent.last_use = self._use_count
 
-                # End segment.
-                if uncachedIv.end - cachedIv.end > 0:
-                    newUncachedSet.add(Interval(cachedIv.end, uncachedIv.end))
-            uncached = newUncachedSet
-        return cached, uncached
+    def _find(self, addr, end, adjacent=False):
+        """! @brief Locate the extents intersecting an address range.
+        @param self
+        @param addr Start address.
+        @param end End address, exclusive.
+        @param adjacent If True, extents that end at @a addr or begin at @a end are included.
+        @return Tuple of the start and end indices of the extents.
+        """
+        i = bisect.bisect_right(self._begins, addr) - 1
+        if (i < 0) or (self._extents[i].end < addr) or (not adjacent and self._extents[i].end == addr):
+            i += 1
+        if adjacent:
+            j = bisect.bisect_right(self._begins, end)
+        else:
+            j = bisect.bisect_left(self._begins, end)
+        return i, j
 
-    def _read_uncached(self, uncached):
-        """! "@brief Reads uncached memory ranges and updates the cache.
-        @return A list of Interval objects is returned. Each Interval has its @a data attribute set
-          to a bytearray of the data read from target memory.
+    def _store(self, addr, data):
+        """! @brief Add data to the cache, replacing any cached data for its range.
+        
+        The data is copied. It is coalesced with overlapping and adjacent extents.
         """
-        uncachedData = []
-        for uncachedIv in uncached:
-            data = self._context.read_memory_block8(uncachedIv.begin, uncachedIv.end - uncachedIv.begin)
-            iv = Interval(uncachedIv.begin, uncachedIv.end, bytearray(data))
-            self._cache.add(iv) # TODO merge contiguous cached intervals
-            uncachedData.append(iv)
-        return uncachedData
-
-    def _update_metrics(self, cached, uncached, addr, size):
-        cachedSize = 0
-        for iv in cached:
-            begin = iv.begin
-            end = iv.end
-            if iv.begin < addr:
-                begin = addr
-            if iv.end > addr + size:
-                end = addr + size
-            cachedSize += end - begin
-
-        uncachedSize = sum((iv.end - iv.begin) for iv in uncached)
+        end = addr + len(data)
+        i, j = self._find(addr, end, adjacent=True)
+
+        # Fast path for data entirely within one extent.
+        if (j - i == 1) and (self._extents[i].begin <= addr) and (self._extents[i].end >= end):
+            extent = self._extents[i]
+            offset = addr - extent.begin
+            extent.data[offset:offset + len(data)] = data
+            self._touch(extent)
+            return
 
-        self._metrics.reads += 1
-        self._metrics.hits += cachedSize
-        self._metrics.misses += uncachedSize
+        if i < j:
+            first = self._extents[i]
+            last = self._extents[j - 1]
+            tail = last.data[end - last.begin:] if (last.end > end) else bytearray()
+            self._size -= sum(len(e.data) for e in self._extents[i:j])
+            if first.begin <= addr:
+                # Extend the first extent in place.
+                first.data[addr - first.begin:] = data
+                first.data += tail
+                extent = first
+            else:
+                extent = _CacheExtent(addr, bytearray(data) + tail)
+            del self._extents[i:j]
+            del self._begins[i:j]
+        else:
+            extent = _CacheExtent(addr, bytearray(data))
+        self._extents.insert(i, extent)
+        self._begins.insert(i, extent.begin)
+        self._size += len(extent.data)
+        self._touch(extent)
+        self._evict()
+
+    def _evict(self):
+        """! @brief Remove least recently used extents until the cache is within its size limit."""
+        while self._size > self._size_limit:
+            index = min(range(len(self._extents)), key=lambda n: self._extents[n].last_use)
+            extent = self._extents.pop(index)
+            del self._begins[index]
+            self._size -= len(extent.data)
+            self._metrics.evictions += 1
+            self._metrics.evicted_bytes += len(extent.data)
 
     def _dump_metrics(self):
         if self._metrics.total > 0:
-            self._log.debug("%d reads, %d bytes [%d%% hits, %d bytes]; %d bytes written",
+            self._log.debug("%d reads, %d bytes [%d%% hits, %d bytes]; %d bytes written; "
+                "%d evictions [%d bytes]",
                 self._metrics.reads, self._metrics.total, self._metrics.percent_hit,
-                self._metrics.hits, self._metrics.writes)
+                self._metrics.hits, self._metrics.writes, self._metrics.evictions,
+                self._metrics.evicted_bytes)
         else:
             self._log.debug("no reads")
 
     def _read(self, addr, size):
         """! @brief Performs a cached read operation of an address range.
-        @return A list of Interval objects sorted by address.
-        """
-        # Get the cached and uncached subranges of the requested read.
-        cached, uncached = self._get_ranges(addr, size)
-        self._update_metrics(cached, uncached, addr, size)
-
-        # Read any uncached ranges.
-        uncachedData = self._read_uncached(uncached)
-
-        # Merged cached with data we just read
-        combined = list(cached) + uncachedData
-        combined.sort(key=lambda x: x.begin)
-        return combined
-
-    def _merge_data(self, combined, addr, size):
-        """! @brief Extracts data from the intersection of an address range across a list of interval objects.
         
-        The range represented by @a addr and @a size are assumed to overlap the intervals. The first
-        and last interval in the list may have ragged edges not fully contained in the address range, in
-        which case the correct slice of those intervals is extracted.
+        Cached extents are copied into the result, and the gaps between them are read from the
+        target. The complete range is then stored back to the cache as a single extent.
         
-        @param self
-        @param combined List of Interval objects forming a contiguous range. The @a data attribute of
-          each interval must be a bytearray.
-        @param addr Start address. Must be within the range of the first interval.
-        @param size Number of bytes. (@a addr + @a size) must be within the range of the last interval.
-        @return A single bytearray object with all data from the intervals that intersects the address
-          range.
+        @return A bytearray of length @a size.
         """
-        result = bytearray()
-        resultAppend = bytearray()
-
-        # Check for fully contained subrange.
-        if len(combined) and combined[0].begin < addr and combined[0].end > addr + size:
-            offset = addr - combined[0].begin
-            endOffset = offset + size
-            result = combined[0].data[offset:endOffset]
-            return result
-        
-        # Take slice of leading ragged edge.
-        if len(combined) and combined[0].begin < addr:
-            offset = addr - combined[0].begin
-            result += combined[0].data[offset:]
-            combined = combined[1:]
-        # Take slice of trailing ragged edge.
-        if len(combined) and combined[-1].end > addr + size:
-            offset = addr + size - combined[-1].begin
-            resultAppend = combined[-1].data[:offset]
-            combined = combined[:-1]
-
-        # Merge.
-        for iv in combined:
-            result += iv.data
-        result += resultAppend
-
-        return result
-
-    def _update_contiguous(self, cached, addr, value):
-        size = len(value)
         end = addr + size
-        leadBegin = addr
-        leadData = bytearray()
-        trailData = bytearray()
-        trailEnd = end
-
-        if cached[0].begin < addr and cached[0].end > addr:
-            offset = addr - cached[0].begin
-            leadData = cached[0].data[:offset]
-            leadBegin = cached[0].begin
-        if cached[-1].begin < end and cached[-1].end > end:
-            offset = end - cached[-1].begin
-            trailData = cached[-1].data[offset:]
-            trailEnd = cached[-1].end
-
-        self._cache.remove_overlap(addr, end)
+        i, j = self._find(addr, end)
+        self._metrics.reads += 1
 
-        data = leadData + value + trailData
-        self._cache.addi(leadBegin, trailEnd, data)
+        # Fast path for a range entirely within one extent.
+        if (j - i == 1) and (self._extents[i].begin <= addr) and (self._extents[i].end >= end):
+            extent = self._extents[i]
+            self._touch(extent)
+            self._metrics.hits += size
+            offset = addr - extent.begin
+            return extent.data[offset:offset + size]
+
+        result = bytearray(size)
+        pos = addr
+        hits = 0
+        for extent in self._extents[i:j]:
+            if extent.begin > pos:
+                result[pos - addr:extent.begin - addr] = \
+                        self._context.read_memory_bytes(pos, extent.begin - pos)
+                pos = extent.begin
+            overlap_end = min(extent.end, end)
+            result[pos - addr:overlap_end - addr] = \
+                    extent.data[pos - extent.begin:overlap_end - extent.begin]
+            hits += overlap_end - pos
+            pos = overlap_end
+        if pos < end:
+            result[pos - addr:] = self._context.read_memory_bytes(pos, end - pos)
+
+        self._metrics.hits += hits
+        self._metrics.misses += size - hits
+        self._store(addr, result)
+        return result
 
     def _check_regions(self, addr, count):
         """! @return A bool indicating whether the given address range is fully contained within
@@ -416,14 +437,59 @@ class MemoryCache(object):
         # Otherwise return whether the region is cacheable.
         return regions[0].is_cacheable
 
+    def _read_memory_deferred(self, addr, transfer_size):
+        """! @brief Start a deferred read of a single location that is not cached.
+
+        The read is passed to the underlying context as a deferred transfer, so several of them
+        can be pipelined. The value is added to the cache when the returned callback is called,
+        provided no write or invalidation has happened since the read was started.
+
+        @return Callback returning the value, or None if the location is cached or the access is
+            not aligned, in which case a normal read should be performed.
+        """
+        size = transfer_size // 8
+        if addr % size:
+            return None
+
+        self._check_cache()
+        if not self._check_regions(addr, size):
+            return self._context.read_memory(addr, transfer_size, now=False)
+
+        i, j = self._find(addr, addr + size)
+        if (j - i == 1) and (self._extents[i].begin <= addr) and (self._extents[i].end >= addr + size):
+            return None
+
+        result_cb = self._context.read_memory(addr, transfer_size, now=False)
+        generation = self._generation
+
+        def read_cb():
+            value = result_cb()
+            if generation == self._generation:
+                self._metrics.reads += 1
+                self._metrics.misses += size
+                if transfer_size == 8:
+                    data = bytearray([value])
+                elif transfer_size == 16:
+                    data = bytearray(conversion.u16le_list_to_byte_list([value]))
+                else:
+                    data = conversion.u32le_list_to_bytes([value])
+                self._store(addr, data)
+            return value
+        return read_cb
+
     def read_memory(self, addr, transfer_size=32, now=True):
+        if not now:
+            read_cb = self._read_memory_deferred(addr, transfer_size)
+            if read_cb is not None:
+                return read_cb
+
         # TODO use more optimal underlying read_memory call
         if transfer_size == 8:
-            data = self.read_memory_block8(addr, 1)[0]
+            data = self.read_memory_bytes(addr, 1)[0]
         elif transfer_size == 16:
-            data = conversion.byte_list_to_u16le_list(self.read_memory_block8(addr, 2))[0]
+            data = conversion.byte_list_to_u16le_list(self.read_memory_bytes(addr, 2))[0]
         elif transfer_size == 32:
-            data = conversion.byte_list_to_u32le_list(self.read_memory_block8(addr, 4))[0]
+            data = conversion.bytes_to_u32le_list(self.read_memory_bytes(addr, 4))[0]
 
         if now:
             return data
@@ -432,27 +498,29 @@ class MemoryCache(object):
                 return data
             return read_cb
 
-    def read_memory_block8(self, addr, size):
+    def read_memory_bytes(self, addr, size):
+        """! @brief Read a block of bytes, using cached data where possible.
+        @return A bytearray of length @a size.
+        """
         if size <= 0:
-            return []
+            return bytearray()
 
         self._check_cache()
 
         # Validate memory regions.
         if not self._check_regions(addr, size):
             self._log.debug("range [%x:%x] is not cacheable", addr, addr+size)
-            return self._context.read_memory_block8(addr, size)
+            return self._context.read_memory_bytes(addr, size)
 
-        # Get the cached and uncached subranges of the requested read.
-        combined = self._read(addr, size)
-
-        # Extract data out of combined intervals.
-        result = list(self._merge_data(combined, addr, size))
+        result = self._read(addr, size)
         assert len(result) == size, "result size ({}) != requested size ({})".format(len(result), size)
         return result
 
+    def read_memory_block8(self, addr, size):
+        return list(self.read_memory_bytes(addr, size))
+
     def read_memory_block32(self, addr, size):
-        return conversion.byte_list_to_u32le_list(self.read_memory_block8(addr, size*4))
+        return conversion.bytes_to_u32le_list(self.read_memory_bytes(addr, size*4))
 
     def write_memory(self, addr, value, transfer_size=32):
         if transfer_size == 8:
@@ -463,6 +531,10 @@ class MemoryCache(object):
             return self.write_memory_block8(addr, conversion.u32le_list_to_byte_list([value]))
 
     def write_memory_block8(self, addr, value):
+        return self.write_memory_bytes(addr, bytearray(value))
+
+    def write_memory_bytes(self, addr, value):
+        """! @brief Write a bytes-like object to memory and update the cache."""
         if len(value) <= 0:
             return
 
@@ -471,32 +543,19 @@ class MemoryCache(object):
         # Validate memory regions.
         cacheable = self._check_regions(addr, len(value))
 
-        # Write to the target first, so if it fails we don't update the cache.
-        result = self._context.write_memory_block8(addr, value)
+        # Write to the target first, so if it fails we don't update the cache. Deferred reads
+        # started before this write must not update the cache with old data.
+        self._generation += 1
+        result = self._context.write_memory_bytes(addr, value)
 
         if cacheable:
-            size = len(value)
-            end = addr + size
-            cached = sorted(self._cache.overlap(addr, end), key=lambda x:x.begin)
-            self._metrics.writes += size
-
-            if len(cached):
-                # Write data is entirely within a single cached interval.
-                if addr >= cached[0].begin and end <= cached[0].end:
-                    beginOffset = addr - cached[0].begin
-                    endOffset = beginOffset + size
-                    cached[0].data[beginOffset:endOffset] = value
-
-                else:
-                    self._update_contiguous(cached, addr, bytearray(value))
-            else:
-                # No cached data in this range, so just add the entire interval.
-                self._cache.addi(addr, end, bytearray(value))
+            self._metrics.writes += len(value)
+            self._store(addr, value)
 
         return result
 
     def write_memory_block32(self, addr, data):
-        return self.write_memory_block8(addr, conversion.u32le_list_to_byte_list(data))
+        return self.write_memory_bytes(addr, conversion.u32le_list_to_bytes(data))
 
     def invalidate(self):
         self._reset_cache()
@@ -507,7 +566,8 @@ class CachingDebugContext(DebugContext):
     def __init__(self, parent):
         super(CachingDebugContext, self).__init__(parent)
         self._regcache = RegisterCache(parent, self.core)
-        self._memcache = MemoryCache(parent, self.core)
+        self._memcache = MemoryCache(parent, self.core,
+                                        self.core.session.options.get('cache.memory_limit'))
 
     def write_memory(self, addr, value, transfer_size=32):
         return self._memcache.write_memory(addr, value, transfer_size)
@@ -527,6 +587,12 @@ class CachingDebugContext(DebugContext):
     def read_memory_block32(self, addr, size):
         return self._memcache.read_memory_block32(addr, size)
 
+    def write_memory_bytes(self, addr, data):
+        return self._memcache.write_memory_bytes(addr, data)
+
+    def read_memory_bytes(self, addr, size):
+        return self._memcache.read_memory_bytes(addr, size)
+
     def read_core_registers_raw(self, reg_list):
         return self._regcache.read_core_registers_raw(reg_list)
 
@@ -537,5 +603,45 @@ class CachingDebugContext(DebugContext):
         self._regcache.invalidate()
         self._memcache.invalidate()
 
+    def prefetch(self, reg_list, stack_size=0, code_size=0):
+        """! @brief Read state that a debugger commonly needs after the core halts into the caches.
+
+        The registers in @a reg_list, plus SP and PC, are read with a single batched transfer.
+        Then @a stack_size bytes from the stack pointer and @a code_size bytes around the PC are
+        read. Each memory range is limited to the cacheable region containing its address, and
+        errors reading memory are ignored, so the prefetch never fails because of a bad SP or PC.
+
+        The cached values remain valid until the core's run token changes.
+
+        @param self
+        @param reg_list List of register names or indices to read.
+        @param stack_size Number of bytes of the stack to read.
+        @param code_size Number of bytes of memory centered on the PC to read.
+        """
+        reg_list = [register_name_to_index(reg) for reg in reg_list]
+        for reg in (CORE_REGISTER['sp'], CORE_REGISTER['pc']):
+            if reg not in reg_list:
+                reg_list.append(reg)
+        values = self._regcache.read_core_registers_raw(reg_list)
+        sp = values[reg_list.index(CORE_REGISTER['sp'])]
+        pc = values[reg_list.index(CORE_REGISTER['pc'])] & ~1
+
+        self._prefetch_memory(sp, sp & ~3, sp + stack_size)
+        self._prefetch_memory(pc, (pc - code_size // 2) & ~3, pc + code_size // 2)
+
+    def _prefetch_memory(self, addr, start, end):
+        """! @brief Read the part of [start, end) in the region containing addr into the cache."""
+        if end <= start:
+            return
+        region = self.core.memory_map.get_region_for_address(addr)
+        if (region is None) or not region.is_cacheable:
+            return
+        start = max(start, region.start)
+        end = min(end, region.end + 1)
+        try:
+            self._memcache.read_memory_bytes(start, end - start)
+        except (exceptions.TransferError, MemoryAccessError) as err:
+            LOG.debug("prefetch of [%#010x:%#010x] failed: %s", start, end, err)
+
 
 
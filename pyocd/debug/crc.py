@@ -0,0 +1,201 @@
+# pyOCD debugger
+# Copyright (c) 2020 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import binascii
+import logging
+
+from ..core import exceptions
+from ..core.memory_map import MemoryType
+from ..core.target import Target
+from ..utility.timeout import PollBackoff
+
+LOG = logging.getLogger(__name__)
+
+## Table to reverse the order of bits in a byte.
+_BIT_REVERSE = bytes(bytearray(int('{0:08b}'.format(i)[::-1], 2) for i in range(256)))
+
+def _reverse32(value):
+    return int('{0:032b}'.format(value)[::-1], 2)
+
+def crc32_mpeg2(data, crc=0xffffffff):
+    """! @brief Compute the CRC used by gdb's qCRC packet and compare-sections command.
+
+    This is the MSB-first CRC-32 with polynomial 0x04c11db7 and no final inversion, also known
+    as CRC-32/MPEG-2. The bits of each byte are reversed so the LSB-first CRC-32 implemented in C
+    by binascii can do the work, then the bits of the result are reversed.
+
+    @param data Bytes-like object.
+    @param crc Initial CRC value, or the CRC of the preceding data.
+    @return The CRC as an unsigned integer.
+    """
+    reflected = binascii.crc32(bytes(data).translate(_BIT_REVERSE), ~_reverse32(crc) & 0xffffffff)
+    return _reverse32(~reflected & 0xffffffff)
+
+## Routine to compute crc32_mpeg2() on a Cortex-M core, in Thumb code for ARMv6-M.
+#
+# The code is relocatable and must be on a 4 byte boundary. The first halfword is a breakpoint
+# used as the return address. The entry point at offset 2 takes the start address in r0, the
+# length in r1, the initial CRC in r2, and the address of a 1 KB buffer for the CRC table in r3.
+# It returns the CRC in r0, and only uses r0-r7 and no stack.
+#
+#     base:   bkpt    #0
+#     entry:  ldr     r4, poly
+#             movs    r5, #0
+#     1:      lsls    r6, r5, #24         @ Build the table entry for each byte value.
+#             movs    r7, #8
+#     2:      lsls    r6, r6, #1
+#             bcc     3f
+#             eors    r6, r4
+#     3:      subs    r7, #1
+#             bne     2b
+#             lsls    r7, r5, #2
+#             str     r6, [r3, r7]
+#             adds    r5, #1
+#             lsrs    r7, r5, #8
+#             beq     1b
+#             cmp     r1, #0
+#             beq     5f
+#             adds    r1, r0, r1
+#     4:      ldrb    r5, [r0]            @ crc = (crc << 8) ^ table[(crc >> 24) ^ byte]
+#             adds    r0, #1
+#             lsrs    r6, r2, #24
+#             eors    r6, r5
+#             lsls    r6, r6, #2
+#             ldr     r6, [r3, r6]
+#             lsls    r2, r2, #8
+#             eors    r2, r6
+#             cmp     r0, r1
+#             bne     4b
+#     5:      movs    r0, r2
+#             bx      lr
+#             .align  2
+#     poly:   .word   0x04c11db7
+CRC_ROUTINE = (
+    0x4c0ebe00, 0x062e2500, 0x00762708, 0x4066d300, 0xd1fa3f01, 0x51de00af, 0x0a2f3501, 0x2900d0f3,
+    0x1841d00a, 0x30017805, 0x406e0e16, 0x599e00b6, 0x40720212, 0xd1f54288, 0x47700010, 0x04c11db7,
+    )
+
+class MemoryCRC(object):
+    """! @brief Computes the gdb CRC of a range of target memory.
+
+    Large ranges are checksummed by running a small routine on the core, so only a few words are
+    transferred instead of the whole range. The routine is loaded into the RAM reserved for the
+    flash algorithm's CRC analyzer, so this is only possible if a flash region has a flash
+    algorithm with the analyzer supported. The RAM contents and the core registers used are saved
+    before the routine runs and restored afterwards, and interrupts are masked while it runs.
+
+    Small ranges, and ranges that cannot be checksummed on the core, are read in bulk and
+    checksummed on the host.
+    """
+
+    ## Ranges at least this large are checksummed on the core.
+    MIN_TARGET_LENGTH = 0x1000
+
+    ## Offset of the CRC table from the start of the workspace.
+    TABLE_OFFSET = 0x100
+
+    ## Bytes of RAM used by the routine and its table.
+    WORKSPACE_SIZE = TABLE_OFFSET + 0x400
+
+    ## Registers changed by running the routine.
+    SAVED_REGISTERS = ['r0', 'r1', 'r2', 'r3', 'r4', 'r5', 'r6', 'r7', 'lr', 'pc', 'xpsr', 'cfbp']
+
+    ## Bytes read at a time when checksumming on the host.
+    READ_CHUNK_SIZE = 0x10000
+
+    def __init__(self, context):
+        """! @brief Constructor.
+        @param self
+        @param context Debug context used to access the core and memory.
+        """
+        self._context = context
+
+    def compute(self, addr, length, crc=0xffffffff):
+        """! @brief Compute the CRC of a range of memory.
+        @param self
+        @param addr Start address.
+        @param length Number of bytes.
+        @param crc Initial CRC value.
+        @return The CRC as an unsigned integer.
+        @exception TransferError Memory could not be read.
+        """
+        if length >= self.MIN_TARGET_LENGTH:
+            workspace = self._find_workspace(addr, length)
+            if workspace is not None:
+                try:
+                    return self._compute_on_target(workspace, addr, length, crc)
+                except exceptions.Error as err:
+                    LOG.debug("CRC on target failed, computing on host: %s", err)
+        return self._compute_on_host(addr, length, crc)
+
+    def _compute_on_host(self, addr, length, crc):
+        end = addr + length
+        while addr < end:
+            size = min(self.READ_CHUNK_SIZE, end - addr)
+            crc = crc32_mpeg2(self._context.read_memory_bytes(addr, size), crc)
+            addr += size
+        return crc
+
+    def _find_workspace(self, addr, length):
+        """! @brief Return the address of RAM for the routine, or None if none is available."""
+        core = self._context.core
+        if addr + length > (1 << 32):
+            return None
+        for region in core.memory_map.get_regions_of_type(MemoryType.FLASH):
+            flash = region.flash
+            if (flash is None) or not flash.use_analyzer:
+                continue
+            workspace = flash.flash_algo['analyzer_address']
+            if (workspace + self.WORKSPACE_SIZE <= addr) or (addr + length <= workspace):
+                # The routine can only be run while the core is halted.
+                if core.get_state() != Target.TARGET_HALTED:
+                    return None
+                return workspace
+        return None
+
+    def _compute_on_target(self, workspace, addr, length, crc):
+        core = self._context.core
+        saved_registers = core.read_core_registers_raw(self.SAVED_REGISTERS)
+        saved_ram = core.read_memory_block32(workspace, self.WORKSPACE_SIZE // 4)
+        saved_catch = core.get_vector_catch()
+        try:
+            core.write_memory_block32(workspace, CRC_ROUTINE)
+            # Halt instead of running the application's handler if the routine faults.
+            core.set_vector_catch(Target.CATCH_ALL)
+            core.write_core_registers_raw(['r0', 'r1', 'r2', 'r3', 'lr', 'pc', 'primask'],
+                    [addr, length, crc, workspace + self.TABLE_OFFSET, workspace + 1,
+                    workspace + 3, 1])
+            core.resume()
+
+            # Allow for a slow core, at over 100 cycles per byte.
+            timeout = 1.0 + length / 100000.0
+            backoff = PollBackoff(timeout=timeout)
+            while core.get_state() != Target.TARGET_HALTED:
+                if not backoff.wait():
+                    core.halt()
+                    raise exceptions.TimeoutError("CRC routine did not complete within %g seconds"
+                            % timeout)
+            if core.read_core_register_raw('pc') != workspace:
+                raise exceptions.TargetError("CRC routine stopped at unexpected address 0x%08x"
+                        % core.read_core_register_raw('pc'))
+            result = core.read_core_register_raw('r0')
+            LOG.debug("CRC of [0x%08x..0x%08x] on target took %.3f s", addr, addr + length - 1,
+                    backoff.elapsed)
+            return result
+        finally:
+            core.set_vector_catch(saved_catch)
+            core.write_memory_block32(workspace, saved_ram)
+            core.write_core_registers_raw(self.SAVED_REGISTERS, saved_registers)
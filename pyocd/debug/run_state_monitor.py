@@ -0,0 +1,233 @@
+# pyOCD debugger
+# Copyright (c) 2020 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import threading
+from time import time
+
+from ..core import exceptions
+from ..core.target import Target
+from ..utility.timeout import PollBackoff
+
+LOG = logging.getLogger(__name__)
+
+## Core states in which the core is not halted.
+_RUNNING_STATES = (Target.TARGET_RUNNING, Target.TARGET_SLEEPING, Target.TARGET_LOCKUP,
+                    Target.TARGET_RESET)
+
+class RunStateMonitor(object):
+    """! @brief Tracks whether a core is running and detects when it halts.
+
+    While the core is believed to be running, a background thread polls its state. The polls start
+    at a short interval so quick halts, such as breakpoints hit soon after resuming or semihosting
+    requests, are seen with low latency. The interval then backs off so a core that runs for a
+    long time costs fewer polls, without the halt latency exceeding the maximum interval.
+
+    Polling only starts when the owner of the monitor calls resumed(), and only that owner should
+    access the core while the monitor is polling. Other code that runs the core, such as flash
+    algorithms or reset, does its own waiting and is not followed by the monitor, so it does not
+    pay for a second thread reading the core's state. A post-halt notification marks the core as
+    halted. Before accessing the core while the monitor may be polling, call halted(), which
+    returns once any poll in progress is complete.
+
+    Threads wait for a change of state with wait_for_halt() and wait_for_running(), which block on
+    a condition variable rather than accessing the target themselves. One monitor can be shared by
+    all users of a core, such as the gdbserver and the SWV reader.
+
+    A core is considered halted only in the Target.TARGET_HALTED state. Sleeping, lockup, and
+    reset states are treated as running.
+    """
+
+    ## Shortest time between polls, used just after the core resumes.
+    MIN_INTERVAL = 0.0005
+
+    ## Default longest time between polls.
+    MAX_INTERVAL = 0.01
+
+    def __init__(self, session, core, max_interval=MAX_INTERVAL):
+        """! @brief Constructor.
+        @param self
+        @param session The session, used to subscribe to notifications from the core.
+        @param core The core to monitor.
+        @param max_interval Longest time between polls in seconds.
+        """
+        self._session = session
+        self._core = core
+        self._max_interval = max_interval
+        self._lock = threading.Condition()
+        self._poll_lock = threading.Lock()
+        self._wake_event = threading.Event()
+        self._running = False
+        self._state = None
+        self._sequence = 0
+        self._shutdown = False
+        self._thread = None
+
+    @property
+    def is_running(self):
+        """! @brief Whether the core is believed to be running."""
+        return self._running
+
+    @property
+    def state(self):
+        """! @brief The last state read from the core.
+
+        This is None if the state has not been read yet, or if the last read failed.
+        """
+        return self._state
+
+    def start(self):
+        """! @brief Start monitoring.
+
+        The core is assumed to be halted until resumed() is called.
+        """
+        if self._thread is not None:
+            return
+        self._shutdown = False
+        self._session.subscribe(self._post_halt_handler, Target.EVENT_POST_HALT, self._core)
+        self._thread = threading.Thread(target=self._poll_thread,
+                name="run-state-monitor-core%d" % getattr(self._core, 'core_number', 0))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """! @brief Stop monitoring and wake all waiters."""
+        if self._thread is None:
+            return
+        self._session.unsubscribe(self._post_halt_handler)
+        with self._lock:
+            self._shutdown = True
+            self._wake_event.set()
+            self._lock.notify_all()
+        self._thread.join()
+        self._thread = None
+
+    def resumed(self, poll=True):
+        """! @brief Inform the monitor that the core has been resumed.
+
+        @param self
+        @param poll Whether to poll the core until it halts, restarting from the shortest
+            interval. If False, the core is only marked as running, for a caller that polls the
+            core itself and calls halted() when it sees a halt.
+        """
+        with self._lock:
+            self._running = True
+            self._sequence += 1
+            if poll:
+                self._wake_event.set()
+            self._lock.notify_all()
+
+    def halted(self):
+        """! @brief Inform the monitor that the core is halted, or about to be halted by the caller.
+
+        Polling stops. This method returns once any poll in progress has completed, so the caller
+        can then access the core without racing the monitor's thread.
+        """
+        with self._lock:
+            self._set_halted(Target.TARGET_HALTED)
+        # Wait for a poll that was already in progress.
+        with self._poll_lock:
+            pass
+
+    def wake(self):
+        """! @brief Wake threads blocked in one of the wait methods so they check their event."""
+        with self._lock:
+            self._lock.notify_all()
+
+    def wait_for_halt(self, timeout=None, event=None):
+        """! @brief Wait until the core halts.
+        @param self
+        @param timeout Maximum time to wait in seconds, or None to wait forever.
+        @param event Optional threading.Event that ends the wait when set. Call wake() after
+            setting the event so the waiter notices it immediately.
+        @return Boolean of whether the core is halted.
+        """
+        return self._wait(False, timeout, event)
+
+    def wait_for_running(self, timeout=None, event=None):
+        """! @brief Wait until the core is running.
+
+        Parameters are the same as for wait_for_halt().
+
+        @return Boolean of whether the core is running.
+        """
+        return self._wait(True, timeout, event)
+
+    def _wait(self, running, timeout, event):
+        deadline = None if (timeout is None) else (time() + timeout)
+        with self._lock:
+            while (self._running != running) and not self._shutdown:
+                if (event is not None) and event.is_set():
+                    break
+                if deadline is None:
+                    self._lock.wait()
+                else:
+                    remaining = deadline - time()
+                    if remaining <= 0:
+                        break
+                    self._lock.wait(remaining)
+            return self._running == running
+
+    def _set_halted(self, state):
+        """! @brief Mark the core as not running. Must be called with the lock held."""
+        self._running = False
+        self._sequence += 1
+        self._state = state
+        self._lock.notify_all()
+
+    def _post_halt_handler(self, notification):
+        with self._lock:
+            self._set_halted(Target.TARGET_HALTED)
+
+    def _poll_thread(self):
+        """! @brief Background thread that polls the core while it is running."""
+        while True:
+            with self._lock:
+                while not self._wake_event.is_set() and not self._shutdown:
+                    self._lock.wait()
+                if self._shutdown:
+                    return
+                sequence = self._sequence
+                self._wake_event.clear()
+
+            backoff = PollBackoff(min_interval=self.MIN_INTERVAL, max_interval=self._max_interval,
+                                    event=self._wake_event)
+            while True:
+                with self._poll_lock:
+                    # Check before every poll, so no poll is started after halted() is called
+                    # or a halt notification is received.
+                    with self._lock:
+                        if (sequence != self._sequence) or not self._running or self._shutdown:
+                            break
+                    try:
+                        state = self._core.get_state()
+                    except exceptions.Error as err:
+                        # Let waiters read the state themselves and handle the error.
+                        LOG.debug("Failed to read core state: %s", err)
+                        state = None
+
+                with self._lock:
+                    # A new resume or a halt supersedes this poll.
+                    if (sequence != self._sequence) or not self._running:
+                        break
+                    if state not in _RUNNING_STATES:
+                        self._set_halted(state)
+                        break
+                    self._state = state
+
+                if not backoff.wait():
+                    # Woken by a resume or by stop().
+                    break
@@ -17,11 +17,13 @@
 from ..core.target import Target
 from ..core.exceptions import (FlashFailure, FlashEraseFailure, FlashProgramFailure)
 from ..utility.mask import msb
+from ..utility.timeout import PollBackoff
 import logging
 from struct import unpack
 from time import time
 from enum import Enum
 from .flash_builder import FlashBuilder
+from .manifest import FlashManifest
 
 LOG = logging.getLogger(__name__)
 
@@ -134,6 +136,11 @@ class Flash(object):
         self._region = None
         self._did_prepare_target = False
         self._active_operation = None
+        self._call_start_time = None
+        self._call_pc = None
+        self._call_expected_time = None
+        ## Last measured duration of each algo entry point, used to pace completion polling.
+        self._call_durations = {}
         if flash_algo is not None:
             self.is_valid = True
             self.use_analyzer = flash_algo['analyzer_supported']
@@ -330,8 +337,11 @@ class Flash(object):
         assert self._active_operation == self.Operation.ERASE
         assert self.is_erase_all_supported
 
+        self._remove_from_manifest()
+
         # update core register to execute the erase_all subroutine
-        result = self._call_function_and_wait(self.flash_algo['pc_eraseAll'])
+        result = self._call_function_and_wait(self.flash_algo['pc_eraseAll'],
+                                                expected_time=self.get_flash_info().erase_weight)
 
         # check the return code
         if result != 0:
@@ -345,13 +355,33 @@ class Flash(object):
         """
         assert self._active_operation == self.Operation.ERASE
 
+        self._remove_from_manifest(address)
+
         # update core register to execute the erase_sector subroutine
-        result = self._call_function_and_wait(self.flash_algo['pc_erase_sector'], address)
+        result = self._call_function_and_wait(self.flash_algo['pc_erase_sector'], address,
+                                                expected_time=self.get_sector_info(address).erase_weight)
 
         # check the return code
         if result != 0:
             raise FlashEraseFailure('erase_sector(0x%x) error: %i' % (address, result), address, result)
 
+    def _remove_from_manifest(self, address=None):
+        """! @brief Forget the recorded contents of flash about to be erased.
+        
+        @param self
+        @param address Address of the sector being erased. If None, the whole region is erased.
+        """
+        manifest = FlashManifest.for_session(self.target.session)
+        if (manifest is None) or (self.region is None):
+            return
+        if address is None:
+            changed = manifest.remove_region(self.region)
+        else:
+            changed = manifest.remove_sectors(self.region, [address])
+        # Sectors erased by the flash builder were already removed, so usually nothing changes.
+        if changed:
+            manifest.save()
+
     def program_page(self, address, bytes):
         """!
         @brief Flash one or more pages.
@@ -364,10 +394,11 @@ class Flash(object):
         bytes = self.override_security_bits(address, bytes)
 
         # first transfer in RAM
-        self.target.write_memory_block8(self.begin_data, bytes)
+        self.target.write_memory_bytes(self.begin_data, bytes)
 
         # update core register to execute the program_page subroutine
-        result = self._call_function_and_wait(self.flash_algo['pc_program_page'], address, len(bytes), self.begin_data)
+        result = self._call_function_and_wait(self.flash_algo['pc_program_page'], address, len(bytes), self.begin_data,
+                                                expected_time=self.get_page_info(address).program_weight)
 
         # check the return code
         if result != 0:
@@ -381,7 +412,8 @@ class Flash(object):
         assert self._active_operation == self.Operation.PROGRAM
 
         # update core register to execute the program_page subroutine
-        result = self._call_function(self.flash_algo['pc_program_page'], address, self.region.page_size, self.page_buffers[buffer_number])
+        result = self._call_function(self.flash_algo['pc_program_page'], address, self.region.page_size, self.page_buffers[buffer_number],
+                                        expected_time=self.get_page_info(address).program_weight)
 
     def load_page_buffer(self, buffer_number, address, bytes):
         """!
@@ -396,7 +428,7 @@ class Flash(object):
         bytes = self.override_security_bits(address, bytes)
 
         # transfer the buffer to device RAM
-        self.target.write_memory_block8(self.page_buffers[buffer_number], bytes)
+        self.target.write_memory_bytes(self.page_buffers[buffer_number], bytes)
 
     def program_phrase(self, address, bytes):
         """!
@@ -424,10 +456,11 @@ class Flash(object):
         bytes = self.override_security_bits(address, bytes)
 
         # first transfer in RAM
-        self.target.write_memory_block8(self.begin_data, bytes)
+        self.target.write_memory_bytes(self.begin_data, bytes)
 
         # update core register to execute the program_page subroutine
-        result = self._call_function_and_wait(self.flash_algo['pc_program_page'], address, len(bytes), self.begin_data)
+        result = self._call_function_and_wait(self.flash_algo['pc_program_page'], address, len(bytes), self.begin_data,
+                                                expected_time=self.get_page_info(address).program_weight)
 
         # check the return code
         if result != 0:
@@ -490,7 +523,7 @@ class Flash(object):
         info = fb.program(chip_erase, progress_cb, smart_flash, fast_verify)
         return info
 
-    def _call_function(self, pc, r0=None, r1=None, r2=None, r3=None, init=False):
+    def _call_function(self, pc, r0=None, r1=None, r2=None, r3=None, init=False, expected_time=None):
         reg_list = []
         data_list = []
 
@@ -523,19 +556,48 @@ class Flash(object):
         data_list.append(self.flash_algo['load_address'] + 1)
         self.target.write_core_registers_raw(reg_list, data_list)
 
+        # Prefer the measured duration of the previous call to the same entry point over the
+        # nominal weight, which is only a rough estimate. Calls without a weight, such as the
+        # analyzer, do a variable amount of work and are paced by the elapsed time alone.
+        self._call_pc = pc
+        if expected_time is not None:
+            expected_time = self._call_durations.get(pc, expected_time)
+        self._call_expected_time = expected_time
+
         # resume target
         self.target.resume()
+        self._call_start_time = time()
 
-    def wait_for_completion(self):
+    def wait_for_completion(self, timeout=None):
         """!
         @brief Wait until the breakpoint is hit.
+        
+        The target is polled with an adaptive backoff paced by the expected duration of the
+        algo function, so the host does not spin while a long erase or program runs.
+        
+        @param self
+        @param timeout Maximum time in seconds for the algo function to complete, counted from
+            when it was started. If not provided, the 'flash.timeout' session option is used.
+        
+        @exception FlashFailure The algo function did not complete before the timeout. The
+            target is halted.
         """
+        if timeout is None:
+            timeout = self.target.session.options.get('flash.timeout')
+        backoff = PollBackoff(expected_time=self._call_expected_time, timeout=timeout,
+                                start_time=self._call_start_time)
         while self.target.get_state() == Target.TARGET_RUNNING:
-            pass
+            if not backoff.wait():
+                self.target.halt()
+                raise FlashFailure("flash algo function at 0x%x did not complete within %g seconds"
+                                    % (self._call_pc, timeout))
+        if self._call_expected_time is not None:
+            self._call_durations[self._call_pc] = backoff.elapsed
 
         if self.flash_algo_debug:
-            regs = self.target.read_core_registers_raw(list(range(19)) + [20])
-            LOG.debug("Registers after flash algo: [%s]", " ".join("%08x" % r for r in regs))
+            # Read all the registers to check in the same batch as those that are logged.
+            regs = self.target.read_core_registers_raw(list(range(19)) + [20, 'ipsr'])
+            LOG.debug("Registers after flash algo: [%s]", " ".join("%08x" % r for r in regs[:-1]))
 
             expected_fp = self.flash_algo['static_base']
             expected_sp = self.flash_algo['begin_stack']
@@ -543,10 +605,10 @@ class Flash(object):
             expected_flash_algo = self.flash_algo['instructions']
             if self.use_analyzer:
                 expected_analyzer = analyzer
-            final_ipsr = self.target.read_core_register('ipsr')
-            final_fp = self.target.read_core_register('r9')
-            final_sp = self.target.read_core_register('sp')
-            final_pc = self.target.read_core_register('pc')
+            final_ipsr = regs[-1]
+            final_fp = regs[9]
+            final_sp = regs[13]
+            final_pc = regs[15]
             #TODO - uncomment if Read/write and zero init sections can be moved into a separate flash algo section
             #final_flash_algo = self.target.read_memory_block32(self.flash_algo['load_address'], len(self.flash_algo['instructions']))
             #if self.use_analyzer:
@@ -580,8 +642,8 @@ class Flash(object):
 
         return self.target.read_core_register('r0')
 
-    def _call_function_and_wait(self, pc, r0=None, r1=None, r2=None, r3=None, init=False):
-        self._call_function(pc, r0, r1, r2, r3, init)
+    def _call_function_and_wait(self, pc, r0=None, r1=None, r2=None, r3=None, init=False, expected_time=None):
+        self._call_function(pc, r0, r1, r2, r3, init, expected_time)
         return self.wait_for_completion()
 
     def set_flash_algo_debug(self, enable):
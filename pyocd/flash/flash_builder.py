@@ -19,9 +19,10 @@ from ..core.exceptions import (FlashFailure, FlashProgramFailure)
 from ..utility.notification import Notification
 from ..utility.mask import same
 import logging
+import threading
 from struct import unpack
 from time import time
-from binascii import crc32
+from zlib import crc32
 
 # Number of bytes in a page to read to quickly determine if the page has the same data
 PAGE_ESTIMATE_SIZE = 32
@@ -56,6 +57,11 @@ class ProgrammingInfo(object):
         self.erase_sector_count = 0
         self.skipped_byte_count = 0
         self.skipped_page_count = 0
+        self.erase_time = 0                     # Time spent erasing
+        self.scan_time = 0                      # Time spent reading pages to check for unchanged data
+        self.crc_time = 0                       # Host time spent computing CRCs of page data
+        self.load_time = 0                      # Time spent issuing page buffer uploads
+        self.wait_time = 0                      # Time spent waiting for the algo to program pages
 
 def _stub_progress(percent):
     pass
@@ -98,7 +104,7 @@ class _FlashPage(object):
     def __init__(self, page_info):
         self.addr = page_info.base_addr
         self.size = page_info.size
-        self.data = []
+        self.data = bytearray()
         self.program_weight = page_info.program_weight
         self.erased = None # Whether the data all matches the erased value.
         self.same = None
@@ -149,6 +155,7 @@ class FlashBuilder(object):
     # Type of flash analysis
     FLASH_ANALYSIS_CRC32 = "CRC32"
     FLASH_ANALYSIS_PARTIAL_PAGE_READ = "PAGE_READ"
+    FLASH_ANALYSIS_MANIFEST = "MANIFEST"
 
     def __init__(self, flash):
         self.flash = flash
@@ -167,6 +174,11 @@ class FlashBuilder(object):
         self.sector_erase_count = 0 # Number of pages to program using sector erase method.
         self.sector_erase_weight = 0 # Erase/program weight using sector erase method.
         self.algo_inited_for_read = False
+        self._image = None
+        ## Optional FlashManifest of the flash contents last written by pyOCD.
+        self.manifest = None
+        ## Number of sectors matched by the manifest to verify against target memory.
+        self.manifest_spot_check_count = 1
 
     def enable_double_buffer(self, enable):
         self.enable_double_buffering = enable
@@ -179,7 +191,7 @@ class FlashBuilder(object):
         @param self
         @param addr Base address of the block of data passed to this method. The entire block of
             data must be contained within the flash memory region associated with this instance.
-        @param data Data to be programmed. Should be a list of byte values.
+        @param data Data to be programmed. A list of byte values, or a bytes or bytearray object.
         
         @exception ValueError Attempt to add overlapping data, or address range of added data is
             outside the address range of the flash region associated with the builder.
@@ -257,9 +269,9 @@ class FlashBuilder(object):
                 old_data_len = current_page.size - len(current_page.data)
                 if keep_unwritten and self.flash.region.is_readable:
                     self._enable_read_access()
-                    old_data = self.flash.target.read_memory_block8(page_data_end, old_data_len)
+                    old_data = self.flash.target.read_memory_bytes(page_data_end, old_data_len)
                 else:
-                    old_data = [self.flash.region.erased_byte_value] * old_data_len
+                    old_data = bytearray([self.flash.region.erased_byte_value]) * old_data_len
                 current_page.data.extend(old_data)
                 self.program_byte_count += old_data_len
         
@@ -295,9 +307,9 @@ class FlashBuilder(object):
                     old_data_len = flash_addr - page_data_end
                     if keep_unwritten and self.flash.region.is_readable:
                         self._enable_read_access()
-                        old_data = self.flash.target.read_memory_block8(page_data_end, old_data_len)
+                        old_data = self.flash.target.read_memory_bytes(page_data_end, old_data_len)
                     else:
-                        old_data = [self.flash.region.erased_byte_value] * old_data_len
+                        old_data = bytearray([self.flash.region.erased_byte_value]) * old_data_len
                     current_page.data.extend(old_data)
                     self.program_byte_count += old_data_len
 
@@ -318,6 +330,25 @@ class FlashBuilder(object):
         if keep_unwritten and self.flash.region.is_readable:
             self._fill_unwritten_sector_pages()
         
+        self._pack_page_data()
+
+    def _pack_page_data(self):
+        """! @brief Move the data of all pages into a single contiguous image buffer.
+        
+        Each page's data is replaced with a memoryview slice of the image, so page analysis can
+        compare and checksum the data as buffers without copying it.
+        """
+        pages = sorted(self.page_list, key=lambda p: p.addr)
+        self._image = bytearray(sum(len(page.data) for page in pages))
+        image_view = memoryview(self._image)
+        offset = 0
+        for page in pages:
+            length = len(page.data)
+            page_view = image_view[offset:offset + length]
+            page_view[:] = page.data
+            page.data = page_view
+            offset += length
+
     def _fill_unwritten_sector_pages(self):
         """! @brief Fill in missing pages from sectors we are going to modify."""
         for sector in self.sector_list:
@@ -330,7 +361,7 @@ class FlashBuilder(object):
                     raise FlashFailure("Attempt to program flash at invalid address 0x%08x" % sector_page_addr)
                 new_page = _FlashPage(page_info)
                 self._enable_read_access()
-                new_page.data = self.flash.target.read_memory_block8(new_page.addr, new_page.size)
+                new_page.data = self.flash.target.read_memory_bytes(new_page.addr, new_page.size)
                 new_page.same = True
                 sector.add_page(new_page)
                 self.page_list.append(new_page)
@@ -353,7 +384,8 @@ class FlashBuilder(object):
                 page = add_page_with_existing_data()
                 sector_page_addr += page.size
 
-    def program(self, chip_erase=None, progress_cb=None, smart_flash=True, fast_verify=False, keep_unwritten=True):
+    def program(self, chip_erase=None, progress_cb=None, smart_flash=True, fast_verify=False, keep_unwritten=True,
+                cleanup=True):
         """! @brief Determine fastest method of flashing and then run flash programming.
 
         Data must have already been added with add_data().
@@ -378,6 +410,10 @@ class FlashBuilder(object):
             written, there may be ranges of flash that would be erased but not written with new
             data. This parameter sets whether the existing contents of those unwritten ranges will
             be read from memory and restored while programming.
+        @param cleanup Whether to clean up the flash algo and reset the target after programming.
+            If False, the algo is left loaded so a later program() call for the same region does
+            not reset and prepare the target again. The caller must then call cleanup() on the
+            flash and reset the target once done.
         """
 
         # Send notification that we're about to program flash.
@@ -422,6 +458,8 @@ class FlashBuilder(object):
         # as requiring programming
         if not smart_flash:
             self._mark_all_pages_for_programming()
+        elif self.manifest is not None:
+            self._analyze_pages_with_manifest()
         
         # If the flash algo doesn't support erase all, disable chip erase.
         if not self.flash.is_erase_all_supported:
@@ -454,22 +492,39 @@ class FlashBuilder(object):
             LOG.debug("Chip erase weight %f, sector erase weight %f" % (chip_erase_program_time, page_program_time))
             chip_erase = chip_erase_program_time < page_program_time
 
+        # Forget the recorded contents of everything about to be erased, in case programming
+        # does not complete.
+        if self.manifest is not None:
+            if chip_erase:
+                self.manifest.clear()
+            else:
+                self.manifest.remove_sectors(self.flash.region, [sector.addr for sector in self.sector_list])
+            self.manifest.save()
+
+        # The pipelined methods are used even with a single page buffer, because they still
+        # keep the algo initialised across all pages.
         if chip_erase:
-            if self.flash.is_double_buffering_supported and self.enable_double_buffering:
-                LOG.debug("Using double buffer chip erase program")
+            if self.enable_double_buffering:
+                LOG.debug("Using pipelined chip erase program with %d page buffers",
+                    self.flash.page_buffer_count)
                 flash_operation = self._chip_erase_program_double_buffer(progress_cb)
             else:
                 flash_operation = self._chip_erase_program(progress_cb)
         else:
-            if self.flash.is_double_buffering_supported and self.enable_double_buffering:
-                LOG.debug("Using double buffer sector erase program")
+            if self.enable_double_buffering:
+                LOG.debug("Using pipelined sector erase program with %d page buffers",
+                    self.flash.page_buffer_count)
                 flash_operation = self._sector_erase_program_double_buffer(progress_cb)
             else:
                 flash_operation = self._sector_erase_program(progress_cb)
 
         # Cleanup flash algo and reset target after programming.
-        self.flash.cleanup()
-        self.flash.target.reset_and_halt()
+        if cleanup:
+            self.flash.cleanup()
+            self.flash.target.reset_and_halt()
+
+        if self.manifest is not None:
+            self._update_manifest(chip_erase)
 
         program_finish = time()
         self.perf.program_time = program_finish - program_start
@@ -514,6 +569,10 @@ class FlashBuilder(object):
                     skipped_byte_count, get_page_count(skipped_page_count),
                     ((self.program_byte_count/1024) / self.perf.program_time))
 
+        LOG.debug("Stage times: analyze %.3f s, scan %.3f s, host CRC %.3f s, erase %.3f s, "
+                "load %.3f s, program wait %.3f s", self.perf.analyze_time or 0, self.perf.scan_time,
+                self.perf.crc_time, self.perf.erase_time, self.perf.load_time, self.perf.wait_time)
+
         # Send notification that we're done programming flash.
         self.flash.target.session.notify(Target.EVENT_POST_FLASH_PROGRAM, self)
 
@@ -548,6 +607,9 @@ class FlashBuilder(object):
         return chip_erase_count, chip_erase_weight
 
     def _compute_sector_erase_pages_weight_min(self):
+        if self.manifest is not None:
+            # Pages the manifest shows to be unchanged will not be verified.
+            return sum(page.get_verify_weight() for page in self.page_list if page.same is not True)
         return sum(page.get_verify_weight() for page in self.page_list)
 
     def _analyze_pages_with_partial_read(self):
@@ -563,7 +625,7 @@ class FlashBuilder(object):
             # Analyze pages that haven't been analyzed yet
             if page.same is None:
                 size = min(PAGE_ESTIMATE_SIZE, len(page.data))
-                data = self.flash.target.read_memory_block8(page.addr, size)
+                data = self.flash.target.read_memory_bytes(page.addr, size)
                 page_same = same(data, page.data[0:size])
                 if page_same is False:
                     page.same = False
@@ -590,17 +652,28 @@ class FlashBuilder(object):
                 # Add page to compute_crcs
                 sector_list.append((page.addr, page.size))
                 page_list.append(page)
-                # Compute CRC of data (Padded with 0xFF)
-                data = list(page.data)
-                pad_size = page.size - len(page.data)
-                if pad_size > 0:
-                    data.extend([0xFF] * pad_size)
-                page.crc = crc32(bytearray(data)) & 0xFFFFFFFF
 
         # Analyze pages
         if len(page_list) > 0:
-            self._enable_read_access()
-            crc_list = self.flash.compute_crcs(sector_list)
+            # Compute the CRCs of the page data on a worker thread while the analyzer runs on
+            # the target. An error in the worker is re-raised here.
+            crc_errors = []
+            def compute_page_crcs():
+                try:
+                    self._compute_page_crcs(page_list)
+                except Exception as err:
+                    crc_errors.append(err)
+
+            crc_thread = threading.Thread(target=compute_page_crcs, name="flash CRC")
+            crc_thread.daemon = True
+            crc_thread.start()
+            try:
+                self._enable_read_access()
+                crc_list = self.flash.compute_crcs(sector_list)
+            finally:
+                crc_thread.join()
+            if crc_errors:
+                raise crc_errors[0]
             for page, crc in zip(page_list, crc_list):
                 page_same = page.crc == crc
                 if assume_estimate_correct:
@@ -608,6 +681,136 @@ class FlashBuilder(object):
                 elif page_same is False:
                     page.same = False
 
+    def _compute_page_crcs(self, page_list):
+        """! @brief Compute the CRC32 of each page's data, padded with 0xFF to the page size."""
+        start = time()
+        for page in page_list:
+            crc = crc32(page.data)
+            pad_size = page.size - len(page.data)
+            if pad_size > 0:
+                crc = crc32(b'\xff' * pad_size, crc)
+            page.crc = crc & 0xFFFFFFFF
+        self.perf.crc_time += time() - start
+
+    def _compute_sector_crc(self, sector):
+        """! @brief Compute the CRC32 of a sector's contents after it is erased and programmed.
+        
+        Parts of the sector not covered by a page are assumed to hold the erased value.
+        """
+        erased_byte = bytearray([self.flash.region.erased_byte_value])
+        crc = 0
+        addr = sector.addr
+        for page in sector.page_list:
+            if page.addr > addr:
+                crc = crc32(erased_byte * (page.addr - addr), crc)
+            crc = crc32(page.data, crc)
+            addr = page.addr + len(page.data)
+        end_addr = sector.addr + sector.size
+        if addr < end_addr:
+            crc = crc32(erased_byte * (end_addr - addr), crc)
+        return crc & 0xFFFFFFFF
+
+    def _analyze_pages_with_manifest(self):
+        """! @brief Determine which sectors are unchanged from the flash manifest.
+        
+        Sectors whose recorded CRC matches the new contents have all their pages marked as the
+        same, and sectors with a different recorded CRC have their pages marked as changed.
+        Sectors not in the manifest are left for the normal analysis.
+        
+        Before trusting the manifest, up to manifest_spot_check_count of the matching sectors are
+        verified against target memory, along with every matching sector not yet confirmed to
+        describe the connected target in this session. If any differ, the manifest for the
+        region is discarded.
+        """
+        analyze_start = time()
+        recorded_crcs = self.manifest.get_sector_crcs(self.flash.region)
+        matched = []
+        changed = []
+        for sector in self.sector_list:
+            recorded_crc = recorded_crcs.get(sector.addr)
+            if recorded_crc is None:
+                continue
+            crc = self._compute_sector_crc(sector)
+            if crc == recorded_crc:
+                matched.append((sector, crc))
+            else:
+                changed.append(sector)
+        
+        # Every match not yet confirmed in this session is checked. Of the confirmed matches,
+        # spot check sectors spread evenly over them.
+        confirmed = []
+        unconfirmed = []
+        for match in matched:
+            if self.manifest.is_confirmed(self.flash.region, match[0].addr):
+                confirmed.append(match)
+            else:
+                unconfirmed.append(match)
+        check_count = min(self.manifest_spot_check_count, len(confirmed))
+        checks = list(unconfirmed)
+        if check_count:
+            step = len(confirmed) / float(check_count)
+            checks += [confirmed[int(n * step)] for n in range(check_count)]
+        if checks:
+            if not self._verify_sector_crcs(checks):
+                LOG.warning("Flash contents do not match the flash manifest; analyzing flash")
+                self.manifest.remove_region(self.flash.region)
+                self.perf.analyze_time = time() - analyze_start
+                return
+            self.manifest.confirm(self.flash.region, [sector.addr for sector, _ in unconfirmed])
+        
+        for sector, _ in matched:
+            for page in sector.page_list:
+                page.same = True
+        for sector in changed:
+            sector.mark_all_pages_not_same()
+        
+        if matched or changed:
+            self.perf.analyze_type = FlashBuilder.FLASH_ANALYSIS_MANIFEST
+        LOG.debug("Flash manifest: %d sectors unchanged, %d changed, %d unknown", len(matched),
+            len(changed), len(self.sector_list) - len(matched) - len(changed))
+        self.perf.analyze_time = time() - analyze_start
+
+    def _verify_sector_crcs(self, sector_crcs):
+        """! @brief Check that sectors in target memory have the expected CRCs.
+        
+        The CRC32 analyzer is used if possible. Otherwise the sectors are read if the region is
+        readable. If neither is possible, the check passes.
+        
+        @param self
+        @param sector_crcs List of (sector, crc) tuples.
+        @return Boolean of whether all sectors matched.
+        """
+        # The analyzer only handles power of 2 sized, aligned sectors.
+        use_analyzer = self.flash.get_flash_info().crc_supported \
+                and all((sector.size & (sector.size - 1)) == 0 for sector, _ in sector_crcs)
+        if use_analyzer:
+            self._enable_read_access()
+            target_crcs = self.flash.compute_crcs([(sector.addr, sector.size)
+                                                    for sector, _ in sector_crcs])
+        elif self.flash.region.is_readable:
+            self._enable_read_access()
+            target_crcs = [crc32(self.flash.target.read_memory_bytes(sector.addr, sector.size)) & 0xFFFFFFFF
+                            for sector, _ in sector_crcs]
+        else:
+            return True
+        return all(target_crc == crc for (_, crc), target_crc in zip(sector_crcs, target_crcs))
+
+    def _update_manifest(self, chip_erase):
+        """! @brief Record the CRCs of sectors whose contents are fully known after programming.
+        
+        This includes every sector that was erased, and unchanged sectors completely covered by
+        pages.
+        """
+        crcs = {}
+        for sector in self.sector_list:
+            erased = chip_erase or sector.are_any_pages_not_same()
+            covered = sum(len(page.data) for page in sector.page_list) == sector.size
+            if erased or covered:
+                crcs[sector.addr] = self._compute_sector_crc(sector)
+        self.manifest.update_sectors(self.flash.region, crcs)
+        self.manifest.confirm(self.flash.region, crcs.keys())
+        self.manifest.save()
+
     def _compute_sector_erase_pages_and_weight(self, fast_verify):
         """! @brief Quickly analyze flash contents and compute weights for sector erase.
 
@@ -653,7 +856,7 @@ class FlashBuilder(object):
         self.sector_erase_weight = sector_erase_weight
 
         analyze_finish = time()
-        self.perf.analyze_time = analyze_finish - analyze_start
+        self.perf.analyze_time = (self.perf.analyze_time or 0) + analyze_finish - analyze_start
         LOG.debug("Analyze time: %f" % (analyze_finish - analyze_start))
         
         return sector_erase_count, sector_erase_weight
@@ -664,9 +867,11 @@ class FlashBuilder(object):
         progress_cb(0.0)
         progress = 0
 
+        erase_start = time()
         self.flash.init(self.flash.Operation.ERASE)
         self.flash.erase_all()
         self.flash.uninit()
+        self.perf.erase_time += time() - erase_start
         
         progress += self.flash.get_flash_info().erase_weight
         progress_cb(float(progress) / float(self.chip_erase_weight))
@@ -693,55 +898,100 @@ class FlashBuilder(object):
         return page, i + 1
 
     def _chip_erase_program_double_buffer(self, progress_cb=_stub_progress):
-        """! @brief Double-buffered program by first performing an erase all."""
+        """! @brief Pipelined program by first performing an erase all."""
         LOG.debug("%i of %i pages have erased data", len(self.page_list) - self.chip_erase_count, len(self.page_list))
         progress_cb(0.0)
         progress = 0
 
+        erase_start = time()
         self.flash.init(self.flash.Operation.ERASE)
         self.flash.erase_all()
         self.flash.uninit()
+        self.perf.erase_time += time() - erase_start
         
         progress += self.flash.get_flash_info().erase_weight
         progress_cb(float(progress) / float(self.chip_erase_weight))
 
-        # Set up page and buffer info.
+        self._program_pages_pipelined(self._next_unerased_page, progress, self.chip_erase_weight,
+                progress_cb)
+
+        progress_cb(1.0)
+        return FlashBuilder.FLASH_CHIP_ERASE
+
+    def _program_pages_pipelined(self, next_page, progress, total_weight, progress_cb):
+        """! @brief Program pages while overlapping data upload with algo execution.
+        
+        Each time the algo is started on a page, the next page is uploaded into a spare page
+        buffer while the algo runs. The upload is issued as deferred transfers that are only
+        flushed by the completion poll, so the probe streams the data in the background of the
+        program operation. Page buffers are used round-robin.
+        
+        Flash algos with only one page buffer are supported. The next page can then only be
+        uploaded after the current one completes, but all pages are still programmed with a
+        single algo init.
+        
+        @param self
+        @param next_page Callable taking the index of the next candidate page, returning a
+            tuple of the next page to program (or None) and the index following it.
+        @param progress Current progress weight.
+        @param total_weight Total weight used to compute the progress percentage.
+        @param progress_cb Progress callback.
+        @return Number of pages programmed.
+        """
+        page, i = next_page(0)
+
+        # Make sure there are actually pages to program.
+        if page is None:
+            return 0
+        
+        buffer_count = self.flash.page_buffer_count
+        programmed_count = 0
         current_buf = 0
-        next_buf = 1
-        page, i = self._next_unerased_page(0)
-        assert page is not None
+
+        self.flash.init(self.flash.Operation.PROGRAM)
 
         # Load first page buffer
-        self.flash.load_page_buffer(current_buf, page.addr, page.data)
+        self._load_page_buffer(current_buf, page)
 
-        self.flash.init(self.flash.Operation.PROGRAM)
         while page is not None:
             # Kick off this page program.
             current_addr = page.addr
             current_weight = page.get_program_weight()
             self.flash.start_program_page_with_buffer(current_buf, current_addr)
+            programmed_count += 1
 
-            # Get next page and load it.
-            page, i = self._next_unerased_page(i)
-            if page is not None:
-                self.flash.load_page_buffer(next_buf, page.addr, page.data)
+            # Get next page and upload it to a spare buffer while the algo runs.
+            next_buf = (current_buf + 1) % buffer_count
+            page, i = next_page(i)
+            if (page is not None) and (buffer_count > 1):
+                self._load_page_buffer(next_buf, page)
 
             # Wait for the program to complete.
+            wait_start = time()
             result = self.flash.wait_for_completion()
+            self.perf.wait_time += time() - wait_start
             if result != 0:
                 raise FlashProgramFailure('program_page(0x%x) error: %i'
                         % (current_addr, result), current_addr, result)
 
-            # Swap buffers.
-            current_buf, next_buf = next_buf, current_buf
+            # Without a spare buffer, the next page can only be loaded now.
+            if (page is not None) and (buffer_count == 1):
+                self._load_page_buffer(next_buf, page)
+
+            current_buf = next_buf
 
             # Update progress.
             progress += current_weight
-            progress_cb(float(progress) / float(self.chip_erase_weight))
+            if total_weight > 0:
+                progress_cb(float(progress) / float(total_weight))
         
         self.flash.uninit()
-        progress_cb(1.0)
-        return FlashBuilder.FLASH_CHIP_ERASE
+        return programmed_count
+
+    def _load_page_buffer(self, buffer_number, page):
+        load_start = time()
+        self.flash.load_page_buffer(buffer_number, page.addr, page.data)
+        self.perf.load_time += time() - load_start
 
     def _sector_erase_program(self, progress_cb=_stub_progress):
         """! @brief Program by performing sector erases."""
@@ -758,9 +1008,11 @@ class FlashBuilder(object):
         for sector in self.sector_list:
             if sector.are_any_pages_not_same():
                 # Erase the sector
+                erase_start = time()
                 self.flash.init(self.flash.Operation.ERASE)
                 self.flash.erase_sector(sector.addr)
                 self.flash.uninit()
+                self.perf.erase_time += time() - erase_start
 
                 actual_sector_erase_weight += sector.erase_weight
 
@@ -800,6 +1052,7 @@ class FlashBuilder(object):
         the same flag set to False for all pages within that sector.
         """
         progress = 0
+        scan_start = time()
         
         # Read page data if unknown - after this page.same will be True or False
         unknown_pages = [page for page in self.page_list if page.same is None]
@@ -811,10 +1064,10 @@ class FlashBuilder(object):
                     data = page.cached_estimate_data
                     offset = len(data)
                 else:
-                    data = []
+                    data = bytearray()
                     offset = 0
                 assert len(page.data) == page.size, "page data size (%d) != page size (%d)" % (len(page.data), page.size)
-                data.extend(self.flash.target.read_memory_block8(page.addr + offset,
+                data.extend(self.flash.target.read_memory_bytes(page.addr + offset,
                                                                     page.size - offset))
                 page.same = same(page.data, data)
                 page.cached_estimate_data = None # This data isn't needed anymore.
@@ -830,6 +1083,7 @@ class FlashBuilder(object):
             if sector.are_any_pages_not_same():
                 sector.mark_all_pages_not_same()
         
+        self.perf.scan_time += time() - scan_start
         return progress
 
     def _next_nonsame_page(self, i):
@@ -844,9 +1098,7 @@ class FlashBuilder(object):
         return page, i + 1
 
     def _sector_erase_program_double_buffer(self, progress_cb=_stub_progress):
-        """! @brief Double-buffered program by performing sector erases."""
-        actual_sector_erase_count = 0
-        actual_sector_erase_weight = 0
+        """! @brief Pipelined program by performing sector erases."""
         progress = 0
 
         progress_cb(0.0)
@@ -856,6 +1108,7 @@ class FlashBuilder(object):
         progress = self._scan_pages_for_same(progress_cb)
 
         # Erase all sectors up front.
+        erase_start = time()
         self.flash.init(self.flash.Operation.ERASE)
         for sector in self.sector_list:
             if sector.are_any_pages_not_same():
@@ -867,51 +1120,10 @@ class FlashBuilder(object):
                 if self.sector_erase_weight > 0:
                     progress_cb(float(progress) / float(self.sector_erase_weight))
         self.flash.uninit()
+        self.perf.erase_time += time() - erase_start
 
-        # Set up page and buffer info.
-        current_buf = 0
-        next_buf = 1
-        page, i = self._next_nonsame_page(0)
-
-        # Make sure there are actually pages to program differently from current flash contents.
-        if page is not None:
-            self.flash.init(self.flash.Operation.PROGRAM)
-
-            # Load first page buffer
-            self.flash.load_page_buffer(current_buf, page.addr, page.data)
-
-            while page is not None:
-                assert page.same is not None
-
-                # Kick off this page program.
-                current_addr = page.addr
-                current_weight = page.get_program_weight()
-
-                self.flash.start_program_page_with_buffer(current_buf, current_addr)
-                
-                actual_sector_erase_count += 1
-                actual_sector_erase_weight += page.get_program_weight()
-
-                # Get next page and load it.
-                page, i = self._next_nonsame_page(i)
-                if page is not None:
-                    self.flash.load_page_buffer(next_buf, page.addr, page.data)
-
-                # Wait for the program to complete.
-                result = self.flash.wait_for_completion()
-                if result != 0:
-                    raise FlashProgramFailure('program_page(0x%x) error: %i'
-                            % (current_addr, result), current_addr, result)
-                
-                # Swap buffers.
-                current_buf, next_buf = next_buf, current_buf
-
-                # Update progress
-                progress += current_weight
-                if self.sector_erase_weight > 0:
-                    progress_cb(float(progress) / float(self.sector_erase_weight))
-
-            self.flash.uninit()
+        actual_sector_erase_count = self._program_pages_pipelined(self._next_nonsame_page,
+                progress, self.sector_erase_weight, progress_cb)
 
         progress_cb(1.0)
 
@@ -22,8 +22,10 @@ from intelhex import IntelHex
 from enum import Enum
 import six
 import errno
+import threading
 
 from .flash_builder import (FlashBuilder, get_page_count, get_sector_count)
+from .manifest import FlashManifest
 from ..core.memory_map import MemoryType
 from ..core import exceptions
 from ..utility.progress import print_progress
@@ -421,6 +423,7 @@ class FlashLoader(object):
                             else self._session.options.get('fast_program')
         self._keep_unwritten = keep_unwritten if (keep_unwritten is not None) \
                             else self._session.options.get('keep_unwritten')
+        self._manifest = FlashManifest.for_session(session)
         
         self._reset_state()
     
@@ -464,6 +467,8 @@ class FlashLoader(object):
                     raise exceptions.TargetSupportError("flash memory region at address 0x%08x has no flash instance" % address)
                 builder = region.flash.get_flash_builder()
                 builder.log_performance = False
+                builder.manifest = self._manifest
+                builder.manifest_spot_check_count = self._session.options.get('flash.manifest_spot_check')
                 self._builders[region] = builder
         
             # Add as much data to the builder as is contained by this region.
@@ -491,11 +496,27 @@ class FlashLoader(object):
         
         After calling this method, the loader instance can be reused to program more data.
         """
+        perfList = self._program()
+
+        # Report programming statistics.
+        self._log_performance(perfList)
+        
+        # Clear state to allow reuse.
+        self._reset_state()
+    
+    def _program(self, keep_open=False):
+        """! @brief Program the data collected by each builder.
+        @param self
+        @param keep_open If True, the flash algo of the last region programmed is left loaded and
+            the target is not reset afterwards. See the _cleanup_ parameter of FlashBuilder.program().
+        @return List of ProgrammingInfo objects, one per builder.
+        """
         didChipErase = False
         perfList = []
+        builders = sorted(self._builders.values(), key=lambda v: v.flash_start)
         
         # Iterate over builders we've created and program the data.
-        for builder in sorted(self._builders.values(), key=lambda v: v.flash_start):
+        for builder in builders:
             # Determine this builder's portion of total progress.
             self._current_progress_fraction = builder.buffered_data_size / self._total_data_size
             
@@ -505,19 +526,17 @@ class FlashLoader(object):
                                     progress_cb=self._progress_cb,
                                     smart_flash=self._smart_flash,
                                     fast_verify=self._trust_crc,
-                                    keep_unwritten=self._keep_unwritten)
+                                    keep_unwritten=self._keep_unwritten,
+                                    cleanup=not (keep_open and builder is builders[-1]))
             perfList.append(perf)
             didChipErase = True
             
             self._progress_offset += self._current_progress_fraction
 
-        # Report programming statistics.
-        self._log_performance(perfList)
-        
-        # Clear state to allow reuse.
-        self._reset_state()
+        return perfList
     
-    def _log_performance(self, perf_list):
+    @staticmethod
+    def _log_performance(perf_list):
         """! @brief Log a report of programming performance numbers."""
         # Compute overall performance numbers.
         totalProgramTime = sum(perf.program_time for perf in perf_list)
@@ -567,3 +586,201 @@ class FlashLoader(object):
         mgr.add_data(address, data)
         mgr.commit()
 
+
+class StreamingFlashLoader(object):
+    """! @brief Flash loader that programs data while more is still being added.
+
+    This class has the same add_data() and commit() interface as FlashLoader. Instead of
+    collecting all data until commit() is called, a background thread erases and programs each
+    flash sector as soon as all of its data has been added. Data is expected to be added in
+    ascending address order, as gdb does when loading an image. Data for a sector is considered
+    complete once data for any higher sector has been added.
+
+    Data added out of order for a sector that was already programmed is still written correctly.
+    The sector is programmed again with its existing contents preserved.
+
+    Only sector erase is used. The flash algo stays loaded between sectors, and the target is
+    reset once by commit() after all data is programmed. Errors from the background thread are
+    raised by commit(). Once an error occurs, further data is discarded until commit() is called.
+
+    The target must not be accessed by other threads until commit() returns.
+    """
+
+    def __init__(self, session, smart_flash=None, trust_crc=None, keep_unwritten=None):
+        """! @brief Constructor.
+
+        The parameters have the same meaning as for FlashLoader.
+        """
+        self._session = session
+        self._map = session.board.target.memory_map
+        self._smart_flash = smart_flash
+        self._trust_crc = trust_crc
+        self._keep_unwritten = keep_unwritten
+        self._lock = threading.Condition()
+        self._thread = None
+        self._reset_state()
+
+    def _reset_state(self):
+        """! @brief Clear all state variables. """
+        # Chunks of (address, data) whose sectors may still receive more data.
+        self._pending = []
+        # Chunks whose sectors are complete, waiting for the worker thread.
+        self._ready = []
+        # Data below this address is complete.
+        self._boundary = 0
+        # Highest boundary of data passed to the worker.
+        self._handed_off = 0
+        self._out_of_order = False
+        self._finishing = False
+        self._error = None
+        self._perf_list = []
+        # Flash whose algo was left loaded by the worker thread.
+        self._open_flash = None
+
+    def _sector_start(self, address):
+        """! @brief Return the start of the flash sector containing an address.
+
+        If the address is not within a flash sector, the address itself is returned.
+        """
+        region = self._map.get_region_for_address(address)
+        if (region is None) or not region.is_flash or (region.flash is None):
+            return address
+        info = region.flash.get_sector_info(address)
+        return address if (info is None) else info.base_addr
+
+    def add_data(self, address, data):
+        """! @brief Add a chunk of data to be programmed.
+
+        @param self
+        @param address Integer address for where the first byte of _data_ should be written.
+        @param data Bytes-like object or list of byte values to be programmed at the given address.
+
+        @return The StreamingFlashLoader instance is returned, to allow chaining further
+            add_data() calls or a call to commit().
+
+        @exception ValueError Raised when the address is not within a flash memory region.
+        """
+        region = self._map.get_region_for_address(address)
+        if region is None:
+            raise ValueError("no memory region defined for address 0x%08x" % address)
+        if not region.is_flash:
+            raise ValueError("memory region at address 0x%08x is not flash" % address)
+        if not len(data):
+            return self
+
+        data = bytearray(data)
+        end = address + len(data)
+        with self._lock:
+            if self._error is not None:
+                return self
+            if (address < self._handed_off) and not self._out_of_order:
+                LOG.debug("Flash data at 0x%08x added out of order; sectors may be programmed twice",
+                    address)
+                self._out_of_order = True
+            self._pending.append((address, data))
+            self._boundary = max(self._boundary, self._sector_start(end))
+            self._split_pending(self._boundary)
+        return self
+
+    def _split_pending(self, boundary):
+        """! @brief Move pending data below a boundary address to the ready list.
+
+        Must be called with the lock held.
+        """
+        pending = []
+        ready = []
+        for address, data in self._pending:
+            if address + len(data) <= boundary:
+                ready.append((address, data))
+            elif address < boundary:
+                ready.append((address, data[:boundary - address]))
+                pending.append((boundary, data[boundary - address:]))
+            else:
+                pending.append((address, data))
+        self._pending = pending
+        if ready:
+            self._ready += ready
+            self._handed_off = max(self._handed_off, boundary)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._worker, name="flash-stream")
+                self._thread.daemon = True
+                self._thread.start()
+            self._lock.notify()
+
+    def _worker(self):
+        """! @brief Background thread that programs each batch of complete data."""
+        while True:
+            with self._lock:
+                while not self._ready and not self._finishing:
+                    self._lock.wait()
+                if not self._ready:
+                    return
+                batch = self._ready
+                self._ready = []
+                keep_unwritten = True if self._out_of_order else self._keep_unwritten
+
+            try:
+                loader = FlashLoader(self._session, progress=_no_progress, chip_erase="sector",
+                                    smart_flash=self._smart_flash, trust_crc=self._trust_crc,
+                                    keep_unwritten=keep_unwritten)
+                for address, data in batch:
+                    loader.add_data(address, data)
+
+                # Only one algo can be loaded at a time. Unless the batch starts with the region
+                # whose algo is already loaded, clean that one up before another is loaded over it.
+                builders = sorted(loader._builders.values(), key=lambda v: v.flash_start)
+                if (self._open_flash is not None) and (self._open_flash is not builders[0].flash):
+                    self._open_flash.cleanup()
+                self._open_flash = builders[-1].flash
+
+                perf_list = loader._program(keep_open=True)
+            except Exception as err:
+                LOG.debug("Streaming flash programming failed: %s", err,
+                    exc_info=self._session.log_tracebacks)
+                with self._lock:
+                    self._error = err
+                    self._ready = []
+                    self._pending = []
+                continue
+
+            with self._lock:
+                self._perf_list += perf_list
+
+    def commit(self):
+        """! @brief Program any remaining data and wait for programming to finish.
+
+        After calling this method, the loader instance can be reused to program more data.
+
+        @exception Exception Any error raised while programming is re-raised here.
+        """
+        with self._lock:
+            # All data is complete now.
+            self._split_pending(max([self._boundary] + [a + len(d) for a, d in self._pending]))
+            self._finishing = True
+            self._lock.notify()
+            thread = self._thread
+
+        if thread is not None:
+            thread.join()
+
+        try:
+            # Clean up the algo and reset the target once, now that programming is done.
+            if self._open_flash is not None:
+                try:
+                    self._open_flash.cleanup()
+                    self._open_flash.target.reset_and_halt()
+                except Exception as err:
+                    # An earlier programming error takes precedence.
+                    if self._error is None:
+                        raise
+                    LOG.debug("Flash cleanup after error failed: %s", err)
+            if self._error is not None:
+                raise self._error
+            if self._perf_list:
+                FlashLoader._log_performance(self._perf_list)
+        finally:
+            self._thread = None
+            self._reset_state()
+
+def _no_progress(amount):
+    pass
@@ -0,0 +1,205 @@
+# pyOCD debugger
+# Copyright (c) 2020 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import re
+import json
+import logging
+import weakref
+
+LOG = logging.getLogger(__name__)
+
+class FlashManifest(object):
+    """! @brief Record of the flash contents last written by pyOCD to a target.
+
+    The manifest stores the CRC32 of each flash sector that pyOCD programmed, per flash region.
+    The @ref pyocd.flash.flash_builder.FlashBuilder "FlashBuilder" uses it to find unchanged
+    sectors without analyzing target memory, and updates it after programming.
+
+    Manifests are stored as one JSON file per target in the directory given by the
+    'flash.manifest_dir' session option. No manifest is used if that option is not set. The file
+    is named from the 'flash.manifest_target_id' option if it is set, otherwise from the unique
+    ID of the probe.
+
+    Flash written by anything other than pyOCD's flash loader, for instance by firmware, is not
+    tracked and makes the manifest stale. The builder spot checks a few sectors against the
+    target before trusting the manifest to catch this.
+
+    The probe's unique ID does not identify the target, since a probe can be moved to another
+    board of the same type. So unless the target ID option is set, the manifest is not trusted
+    for a flash region until it has been confirmed during the current session, either by
+    checking every sector it matches against the target or by programming the region. In that
+    mode the manifest saves nothing across processes, only within a session.
+
+    Erasing flash through Flash.erase_sector(), Flash.erase_all(), or the target's mass_erase()
+    removes the erased sectors from the manifest.
+    """
+
+    ## Version of the file format.
+    VERSION = 1
+
+    ## Manifests already loaded for each session, so confirmation lasts for the whole session.
+    _session_manifests = weakref.WeakKeyDictionary()
+
+    @classmethod
+    def for_session(cls, session):
+        """! @brief Load the manifest for the session's target.
+        @return A FlashManifest instance, or None if manifests are not enabled.
+        """
+        manifest_dir = session.options.get('flash.manifest_dir')
+        if not manifest_dir:
+            return None
+        manifest_dir = os.path.join(session.project_dir, os.path.expanduser(manifest_dir))
+        target_id = session.options.get('flash.manifest_target_id')
+        filename = re.sub(r'[^A-Za-z0-9_.-]', '_', target_id or session.board.unique_id) + ".json"
+        path = os.path.join(manifest_dir, filename)
+
+        manifests = cls._session_manifests.setdefault(session, {})
+        manifest = manifests.get(path)
+        if manifest is None:
+            manifest = manifests[path] = cls(path, session.board.target_type,
+                                                is_target_identified=bool(target_id))
+        return manifest
+
+    @classmethod
+    def clear_for_session(cls, session):
+        """! @brief Forget the recorded contents of all flash of the session's target.
+
+        Used when all of flash is erased, for instance by a mass erase. Nothing is done if
+        manifests are not enabled.
+        """
+        manifest = cls.for_session(session)
+        if manifest is not None:
+            manifest.clear()
+            manifest.save()
+
+    def __init__(self, path, target_type, is_target_identified=False):
+        """! @brief Constructor.
+
+        The manifest file is read if it exists. A file for a different target type, or one
+        that cannot be parsed, is ignored.
+
+        @param self
+        @param path Path of the manifest file.
+        @param target_type Target type name stored in the manifest.
+        @param is_target_identified Whether the manifest file name identifies the target itself,
+            rather than only the probe connected to it.
+        """
+        self._path = path
+        self._target_type = target_type
+        self._is_target_identified = is_target_identified
+        self._confirmed_sectors = set()
+        self._regions = {}
+
+        try:
+            with open(path, 'r') as manifest_file:
+                data = json.load(manifest_file)
+            if (data.get('version') == self.VERSION) and (data.get('target') == target_type):
+                for key, sectors in data['regions'].items():
+                    self._regions[key] = {int(addr, base=0): crc for addr, crc in sectors.items()}
+            else:
+                LOG.debug("Ignoring flash manifest %s for a different target or version", path)
+        except IOError:
+            pass
+        except (ValueError, KeyError, AttributeError) as err:
+            LOG.warning("Ignoring invalid flash manifest %s: %s", path, err)
+
+    @property
+    def path(self):
+        return self._path
+
+    def is_confirmed(self, region, addr):
+        """! @brief Whether the recorded CRC of a sector is known to describe the connected target.
+
+        This is always true if the manifest is for an identified target. Otherwise it is true
+        once confirm() has been called for the sector in this session.
+        """
+        return self._is_target_identified \
+                or ((self._region_key(region), addr) in self._confirmed_sectors)
+
+    def confirm(self, region, addresses):
+        """! @brief Record that the recorded CRCs of sectors match the connected target."""
+        key = self._region_key(region)
+        self._confirmed_sectors.update((key, addr) for addr in addresses)
+
+    @staticmethod
+    def _region_key(region):
+        return "0x%08x+0x%x" % (region.start, region.length)
+
+    def get_sector_crcs(self, region):
+        """! @brief Get the recorded sector CRCs for a flash region.
+        @return Dictionary of sector address to CRC32.
+        """
+        return dict(self._regions.get(self._region_key(region), {}))
+
+    def update_sectors(self, region, crcs):
+        """! @brief Record the CRCs of sectors in a flash region.
+        @param self
+        @param region The flash region containing the sectors.
+        @param crcs Dictionary of sector address to CRC32.
+        """
+        self._regions.setdefault(self._region_key(region), {}).update(crcs)
+
+    def remove_sectors(self, region, addresses):
+        """! @brief Forget the contents of sectors in a flash region.
+        @return Whether any of the sectors was recorded.
+        """
+        key = self._region_key(region)
+        sectors = self._regions.get(key, {})
+        removed = False
+        for addr in addresses:
+            removed = (sectors.pop(addr, None) is not None) or removed
+            self._confirmed_sectors.discard((key, addr))
+        return removed
+
+    def remove_region(self, region):
+        """! @brief Forget the contents of a flash region.
+        @return Whether any sector of the region was recorded.
+        """
+        key = self._region_key(region)
+        self._confirmed_sectors = set(s for s in self._confirmed_sectors if s[0] != key)
+        return bool(self._regions.pop(key, None))
+
+    def clear(self):
+        """! @brief Forget the contents of all flash regions."""
+        self._regions = {}
+        self._confirmed_sectors = set()
+
+    def save(self):
+        """! @brief Write the manifest file.
+
+        The file is written to a temporary file first and then renamed, so an interrupted save
+        does not leave a corrupt manifest.
+        """
+        data = {
+            'version': self.VERSION,
+            'target': self._target_type,
+            'regions': {key: {"0x%08x" % addr: crc for addr, crc in sectors.items()}
+                        for key, sectors in self._regions.items()},
+            }
+        try:
+            manifest_dir = os.path.dirname(self._path)
+            if manifest_dir and not os.path.isdir(manifest_dir):
+                os.makedirs(manifest_dir)
+            temp_path = self._path + ".tmp"
+            with open(temp_path, 'w') as manifest_file:
+                json.dump(data, manifest_file, indent=1, sort_keys=True)
+            # os.rename() does not replace an existing file on Windows.
+            if os.path.exists(self._path):
+                os.remove(self._path)
+            os.rename(temp_path, self._path)
+        except (IOError, OSError) as err:
+            LOG.warning("Failed to write flash manifest %s: %s", self._path, err)
@@ -0,0 +1,252 @@
+# pyOCD debugger
+# Copyright (c) 2020 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""! @brief Evaluation of gdb agent expressions.
+
+gdb sends a breakpoint condition as agent expression bytecode in the Z0 or Z1 packet when
+target-side condition evaluation is enabled. Evaluating the condition in the server saves the
+round trips gdb needs to read registers and memory to evaluate the condition itself.
+
+Only the integer subset of the bytecode used for conditions is supported. Tracepoint,
+trace state variable, floating point, and printf operations raise AgentExpressionError.
+"""
+
+import six
+
+from ..core import exceptions
+
+class AgentExpressionError(exceptions.Error):
+    """! @brief An agent expression is invalid or cannot be evaluated."""
+    pass
+
+## Values are computed with 64 bits, the same as gdb's LONGEST type.
+_MASK = (1 << 64) - 1
+_SIGN = 1 << 63
+
+## Maximum number of instructions executed for one evaluation, to stop runaway loops.
+MAX_STEPS = 10000
+
+## Maximum depth of the value stack.
+MAX_STACK = 1024
+
+def _signed(value):
+    return value - (1 << 64) if (value & _SIGN) else value
+
+def _binary(fn):
+    def op(stack):
+        b = stack.pop()
+        a = stack.pop()
+        stack.append(fn(a, b) & _MASK)
+    return op
+
+def _div(a, b, signed):
+    if b == 0:
+        raise AgentExpressionError("division by zero")
+    if signed:
+        a, b = _signed(a), _signed(b)
+        # Truncate toward zero as C does.
+        q = abs(a) // abs(b)
+        return -q if ((a < 0) != (b < 0)) else q
+    return a // b
+
+def _rem(a, b, signed):
+    if b == 0:
+        raise AgentExpressionError("division by zero")
+    if signed:
+        a, b = _signed(a), _signed(b)
+        r = abs(a) % abs(b)
+        return -r if (a < 0) else r
+    return a % b
+
+## Operations that only use the stack, by opcode.
+_STACK_OPS = {
+    0x02: _binary(lambda a, b: a + b),                              # add
+    0x03: _binary(lambda a, b: a - b),                              # sub
+    0x04: _binary(lambda a, b: a * b),                              # mul
+    0x05: _binary(lambda a, b: _div(a, b, True)),                   # div_signed
+    0x06: _binary(lambda a, b: _div(a, b, False)),                  # div_unsigned
+    0x07: _binary(lambda a, b: _rem(a, b, True)),                   # rem_signed
+    0x08: _binary(lambda a, b: _rem(a, b, False)),                  # rem_unsigned
+    0x09: _binary(lambda a, b: (a << b) if (b < 64) else 0),       # lsh
+    0x0a: _binary(lambda a, b: _signed(a) >> min(b, 63)),           # rsh_signed
+    0x0b: _binary(lambda a, b: a >> b),                             # rsh_unsigned
+    0x0f: _binary(lambda a, b: a & b),                              # bit_and
+    0x10: _binary(lambda a, b: a | b),                              # bit_or
+    0x11: _binary(lambda a, b: a ^ b),                              # bit_xor
+    0x13: _binary(lambda a, b: int(a == b)),                        # equal
+    0x14: _binary(lambda a, b: int(_signed(a) < _signed(b))),       # less_signed
+    0x15: _binary(lambda a, b: int(a < b)),                         # less_unsigned
+    }
+
+## Memory reference opcodes and the number of bytes each reads.
+_REF_SIZES = {
+    0x17: 1,    # ref8
+    0x18: 2,    # ref16
+    0x19: 4,    # ref32
+    0x1a: 8,    # ref64
+    }
+
+## Opcodes with immediate operands of a fixed size, and their operand size.
+_CONST_SIZES = {
+    0x22: 1,    # const8
+    0x23: 2,    # const16
+    0x24: 4,    # const32
+    0x25: 8,    # const64
+    }
+
+OP_LOG_NOT = 0x0e
+OP_BIT_NOT = 0x12
+OP_EXT = 0x16
+OP_IF_GOTO = 0x20
+OP_GOTO = 0x21
+OP_REG = 0x26
+OP_END = 0x27
+OP_DUP = 0x28
+OP_POP = 0x29
+OP_ZERO_EXT = 0x2a
+OP_SWAP = 0x2b
+OP_PICK = 0x32
+OP_ROT = 0x33
+
+class AgentExpression(object):
+    """! @brief A gdb agent expression.
+
+    The expression is evaluated against a debug context. The `reg` operation takes gdb register
+    numbers, which are indexes into the register list from the target description.
+    """
+
+    @classmethod
+    def from_packet(cls, data):
+        """! @brief Create an expression from its encoding in a packet.
+        @param data Bytes of the form 'X' followed by the length in hex, a comma, and the
+            bytecode in hex.
+        """
+        try:
+            if data[0:1] != b'X':
+                raise ValueError("missing 'X'")
+            length, code = data[1:].split(b',', 1)
+            code = bytearray.fromhex(code.decode())
+            if len(code) != int(length, 16):
+                raise ValueError("length mismatch")
+        except ValueError as err:
+            raise AgentExpressionError("malformed agent expression %r (%s)" % (data, err))
+        return cls(code)
+
+    def __init__(self, code):
+        """! @brief Constructor.
+        @param self
+        @param code Bytes-like object containing the bytecode.
+        """
+        self._code = bytearray(code)
+
+    @property
+    def code(self):
+        return bytes(self._code)
+
+    def evaluate(self, context, register_list):
+        """! @brief Evaluate the expression.
+        @param self
+        @param context Debug context used to read registers and memory.
+        @param register_list List of RegisterInfo objects in gdb register number order.
+        @return The value on top of the stack when the expression ends, as an unsigned
+            64-bit integer.
+        @exception AgentExpressionError The expression is invalid or uses an unsupported
+            operation.
+        """
+        code = self._code
+        stack = []
+        pc = 0
+        try:
+            for _ in six.moves.range(MAX_STEPS):
+                op = code[pc]
+                pc += 1
+                fn = _STACK_OPS.get(op)
+                if fn is not None:
+                    fn(stack)
+                elif op in _CONST_SIZES:
+                    size = _CONST_SIZES[op]
+                    stack.append(self._operand(pc, size))
+                    pc += size
+                elif op in _REF_SIZES:
+                    size = _REF_SIZES[op]
+                    data = bytearray(context.read_memory_bytes(stack.pop(), size))
+                    if len(data) != size:
+                        raise AgentExpressionError("short memory read")
+                    stack.append(sum(b << (8 * i) for i, b in enumerate(data)))
+                elif op == OP_REG:
+                    regnum = self._operand(pc, 2)
+                    pc += 2
+                    if regnum >= len(register_list):
+                        raise AgentExpressionError("invalid register number %d" % regnum)
+                    stack.append(context.read_core_register_raw(register_list[regnum].reg_num)
+                                    & _MASK)
+                elif op == OP_IF_GOTO:
+                    if stack.pop():
+                        pc = self._operand(pc, 2)
+                    else:
+                        pc += 2
+                elif op == OP_GOTO:
+                    pc = self._operand(pc, 2)
+                elif op == OP_END:
+                    return stack[-1]
+                elif op == OP_LOG_NOT:
+                    stack.append(int(not stack.pop()))
+                elif op == OP_BIT_NOT:
+                    stack.append(~stack.pop() & _MASK)
+                elif op == OP_EXT:
+                    bits = code[pc]
+                    pc += 1
+                    value = stack.pop() & ((1 << bits) - 1)
+                    if value & (1 << (bits - 1)):
+                        value -= 1 << bits
+                    stack.append(value & _MASK)
+                elif op == OP_ZERO_EXT:
+                    bits = code[pc]
+                    pc += 1
+                    stack.append(stack.pop() & ((1 << bits) - 1))
+                elif op == OP_DUP:
+                    stack.append(stack[-1])
+                elif op == OP_POP:
+                    stack.pop()
+                elif op == OP_SWAP:
+                    stack[-1], stack[-2] = stack[-2], stack[-1]
+                elif op == OP_PICK:
+                    n = code[pc]
+                    pc += 1
+                    stack.append(stack[-1 - n])
+                elif op == OP_ROT:
+                    stack[-3], stack[-2], stack[-1] = stack[-2], stack[-1], stack[-3]
+                else:
+                    raise AgentExpressionError("unsupported agent expression opcode 0x%02x" % op)
+
+                if len(stack) > MAX_STACK:
+                    raise AgentExpressionError("agent expression stack overflow")
+        except IndexError:
+            raise AgentExpressionError("agent expression stack underflow or invalid jump")
+        raise AgentExpressionError("agent expression did not end after %d steps" % MAX_STEPS)
+
+    def _operand(self, offset, size):
+        """! @brief Read a big endian immediate operand."""
+        data = self._code[offset:offset + size]
+        if len(data) != size:
+            raise AgentExpressionError("truncated agent expression")
+        value = 0
+        for b in data:
+            value = (value << 8) | b
+        return value
+
+    def __repr__(self):
+        return "<%s@%x %s>" % (self.__class__.__name__, id(self), self.code)
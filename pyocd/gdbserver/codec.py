@@ -0,0 +1,92 @@
+# pyOCD debugger
+# Copyright (c) 2020 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""! @brief Encoding of GDB RSP packet payloads.
+
+All functions operate on whole buffers with bytes methods, so the per-byte work is done in C
+rather than in Python loops.
+"""
+
+import six
+
+from ..utility.compatibility import PY3
+
+## Escape character for binary data.
+ESCAPE = b'}'
+
+## Characters that must be escaped in binary data, with their escaped form. The escape character
+# itself must be replaced first, so that it is not applied to the escape characters inserted
+# for the other characters.
+_ESCAPES = [(c, ESCAPE + six.int2byte(six.byte2int(c) ^ 0x20)) for c in (b'}', b'#', b'$', b'*')]
+
+## Two-character lowercase hex string for each checksum value.
+_CHECKSUM_HEX = [("%02x" % i).encode() for i in range(256)]
+
+if PY3:
+    _byte_sum = sum
+else:
+    def _byte_sum(data):
+        return sum(bytearray(data))
+
+def escape(data):
+    """! @brief Escape binary data to be sent to gdb.
+
+    @param data Bytes-like object containing raw binary.
+    @return Bytes object with the characters in '#$}*' escaped as required by gdb.
+    """
+    data = bytes(data)
+    for c, escaped in _ESCAPES:
+        if c in data:
+            data = data.replace(c, escaped)
+    return data
+
+def unescape(data):
+    """! @brief De-escape binary data received from gdb.
+
+    @param data Bytes-like object with possibly escaped values.
+    @return Bytearray with all escaped bytes de-escaped.
+    """
+    data = bytes(data)
+    result = bytearray()
+    start = 0
+    while True:
+        # Copy everything up to the next escape character in one slice. The byte following
+        # an escape is always data, even if it is itself the escape character.
+        index = data.find(ESCAPE, start)
+        if index < 0:
+            result += data[start:]
+            return result
+        result += data[start:index]
+        # A trailing escape character without a following byte is dropped.
+        if index + 1 < len(data):
+            result.append(six.indexbytes(data, index + 1) ^ 0x20)
+        start = index + 2
+
+def checksum(data):
+    """! @brief Compute the checksum of a packet payload.
+
+    @param data Bytes-like object containing the payload between the '$' and '#'.
+    @return Bytes object with the checksum as two lowercase hex characters.
+    """
+    return _CHECKSUM_HEX[_byte_sum(memoryview(data)) & 0xff]
+
+def frame(data):
+    """! @brief Build a complete packet from a payload.
+
+    @param data Bytes object containing the payload, which must already be escaped.
+    @return Bytes object with the packet, including the leading '$' and trailing '#' and checksum.
+    """
+    return b'$' + data + b'#' + checksum(data)
@@ -57,6 +57,11 @@ class GDBDebugContextFacade(object):
     def context(self):
         return self._context
 
+    @property
+    def register_list(self):
+        """! @brief List of RegisterInfo objects for the registers reported to gdb."""
+        return self._register_list
+
     def set_context(self, newContext):
         self._context = newContext
 
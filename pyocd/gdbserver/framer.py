@@ -0,0 +1,134 @@
+# pyOCD debugger
+# Copyright (c) 2020 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+_PACKET_START = ord('$')
+_PACKET_END = b'#'
+_ACK = ord('+')
+_NACK = ord('-')
+_CTRL_C = 0x03
+
+class RSPFramer(object):
+    """! @brief Streaming parser that splits received GDB RSP data into packets.
+
+    Data is passed to feed() as it is received, in chunks of any size. Received bytes are
+    appended to a single buffer that is scanned from a read cursor, so each byte is examined
+    only once no matter how the data is split into chunks. The packet checksum is accumulated
+    as the packet body is scanned. Consumed data is discarded from the buffer in bulk.
+
+    Outside of a packet, acks, nacks, and Ctrl-C interrupts are reported through callbacks as
+    soon as they are seen. Any other bytes between packets are ignored. Within a packet, all
+    bytes are part of the packet.
+    """
+
+    ## Consumed data is discarded from the buffer once it exceeds this size.
+    COMPACT_THRESHOLD = 64 * 1024
+
+    def __init__(self, packet_cb, ack_cb=None, interrupt_cb=None):
+        """! @brief Constructor.
+        @param self
+        @param packet_cb Called with two parameters for each complete packet: the packet as a
+            bytes object including the leading '$' and trailing '#' and checksum, and a bool for
+            whether the checksum is valid.
+        @param ack_cb Optional callable passed b'+' or b'-' when an ack or nack is received.
+        @param interrupt_cb Optional callable called with no parameters when a Ctrl-C is received.
+        """
+        self._packet_cb = packet_cb
+        self._ack_cb = ack_cb
+        self._interrupt_cb = interrupt_cb
+        self._buffer = bytearray()
+        self._pos = 0
+        self._in_packet = False
+        self._packet_start = 0
+        self._scan_pos = 0
+        self._sum = 0
+
+    @property
+    def pending_bytes(self):
+        """! @brief Number of buffered bytes not yet consumed as part of a complete packet."""
+        start = self._packet_start if self._in_packet else self._pos
+        return len(self._buffer) - start
+
+    def reset(self):
+        """! @brief Discard all buffered data."""
+        self._buffer = bytearray()
+        self._pos = 0
+        self._in_packet = False
+
+    def feed(self, data):
+        """! @brief Process received data.
+
+        Callbacks are invoked from within this method for every packet, ack, and interrupt that
+        is completed by the new data.
+        """
+        buf = self._buffer
+        buf += data
+        pos = self._pos
+        length = len(buf)
+
+        while pos < length:
+            if not self._in_packet:
+                c = buf[pos]
+                pos += 1
+                if c == _PACKET_START:
+                    self._in_packet = True
+                    self._packet_start = pos - 1
+                    self._scan_pos = pos
+                    self._sum = 0
+                elif c in (_ACK, _NACK):
+                    if self._ack_cb is not None:
+                        self._ack_cb(b'+' if c == _ACK else b'-')
+                elif c == _CTRL_C:
+                    if self._interrupt_cb is not None:
+                        self._interrupt_cb()
+                continue
+
+            # Find the end of the packet body, adding the body to the checksum as it's scanned.
+            end = buf.find(_PACKET_END, self._scan_pos)
+            if end < 0:
+                self._sum += sum(buf[self._scan_pos:length])
+                self._scan_pos = length
+                break
+            self._sum += sum(buf[self._scan_pos:end])
+            self._scan_pos = end
+
+            # Wait for both checksum characters.
+            if end + 3 > length:
+                break
+
+            packet = bytes(buf[self._packet_start:end + 3])
+            try:
+                good = int(packet[-2:], 16) == (self._sum & 0xff)
+            except ValueError:
+                good = False
+            self._in_packet = False
+            pos = end + 3
+            self._packet_cb(packet, good)
+
+        self._pos = pos
+        self._compact()
+
+    def _compact(self):
+        """! @brief Discard consumed data from the start of the buffer."""
+        if self._in_packet:
+            discard = self._packet_start
+        else:
+            discard = self._pos
+        if (discard == len(self._buffer)) or (discard > self.COMPACT_THRESHOLD):
+            del self._buffer[:discard]
+            self._pos -= discard
+            if self._in_packet:
+                self._packet_start -= discard
+                self._scan_pos -= discard
@@ -16,31 +16,33 @@
 
 from ..core import exceptions
 from ..core.target import Target
-from ..flash.loader import (FlashLoader, FlashEraser)
+from ..flash.loader import (FlashLoader, FlashEraser, StreamingFlashLoader)
 from ..utility.cmdline import convert_vector_catch
-from ..utility.conversion import (hex_to_byte_list, hex_encode, hex_decode, hex8_to_u32le)
+from ..utility.conversion import (hex_encode, hex_decode, hex8_to_u32le)
 from ..utility.progress import print_progress
-from ..utility.compatibility import (iter_single_bytes, to_bytes_safe, to_str_safe)
+from ..utility.compatibility import (to_bytes_safe, to_str_safe)
 from ..utility.server import StreamServer
 from ..trace.swv import SWVReader
 from ..utility.sockets import ListenerSocket
 from .syscall import GDBSyscallIOHandler
+from .framer import RSPFramer
+from .codec import (checksum, escape, unescape, frame)
+from .agent_expression import (AgentExpression, AgentExpressionError)
 from ..debug import semihost
+from ..debug.run_state_monitor import RunStateMonitor
+from ..debug.crc import MemoryCRC
 from ..debug.cache import MemoryAccessError
 from .context_facade import GDBDebugContextFacade
 from .symbols import GDBSymbolProvider
 from ..rtos import RTOS
 from . import signals
 import logging, threading, socket
-from struct import unpack
 from time import (sleep, time)
 import sys
 import six
 from six.moves import queue
 from xml.etree.ElementTree import (Element, SubElement, tostring)
 
-CTRL_C = b'\x03'
-
 LOG = logging.getLogger(__name__)
 
 TRACE_MEM = LOG.getChild("trace_mem")
@@ -52,45 +54,6 @@ TRACE_ACK.setLevel(logging.CRITICAL)
 TRACE_PACKETS = LOG.getChild("trace_packet")
 TRACE_PACKETS.setLevel(logging.CRITICAL)
 
-def checksum(data):
-    return ("%02x" % (sum(six.iterbytes(data)) % 256)).encode()
-
-def unescape(data):
-    """! @brief De-escapes binary data from Gdb.
-    
-    @param data Bytes-like object with possibly escaped values.
-    @return List of integers in the range 0-255, with all escaped bytes de-escaped.
-    """
-    data_idx = 0
-
-    # unpack the data into binary array
-    str_unpack = str(len(data)) + 'B'
-    data = unpack(str_unpack, data)
-    data = list(data)
-
-    # check for escaped characters
-    while data_idx < len(data):
-        if data[data_idx] == 0x7d:
-            data.pop(data_idx)
-            data[data_idx] = data[data_idx] ^ 0x20
-        data_idx += 1
-
-    return data
-
-def escape(data):
-    """! @brief Escape binary data to be sent to Gdb.
-    
-    @param data Bytes-like object containing raw binary.
-    @return Bytes object with the characters in '#$}*' escaped as required by Gdb.
-    """
-    result = b''
-    for c in iter_single_bytes(data):
-        if c in b'#$}*':
-            result += b'}' + six.int2byte(six.byte2int(c) ^ 0x20)
-        else:
-            result += c
-    return result
-
 class GDBError(exceptions.Error):
     """! @brief Error communicating with GDB."""
     pass
@@ -99,32 +62,43 @@ class ConnectionClosedException(Exception):
     """! @brief Exception used to signal the GDB server connection closed."""
     pass
 
-class GDBServerPacketIOThread(threading.Thread):
-    """! @brief Packet I/O thread.
+class GDBServerPacketIO(object):
+    """! @brief Packet I/O for a gdb connection.
     
-    This class is a thread used by the GDBServer class to perform all RSP packet I/O. It
-    handles verifying checksums, acking, and receiving Ctrl-C interrupts. There is a queue
-    for received packets. The interface to this queue is the receive() method. The send()
-    method writes outgoing packets to the socket immediately.
+    This class is used by the GDBServer class to perform all RSP packet I/O. It handles
+    verifying checksums, acking, and receiving Ctrl-C interrupts. Incoming data is read from the
+    socket by a Reactor callback when the socket is readable. There is a queue for received
+    packets. The interface to this queue is the receive() method. The send() method writes
+    outgoing packets to the socket immediately.
     """
     
-    def __init__(self, abstract_socket):
-        super(GDBServerPacketIOThread, self).__init__()
-        self.name = "gdb-packet-thread-port%d" % abstract_socket.port
+    def __init__(self, abstract_socket, reactor, interrupt_callback=None):
+        """! @brief Constructor.
+        @param self
+        @param abstract_socket Socket connected to gdb.
+        @param reactor The Reactor that reads from the socket.
+        @param interrupt_callback Optional callable invoked with no parameters from the
+            reactor thread after the interrupt event is set by a Ctrl-C from gdb.
+        """
         self.log = LOG.getChild('gdbpacket')
         self._abstract_socket = abstract_socket
+        self._conn = abstract_socket.conn
+        self._reactor = reactor
         self._receive_queue = queue.Queue()
-        self._shutdown_event = threading.Event()
         self.interrupt_event = threading.Event()
         self.send_acks = True
         self._clear_send_acks = False
-        self._buffer = b''
+        self._interrupt_callback = interrupt_callback
+        self._framer = RSPFramer(self._handling_incoming_packet, self._handle_ack,
+                                    self._handle_interrupt)
         self._expecting_ack = False
         self.drop_reply = False
         self._last_packet = b''
         self._closed = False
-        self.setDaemon(True)
-        self.start()
+
+        # Reads only happen once select() reports data, so they never block.
+        self._abstract_socket.set_timeout(None)
+        self._reactor.add_reader(self._conn, self._read)
 
     def set_send_acks(self, ack):
         if ack:
@@ -133,7 +107,9 @@ class GDBServerPacketIOThread(threading.Thread):
             self._clear_send_acks = True
 
     def stop(self):
-        self._shutdown_event.set()
+        """! @brief Stop reading from the socket and wake any thread blocked in receive()."""
+        self._reactor.remove_reader(self._conn)
+        self._set_closed()
 
     def send(self, packet):
         if self._closed or not packet:
@@ -145,49 +121,48 @@ class GDBServerPacketIOThread(threading.Thread):
             self.drop_reply = False
             self.log.debug("GDB dropped reply %s", packet)
 
-    def receive(self, block=True):
+    def receive(self, block=True, timeout=None):
+        """! @brief Return the next packet from gdb.
+        @param self
+        @param block Whether to wait for a packet if none has been received.
+        @param timeout Maximum time in seconds to wait if _block_ is True, or None to wait
+            until a packet is received or the connection is closed.
+        @return The packet, or None if there is none.
+        @exception ConnectionClosedException The connection is closed.
+        """
         if self._closed:
             raise ConnectionClosedException()
-        while True:
-            try:
-                # If block is false, we'll get an Empty exception immediately if there
-                # are no packets in the queue. Same if block is true and it times out
-                # waiting on an empty queue.
-                return self._receive_queue.get(block, 0.1)
-            except queue.Empty:
-                # Only exit the loop if block is false or connection closed.
-                if not block:
-                    return None
-                if self._closed:
-                    raise ConnectionClosedException()
-
-    def run(self):
-        self.log.debug("Starting GDB server packet I/O thread")
-
-        self._abstract_socket.set_timeout(0.01)
-
-        while not self._shutdown_event.is_set():
-            try:
-                data = self._abstract_socket.read()
-
-                # Handle closed connection
-                if len(data) == 0:
-                    self.log.debug("GDB packet thread: other side closed connection")
-                    self._closed = True
-                    break
-
-                TRACE_PACKETS.debug('-->>>> GDB read %d bytes: %s', len(data), data)
-
-                self._buffer += data
-            except socket.error:
-                pass
+        try:
+            packet = self._receive_queue.get(block, timeout)
+        except queue.Empty:
+            return None
+        # None is queued to wake the receiver when the connection is closed.
+        if packet is None:
+            raise ConnectionClosedException()
+        return packet
 
-            if self._shutdown_event.is_set():
-                break
+    def _set_closed(self):
+        if not self._closed:
+            self._closed = True
+            self._receive_queue.put(None)
 
-            self._process_data()
+    def _read(self):
+        """! @brief Reactor callback for data from gdb."""
+        try:
+            data = self._abstract_socket.read()
+        except socket.error as err:
+            self.log.debug("GDB packet I/O: error reading socket: %s", err)
+            data = b''
+
+        # Handle closed connection
+        if len(data) == 0:
+            self.log.debug("GDB packet I/O: other side closed connection")
+            self._reactor.remove_reader(self._conn)
+            self._set_closed()
+            return
 
-        self.log.debug("GDB packet thread stopping")
+        TRACE_PACKETS.debug('-->>>> GDB read %d bytes: %s', len(data), data)
+        self._framer.feed(data)
 
     def _write_packet(self, packet):
         TRACE_PACKETS.debug('--<<<< GDB send %d bytes: %s', len(packet), packet)
@@ -203,55 +178,31 @@ class GDBServerPacketIOThread(threading.Thread):
         if self.send_acks:
             self._expecting_ack = True
 
-    def _check_expected_ack(self):
-        # Handle expected ack.
-        c = self._buffer[0:1]
-        if c in (b'+', b'-'):
-            self._buffer = self._buffer[1:]
-            TRACE_ACK.debug('got ack: %s', c)
-            if c == b'-':
-                # Handle nack from gdb
-                self._write_packet(self._last_packet)
-                return
-
-            # Handle disabling of acks.
-            if self._clear_send_acks:
-                self.send_acks = False
-                self._clear_send_acks = False
-        else:
-            self.log.debug("GDB: expected n/ack but got '%s'", c)
+    def _handle_ack(self, c):
+        if not self._expecting_ack:
+            TRACE_ACK.debug('ignoring unexpected ack: %s', c)
+            return
+        self._expecting_ack = False
+        TRACE_ACK.debug('got ack: %s', c)
+        if c == b'-':
+            # Handle nack from gdb
+            self._write_packet(self._last_packet)
+            return
 
-    def _process_data(self):
-        """! @brief Process all incoming data until there are no more complete packets."""
-        while len(self._buffer):
-            if self._expecting_ack:
-                self._expecting_ack = False
-                self._check_expected_ack()
+        # Handle disabling of acks.
+        if self._clear_send_acks:
+            self.send_acks = False
+            self._clear_send_acks = False
 
-            # Check for a ctrl-c.
-            if len(self._buffer) and self._buffer[0:1] == CTRL_C:
-                self.interrupt_event.set()
-                self._buffer = self._buffer[1:]
+    def _handle_interrupt(self):
+        self.interrupt_event.set()
+        if self._interrupt_callback is not None:
+            self._interrupt_callback()
 
-            try:
-                # Look for complete packet and extract from buffer.
-                pkt_begin = self._buffer.index(b"$")
-                pkt_end = self._buffer.index(b"#") + 2
-                if pkt_begin >= 0 and pkt_end < len(self._buffer):
-                    pkt = self._buffer[pkt_begin:pkt_end + 1]
-                    self._buffer = self._buffer[pkt_end + 1:]
-                    self._handling_incoming_packet(pkt)
-                else:
-                    break
-            except ValueError:
-                # No complete packet received yet.
-                break
-
-    def _handling_incoming_packet(self, packet):
-        # Compute checksum
-        data, cksum = packet[1:].split(b'#')
-        computedCksum = checksum(data)
-        goodPacket = (computedCksum.lower() == cksum.lower())
+    def _handling_incoming_packet(self, packet, goodPacket):
+        if self._expecting_ack:
+            self.log.debug("GDB: expected n/ack but got a packet")
+            self._expecting_ack = False
 
         if self.send_acks:
             ack = b'+' if goodPacket else b'-'
@@ -267,6 +218,17 @@ class GDBServer(threading.Thread):
     This class start a GDB server listening a gdb connection on a specific port.
     It implements the RSP (Remote Serial Protocol).
     """
+
+    ## Longest time in seconds between target state polls while the target is running. This
+    # bounds the latency of reporting a halt.
+    RESUME_POLL_MAX_INTERVAL = 0.01
+
+    ## Time in seconds between checks for server shutdown while waiting for the target to halt.
+    RESUME_WAIT_TIMEOUT = 0.1
+
+    ## Number of bytes around the PC read into the cache when the target halts.
+    CODE_PREFETCH_SIZE = 64
+
     def __init__(self, session, core=None, server_listening_callback=None):
         super(GDBServer, self).__init__()
         self.session = session
@@ -295,8 +257,9 @@ class GDBServer(threading.Thread):
         self.semihost_use_syscalls = session.options.get('semihost_use_syscalls')
         self.serve_local_only = session.options.get('serve_local_only')
         self.report_core = session.options.get('report_core_number')
+        self.stack_prefetch_size = session.options.get('stack_prefetch_size')
         self.server_listening_callback = server_listening_callback
-        self.packet_size = 2048
+        self.packet_size = session.options.get('gdbserver_packet_size')
         self.packet_io = None
         self.gdb_features = []
         self.non_stop = False
@@ -305,6 +268,8 @@ class GDBServer(threading.Thread):
         self.flash_loader = None
         self.shutdown_event = threading.Event()
         self.detach_event = threading.Event()
+        self._reactor = session.reactor
+        self._connection_queue = queue.Queue()
         if core is None:
             self.target_context = self.board.target.get_target_context()
         else:
@@ -314,6 +279,9 @@ class GDBServer(threading.Thread):
         self.did_init_thread_providers = False
         self.current_thread_id = 0
         self.first_run_after_reset_or_flash = True
+        self._xml_cache = {}
+        self._thread_xml_fragments = {}
+        self._breakpoint_conditions = {}
 
         self.abstract_socket = ListenerSocket(self.port, self.packet_size)
         if self.serve_local_only:
@@ -332,7 +300,8 @@ class GDBServer(threading.Thread):
             semihost_io_handler = semihost.InternalSemihostIOHandler()
 
         if self.semihost_console_type == 'telnet':
-            self.telnet_server = StreamServer(self.telnet_port, self.serve_local_only, "Semihost", False)
+            self.telnet_server = StreamServer(self.telnet_port, self.serve_local_only, "Semihost", False,
+                                                self._reactor)
             console_file = self.telnet_server
             semihost_console = semihost.ConsoleIOHandler(self.telnet_server)
         else:
@@ -342,6 +311,14 @@ class GDBServer(threading.Thread):
             semihost_console = semihost_io_handler
         self.semihost = semihost.SemihostAgent(self.target_context, io_handler=semihost_io_handler, console=semihost_console)
         
+        # Monitor the run state of the core, shared with the SWV reader.
+        if core is None:
+            monitored_core = self.board.target.selected_core
+        else:
+            monitored_core = self.target
+        self._run_monitor = RunStateMonitor(session, monitored_core, self.RESUME_POLL_MAX_INTERVAL)
+        self._run_monitor.start()
+
         self._swv_reader = None
         if session.options.get("enable_swv"):
             if "swv_system_clock" not in session.options:
@@ -349,7 +326,7 @@ class GDBServer(threading.Thread):
             else:
                 sys_clock = int(session.options.get("swv_system_clock"))
                 swo_clock = int(session.options.get("swv_clock"))
-                self._swv_reader = SWVReader(session, self.core)
+                self._swv_reader = SWVReader(session, self.core, self._run_monitor)
                 self._swv_reader.init(sys_clock, swo_clock, console_file)
 
         # pylint: disable=invalid-name
@@ -388,6 +365,7 @@ class GDBServer(threading.Thread):
                 b'S' : (self.step,               1   ), # Step with signal.
                 b'T' : (self.is_thread_alive,    1   ), # Thread liveness query.
                 b'v' : (self.v_command,          2   ), # v command.
+                b'x' : (self.get_memory_binary,  2   ), # Read memory (binary).
                 b'X' : (self.write_memory,       2   ), # Write memory (binary).
                 b'z' : (self.breakpoint,         1   ), # Insert breakpoint/watchpoint.
                 b'Z' : (self.breakpoint,         1   ), # Remove breakpoint/watchpoint.
@@ -404,12 +382,17 @@ class GDBServer(threading.Thread):
     def restart(self):
         if self.isAlive():
             self.detach_event.set()
+            self._connection_queue.put(None)
 
     def stop(self):
         if self.isAlive():
             self.shutdown_event.set()
-            while self.isAlive():
-                pass
+            # Wake the server thread whether it is waiting for a connection or for a packet.
+            self._connection_queue.put(None)
+            packet_io = self.packet_io
+            if packet_io is not None:
+                packet_io.stop()
+            self.join()
             self.log.info("GDB server thread killed")
 
     def _cleanup(self):
@@ -426,6 +409,9 @@ class GDBServer(threading.Thread):
         if self._swv_reader:
             self._swv_reader.stop()
             self._swv_reader = None
+        self._run_monitor.stop()
+        if self.abstract_socket.listener is not None:
+            self._reactor.remove_reader(self.abstract_socket.listener)
         self.abstract_socket.cleanup()
 
     def _cleanup_for_next_connection(self):
@@ -433,6 +419,9 @@ class GDBServer(threading.Thread):
         self.thread_provider = None
         self.did_init_thread_providers = False
         self.current_thread_id = 0
+        self._xml_cache = {}
+        self._thread_xml_fragments = {}
+        self._breakpoint_conditions = {}
 
     def run(self):
         self.log.info('GDB server started on port %d', self.port)
@@ -445,10 +434,14 @@ class GDBServer(threading.Thread):
                 if self.server_listening_callback:
                     self.server_listening_callback(self)
 
+                # Wait for the reactor to accept a connection, or for stop() or restart().
                 while not self.shutdown_event.isSet() and not self.detach_event.isSet():
-                    connected = self.abstract_socket.connect()
-                    if connected != None:
-                        self.packet_io = GDBServerPacketIOThread(self.abstract_socket)
+                    self._reactor.add_reader(self.abstract_socket.listener, self._accept_connection)
+                    connected = self._connection_queue.get()
+                    self._reactor.remove_reader(self.abstract_socket.listener)
+                    if connected is not None:
+                        self.packet_io = GDBServerPacketIO(self.abstract_socket, self._reactor,
+                                                    self._run_monitor.wake)
                         break
 
                 if self.shutdown_event.isSet():
@@ -461,11 +454,26 @@ class GDBServer(threading.Thread):
                 self.log.info("One client connected!")
                 self._run_connection()
                 self.log.info("Client disconnected!")
+                self._close_connection()
                 self._cleanup_for_next_connection()
 
             except Exception as e:
                 self.log.error("Unexpected exception: %s", e, exc_info=self.session.log_tracebacks)
 
+    def _accept_connection(self):
+        """! @brief Reactor callback for gdb connecting to the listener socket."""
+        conn = self.abstract_socket.accept()
+        if conn is not None:
+            # Only one connection is served at a time.
+            self._reactor.remove_reader(self.abstract_socket.listener)
+            self._connection_queue.put(conn)
+
+    def _close_connection(self):
+        if self.packet_io is not None:
+            self.packet_io.stop()
+            self.packet_io = None
+        self.abstract_socket.close()
+
     def _run_connection(self):
         while True:
             try:
@@ -478,6 +486,7 @@ class GDBServer(threading.Thread):
 
                 if self.packet_io.interrupt_event.isSet():
                     if self.non_stop:
+                        self._run_monitor.halted()
                         self.target.halt()
                         self.is_target_running = False
                         self.send_stop_notification()
@@ -485,18 +494,29 @@ class GDBServer(threading.Thread):
                         self.log.error("Got unexpected ctrl-c, ignoring")
                     self.packet_io.interrupt_event.clear()
 
+                # In non-stop mode packets are handled while the target runs, so this thread
+                # polls the target itself rather than sharing it with the run state monitor.
                 if self.non_stop and self.is_target_running:
                     try:
                         if self.target.get_state() == Target.TARGET_HALTED:
-                            self.log.debug("state halted")
-                            self.is_target_running = False
-                            self.send_stop_notification()
+                            if self._check_breakpoint_condition():
+                                self.log.debug("state halted")
+                                self._run_monitor.halted()
+                                self.is_target_running = False
+                                self.send_stop_notification()
                     except Exception as e:
                         self.log.error("Unexpected exception: %s", e, exc_info=self.session.log_tracebacks)
 
-                # read command
+                # read command. In non-stop mode, stop waiting periodically to check whether
+                # the target has halted.
+                if not self.non_stop:
+                    timeout = None
+                elif self.is_target_running:
+                    timeout = self.RESUME_POLL_MAX_INTERVAL
+                else:
+                    timeout = self.RESUME_WAIT_TIMEOUT
                 try:
-                    packet = self.packet_io.receive(block=not self.non_stop)
+                    packet = self.packet_io.receive(timeout=timeout)
                 except ConnectionClosedException:
                     break
 
@@ -507,8 +527,7 @@ class GDBServer(threading.Thread):
                 if self.detach_event.isSet():
                     break
 
-                if self.non_stop and packet is None:
-                    sleep(0.1)
+                if packet is None:
                     continue
 
                 if len(packet) != 0:
@@ -520,9 +539,7 @@ class GDBServer(threading.Thread):
                         self.packet_io.send(resp)
 
                     if detach:
-                        self.abstract_socket.close()
-                        self.packet_io.stop()
-                        self.packet_io = None
+                        self._close_connection()
                         if self.persist:
                             self._cleanup_for_next_connection()
                             break
@@ -581,22 +598,25 @@ class GDBServer(threading.Thread):
         addr = int(split[1], 16)
         self.log.debug("GDB breakpoint %s%d @ %x" % (data[0:1], int(data[1:2]), addr))
 
-        # handle software breakpoint Z0/z0
-        if data[1:2] == b'0':
+        # handle software breakpoint Z0/z0 and hardware breakpoint Z1/z1
+        if data[1:2] in (b'0', b'1'):
+            bp_type = Target.BREAKPOINT_SW if (data[1:2] == b'0') else Target.BREAKPOINT_HW
             if data[0:1] == b'Z':
-                if not self.target.set_breakpoint(addr, Target.BREAKPOINT_SW):
-                    return self.create_rsp_packet(b'E01') #EPERM
-            else:
-                self.target.remove_breakpoint(addr)
-            return self.create_rsp_packet(b"OK")
-
-        # handle hardware breakpoint Z1/z1
-        if data[1:2] == b'1':
-            if data[0:1] == b'Z':
-                if self.target.set_breakpoint(addr, Target.BREAKPOINT_HW) is False:
+                try:
+                    conditions = self._parse_breakpoint_conditions(data)
+                except AgentExpressionError as err:
+                    self.log.warning("Invalid breakpoint condition: %s", err)
+                    return self.create_rsp_packet(b'E01')
+                if self.target.set_breakpoint(addr, bp_type) is False:
                     return self.create_rsp_packet(b'E01') #EPERM
+                # gdb sends the breakpoint again without removing it when its conditions change.
+                if conditions:
+                    self._breakpoint_conditions[addr & ~1] = (bp_type, conditions)
+                else:
+                    self._breakpoint_conditions.pop(addr & ~1, None)
             else:
                 self.target.remove_breakpoint(addr)
+                self._breakpoint_conditions.pop(addr & ~1, None)
             return self.create_rsp_packet(b"OK")
 
         # handle hardware watchpoint Z2/z2/Z3/z3/Z4/z4
@@ -620,6 +640,59 @@ class GDBServer(threading.Thread):
             self.target.remove_watchpoint(addr, size, watchpoint_type)
         return self.create_rsp_packet(b"OK")
 
+    def _parse_breakpoint_conditions(self, data):
+        """! @brief Return the list of condition expressions from a Z0 or Z1 packet.
+
+        The packet has the form 'Z0,addr,kind;X len,expr;X len,expr...', possibly followed
+        by a ';cmds:' section, which is ignored.
+        """
+        conditions = []
+        for item in data.split(b'#')[0].split(b';')[1:]:
+            if item.startswith(b'cmds:'):
+                break
+            conditions.append(AgentExpression.from_packet(item))
+        return conditions
+
+    def _check_breakpoint_condition(self):
+        """! @brief Decide whether a halt must be reported to gdb.
+
+        If the core halted at a breakpoint with conditions, the conditions are evaluated with
+        the target context, so the values read are cached for gdb's requests if the halt is
+        reported. gdb stops if any condition is true. If none is, the core steps over the
+        breakpoint and resumes.
+
+        @retval True The halt should be reported to gdb.
+        @retval False The core was resumed.
+        """
+        if not self._breakpoint_conditions:
+            return True
+        pc = self.target_context.read_core_register('pc') & ~1
+        entry = self._breakpoint_conditions.get(pc)
+        if entry is None:
+            return True
+        bp_type, conditions = entry
+        register_list = self.target_facade.register_list
+        for condition in conditions:
+            try:
+                if condition.evaluate(self.target_context, register_list):
+                    return True
+            except exceptions.Error as err:
+                # Stop so the user sees the breakpoint, the same as gdb does when it fails
+                # to evaluate a condition.
+                self.log.warning("Failed to evaluate condition of breakpoint at 0x%08x: %s",
+                        pc, err)
+                return True
+
+        self.log.debug("condition false for breakpoint at 0x%08x; resuming", pc)
+        self.target.remove_breakpoint(pc)
+        try:
+            self.target.step(not self.step_into_interrupt)
+        finally:
+            self.target.set_breakpoint(pc, bp_type)
+        self.target.resume()
+        self._run_monitor.resumed(poll=not self.non_stop)
+        return False
+
     def set_thread(self, data):
         if not self.is_threading_enabled():
             return self.create_rsp_packet(b'OK')
@@ -698,6 +771,7 @@ class GDBServer(threading.Thread):
     def resume(self, data):
         addr = self._get_resume_step_addr(data)
         self.target.resume()
+        self._run_monitor.resumed()
         self.log.debug("target resumed")
 
         if self.first_run_after_reset_or_flash:
@@ -707,19 +781,27 @@ class GDBServer(threading.Thread):
 
         val = b''
 
+        # Wait for the run state monitor to see the target halt. The packet I/O thread wakes
+        # the monitor's waiters when a ctrl-c is received, so it ends the wait immediately.
         while True:
             if self.shutdown_event.isSet():
+                self._run_monitor.halted()
                 self.packet_io.interrupt_event.clear()
                 return self.create_rsp_packet(val)
 
-            # Wait for a ctrl-c to be received.
-            if self.packet_io.interrupt_event.wait(0.01):
+            halted = self._run_monitor.wait_for_halt(timeout=self.RESUME_WAIT_TIMEOUT,
+                                        event=self.packet_io.interrupt_event)
+            if self.packet_io.interrupt_event.is_set():
                 self.log.debug("receive CTRL-C")
                 self.packet_io.interrupt_event.clear()
+                self._run_monitor.halted()
                 self.target.halt()
                 val = self.get_t_response(forceSignal=signals.SIGINT)
                 break
 
+            if not halted:
+                continue
+
             try:
                 if self.target.get_state() == Target.TARGET_HALTED:
                     # Handle semihosting
@@ -728,13 +810,23 @@ class GDBServer(threading.Thread):
 
                         if was_semihost:
                             self.target.resume()
+                            self._run_monitor.resumed()
                             continue
 
+                    if not self._check_breakpoint_condition():
+                        continue
+
+                    self._prefetch_halt_state()
                     pc = self.target_context.read_core_register('pc')
                     self.log.debug("state halted; pc=0x%08x", pc)
                     val = self.get_t_response()
                     break
+                else:
+                    # The monitor stopped on an error reading the state, or saw a transient
+                    # state. Go back to waiting.
+                    self._run_monitor.resumed()
             except exceptions.Error as e:
+                self._run_monitor.halted()
                 try:
                     self.target.halt()
                 except:
@@ -749,8 +841,27 @@ class GDBServer(threading.Thread):
         addr = self._get_resume_step_addr(data)
         self.log.debug("GDB step: %s (start=0x%x, end=0x%x)", data, start, end)
         self.target.step(not self.step_into_interrupt, start, end)
+        self._prefetch_halt_state()
         return self.create_rsp_packet(self.get_t_response())
 
+    def _prefetch_halt_state(self):
+        """! @brief Read the state gdb requests after every stop into the target context's caches.
+
+        gdb follows a stop reply with requests for the registers, the top of the stack, and the
+        code around the PC. Reading all of them at once takes far fewer round trips to the probe
+        than serving each request separately.
+        """
+        prefetch = getattr(self.target_context, 'prefetch', None)
+        if prefetch is None:
+            return
+        start = time()
+        try:
+            prefetch([reg.reg_num for reg in self.target_facade.register_list],
+                        self.stack_prefetch_size, self.CODE_PREFETCH_SIZE)
+        except exceptions.Error as e:
+            self.log.debug("halt prefetch failed: %s", e)
+        self.log.debug("halt prefetch took %.3f ms", (time() - start) * 1000)
+
     def halt(self):
         self.target.halt()
         return self.create_rsp_packet(self.get_t_response())
@@ -821,6 +932,7 @@ class GDBServer(threading.Thread):
         if thread_actions[currentThread][0:1] in (b'c', b'C'):
             if self.non_stop:
                 self.target.resume()
+                self._run_monitor.resumed(poll=False)
                 self.is_target_running = True
                 return self.create_rsp_packet(b"OK")
             else:
@@ -869,7 +981,7 @@ class GDBServer(threading.Thread):
 
             # Get flash loader if there isn't one already
             if self.flash_loader is None:
-                self.flash_loader = FlashLoader(self.session)
+                self.flash_loader = self._create_flash_loader()
 
             # Add data to flash loader
             self.flash_loader.add_data(write_addr, unescape(data[idx_begin:len(data) - 3]))
@@ -880,12 +992,14 @@ class GDBServer(threading.Thread):
         elif b'FlashDone' in ops :
             # Only program if we received data.
             if self.flash_loader is not None:
-                # Write all buffered flash contents.
-                self.flash_loader.commit()
-
-                # Set flash loader to None so that on the next flash command a new
-                # object is used.
-                self.flash_loader = None
+                try:
+                    # Write all buffered flash contents. For the streaming loader, this
+                    # finishes programming and reports any error that occurred.
+                    self.flash_loader.commit()
+                finally:
+                    # Set flash loader to None so that on the next flash command a new
+                    # object is used.
+                    self.flash_loader = None
 
             self.first_run_after_reset_or_flash = True
             if self.thread_provider is not None:
@@ -895,7 +1009,10 @@ class GDBServer(threading.Thread):
 
         return None
 
-    def get_memory(self, data):
+    def _read_memory(self, data):
+        """! @brief Read the memory requested by an 'm' or 'x' packet.
+        @return Bytes object with the memory contents, or None if the read failed.
+        """
         split = data.split(b',')
         addr = int(split[0], 16)
         length = split[1].split(b'#')[0]
@@ -903,19 +1020,58 @@ class GDBServer(threading.Thread):
 
         TRACE_MEM.debug("GDB getMem: addr=%x len=%x", addr, length)
 
+        if length == 0:
+            return b''
         try:
-            mem = self.target_context.read_memory_block8(addr, length)
+            mem = self.target_context.read_memory_bytes(addr, length)
             # Flush so an exception is thrown now if invalid memory was accesses
             self.target_context.flush()
-            val = hex_encode(bytearray(mem))
+            return mem
         except exceptions.TransferError:
             self.log.debug("get_memory failed at 0x%x" % addr)
-            val = b'E01' #EPERM
         except MemoryAccessError as e:
             self.log.debug("get_memory failed at 0x%x: %s", addr, str(e))
+        return None
+
+    def _create_flash_loader(self):
+        """! @brief Create the loader used for vFlashWrite data.
+
+        If the 'streaming_flash' option is enabled, sectors are programmed while gdb is still
+        sending data. Streaming uses sector erase, so it is not used if chip erase is selected.
+        """
+        if self.session.options.get('streaming_flash') \
+                and self.session.options.get('chip_erase') != "chip":
+            return StreamingFlashLoader(self.session)
+        return FlashLoader(self.session)
+
+    def get_memory(self, data):
+        mem = self._read_memory(data)
+        if mem is None:
             val = b'E01' #EPERM
+        else:
+            val = hex_encode(mem)
         return self.create_rsp_packet(val)
 
+    def get_memory_binary(self, data):
+        """! @brief Handle the 'x' packet, which reads memory in binary.
+
+        The reply is 'b' followed by the escaped memory contents. If escaping makes the reply
+        larger than the packet size, the reply is truncated. gdb accepts a partial read and
+        requests the remainder.
+        """
+        mem = self._read_memory(data)
+        if mem is None:
+            return self.create_rsp_packet(b'E01') #EPERM
+
+        val = escape(bytes(mem))
+        max_size = self.packet_size - 5
+        if len(val) > max_size:
+            val = val[:max_size]
+            # Don't split an escape sequence. Escaped bytes never have the value of '}'.
+            if val.endswith(b'}'):
+                val = val[:-1]
+        return self.create_rsp_packet(b'b' + val)
+
     def write_memory_hex(self, data):
         split = data.split(b',')
         addr = int(split[0], 16)
@@ -924,13 +1080,13 @@ class GDBServer(threading.Thread):
         length = int(split[0], 16)
 
         split = split[1].split(b'#')
-        data = hex_to_byte_list(split[0])
+        data = hex_decode(split[0])
 
         TRACE_MEM.debug("GDB writeMemHex: addr=%x len=%x", addr, length)
 
         try:
             if length > 0:
-                self.target_context.write_memory_block8(addr, data)
+                self.target_context.write_memory_bytes(addr, data)
                 # Flush so an exception is thrown now if invalid memory was accessed
                 self.target_context.flush()
             resp = b"OK"
@@ -956,7 +1112,7 @@ class GDBServer(threading.Thread):
 
         try:
             if length > 0:
-                self.target_context.write_memory_block8(addr, data)
+                self.target_context.write_memory_bytes(addr, data)
                 # Flush so an exception is thrown now if invalid memory was accessed
                 self.target_context.flush()
             resp = b"OK"
@@ -998,9 +1154,10 @@ class GDBServer(threading.Thread):
             self.gdb_features = query[1].split(b';')
 
             # Build our list of features.
-            features = [b'qXfer:features:read+', b'QStartNoAckMode+', b'qXfer:threads:read+', b'QNonStop+']
+            features = [b'qXfer:features:read+', b'QStartNoAckMode+', b'qXfer:threads:read+', b'QNonStop+',
+                        b'binary-upload+', b'ConditionalBreakpoints+']
             features.append(b'PacketSize=' + six.b(hex(self.packet_size))[2:])
-            if self.target_facade.get_memory_map_xml() is not None:
+            if self._get_xml_document(b'memory_map', 0) is not None:
                 features.append(b'qXfer:memory-map:read+')
             resp = b';'.join(features)
             return self.create_rsp_packet(resp)
@@ -1027,6 +1184,9 @@ class GDBServer(threading.Thread):
                 self.log.debug("Unsupported qXfer request: %s:%s:%s:%s", query[1], query[2], query[3], query[4])
                 return None
 
+        elif query[0] == b'CRC':
+            return self.handle_query_crc(query[1].split(b'#')[0])
+
         elif query[0].startswith(b'C'):
             if not self.is_threading_enabled():
                 return self.create_rsp_packet(b"QC1")
@@ -1199,17 +1359,60 @@ class GDBServer(threading.Thread):
         else:
             return self.create_rsp_packet(b"")
 
-    def handle_query_xml(self, query, offset, size):
-        self.log.debug('GDB query %s: offset: %s, size: %s', query, offset, size)
-        xml = ''
+    def _get_xml_document(self, query, offset):
+        """! @brief Return the XML document for a qXfer query, generating it only when needed.
+
+        gdb reads a document in chunks, starting at offset 0. Each document is cached for the
+        connection. Chunks after the first are always served from the cached copy, so the
+        chunks fit together even if the target state changes during the read. A read starting
+        at offset 0 reuses the cached document unless its key has changed. The memory map and
+        target description never change for a connection. With an RTOS, the threads document is
+        keyed by the thread provider's generation, so it is only built again when the thread
+        list changes. Otherwise it is keyed by the run token, so it is built at most once per stop.
+        """
+        if query == b'threads':
+            # Checking whether threading is enabled updates the provider's thread list.
+            if self.is_threading_enabled():
+                key = (True, self.thread_provider.generation)
+            else:
+                key = (False, self.target_context.core.run_token)
+        elif query in (b'memory_map', b'read_feature'):
+            key = None
+        else:
+            raise GDBError("Invalid XML query (%s)" % query)
+
+        cached = self._xml_cache.get(query)
+        if (cached is not None) and ((offset > 0) or (cached[0] == key)):
+            return cached[1]
+
         if query == b'memory_map':
             xml = self.target_facade.get_memory_map_xml()
         elif query == b'read_feature':
             xml = self.target.get_target_xml()
-        elif query == b'threads':
-            xml = self.get_threads_xml()
         else:
-            raise GDBError("Invalid XML query (%s)" % query)
+            xml = self.get_threads_xml()
+        self._xml_cache[query] = (key, xml)
+        return xml
+
+    def handle_query_crc(self, data):
+        """! @brief Handle qCRC, used by gdb's compare-sections command."""
+        try:
+            addr, length = [int(v, 16) for v in data.split(b',')]
+        except ValueError:
+            return self.create_rsp_packet(b'E01')
+        start = time()
+        try:
+            crc = MemoryCRC(self.target_context).compute(addr, length)
+        except exceptions.Error as err:
+            self.log.debug("qCRC of [0x%08x..0x%08x] failed: %s", addr, addr + length - 1, err)
+            return self.create_rsp_packet(b'E01')
+        self.log.debug("qCRC of [0x%08x..0x%08x] took %.3f s", addr, addr + length - 1,
+                time() - start)
+        return self.create_rsp_packet(("C%08x" % crc).encode())
+
+    def handle_query_xml(self, query, offset, size):
+        self.log.debug('GDB query %s: offset: %s, size: %s', query, offset, size)
+        xml = self._get_xml_document(query, offset)
 
         size_xml = len(xml)
 
@@ -1233,8 +1436,7 @@ class GDBServer(threading.Thread):
 
 
     def create_rsp_packet(self, data):
-        resp = b'$' + data + b'#' + checksum(data)
-        return resp
+        return frame(data)
 
     def syscall(self, op):
         op = to_bytes_safe(op)
@@ -1306,16 +1508,36 @@ class GDBServer(threading.Thread):
             else:
                 t.text = self.exception_name()
         else:
-            threads = self.thread_provider.get_threads()
-            for thread in threads:
-                hexId = "%x" % thread.unique_id
-                t = SubElement(root, 'thread', id=hexId, name=thread.name)
-                if self.report_core:
-                    t.set("core", str(self.core))
-                t.text = thread.description
+            return self._get_rtos_threads_xml()
 
         return b'<?xml version="1.0"?><!DOCTYPE feature SYSTEM "threads.dtd">' + tostring(root)
 
+    def _get_rtos_threads_xml(self):
+        """! @brief Build the threads XML document from the thread provider.
+
+        The XML element for each thread is kept from one stop to the next and only rebuilt if
+        the thread's name or description changed. The document is then joined from the elements.
+        """
+        previous = self._thread_xml_fragments
+        fragments = {}
+        # Keep the elements in the provider's thread order; the dict is only for lookup.
+        elements = []
+        for thread in self.thread_provider.get_threads():
+            info = (thread.name, thread.description)
+            entry = previous.get(thread.unique_id)
+            if (entry is None) or (entry[0] != info):
+                t = Element('thread', id=("%x" % thread.unique_id), name=info[0])
+                if self.report_core:
+                    t.set("core", str(self.core))
+                t.text = info[1]
+                entry = (info, tostring(t))
+            fragments[thread.unique_id] = entry
+            elements.append(entry[1])
+        self._thread_xml_fragments = fragments
+
+        return b'<?xml version="1.0"?><!DOCTYPE feature SYSTEM "threads.dtd"><threads>' \
+            + b''.join(elements) + b'</threads>'
+
     def is_threading_enabled(self):
         return (self.thread_provider is not None) and self.thread_provider.is_enabled \
             and (self.thread_provider.current_thread is not None)
@@ -19,6 +19,8 @@ import re
 import logging
 import time
 import collections
+import struct
+import threading
 import six
 from .dap_settings import DAPSettings
 from .dap_access_api import DAPAccessIntf
@@ -79,6 +81,11 @@ def _get_unique_id(interface):
     return interface.get_serial_number()
 
 
+# Packed structures for encoding DAP_Transfer and DAP_TransferBlock commands.
+_TRANSFER_HEADER = struct.Struct("<BBB")
+_TRANSFER_WRITE = struct.Struct("<BI")
+_TRANSFER_BLOCK_HEADER = struct.Struct("<BBHB")
+
 class _Transfer(object):
     """! @brief A wrapper object representing a command invoked by the layer above.
 
@@ -104,25 +111,23 @@ class _Transfer(object):
             self._size_bytes = transfer_count * 4
         self._result = None
         self._error = None
+        # The last command object that part of this transfer was added to.
+        self.last_command = None
 
     def get_data_size(self):
         """! @brief Get the size in bytes of the return value of this transfer
         """
         return self._size_bytes
 
-    def add_response(self, data):
+    def add_response(self, data, offset=0):
         """! @brief Add data read from the remote device to this object.
 
-        The size of data added must match exactly the size
-        that get_data_size returns.
+        The words are unpacked directly from _data_ starting at _offset_, so the caller does not
+        need to slice out the bytes for this transfer. There must be at least the number of bytes
+        returned by get_data_size available after the offset.
         """
-        assert len(data) == self._size_bytes
-        result = []
-        for i in range(0, self._size_bytes, 4):
-            word = ((data[0 + i] << 0) | (data[1 + i] << 8) |
-                    (data[2 + i] << 16) | (data[3 + i] << 24))
-            result.append(word)
-        self._result = result
+        assert len(data) - offset >= self._size_bytes
+        self._result = list(struct.unpack_from("<%dI" % self.transfer_count, data, offset))
 
     def add_error(self, error):
         """! @brief Attach an exception to this transfer rather than data.
@@ -130,15 +135,22 @@ class _Transfer(object):
         assert isinstance(error, Exception)
         self._error = error
 
+    def is_done(self):
+        """! @brief Whether a response or error has been attached to this transfer."""
+        return (self._result is not None) or (self._error is not None)
+
     def get_result(self):
         """! @brief Get the result of this transfer.
         """
-        while self._result is None:
-            if len(self.daplink._commands_to_read) > 0:
-                self.daplink._read_packet()
-            else:
-                assert not self.daplink._crnt_cmd.get_empty()
-                self.daplink.flush()
+        if self.daplink._is_pipelined:
+            self.daplink._wait_for_transfer(self)
+        else:
+            while self._result is None:
+                if len(self.daplink._commands_to_read) > 0:
+                    self.daplink._read_packet()
+                else:
+                    assert not self.daplink._crnt_cmd.get_empty()
+                    self.daplink.flush()
 
         if self._error is not None:
             # Pylint is confused and thinks self._error is None
@@ -150,6 +162,38 @@ class _Transfer(object):
         assert self._result is not None
         return self._result
 
+class _TransferFuture(object):
+    """! @brief Pending result of a read transfer.
+
+    Returned by read_reg() and reg_read_repeat() when the read is not performed immediately.
+    Instances are callable, so they can be used anywhere a deferred read callback is expected.
+    Calling the future, or its result() method, waits for the transfer to complete and returns
+    its value, raising any error that occurred.
+    """
+
+    def __init__(self, transfer, single=False):
+        self._transfer = transfer
+        self._single = single
+
+    def done(self):
+        """! @brief Returns True if the transfer has completed, either with data or an error."""
+        return self._transfer.is_done()
+
+    def result(self):
+        """! @brief Wait for and return the transfer result.
+
+        For single register reads an integer is returned, otherwise a list of words.
+        """
+        res = self._transfer.get_result()
+        if self._single:
+            assert len(res) == 1
+            return res[0]
+        else:
+            assert len(res) == self._transfer.transfer_count
+            return res
+
+    __call__ = result
+
 class _Command(object):
     """! @brief Wrapper object representing a command send to the layer below (ex. USB).
 
@@ -278,39 +322,24 @@ class _Command(object):
         TRACE.debug("add(%d, %02x:%s) -> [wc=%d, rc=%d, ba=%d]" %
                 (count, request, 'r' if (request & READ) else 'w', self._write_count, self._read_count, self._block_allowed))
 
-    def _encode_transfer_data(self):
+    def _encode_transfer_data(self, buf):
         """! @brief Encode this command into a byte array that can be sent
 
-        The data returned by this function is a bytearray in
-        the format that of a DAP_Transfer CMSIS-DAP command.
+        The command is written into _buf_ in the format of a DAP_Transfer CMSIS-DAP command.
         """
         assert self.get_empty() is False
-        buf = bytearray(self._size)
         transfer_count = self._read_count + self._write_count
-        pos = 0
-        buf[pos] = Command.DAP_TRANSFER
-        pos += 1
-        buf[pos] = self._dap_index
-        pos += 1
-        buf[pos] = transfer_count
-        pos += 1
+        _TRANSFER_HEADER.pack_into(buf, 0, Command.DAP_TRANSFER, self._dap_index, transfer_count)
+        pos = _TRANSFER_HEADER.size
         for count, request, write_list in self._data:
             assert write_list is None or len(write_list) <= count
-            write_pos = 0
-            for _ in range(count):
-                buf[pos] = request
-                pos += 1
-                if not request & READ:
-                    buf[pos] = (write_list[write_pos] >> (8 * 0)) & 0xff
-                    pos += 1
-                    buf[pos] = (write_list[write_pos] >> (8 * 1)) & 0xff
-                    pos += 1
-                    buf[pos] = (write_list[write_pos] >> (8 * 2)) & 0xff
-                    pos += 1
-                    buf[pos] = (write_list[write_pos] >> (8 * 3)) & 0xff
-                    pos += 1
-                    write_pos += 1
-        return buf
+            if request & READ:
+                buf[pos:pos + count] = bytearray([request]) * count
+                pos += count
+            else:
+                for value in write_list[:count]:
+                    _TRANSFER_WRITE.pack_into(buf, pos, request, value)
+                    pos += _TRANSFER_WRITE.size
 
     def _check_response(self, response):
         """! @brief Check the response status byte from CMSIS-DAP transfer commands.
@@ -361,46 +390,26 @@ class _Command(object):
         if data[1] != self._read_count + self._write_count:
             raise DAPAccessIntf.TransferError()
 
-        return data[3:3 + 4 * self._read_count]
+        return memoryview(data)[3:3 + 4 * self._read_count]
 
-    def _encode_transfer_block_data(self):
+    def _encode_transfer_block_data(self, buf):
         """! @brief Encode this command into a byte array that can be sent
 
-        The data returned by this function is a bytearray in
-        the format that of a DAP_TransferBlock CMSIS-DAP command.
+        The command is written into _buf_ in the format of a DAP_TransferBlock CMSIS-DAP command.
         """
         assert self.get_empty() is False
-        buf = bytearray(self._size)
         transfer_count = self._read_count + self._write_count
         assert not (self._read_count != 0 and self._write_count != 0)
         assert self._block_request is not None
-        pos = 0
-        buf[pos] = Command.DAP_TRANSFER_BLOCK
-        pos += 1
-        buf[pos] = self._dap_index
-        pos += 1
-        buf[pos] = transfer_count & 0xff
-        pos += 1
-        buf[pos] = (transfer_count >> 8) & 0xff
-        pos += 1
-        buf[pos] = self._block_request
-        pos += 1
+        _TRANSFER_BLOCK_HEADER.pack_into(buf, 0, Command.DAP_TRANSFER_BLOCK, self._dap_index,
+                transfer_count, self._block_request)
+        pos = _TRANSFER_BLOCK_HEADER.size
         for count, request, write_list in self._data:
             assert write_list is None or len(write_list) <= count
             assert request == self._block_request
-            write_pos = 0
             if not request & READ:
-                for _ in range(count):
-                    buf[pos] = (write_list[write_pos] >> (8 * 0)) & 0xff
-                    pos += 1
-                    buf[pos] = (write_list[write_pos] >> (8 * 1)) & 0xff
-                    pos += 1
-                    buf[pos] = (write_list[write_pos] >> (8 * 2)) & 0xff
-                    pos += 1
-                    buf[pos] = (write_list[write_pos] >> (8 * 3)) & 0xff
-                    pos += 1
-                    write_pos += 1
-        return buf
+                struct.pack_into("<%dI" % count, buf, pos, *write_list[:count])
+                pos += 4 * count
 
     def _decode_transfer_block_data(self, data):
         """! @brief Take a byte array and extract the data from it
@@ -422,24 +431,34 @@ class _Command(object):
         if transfer_count != self._read_count + self._write_count:
             raise DAPAccessIntf.TransferError()
 
-        return data[4:4 + 4 * self._read_count]
+        return memoryview(data)[4:4 + 4 * self._read_count]
 
-    def encode_data(self):
+    def encode_data(self, buf=None):
         """! @brief Encode this command into a byte array that can be sent
 
         The actual command this is encoded into depends on the data
         that was added.
+
+        @param self
+        @param buf Optional preallocated bytearray of at least the command's packet size to
+            encode into. It is returned as the encoded command. If not provided, a new bytearray
+            is allocated. Bytes following the encoded command are not modified.
         """
         assert self.get_empty() is False
+        if buf is None:
+            buf = bytearray(self._size)
+        assert len(buf) >= self._size
         self._data_encoded = True
         if self._block_allowed:
-            data = self._encode_transfer_block_data()
+            self._encode_transfer_block_data(buf)
         else:
-            data = self._encode_transfer_data()
-        return data
+            self._encode_transfer_data(buf)
+        return buf
 
     def decode_data(self, data):
         """! @brief Decode the response data
+
+        The returned transfer data is a memoryview of _data_, not a copy.
         """
         assert self.get_empty() is False
         assert self._data_encoded is True
@@ -551,7 +570,13 @@ class DAPAccessCMSISDAP(DAPAccessIntf):
         self._packet_size = None
         self._commands_to_read = None
         self._command_response_buf = None
+        self._packet_buf = None
         self._swo_status = None
+        self._is_pipelined = False
+        self._pipeline_cond = None
+        self._pipeline_error = None
+        self._pipeline_stop = False
+        self._reader_thread = None
 
     @property
     def vendor_name(self):
@@ -578,6 +603,9 @@ class DAPAccessCMSISDAP(DAPAccessIntf):
             LOG.debug("Limiting packet count to %d", self._packet_count)
         else:
             self._packet_count = self._protocol.dap_info(self.ID.MAX_PACKET_COUNT)
+            if DAPSettings.max_packet_count > 0:
+                self._packet_count = min(self._packet_count, DAPSettings.max_packet_count)
+                LOG.debug("Limiting packet count to %d", self._packet_count)
 
         # Log probe's firmware version.
         fw_version = self._protocol.dap_info(self.ID.FW_VER)
@@ -597,10 +625,17 @@ class DAPAccessCMSISDAP(DAPAccessIntf):
 
         self._init_deferred_buffers()
 
+        if DAPSettings.pipeline_transfers:
+            self._start_pipeline()
+
     def close(self):
         assert self._interface is not None
-        self.flush()
-        self._interface.close()
+        try:
+            self.flush()
+        finally:
+            if self._is_pipelined:
+                self._stop_pipeline()
+            self._interface.close()
 
     def get_unique_id(self):
         return self._unique_id
@@ -652,6 +687,11 @@ class DAPAccessCMSISDAP(DAPAccessIntf):
         reads can be made using READ_START and finished later with READ_NOW.
         This allows the reads to be buffered and sent at once.  Note - All
         READ_ENDs must be called before a call using READ_NOW can be made.
+
+        With pipelined transfers, non-deferred transfers are also sent
+        immediately, but writes do not wait for the response. An error from
+        a write is raised by the next read, flush(), or packet sent once the
+        reader thread has processed the response.
         """
         if self._deferred_transfer and not enable:
             self.flush()
@@ -660,9 +700,16 @@ class DAPAccessCMSISDAP(DAPAccessIntf):
     def flush(self):
         # Send current packet
         self._send_packet()
-        # Read all backlogged
-        for _ in range(len(self._commands_to_read)):
-            self._read_packet()
+        if self._is_pipelined:
+            # Wait for the reader thread to finish all backlogged packets.
+            with self._pipeline_cond:
+                while len(self._commands_to_read) and (self._pipeline_error is None):
+                    self._pipeline_cond.wait()
+                self._raise_pipeline_error()
+        else:
+            # Read all backlogged
+            for _ in range(len(self._commands_to_read)):
+                self._read_packet()
 
     def identify(self, item):
         assert isinstance(item, DAPAccessIntf.ID)
@@ -802,16 +849,11 @@ class DAPAccessCMSISDAP(DAPAccessIntf):
         transfer = self._write(dap_index, 1, request, None)
         assert transfer is not None
 
-        def read_reg_cb():
-            res = transfer.get_result()
-            assert len(res) == 1
-            res = res[0]
-            return res
-
+        future = _TransferFuture(transfer, single=True)
         if now:
-            return read_reg_cb()
+            return future.result()
         else:
-            return read_reg_cb
+            return future
 
     def reg_write_repeat(self, num_repeats, reg_id, data_array, dap_index=0):
         assert isinstance(num_repeats, six.integer_types)
@@ -843,15 +885,11 @@ class DAPAccessCMSISDAP(DAPAccessIntf):
         transfer = self._write(dap_index, num_repeats, request, None)
         assert transfer is not None
 
-        def reg_read_repeat_cb():
-            res = transfer.get_result()
-            assert len(res) == num_repeats
-            return res
-
+        future = _TransferFuture(transfer)
         if now:
-            return reg_read_repeat_cb()
+            return future.result()
         else:
-            return reg_read_repeat_cb
+            return future
     # ------------------------------------------- #
     #          Private functions
     # ------------------------------------------- #
@@ -874,6 +912,8 @@ class DAPAccessCMSISDAP(DAPAccessIntf):
         # Buffer for data returned for completed commands.
         # This data will be added to transfers
         self._command_response_buf = bytearray()
+        # Reusable buffer that commands are encoded into before being sent.
+        self._packet_buf = bytearray(self._packet_size)
 
     def _read_packet(self):
         """! @brief Reads and decodes a single packet
@@ -892,13 +932,25 @@ class DAPAccessCMSISDAP(DAPAccessIntf):
             self._abort_all_transfers(exception)
             raise
 
-        decoded_data = bytearray(decoded_data)
-        self._command_response_buf.extend(decoded_data)
+        self._add_response_data(decoded_data)
+
+    def _add_response_data(self, decoded_data):
+        """! @brief Attach decoded response data to the pending transfers it belongs to.
+
+        Transfers unpack their words directly from the response. Only data for a transfer that
+        continues into a following packet is copied, into _command_response_buf.
+        """
+        buf = self._command_response_buf
+        if len(buf):
+            buf += decoded_data
+            data = buf
+        else:
+            data = decoded_data
 
         # Attach data to transfers
         pos = 0
         while True:
-            size_left = len(self._command_response_buf) - pos
+            size_left = len(data) - pos
             if size_left == 0:
                 # If size left is 0 then the transfer list might
                 # be empty, so don't try to access element 0
@@ -909,13 +961,14 @@ class DAPAccessCMSISDAP(DAPAccessIntf):
                 break
 
             self._transfer_list.popleft()
-            data = self._command_response_buf[pos:pos + size]
+            transfer.add_response(data, pos)
             pos += size
-            transfer.add_response(data)
 
-        # Remove used data from _command_response_buf
-        if pos > 0:
-            self._command_response_buf = self._command_response_buf[pos:]
+        # Remove used data from _command_response_buf, or save the partial transfer data.
+        if data is buf:
+            del buf[:pos]
+        else:
+            buf += data[pos:]
 
     def _send_packet(self):
         """! @brief Send a single packet to the interface
@@ -929,18 +982,163 @@ class DAPAccessCMSISDAP(DAPAccessIntf):
         if cmd.get_empty():
             return
 
+        if self._is_pipelined:
+            self._send_packet_pipelined(cmd)
+            return
+
         max_packets = self._interface.get_packet_count()
         if len(self._commands_to_read) >= max_packets:
             self._read_packet()
-        data = cmd.encode_data()
+        data = cmd.encode_data(self._packet_buf)
         try:
-            self._interface.write(list(data))
+            self._interface.write(data)
         except Exception as exception:
             self._abort_all_transfers(exception)
             raise
         self._commands_to_read.append(cmd)
         self._crnt_cmd = _Command(self._packet_size)
 
+    def _start_pipeline(self):
+        """! @brief Start the response reader thread and switch to pipelined transfers.
+
+        In pipelined mode, responses are read and decoded by a dedicated thread. The thread that
+        issues transfers only blocks when the probe's packet count limit has been reached, so it can
+        continue encoding and sending packets while earlier packets are still being processed.
+        """
+        self._pipeline_cond = threading.Condition()
+        self._pipeline_error = None
+        self._pipeline_stop = False
+        thread_name = "CMSIS-DAP transfer reader (%s)" % self._unique_id
+        self._reader_thread = threading.Thread(target=self._pipeline_reader_task, name=thread_name)
+        self._reader_thread.daemon = True
+        self._is_pipelined = True
+        self._reader_thread.start()
+
+    def _stop_pipeline(self):
+        """! @brief Stop the response reader thread."""
+        with self._pipeline_cond:
+            self._pipeline_stop = True
+            self._pipeline_cond.notify_all()
+        self._reader_thread.join()
+        self._reader_thread = None
+        self._is_pipelined = False
+
+    def _pipeline_reader_task(self):
+        """! @brief Body of the response reader thread.
+
+        Responses are read in the same order that commands were sent. A command stays at the head
+        of _commands_to_read until its response has been processed, so the length of the deque is
+        always the number of packets in flight.
+        """
+        cond = self._pipeline_cond
+        while True:
+            with cond:
+                while (len(self._commands_to_read) == 0) and not self._pipeline_stop:
+                    cond.wait()
+                if len(self._commands_to_read) == 0:
+                    return
+                cmd = self._commands_to_read[0]
+
+            try:
+                raw_data = self._interface.read()
+                decoded_data = cmd.decode_data(bytearray(raw_data))
+            except Exception as exception:
+                with cond:
+                    self._abort_pipelined_transfers(exception)
+                    cond.notify_all()
+                continue
+
+            with cond:
+                self._commands_to_read.popleft()
+                self._add_response_data(decoded_data)
+                cond.notify_all()
+
+    def _abort_pipelined_transfers(self, exception):
+        """! @brief Fail all pending transfers after an error in the reader thread.
+
+        Must be called with the pipeline lock held. The exception is saved so it can be raised
+        from the thread issuing transfers the next time it sends a packet or flushes.
+        """
+        TRACE.debug("pipelined transfer error: %r", exception)
+        pending_reads = len(self._commands_to_read) - 1
+        for transfer in self._transfer_list:
+            transfer.add_error(exception)
+        self._transfer_list.clear()
+        self._commands_to_read.clear()
+        self._command_response_buf = bytearray()
+        self._pipeline_error = exception
+        # Finish pending reads and ignore the data, but only for transfer errors. Otherwise
+        # this could cause another exception.
+        if isinstance(exception, DAPAccessIntf.TransferError):
+            for _ in range(pending_reads):
+                self._interface.read()
+
+    def _raise_pipeline_error(self):
+        """! @brief Raise an error saved by the reader thread, if there is one.
+
+        Must be called with the pipeline lock held. Transfers queued after the error occurred are
+        failed as well and the deferred buffers are reset, just as for a non-pipelined error.
+        """
+        exception = self._pipeline_error
+        if exception is None:
+            return
+        self._pipeline_error = None
+        for transfer in self._transfer_list:
+            transfer.add_error(exception)
+        self._init_deferred_buffers()
+        raise exception
+
+    def _send_packet_pipelined(self, cmd):
+        """! @brief Send a packet without waiting for responses to earlier packets.
+
+        Only blocks if the maximum number of packets is already in flight, until the reader
+        thread has processed a response.
+        """
+        max_packets = self._interface.get_packet_count()
+        data = cmd.encode_data(self._packet_buf)
+        with self._pipeline_cond:
+            while (len(self._commands_to_read) >= max_packets) and (self._pipeline_error is None):
+                self._pipeline_cond.wait()
+            self._raise_pipeline_error()
+
+        # Only this thread adds commands, so the slot we waited for remains available while the
+        # packet is written outside of the lock.
+        try:
+            self._interface.write(data)
+        except Exception as exception:
+            # Let the reader finish with the packets that were successfully sent.
+            with self._pipeline_cond:
+                while len(self._commands_to_read):
+                    self._pipeline_cond.wait()
+                self._pipeline_error = None
+                self._abort_all_transfers(exception)
+            raise
+
+        with self._pipeline_cond:
+            # If an earlier packet failed while this one was being written, the transfers in this
+            # packet have already been failed. Discard the response and report the error.
+            if self._pipeline_error is not None:
+                if isinstance(self._pipeline_error, DAPAccessIntf.TransferError):
+                    self._interface.read()
+                self._raise_pipeline_error()
+            self._commands_to_read.append(cmd)
+            self._crnt_cmd = _Command(self._packet_size)
+            self._pipeline_cond.notify_all()
+
+    def _wait_for_transfer(self, transfer):
+        """! @brief Block until a transfer completes in pipelined mode."""
+        # Send the packet holding the end of the transfer if it is still being built.
+        if transfer.last_command is self._crnt_cmd:
+            self._send_packet()
+        with self._pipeline_cond:
+            while not transfer.is_done():
+                self._raise_pipeline_error()
+                self._pipeline_cond.wait()
+            # The saved error is raised here on behalf of the transfer, which clears it so that it
+            # isn't reported a second time by a later flush.
+            if (transfer._error is not None) and (transfer._error is self._pipeline_error):
+                self._raise_pipeline_error()
+
     def _write(self, dap_index, transfer_count,
                transfer_request, transfer_data):
         """! @brief Write one or more commands
@@ -955,7 +1153,11 @@ class DAPAccessCMSISDAP(DAPAccessIntf):
         if transfer_request & READ:
             transfer = _Transfer(self, dap_index, transfer_count,
                                  transfer_request, transfer_data)
-            self._transfer_list.append(transfer)
+            if self._is_pipelined:
+                with self._pipeline_cond:
+                    self._transfer_list.append(transfer)
+            else:
+                self._transfer_list.append(transfer)
 
         # Build physical packet by adding it to command
         cmd = self._crnt_cmd
@@ -979,6 +1181,8 @@ class DAPAccessCMSISDAP(DAPAccessIntf):
             else:
                 data = transfer_data[trans_data_pos:trans_data_pos + size]
             cmd.add(size, transfer_request, data, dap_index)
+            if transfer is not None:
+                transfer.last_command = cmd
             size_to_transfer -= size
             trans_data_pos += size
 
@@ -989,7 +1193,12 @@ class DAPAccessCMSISDAP(DAPAccessIntf):
                 cmd = self._crnt_cmd
 
         if not self._deferred_transfer:
-            self.flush()
+            if self._is_pipelined:
+                # Send the packet right away, but leave it in flight. Only reads wait for their
+                # response, when the result is requested.
+                self._send_packet()
+            else:
+                self.flush()
 
         return transfer
 
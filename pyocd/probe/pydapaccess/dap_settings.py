@@ -17,3 +17,9 @@
 class DAPSettings():
 	
 	limit_packets = False
+
+	# Maximum number of packets in flight, or 0 to use the probe's reported packet count.
+	max_packet_count = 0
+
+	# Use a dedicated thread to read transfer responses while new packets are sent.
+	pipeline_transfers = False
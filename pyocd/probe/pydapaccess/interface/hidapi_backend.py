@@ -100,10 +100,12 @@ class HidApiUSB(Interface):
     def write(self, data):
         """! @brief Write data on the OUT endpoint associated to the HID interface
         """
-        for _ in range(self.packet_size - len(data)):
-            data.append(0)
+        # The report must be a list of ints prefixed with the report ID. Build a new list so
+        # the caller's buffer, which may be bytes or a bytearray, is not modified.
+        report = [0] + list(data)
+        report.extend([0] * (self.packet_size - len(data)))
         #logging.debug("send: %s", data)
-        self.device.write([0] + data)
+        self.device.write(report)
         return
 
 
@@ -176,8 +176,12 @@ class PyUSB(Interface):
         if self.ep_out:
             report_size = self.ep_out.wMaxPacketSize
 
-        for _ in range(report_size - len(data)):
-            data.append(0)
+        # Pad to the report size without modifying the caller's buffer. Any bytes-like object
+        # or list of ints is passed through to pyusb as is.
+        pad_size = report_size - len(data)
+        if pad_size > 0:
+            data = bytearray(data)
+            data.extend(bytearray(pad_size))
 
         self.read_sem.release()
 
@@ -15,7 +15,8 @@
 # limitations under the License.
 
 from .provider import (TargetThread, ThreadProvider)
-from .common import (read_c_string, HandlerModeThread, EXC_RETURN_EXT_FRAME_MASK)
+from .common import (HandlerModeThread, TargetSnapshot, StackFrameCache, decode_stacked_registers,
+    EXC_RETURN_EXT_FRAME_MASK)
 from ..core import exceptions
 from ..core.target import Target
 from ..debug.context import DebugContext
@@ -23,6 +24,7 @@ from ..coresight.cortex_m import (CORE_REGISTER, register_name_to_index)
 from ..trace import events
 from ..trace.sink import TraceEventFilter
 import logging
+import struct
 
 KERNEL_FLAGS_OFFSET = 0x1c
 IS_RUNNING_MASK = 0x1
@@ -37,35 +39,15 @@ THREAD_PRIORITY_OFFSET = 16
 THREAD_STATE_OFFSET = 17
 THREAD_CREATED_NODE_OFFSET = 36
 
+## Bytes of the thread struct read as one block, covering the fields up to the state.
+THREAD_BLOCK_SIZE = 20
+
 LIST_NODE_NEXT_OFFSET = 0
 LIST_NODE_OBJ_OFFSET= 8
 
 # Create a logger for this module.
 LOG = logging.getLogger(__name__)
 
-class TargetList(object):
-    def __init__(self, context, ptr):
-        self._context = context
-        self._list = ptr
-
-    def __iter__(self):
-        next = 0
-        head = self._context.read32(self._list)
-        node = head
-        is_valid = head != 0
-
-        while is_valid and next != head:
-            try:
-                # Read the object from the node.
-                obj = self._context.read32(node + LIST_NODE_OBJ_OFFSET)
-                yield obj
-
-                next = self._context.read32(node + LIST_NODE_NEXT_OFFSET)
-                node = next
-            except exceptions.TransferError:
-                LOG.warning("TransferError while reading list elements (list=0x%08x, node=0x%08x), terminating list", self._list, node)
-                is_valid = False
-
 class ArgonThreadContext(DebugContext):
     """! @brief Thread context for Argon."""
     
@@ -151,10 +133,10 @@ class ArgonThreadContext(DebugContext):
         super(ArgonThreadContext, self).__init__(parent)
         self._thread = thread
         self._has_fpu = self.core.has_fpu
+        self._frame_cache = StackFrameCache(self._parent)
 
     def read_core_registers_raw(self, reg_list):
         reg_list = [register_name_to_index(reg) for reg in reg_list]
-        reg_vals = []
 
         isCurrent = self._thread.is_current
         inException = isCurrent and self._parent.read_core_register('ipsr') > 0
@@ -195,33 +177,11 @@ class ArgonThreadContext(DebugContext):
                 hwStacked = 0x68
                 swStacked = 0x60
 
-        for reg in reg_list:
-            # Must handle stack pointer specially.
-            if reg == 13:
-                if inException:
-                    reg_vals.append(sp + hwStacked)
-                else:
-                    reg_vals.append(sp + swStacked + hwStacked)
-                continue
-
-            # Look up offset for this register on the stack.
-            spOffset = table.get(reg, None)
-            if spOffset is None:
-                reg_vals.append(self._parent.read_core_register_raw(reg))
-                continue
-            if inException:
-                spOffset -= swStacked
-
-            try:
-                if spOffset >= 0:
-                    reg_vals.append(self._parent.read32(sp + spOffset))
-                else:
-                    # Not available - try live one
-                    reg_vals.append(self._parent.read_core_register_raw(reg))
-            except exceptions.TransferError:
-                reg_vals.append(0)
-
-        return reg_vals
+        # Read the whole frame with one transfer.
+        frameSize = hwStacked if inException else (swStacked + hwStacked)
+        frame = self._frame_cache.read(sp, frameSize)
+        return decode_stacked_registers(self._parent, reg_list, sp, frame, table, swStacked,
+                hwStacked, inException)
 
 class ArgonThread(TargetThread):
     """! @brief Base class representing a thread on the target."""
@@ -258,25 +218,29 @@ class ArgonThread(TargetThread):
         try:
             self.update_info()
 
-            ptr = self._target_context.read32(self._base + THREAD_NAME_OFFSET)
-            self._name = read_c_string(self._target_context, ptr)
+            ptr, = struct.unpack_from("<I", self._read_block(), THREAD_NAME_OFFSET)
+            self._name = self._provider.snapshot.read_c_string(ptr)
             LOG.debug("Thread@%x name=%x '%s'", self._base, ptr, self._name)
         except exceptions.TransferError:
             LOG.debug("Transfer error while reading thread info")
 
+    def _read_block(self):
+        return self._provider.snapshot.read_block(self._base, THREAD_BLOCK_SIZE)
+
     def get_stack_pointer(self):
         # Get stack pointer saved in thread struct.
         try:
-            return self._target_context.read32(self._base + THREAD_STACK_POINTER_OFFSET)
+            return struct.unpack_from("<I", self._read_block(), THREAD_STACK_POINTER_OFFSET)[0]
         except exceptions.TransferError:
             LOG.debug("Transfer error while reading thread's stack pointer @ 0x%08x", self._base + THREAD_STACK_POINTER_OFFSET)
             return 0
 
     def update_info(self):
         try:
-            self._priority = self._target_context.read8(self._base + THREAD_PRIORITY_OFFSET)
+            block = self._read_block()
+            self._priority = block[THREAD_PRIORITY_OFFSET]
 
-            self._state = self._target_context.read8(self._base + THREAD_STATE_OFFSET)
+            self._state = block[THREAD_STATE_OFFSET]
             if self._state > self.DONE:
                 self._state = self.UNKNOWN
         except exceptions.TransferError:
@@ -315,7 +279,7 @@ class ArgonThread(TargetThread):
         if not self._has_fpu:
             return False
         try:
-            flag = self._target_context.read8(self._base + THREAD_EXTENDED_FRAME_OFFSET)
+            flag = self._read_block()[THREAD_EXTENDED_FRAME_OFFSET]
             return flag != 0
         except exceptions.TransferError:
             LOG.debug("Transfer error while reading thread's extended frame flag @ 0x%08x", self._base + THREAD_EXTENDED_FRAME_OFFSET)
@@ -336,6 +300,12 @@ class ArgonThreadProvider(ThreadProvider):
         self.g_ar_objects = None
         self._all_threads = None
         self._threads = {}
+        self._snapshot = TargetSnapshot(self._target_context, self._target)
+
+    @property
+    def snapshot(self):
+        """! @brief TargetSnapshot used to read the kernel data structures."""
+        return self._snapshot
 
     def init(self, symbolProvider):
         self.g_ar = symbolProvider.get_symbol_value("g_ar")
@@ -356,7 +326,8 @@ class ArgonThreadProvider(ThreadProvider):
         return True
 
     def invalidate(self):
-        self._threads = {}
+        super(ArgonThreadProvider, self).invalidate()
+        self._snapshot.invalidate()
 
     def event_handler(self, notification):
         # Invalidate threads list if flash is reprogrammed.
@@ -364,18 +335,24 @@ class ArgonThreadProvider(ThreadProvider):
         self.invalidate();
 
     def _build_thread_list(self):
-        allThreads = TargetList(self._target_context, self._all_threads)
         newThreads = {}
-        for threadBase in allThreads:
+
+        # Walk the circular list of all threads, then read the structs and names of all threads.
+        head = self._snapshot.read32(self._all_threads)
+        allThreads = self._snapshot.walk_lists([head], LIST_NODE_NEXT_OFFSET, LIST_NODE_OBJ_OFFSET)[0]
+        blocks = self._snapshot.read_blocks(allThreads, THREAD_BLOCK_SIZE)
+
+        # Names are only read for new threads.
+        self._snapshot.read_c_strings([struct.unpack_from("<I", block, THREAD_NAME_OFFSET)[0]
+                for threadBase, block in zip(allThreads, blocks)
+                if (block is not None) and (self._find_thread(threadBase) is None)])
+
+        for threadBase, block in zip(allThreads, blocks):
             try:
-                # Reuse existing thread objects if possible.
-                if threadBase in self._threads:
-                    t = self._threads[threadBase]
-
-                    # Ask the thread object to update its state and priority.
-                    t.update_info()
-                else:
-                    t = ArgonThread(self._target_context, self, threadBase)
+                # Reuse existing thread objects if possible, updating the state and priority
+                # only if the thread struct changed.
+                t = self._get_thread_for_block(threadBase, block,
+                        lambda: ArgonThread(self._target_context, self, threadBase))
                 LOG.debug("Thread 0x%08x (%s)", threadBase, t.name)
                 newThreads[t.unique_id] = t
             except exceptions.TransferError:
@@ -387,7 +364,7 @@ class ArgonThreadProvider(ThreadProvider):
             t = HandlerModeThread(self._target_context, self)
             newThreads[t.unique_id] = t
 
-        self._threads = newThreads
+        self._set_threads(newThreads)
 
     def get_threads(self):
         if not self.is_enabled:
@@ -19,6 +19,7 @@ from ..debug.context import DebugContext
 from ..coresight.cortex_m import (CORE_REGISTER, register_name_to_index)
 from ..core import exceptions
 import logging
+import six
 
 LOG = logging.getLogger(__name__)
 
@@ -26,40 +27,357 @@ LOG = logging.getLogger(__name__)
 # on the frame. The bit is 0 if the frame is extended.
 EXC_RETURN_EXT_FRAME_MASK = (1 << 4)
 
-def read_c_string(context, ptr):
-    """! @brief Reads a null-terminated C string from the target."""
+## Maximum length of a C string read from the target.
+MAX_STRING_LENGTH = 256
+
+## Block size for string reads. String reads never cross a boundary of this size, so they cannot
+# cross a memory region boundary.
+STRING_CHUNK_SIZE = 32
+
+## Maximum number of nodes followed in one linked list, to protect against corrupted lists.
+MAX_LIST_LENGTH = 1024
+
+class CStringDecoder(object):
+    """! @brief Decodes a C string from chunks of bytes read from the target."""
+
+    def __init__(self):
+        self.value = ""
+        self.done = False
+        self.count = 0
+        self._bad_count = 0
+
+    def feed(self, data):
+        """! @brief Decode a chunk of bytes.
+        @return Boolean of whether the end of the string was found.
+        """
+        self.count += len(data)
+        for c in bytearray(data):
+            if c == 0:
+                self.done = True
+                break
+            elif c > 127:
+                # Replace non-ASCII characters. If there is a run of invalid characters longer
+                # than 4, then terminate the string early.
+                self._bad_count += 1
+                if self._bad_count > 4:
+                    self.done = True
+                    break
+                self.value += '?'
+            else:
+                self.value += chr(c)
+                self._bad_count = 0
+        if self.count >= MAX_STRING_LENGTH:
+            self.done = True
+        return self.done
+
+def read_c_string(context, ptr, decoder=None):
+    """! @brief Reads a null-terminated C string from the target.
+    @param context Context used to read memory.
+    @param ptr Address of the string.
+    @param decoder Optional CStringDecoder holding a partially decoded string that continues at
+        @a ptr.
+    """
     if ptr == 0:
         return ""
 
-    s = ""
-    done = False
-    count = 0
-    badCount = 0
+    if decoder is None:
+        decoder = CStringDecoder()
     try:
-        while not done and count < 256:
+        while not decoder.done:
             data = context.read_memory_block8(ptr, 16)
             ptr += 16
-            count += 16
-
-            for c in data:
-                if c == 0:
-                    done = True
-                    break
-                elif c > 127:
-                    # Replace non-ASCII characters. If there is a run of invalid characters longer
-                    # than 4, then terminate the string early.
-                    badCount += 1
-                    if badCount > 4:
-                        done = True
-                        break
-                    s += '?'
-                else:
-                    s += chr(c)
-                    badCount = 0
+            decoder.feed(data)
     except exceptions.TransferError:
         LOG.debug("TransferError while trying to read 16 bytes at 0x%08x", ptr)
 
-    return s
+    return decoder.value
+
+class TargetSnapshot(object):
+    """! @brief Batched and cached reads of RTOS data structures.
+
+    Thread providers use a snapshot to read the kernel data structures they walk. Reads of
+    independent words, such as the next pointers of the current node of every list being walked,
+    are issued together as deferred transfers and resolved at once, so the probe can pipeline
+    them. Thread control blocks are read whole, as one block each, and decoded by the thread
+    objects from the cached bytes.
+
+    All data is cached until the run token of the target changes or invalidate() is called. A
+    snapshot must only be used while the target is halted.
+    """
+
+    def __init__(self, context, target):
+        """! @brief Constructor.
+        @param self
+        @param context Context used to read memory.
+        @param target Target or core providing the run token.
+        """
+        self._context = context
+        self._target = target
+        self._run_token = None
+        self._words = {}
+        self._blocks = {}
+        self._strings = {}
+
+    def invalidate(self):
+        """! @brief Discard all cached data."""
+        self._words = {}
+        self._blocks = {}
+        self._strings = {}
+
+    def _check_run_token(self):
+        token = self._target.run_token
+        if token != self._run_token:
+            self.invalidate()
+            self._run_token = token
+
+    def read32_list(self, addrs):
+        """! @brief Read a list of words.
+
+        Words that are not cached are read with deferred transfers that are resolved together. If
+        any transfer fails, the words are read again one at a time.
+
+        @return List of values in the same order as @a addrs. The value is None for words that
+            could not be read.
+        """
+        self._check_run_token()
+        missing = []
+        for addr in addrs:
+            if addr not in self._words:
+                self._words[addr] = None
+                missing.append(addr)
+
+        if missing:
+            try:
+                results = [self._context.read32(addr, now=False) for addr in missing]
+                values = [result() for result in results]
+            except exceptions.TransferError:
+                values = []
+                for addr in missing:
+                    try:
+                        values.append(self._context.read32(addr))
+                    except exceptions.TransferError:
+                        LOG.debug("TransferError while reading word at 0x%08x", addr)
+                        values.append(None)
+            self._words.update(zip(missing, values))
+
+        return [self._words[addr] for addr in addrs]
+
+    def read32(self, addr):
+        """! @brief Read a single word.
+        @exception TransferError The word could not be read.
+        """
+        value = self.read32_list([addr])[0]
+        if value is None:
+            raise exceptions.TransferError("failed to read word at 0x%08x" % addr)
+        return value
+
+    def read_blocks(self, addrs, size):
+        """! @brief Read a block of bytes at each of several addresses.
+
+        Typically used to read the control blocks of all threads found by a list walk.
+
+        @return List of bytearrays in the same order as @a addrs. The item is None for blocks that
+            could not be read.
+        """
+        self._check_run_token()
+        results = []
+        for addr in addrs:
+            data = self._blocks.get(addr)
+            if (data is None) or (len(data) < size):
+                try:
+                    data = bytearray(self._context.read_memory_bytes(addr, size))
+                except exceptions.Error as err:
+                    LOG.debug("Error while reading %d bytes at 0x%08x: %s", size, addr, err)
+                    results.append(None)
+                    continue
+                self._blocks[addr] = data
+            results.append(data[:size])
+        return results
+
+    def read_block(self, addr, size):
+        """! @brief Read a block of bytes.
+        @exception TransferError The block could not be read.
+        """
+        data = self.read_blocks([addr], size)[0]
+        if data is None:
+            raise exceptions.TransferError("failed to read %d bytes at 0x%08x" % (size, addr))
+        return data
+
+    def read_c_strings(self, ptrs):
+        """! @brief Read several null-terminated C strings.
+
+        The first chunk of each string, up to the next STRING_CHUNK_SIZE boundary, is read first.
+        Only strings that do not end within that chunk are read further.
+
+        @return List of strings in the same order as @a ptrs. A null pointer results in an empty
+            string.
+        """
+        self._check_run_token()
+        pending = [ptr for ptr in ptrs if ptr and (ptr not in self._strings)]
+        for ptr in pending:
+            chunk_size = STRING_CHUNK_SIZE - (ptr % STRING_CHUNK_SIZE)
+            data = self.read_blocks([ptr], chunk_size)[0]
+            decoder = CStringDecoder()
+            if data is not None:
+                decoder.feed(data)
+            if not decoder.done:
+                read_c_string(self._context, ptr + decoder.count, decoder)
+            self._strings[ptr] = decoder.value
+        return [self._strings[ptr] if ptr else "" for ptr in ptrs]
+
+    def read_c_string(self, ptr):
+        """! @brief Read a null-terminated C string."""
+        return self.read_c_strings([ptr])[0]
+
+    def walk_lists(self, heads, next_offset, object_offset=None, counts=None):
+        """! @brief Walk several linked lists together.
+
+        The nodes at the same depth of all lists are read with one batch of deferred reads. A
+        list ends at a null pointer, at a node that was already visited, which covers circular
+        lists, or when its count is reached.
+
+        @param self
+        @param heads Sequence of the first node of each list. 0 is an empty list.
+        @param next_offset Offset of the next node pointer within a node, or a sequence with the
+            offset for each list.
+        @param object_offset Offset of the object pointer within a node, or None if the nodes are
+            themselves the objects.
+        @param counts Optional sequence of the maximum number of objects in each list.
+        @return List with a list of object pointers for each list.
+        """
+        if isinstance(next_offset, six.integer_types):
+            next_offset = [next_offset] * len(heads)
+        objects = [[] for _ in heads]
+        visited = [set() for _ in heads]
+        active = [(i, node) for i, node in enumerate(heads) if node != 0]
+        if counts is not None:
+            active = [(i, node) for i, node in active if counts[i] > 0]
+
+        while active:
+            addrs = []
+            for i, node in active:
+                addrs.append(node + next_offset[i])
+                if object_offset is not None:
+                    addrs.append(node + object_offset)
+            values = self.read32_list(addrs)
+            stride = 1 if (object_offset is None) else 2
+
+            next_active = []
+            for n, (i, node) in enumerate(active):
+                visited[i].add(node)
+                next_node = values[n * stride]
+                obj = node if (object_offset is None) else values[n * stride + 1]
+                if obj is None:
+                    LOG.warning("TransferError while reading list elements (list=%d, node=0x%08x), "
+                            "terminating list", i, node)
+                    continue
+                objects[i].append(obj)
+                if next_node is None:
+                    LOG.warning("TransferError while reading list elements (list=%d, node=0x%08x), "
+                            "terminating list", i, node)
+                    continue
+                if (next_node == 0) or (next_node in visited[i]) \
+                        or (len(objects[i]) >= MAX_LIST_LENGTH) \
+                        or ((counts is not None) and (len(objects[i]) >= counts[i])):
+                    continue
+                next_active.append((i, next_node))
+            active = next_active
+
+        return objects
+
+class StackFrameCache(object):
+    """! @brief Reads the register frames saved on a thread's stack.
+
+    Each frame is read with a single read_memory_block32() and cached until the run token of the
+    core changes. Thread contexts keep one cache each, so the frames of all threads are cached
+    independently.
+    """
+
+    def __init__(self, context):
+        """! @brief Constructor.
+        @param self
+        @param context Context used to read memory. Its core provides the run token.
+        """
+        self._context = context
+        self._run_token = None
+        self._frames = {}
+
+    def read(self, sp, size, min_size=None):
+        """! @brief Read a stack frame.
+
+        If reading @a size bytes fails, for instance because the frame would extend past the end
+        of the memory region holding the stack, then @a min_size bytes are read instead.
+
+        @param self
+        @param sp Address of the frame. Must be word aligned.
+        @param size Number of bytes to read.
+        @param min_size Optional smaller number of bytes to read if reading @a size bytes fails.
+        @return List of words, or None if the frame could not be read.
+        """
+        token = self._context.core.run_token
+        if token != self._run_token:
+            self._frames = {}
+            self._run_token = token
+
+        words = self._frames.get(sp)
+        if (words is not None) and (len(words) * 4 >= size):
+            return words[:size // 4]
+
+        for read_size in (size, min_size):
+            if (read_size is None) or (sp % 4):
+                continue
+            try:
+                words = self._context.read_memory_block32(sp, read_size // 4)
+            except exceptions.Error as err:
+                LOG.debug("Error while reading %d byte stack frame at 0x%08x: %s", read_size, sp, err)
+                continue
+            self._frames[sp] = words
+            return words
+        return None
+
+def decode_stacked_registers(context, reg_list, sp, frame, table, sw_stacked, hw_stacked, in_exception):
+    """! @brief Decode registers from a frame saved on a thread's stack.
+
+    The frame consists of the registers saved by the RTOS, @a sw_stacked bytes, followed by the
+    registers stacked by the hardware on exception entry, @a hw_stacked bytes. If the thread is
+    in an exception, only the hardware frame is on the stack, and registers from the software
+    frame are read from the core. Registers that are not in @a table are also read from the core,
+    with one call for all of them.
+
+    @param context Context used to read live registers.
+    @param reg_list List of register indices.
+    @param sp Address of the start of the frame.
+    @param frame List of words read from @a sp, as returned by StackFrameCache.read(), or None if
+        the frame could not be read.
+    @param table Dict mapping register index to offset in the frame, including the software frame.
+    @param sw_stacked Size in bytes of the software frame.
+    @param hw_stacked Size in bytes of the hardware frame.
+    @param in_exception Whether the thread is in an exception.
+    @return List of register values. Registers whose frame could not be read have value 0.
+    """
+    values = [0] * len(reg_list)
+    live = []
+    for i, reg in enumerate(reg_list):
+        # Must handle stack pointer specially.
+        if reg == 13:
+            values[i] = sp + hw_stacked + (0 if in_exception else sw_stacked)
+            continue
+
+        # Look up offset for this register on the stack.
+        offset = table.get(reg, None)
+        if (offset is not None) and in_exception:
+            offset -= sw_stacked
+        if (offset is None) or (offset < 0):
+            # Not available - use the live one.
+            live.append(i)
+        elif (frame is not None) and (offset // 4 < len(frame)):
+            values[i] = frame[offset // 4]
+
+    if live:
+        live_values = context.read_core_registers_raw([reg_list[i] for i in live])
+        for i, value in zip(live, live_values):
+            values[i] = value
+    return values
 
 class HandlerModeThread(TargetThread):
     """! @brief Class representing the handler mode."""
@@ -15,12 +15,14 @@
 # limitations under the License.
 
 from .provider import (TargetThread, ThreadProvider)
-from .common import (read_c_string, HandlerModeThread, EXC_RETURN_EXT_FRAME_MASK)
+from .common import (read_c_string, CStringDecoder, HandlerModeThread, TargetSnapshot,
+    StackFrameCache, decode_stacked_registers, EXC_RETURN_EXT_FRAME_MASK)
 from ..core import exceptions
 from ..core.target import Target
 from ..debug.context import DebugContext
 from ..coresight.cortex_m import (CORE_REGISTER, register_name_to_index)
 import logging
+import struct
 
 FREERTOS_MAX_PRIORITIES	= 63
 
@@ -33,36 +35,28 @@ THREAD_STACK_POINTER_OFFSET = 0
 THREAD_PRIORITY_OFFSET = 44
 THREAD_NAME_OFFSET = 52
 
+## Bytes of the TCB read as one block. This covers the name for the default
+# configMAX_TASK_NAME_LEN of 16; longer names are read separately.
+THREAD_BLOCK_SIZE = THREAD_NAME_OFFSET + 16
+
 # Create a logger for this module.
 LOG = logging.getLogger(__name__)
 
-class TargetList(object):
-    def __init__(self, context, ptr):
-        self._context = context
-        self._list = ptr
-
-    def __iter__(self):
-        prev = -1
-        found = 0
-        count = self._context.read32(self._list)
-        if count == 0:
-            return
-
-        node = self._context.read32(self._list + LIST_INDEX_OFFSET)
+def read_target_lists(snapshot, lists):
+    """! @brief Read the objects of several FreeRTOS lists.
 
-        while (node != 0) and (node != prev) and (found < count):
-            try:
-                # Read the object from the node.
-                obj = self._context.read32(node + LIST_NODE_OBJECT_OFFSET)
-                yield obj
-                found += 1
+    Each list is walked from its index node, following the previous pointers of the nodes, for at
+    most the number of items in the list. All lists are walked together with batched reads.
 
-                # Read next list node pointer.
-                prev = node
-                node = self._context.read32(node + LIST_NODE_NEXT_OFFSET)
-            except exceptions.TransferError:
-                LOG.warning("TransferError while reading list elements (list=0x%08x, node=0x%08x), terminating list", self._list, node)
-                node = 0
+    @return List with a list of object pointers for each list address in @a lists.
+    """
+    addrs = []
+    for listPtr in lists:
+        addrs += [listPtr, listPtr + LIST_INDEX_OFFSET]
+    values = snapshot.read32_list(addrs)
+    counts = [(values[i] or 0) for i in range(0, len(values), 2)]
+    heads = [(values[i] or 0) for i in range(1, len(values), 2)]
+    return snapshot.walk_lists(heads, LIST_NODE_NEXT_OFFSET, LIST_NODE_OBJECT_OFFSET, counts)
 
 class FreeRTOSThreadContext(DebugContext):
     """! @brief Thread context for FreeRTOS."""
@@ -98,7 +92,7 @@ class FreeRTOSThreadContext(DebugContext):
                  1: 40, # r1
                  2: 44, # r2
                  3: 48, # r3
-                 12: 42, # r12
+                 12: 52, # r12
                  14: 56, # lr
                  15: 60, # pc
                  16: 64, # xpsr
@@ -152,14 +146,17 @@ class FreeRTOSThreadContext(DebugContext):
             }
     FPU_EXTENDED_REGISTER_OFFSETS.update(COMMON_REGISTER_OFFSETS)
 
+    ## Size of the largest frame, with FPU registers stacked by both the RTOS and the hardware.
+    MAX_FRAME_SIZE = 0x64 + 0x68
+
     def __init__(self, parent, thread):
         super(FreeRTOSThreadContext, self).__init__(parent)
         self._thread = thread
         self._has_fpu = self.core.has_fpu
+        self._frame_cache = StackFrameCache(self._parent)
 
     def read_core_registers_raw(self, reg_list):
         reg_list = [register_name_to_index(reg) for reg in reg_list]
-        reg_vals = []
 
         isCurrent = self._thread.is_current
         inException = isCurrent and self._parent.read_core_register('ipsr') > 0
@@ -183,53 +180,31 @@ class FreeRTOSThreadContext(DebugContext):
         swStacked = 0x20
         table = self.NOFPU_REGISTER_OFFSETS
         if self._has_fpu:
-            try:
-                if inException and self.core.is_vector_catch():
-                    # Vector catch has just occurred, take live LR
-                    exceptionLR = self._parent.read_core_register('lr')
-                else:
-                    # Read stacked exception return LR.
-                    offset = self.FPU_BASIC_REGISTER_OFFSETS[-1]
-                    exceptionLR = self._parent.read32(sp + offset)
-
-                # Check bit 4 of the saved exception LR to determine if FPU registers were stacked.
-                if (exceptionLR & EXC_RETURN_EXT_FRAME_MASK) != 0:
-                    table = self.FPU_BASIC_REGISTER_OFFSETS
-                    swStacked = 0x24
-                else:
-                    table = self.FPU_EXTENDED_REGISTER_OFFSETS
-                    hwStacked = 0x68
-                    swStacked = 0x64
-            except exceptions.TransferError:
+            if inException and self.core.is_vector_catch():
+                # Vector catch has just occurred, take live LR
+                exceptionLR = self._parent.read_core_register('lr')
+            else:
+                # Read the frame, including the stacked exception return LR. The largest possible
+                # frame is read, so the whole frame is usually read with a single transfer.
+                offset = self.FPU_BASIC_REGISTER_OFFSETS[-1]
+                frame = self._frame_cache.read(sp, self.MAX_FRAME_SIZE, offset + 4)
+                exceptionLR = frame[offset // 4] if (frame is not None) else None
+
+            # Check bit 4 of the saved exception LR to determine if FPU registers were stacked.
+            if exceptionLR is None:
                 LOG.debug("Transfer error while reading thread's saved LR")
-
-        for reg in reg_list:
-            # Must handle stack pointer specially.
-            if reg == 13:
-                if inException:
-                    reg_vals.append(sp + hwStacked)
-                else:
-                    reg_vals.append(sp + swStacked + hwStacked)
-                continue
-
-            # Look up offset for this register on the stack.
-            spOffset = table.get(reg, None)
-            if spOffset is None:
-                reg_vals.append(self._parent.read_core_register_raw(reg))
-                continue
-            if inException:
-                spOffset -= swStacked
-
-            try:
-                if spOffset >= 0:
-                    reg_vals.append(self._parent.read32(sp + spOffset))
-                else:
-                    # Not available - try live one
-                    reg_vals.append(self._parent.read_core_register_raw(reg))
-            except exceptions.TransferError:
-                reg_vals.append(0)
-
-        return reg_vals
+            elif (exceptionLR & EXC_RETURN_EXT_FRAME_MASK) != 0:
+                table = self.FPU_BASIC_REGISTER_OFFSETS
+                swStacked = 0x24
+            else:
+                table = self.FPU_EXTENDED_REGISTER_OFFSETS
+                hwStacked = 0x68
+                swStacked = 0x64
+
+        frameSize = hwStacked if inException else (swStacked + hwStacked)
+        frame = self._frame_cache.read(sp, frameSize)
+        return decode_stacked_registers(self._parent, reg_list, sp, frame, table, swStacked,
+                hwStacked, inException)
 
 class FreeRTOSThread(TargetThread):
     """! @brief A FreeRTOS task."""
@@ -255,17 +230,24 @@ class FreeRTOSThread(TargetThread):
         self._base = base
         self._state = FreeRTOSThread.READY
         self._thread_context = FreeRTOSThreadContext(self._target_context, self)
+        self.update_info()
 
-        self._priority = self._target_context.read32(self._base + THREAD_PRIORITY_OFFSET)
+    def update_info(self):
+        block = self._provider.snapshot.read_block(self._base, THREAD_BLOCK_SIZE)
+        self._priority, = struct.unpack_from("<I", block, THREAD_PRIORITY_OFFSET)
 
-        self._name = read_c_string(self._target_context, self._base + THREAD_NAME_OFFSET)
+        decoder = CStringDecoder()
+        if not decoder.feed(block[THREAD_NAME_OFFSET:]):
+            read_c_string(self._target_context, self._base + THREAD_BLOCK_SIZE, decoder)
+        self._name = decoder.value
         if len(self._name) == 0:
             self._name = "Unnamed"
 
     def get_stack_pointer(self):
         # Get stack pointer saved in thread struct.
         try:
-            return self._target_context.read32(self._base + THREAD_STACK_POINTER_OFFSET)
+            block = self._provider.snapshot.read_block(self._base, THREAD_BLOCK_SIZE)
+            return struct.unpack_from("<I", block, THREAD_STACK_POINTER_OFFSET)[0]
         except exceptions.TransferError:
             LOG.debug("Transfer error while reading thread's stack pointer @ 0x%08x", self._base + THREAD_STACK_POINTER_OFFSET)
             return 0
@@ -328,6 +310,12 @@ class FreeRTOSThreadProvider(ThreadProvider):
         self._symbols = None
         self._total_priorities = 0
         self._threads = {}
+        self._snapshot = TargetSnapshot(self._target_context, self._target)
+
+    @property
+    def snapshot(self):
+        """! @brief TargetSnapshot used to read the kernel data structures."""
+        return self._snapshot
 
     def init(self, symbolProvider):
         # Lookup required symbols.
@@ -375,7 +363,8 @@ class FreeRTOSThreadProvider(ThreadProvider):
         return True
 
     def invalidate(self):
-        self._threads = {}
+        super(FreeRTOSThreadProvider, self).invalidate()
+        self._snapshot.invalidate()
 
     def event_handler(self, notification):
         # Invalidate threads list if flash is reprogrammed.
@@ -385,11 +374,14 @@ class FreeRTOSThreadProvider(ThreadProvider):
     def _build_thread_list(self):
         newThreads = {}
 
-        # Read the number of threads.
-        threadCount = self._target_context.read32(self._symbols['uxCurrentNumberOfTasks'])
-
-        # Read the current thread.
-        currentThread = self._target_context.read32(self._symbols['pxCurrentTCB'])
+        # Read the number of threads, the current thread, and the top ready priority.
+        threadCount, currentThread, topPriority = self._snapshot.read32_list([
+                self._symbols['uxCurrentNumberOfTasks'],
+                self._symbols['pxCurrentTCB'],
+                self._symbols['uxTopReadyPriority'],
+                ])
+        if None in (threadCount, currentThread, topPriority):
+            raise exceptions.TransferError("failed to read FreeRTOS kernel state")
 
         # We should only be building the thread list if the scheduler is running, so a zero thread
         # count or a null current thread means something is bizarrely wrong.
@@ -397,9 +389,6 @@ class FreeRTOSThreadProvider(ThreadProvider):
             LOG.warning("FreeRTOS: no threads even though the scheduler is running")
             return
 
-        # Read the top ready priority.
-        topPriority = self._target_context.read32(self._symbols['uxTopReadyPriority'])
-
         # Handle an uxTopReadyPriority value larger than the number of lists. This is most likely
         # caused by the configUSE_PORT_OPTIMISED_TASK_SELECTION option being enabled, which treats
         # uxTopReadyPriority as a bitmap instead of integer. This is ok because uxTopReadyPriority
@@ -420,18 +409,21 @@ class FreeRTOSThreadProvider(ThreadProvider):
         if 'xTasksWaitingTermination' in self._symbols:
             listsToRead.append((self._symbols['xTasksWaitingTermination'], FreeRTOSThread.DELETED))
 
-        for listPtr, state in listsToRead:
-            for threadBase in TargetList(self._target_context, listPtr):
+        # Walk all lists together, then read the TCBs of all threads found.
+        listObjects = read_target_lists(self._snapshot, [listPtr for listPtr, state in listsToRead])
+        allThreads = [threadBase for objects in listObjects for threadBase in objects]
+        blocks = dict(zip(allThreads, self._snapshot.read_blocks(allThreads, THREAD_BLOCK_SIZE)))
+
+        for (listPtr, state), objects in zip(listsToRead, listObjects):
+            for threadBase in objects:
                 try:
                     # Don't try adding more threads than the number of threads that FreeRTOS says there are.
                     if len(newThreads) >= threadCount:
                         break
 
-                    # Reuse existing thread objects.
-                    if threadBase in self._threads:
-                        t = self._threads[threadBase]
-                    else:
-                        t = FreeRTOSThread(self._target_context, self, threadBase)
+                    # Reuse existing thread objects, decoding the TCB again only if it changed.
+                    t = self._get_thread_for_block(threadBase, blocks[threadBase],
+                            lambda: FreeRTOSThread(self._target_context, self, threadBase))
 
                     # Set thread state.
                     if threadBase == currentThread:
@@ -453,7 +445,7 @@ class FreeRTOSThreadProvider(ThreadProvider):
             t = HandlerModeThread(self._target_context, self)
             newThreads[t.unique_id] = t
 
-        self._threads = newThreads
+        self._set_threads(newThreads)
 
     def get_threads(self):
         if not self.is_enabled:
@@ -14,14 +14,25 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import binascii
 import logging
 
+from ..core.target import Target
+
 LOG = logging.getLogger(__name__)
 
 class TargetThread(object):
-    """! @brief Base class representing a thread on the target."""
+    """! @brief Base class representing a thread on the target.
+
+    The fingerprint attribute is used by thread providers to detect whether the thread's control
+    block changed since the thread was last decoded.
+    """
 
     def __init__(self):
+        self.fingerprint = None
+
+    def update_info(self):
+        """! @brief Decode the thread's information again from the target."""
         pass
 
     @property
@@ -44,14 +55,43 @@ class TargetThread(object):
     def context(self):
         raise NotImplementedError()
 
+class ThreadListChanges(object):
+    """! @brief Data for the Target.EVENT_THREADS_CHANGED notification.
+
+    Each attribute is a set of thread unique IDs.
+    """
+
+    def __init__(self, added, removed, updated):
+        ## Threads that are new in the list.
+        self.added = added
+        ## Threads that are no longer in the list.
+        self.removed = removed
+        ## Threads whose name or description changed.
+        self.updated = updated
+
+    def __repr__(self):
+        return "<ThreadListChanges@0x%08x added=%s removed=%s updated=%s>" % (id(self),
+            sorted(self.added), sorted(self.removed), sorted(self.updated))
+
 class ThreadProvider(object):
-    """! @brief Base class for RTOS support plugins."""
+    """! @brief Base class for RTOS support plugins.
+
+    Thread lists are updated incrementally. Providers reuse the thread object for a control block
+    whose contents are unchanged since the last update, without decoding it again. When the
+    updated list differs from the previous one in its threads, or in the name or description of
+    any thread, the generation number is incremented and a Target.EVENT_THREADS_CHANGED
+    notification is sent through the session.
+    """
 
     def __init__(self, target):
         self._target = target
         self._target_context = self._target.get_target_context()
         self._last_run_token = -1
         self._read_from_target = False
+        self._threads = {}
+        self._reusable_threads = {}
+        self._thread_info = {}
+        self._generation = 0
 
     def _lookup_symbols(self, symbolList, symbolProvider):
         syms = {}
@@ -73,6 +113,65 @@ class ThreadProvider(object):
     def _build_thread_list(self):
         raise NotImplementedError()
 
+    def _find_thread(self, base):
+        """! @brief Return the existing thread object for a control block, or None."""
+        return self._threads.get(base, self._reusable_threads.get(base))
+
+    @staticmethod
+    def _fingerprint(block):
+        return (binascii.crc32(bytes(block)) & 0xffffffff) if (block is not None) else None
+
+    def _is_thread_block_changed(self, base, block):
+        """! @brief Whether a thread control block must be decoded.
+        @return True if there is no thread object for the control block, or if the block's
+            contents changed since the thread was last decoded.
+        """
+        thread = self._find_thread(base)
+        return (thread is None) or (block is None) or (self._fingerprint(block) != thread.fingerprint)
+
+    def _get_thread_for_block(self, base, block, factory):
+        """! @brief Get the thread object for a control block, decoding it only if it changed.
+        @param self
+        @param base Address of the thread control block, which is the thread's unique ID.
+        @param block Bytes read from the control block, or None if it could not be read.
+        @param factory Callable that creates a new thread object.
+        """
+        fingerprint = self._fingerprint(block)
+        thread = self._find_thread(base)
+        if thread is None:
+            thread = factory()
+        elif (fingerprint is None) or (fingerprint != thread.fingerprint):
+            thread.update_info()
+        thread.fingerprint = fingerprint
+        return thread
+
+    def _set_threads(self, threads):
+        """! @brief Install a newly built thread list and report changes from the previous one."""
+        info = {}
+        for thread in threads.values():
+            info[thread.unique_id] = (thread.name, thread.description)
+        old_ids = set(self._thread_info)
+        new_ids = set(info)
+        changes = ThreadListChanges(new_ids - old_ids, old_ids - new_ids,
+            set(i for i in (new_ids & old_ids) if info[i] != self._thread_info[i]))
+        self._threads = threads
+        self._reusable_threads = {}
+        self._thread_info = info
+
+        if changes.added or changes.removed or changes.updated:
+            LOG.debug("Thread list changed: %s", changes)
+            self._generation += 1
+            self._target.session.notify(Target.EVENT_THREADS_CHANGED, self, changes)
+
+    @property
+    def generation(self):
+        """! @brief Number that changes whenever the thread list or a thread's info changes.
+
+        Clients such as the gdbserver can compare the generation with a previous value to skip
+        rebuilding data derived from the thread list.
+        """
+        return self._generation
+
     def _is_thread_list_dirty(self):
         token = self._target.run_token
         if token == self._last_run_token:
@@ -92,7 +191,10 @@ class ThreadProvider(object):
         raise NotImplementedError()
 
     def invalidate(self):
-        raise NotImplementedError()
+        """! @brief Discard the thread list so it is rebuilt from scratch on the next update."""
+        self._threads = {}
+        self._reusable_threads = {}
+        self._last_run_token = -1
 
     @property
     def read_from_target(self):
@@ -101,7 +203,11 @@ class ThreadProvider(object):
     @read_from_target.setter
     def read_from_target(self, value):
         if value != self._read_from_target:
-            self.invalidate()
+            # Rebuild the thread list on the next update. The current thread objects are kept
+            # so threads whose control blocks did not change can be reused.
+            self._reusable_threads.update(self._threads)
+            self._threads = {}
+            self._last_run_token = -1
         self._read_from_target = value
 
     @property
@@ -14,37 +14,18 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 from .provider import (TargetThread, ThreadProvider)
-from .common import (read_c_string, HandlerModeThread, EXC_RETURN_EXT_FRAME_MASK)
+from .common import (HandlerModeThread, TargetSnapshot, StackFrameCache, decode_stacked_registers,
+    EXC_RETURN_EXT_FRAME_MASK)
 from ..core import exceptions
 from ..core.target import Target
 from ..debug.context import DebugContext
 from ..coresight.cortex_m import (CORE_REGISTER, register_name_to_index)
 import logging
+import struct
 
 # Create a logger for this module.
 LOG = logging.getLogger(__name__)
 
-class TargetList(object):
-    def __init__(self, context, ptr, nextOffset):
-        self._context = context
-        self._list = ptr
-        self._offset = nextOffset
-
-    def __iter__(self):
-        # Read first item on list.
-        node = self._context.read32(self._list)
-
-        while node != 0:
-            # Return previously read item.
-            yield node
-
-            try:
-                # Read the next item in the list.
-                node = self._context.read32(node + self._offset)
-            except exceptions.TransferError as exc:
-                LOG.warning("TransferError while reading list elements (list=0x%08x, node=0x%08x), terminating list: %s", self._list, node, exc)
-                break
-
 class RTXThreadContext(DebugContext):
     """! @brief Thread context for RTX5."""
     
@@ -134,10 +115,10 @@ class RTXThreadContext(DebugContext):
         super(RTXThreadContext, self).__init__(parent)
         self._thread = thread
         self._has_fpu = self.core.has_fpu
+        self._frame_cache = StackFrameCache(self._parent)
 
     def read_core_registers_raw(self, reg_list):
         reg_list = [register_name_to_index(reg) for reg in reg_list]
-        reg_vals = []
 
         isCurrent = self._thread.is_current
         inException = isCurrent and self._parent.read_core_register('ipsr') > 0
@@ -179,34 +160,11 @@ class RTXThreadContext(DebugContext):
             except exceptions.TransferError:
                 LOG.debug("Transfer error while reading thread's saved LR")
 
-        for reg in reg_list:
-
-            # Must handle stack pointer specially.
-            if reg == 13:
-                if inException:
-                    reg_vals.append(sp + hwStacked)
-                else:
-                    reg_vals.append(sp + swStacked + hwStacked)
-                continue
-
-            # Look up offset for this register on the stack.
-            spOffset = table.get(reg, None)
-            if spOffset is None:
-                reg_vals.append(self._parent.read_core_register_raw(reg))
-                continue
-            if inException:
-                spOffset -= swStacked
-
-            try:
-                if spOffset >= 0:
-                    reg_vals.append(self._parent.read32(sp + spOffset))
-                else:
-                    # Not available - try live one
-                    reg_vals.append(self._parent.read_core_register_raw(reg))
-            except exceptions.TransferError:
-                reg_vals.append(0)
-
-        return reg_vals
+        # Read the whole frame with one transfer.
+        frameSize = hwStacked if inException else (swStacked + hwStacked)
+        frame = self._frame_cache.read(sp, frameSize)
+        return decode_stacked_registers(self._parent, reg_list, sp, frame, table, swStacked,
+                hwStacked, inException)
 
 class RTXTargetThread(TargetThread):
     """! @brief Base class representing a thread on the target."""
@@ -217,6 +175,9 @@ class RTXTargetThread(TargetThread):
     STACKFRAME_OFFSET = 34
     SP_OFFSET = 56
 
+    ## Bytes of osRtxThread_t read as one block, covering all of the above fields.
+    BLOCK_SIZE = 60
+
     STATES = {
          0x00: "Inactive",
          0x01: "Ready",
@@ -244,19 +205,23 @@ class RTXTargetThread(TargetThread):
         self._thread_context = RTXThreadContext(self._target_context, self)
         self._has_fpu = self._thread_context.core.has_fpu
         try:
-            name_ptr = self._target_context.read32(self._base + RTXTargetThread.NAME_OFFSET)
-            self._name = read_c_string(self._target_context, name_ptr)
-            
-            self.update_state()
+            name_ptr, = struct.unpack_from("<I", self._read_block(), RTXTargetThread.NAME_OFFSET)
+            self._name = self._provider.snapshot.read_c_string(name_ptr)
+
+            self.update_info()
         except exceptions.TransferError as exc:
             LOG.debug("Transfer error while reading thread %x name: %s", self._base, exc)
             self._name = "?"
         LOG.debug('RTXTargetThread 0x%x' % base)
     
-    def update_state(self):
+    def _read_block(self):
+        return self._provider.snapshot.read_block(self._base, RTXTargetThread.BLOCK_SIZE)
+
+    def update_info(self):
         try:
-            state = self._target_context.read8(self._base + RTXTargetThread.STATE_OFFSET)
-            priority = self._target_context.read8(self._base + RTXTargetThread.PRIORITY_OFFSET)
+            block = self._read_block()
+            state = block[RTXTargetThread.STATE_OFFSET]
+            priority = block[RTXTargetThread.PRIORITY_OFFSET]
         except exceptions.TransferError as exc:
             LOG.debug("Transfer error while reading thread %x state: %s", self._base, exc)
         else:
@@ -291,7 +256,7 @@ class RTXTargetThread(TargetThread):
     def get_stack_pointer(self):
         # Get stack pointer saved in thread struct.
         try:
-            return self._target_context.read32(self._base + RTXTargetThread.SP_OFFSET)
+            return struct.unpack_from("<I", self._read_block(), RTXTargetThread.SP_OFFSET)[0]
         except exceptions.TransferError:
             LOG.debug("Transfer error while reading thread's stack pointer @ 0x%08x", self._base + RTXTargetThread.SP_OFFSET)
             return 0
@@ -300,7 +265,7 @@ class RTXTargetThread(TargetThread):
         # Get "stack frame" (EXC_RETURN value from LR) saved in thread struct.
         # Note that RTX5 only stores bottom byte - hide that by extending.
         try:
-            return self._target_context.read8(self._base + RTXTargetThread.STACKFRAME_OFFSET) | 0xFFFFFF00
+            return self._read_block()[RTXTargetThread.STACKFRAME_OFFSET] | 0xFFFFFF00
         except exceptions.TransferError:
             LOG.debug("Transfer error while reading thread's stack frame @ 0x%08x", self._base + RTXTargetThread.STACKFRAME_OFFSET)
             return 0xFFFFFFFD
@@ -334,6 +299,7 @@ class RTX5ThreadProvider(ThreadProvider):
         self._threads = {}
         self._current = None
         self._current_id = None
+        self._snapshot = TargetSnapshot(self._target_context, self._target)
         self._target.session.subscribe(self.event_handler, Target.EVENT_POST_FLASH_PROGRAM)
         self._target.session.subscribe(self.event_handler, Target.EVENT_POST_RESET)
         return True
@@ -343,8 +309,14 @@ class RTX5ThreadProvider(ThreadProvider):
             return []
         return list(self._threads.values())
 
+    @property
+    def snapshot(self):
+        """! @brief TargetSnapshot used to read the kernel data structures."""
+        return self._snapshot
+
     def invalidate(self):
-        self._threads = {}
+        super(RTX5ThreadProvider, self).invalidate()
+        self._snapshot.invalidate()
 
     def event_handler(self, notification):
         # Invalidate threads list if flash is reprogrammed.
@@ -354,18 +326,38 @@ class RTX5ThreadProvider(ThreadProvider):
         newThreads = {}
         
         def create_or_update(thread):
-            # Check for and reuse existing thread.
-            if thread in self._threads:
-                # Thread already exists, update its state.
-                t = self._threads[thread]
-                t.update_state()
-            else:
-                # Create a new thread.
-                t = RTXTargetThread(self._target_context, self, thread)
+            # Reuse an existing thread, updating its state only if its struct changed, or create
+            # a new thread.
+            t = self._get_thread_for_block(thread, blocks[thread],
+                    lambda: RTXTargetThread(self._target_context, self, thread))
             newThreads[t.unique_id] = t
 
+        # Read the currently running thread and the heads of the thread lists together.
+        thread, readyHead, delayHead, waitHead = self._snapshot.read32_list([
+                self._os_rtx_info + RTX5ThreadProvider.CURRENT_OFFSET,
+                self._readylist,
+                self._delaylist,
+                self._waitlist,
+                ])
+        if thread is None:
+            raise exceptions.TransferError("failed to read RTX5 current thread")
+
+        # Walk all thread lists, then read the structs and names of all threads found.
+        threadLists = self._snapshot.walk_lists(
+                [readyHead or 0, delayHead or 0, waitHead or 0],
+                [RTX5ThreadProvider.THREADNEXT_OFFSET, RTX5ThreadProvider.DELAYNEXT_OFFSET,
+                    RTX5ThreadProvider.DELAYNEXT_OFFSET])
+        allThreads = [thread] if thread else []
+        for theList in threadLists:
+            allThreads += theList
+        blocks = dict(zip(allThreads, self._snapshot.read_blocks(allThreads, RTXTargetThread.BLOCK_SIZE)))
+
+        # Names are only read for new threads.
+        self._snapshot.read_c_strings([struct.unpack_from("<I", block, RTXTargetThread.NAME_OFFSET)[0]
+                for base, block in blocks.items()
+                if (block is not None) and (self._find_thread(base) is None)])
+
         # Currently running Thread
-        thread = self._target_context.read32(self._os_rtx_info + RTX5ThreadProvider.CURRENT_OFFSET)
         if thread:
             create_or_update(thread)
             self._current_id = thread
@@ -374,13 +366,6 @@ class RTX5ThreadProvider(ThreadProvider):
             self._current_id = None
             self._current = None
 
-        # List of target thread lists to examine.
-        threadLists = [
-            TargetList(self._target_context, self._readylist, RTX5ThreadProvider.THREADNEXT_OFFSET),
-            TargetList(self._target_context, self._delaylist, RTX5ThreadProvider.DELAYNEXT_OFFSET),
-            TargetList(self._target_context, self._waitlist, RTX5ThreadProvider.DELAYNEXT_OFFSET),
-            ]
-
         # Scan thread lists.
         for theList in threadLists:
             for thread in theList:
@@ -389,8 +374,8 @@ class RTX5ThreadProvider(ThreadProvider):
         # Create fake handler mode thread.
         if self._target_context.read_core_register('ipsr') > 0:
             newThreads[HandlerModeThread.UNIQUE_ID] = HandlerModeThread(self._target_context, self)
-        
-        self._threads = newThreads
+
+        self._set_threads(newThreads)
 
     def get_thread(self, threadId):
         if not self.is_enabled:
@@ -15,35 +15,17 @@
 # limitations under the License.
 
 from .provider import (TargetThread, ThreadProvider)
-from .common import (read_c_string, HandlerModeThread)
+from .common import (HandlerModeThread, TargetSnapshot, StackFrameCache)
 from ..core import exceptions
 from ..core.target import Target
 from ..debug.context import DebugContext
 from ..coresight.cortex_m import (CORE_REGISTER, register_name_to_index)
 import logging
+import struct
 
 # Create a logger for this module.
 LOG = logging.getLogger(__name__)
 
-class TargetList(object):
-    def __init__(self, context, ptr, next_offset):
-        self._context = context
-        self._list = ptr
-        self._list_node_next_offset = next_offset
-
-    def __iter__(self):
-        node = self._context.read32(self._list)
-
-        while (node != 0):
-            try:
-                yield node
-
-                # Read next list node pointer.
-                node = self._context.read32(node + self._list_node_next_offset)
-            except exceptions.TransferError:
-                LOG.warning("TransferError while reading list elements (list=0x%08x, node=0x%08x), terminating list", self._list, node)
-                node = 0
-
 class ZephyrThreadContext(DebugContext):
     """! @brief Thread context for Zephyr."""
     
@@ -74,10 +56,10 @@ class ZephyrThreadContext(DebugContext):
         super(ZephyrThreadContext, self).__init__(parent)
         self._thread = thread
         self._has_fpu = self.core.has_fpu
+        self._frame_cache = StackFrameCache(self._parent)
 
     def read_core_registers_raw(self, reg_list):
         reg_list = [register_name_to_index(reg) for reg in reg_list]
-        reg_vals = []
 
         isCurrent = self._thread.is_current
         inException = isCurrent and self._parent.read_core_register('ipsr') > 0
@@ -98,45 +80,47 @@ class ZephyrThreadContext(DebugContext):
             sp = self._thread.get_stack_pointer()
         exceptionFrame = 0x20
 
-        for reg in reg_list:
+        # The exception stack frame is read with one transfer. The callee-saved registers are
+        # saved in the thread struct, which was read as a block by the thread provider.
+        frame = self._frame_cache.read(sp, exceptionFrame)
+        try:
+            threadBlock = self._thread._read_block()
+        except exceptions.TransferError:
+            threadBlock = None
+        calleeBase = self._thread._offsets["t_stack_ptr"]
+
+        reg_vals = [0] * len(reg_list)
+        live = []
+        for i, reg in enumerate(reg_list):
 
             # If this is a stack pointer register, add an offset to account for the exception stack frame
             if reg == 13:
-                val = sp + exceptionFrame
-                LOG.debug("Reading register %d = 0x%x", reg, val)
-                reg_vals.append(val)
+                reg_vals[i] = sp + exceptionFrame
                 continue
 
             # If this is a callee-saved register, read it from the thread structure
             calleeOffset = self.CALLEE_SAVED_OFFSETS.get(reg, None)
             if calleeOffset is not None:
-                try:
-                    addr = self._thread._base + self._thread._offsets["t_stack_ptr"] + calleeOffset
-                    val = self._parent.read32(addr)
-                    reg_vals.append(val)
-                    LOG.debug("Reading callee-saved register %d at 0x%08x = 0x%x", reg, addr, val)
-                except exceptions.TransferError:
-                    reg_vals.append(0)
+                offset = calleeBase + calleeOffset
+                if (threadBlock is not None) and (0 <= offset <= len(threadBlock) - 4):
+                    reg_vals[i], = struct.unpack_from("<I", threadBlock, offset)
                 continue
 
             # If this is a exception stack frame register, read it from the stack
             stackFrameOffset = self.STACK_FRAME_OFFSETS.get(reg, None)
             if stackFrameOffset is not None:
-                try:
-                    addr = sp + stackFrameOffset
-                    val = self._parent.read32(addr)
-                    reg_vals.append(val)
-                    LOG.debug("Reading stack frame register %d at 0x%08x = 0x%x", reg, addr, val)
-                except exceptions.TransferError:
-                    reg_vals.append(0)
+                if frame is not None:
+                    reg_vals[i] = frame[stackFrameOffset // 4]
                 continue
 
             # If we get here, this is a register not in any of the dictionaries
-            val = self._parent.read_core_register_raw(reg)
-            LOG.debug("Reading live register %d = 0x%x", reg, val)
-            reg_vals.append(val)
-            continue
+            live.append(i)
 
+        if live:
+            for i, val in zip(live, self._parent.read_core_registers_raw([reg_list[i] for i in live])):
+                reg_vals[i] = val
+
+        LOG.debug("Thread 0x%08x registers %s = %s", self._thread.unique_id, reg_list, reg_vals)
         return reg_vals
 
 class ZephyrThread(TargetThread):
@@ -176,28 +160,30 @@ class ZephyrThread(TargetThread):
         except exceptions.TransferError:
             LOG.debug("Transfer error while reading thread info")
 
+    def _read_block(self):
+        return self._provider.snapshot.read_block(self._base, self._provider.thread_block_size)
+
     def get_stack_pointer(self):
         # Get stack pointer saved in thread struct.
-        addr = self._base + self._offsets["t_stack_ptr"]
         try:
-            return self._target_context.read32(addr)
+            return struct.unpack_from("<I", self._read_block(), self._offsets["t_stack_ptr"])[0]
         except exceptions.TransferError:
-            LOG.debug("Transfer error while reading thread's stack pointer @ 0x%08x", addr)
+            LOG.debug("Transfer error while reading thread's stack pointer @ 0x%08x",
+                self._base + self._offsets["t_stack_ptr"])
             return 0
 
     def update_info(self):
         try:
-            self._priority = self._target_context.read8(self._base + self._offsets["t_prio"])
-            self._state = self._target_context.read8(self._base + self._offsets["t_state"])
+            block = self._read_block()
+            self._priority = block[self._offsets["t_prio"]]
+            self._state = block[self._offsets["t_state"]]
 
             if self._provider.version > 0:
-                addr = self._target_context.read32(self._base + self._offsets["t_name"])
+                addr, = struct.unpack_from("<I", block, self._offsets["t_name"])
                 if addr != 0:
-                    self._name = read_c_string(self._target_context, addr)
+                    self._name = self._provider.snapshot.read_c_string(addr)
                 else:
                     self._name = "Unnamed"
-
-
         except exceptions.TransferError:
             LOG.debug("Transfer error while reading thread info")
 
@@ -269,7 +255,19 @@ class ZephyrThreadProvider(ThreadProvider):
         self._version = None
         self._all_threads = None
         self._curr_thread = None
+        self._thread_block_size = 0
         self._threads = {}
+        self._snapshot = TargetSnapshot(self._target_context, self._target)
+
+    @property
+    def snapshot(self):
+        """! @brief TargetSnapshot used to read the kernel data structures."""
+        return self._snapshot
+
+    @property
+    def thread_block_size(self):
+        """! @brief Number of bytes of each thread struct that are read as one block."""
+        return self._thread_block_size
 
     def init(self, symbolProvider):
         # Lookup required symbols.
@@ -291,10 +289,13 @@ class ZephyrThreadProvider(ThreadProvider):
             LOG.error("Unsupported _kernel_openocd_size_t_size")
             return None
 
+        # Read all offsets with one batch of deferred reads.
+        base = self._symbols["_kernel_openocd_offsets"]
+        results = [self._target_context.read32(base + index * size, now=False)
+                    for index in range(len(self.ZEPHYR_OFFSETS))]
         offsets = {}
-        for index, name in enumerate(self.ZEPHYR_OFFSETS):
-            offset = self._symbols["_kernel_openocd_offsets"] + index * size
-            offsets[name] = self._target_context.read32(offset)
+        for name, result in zip(self.ZEPHYR_OFFSETS, results):
+            offsets[name] = result()
             LOG.debug("%s = 0x%04x", name, offsets[name])
 
         return offsets
@@ -306,15 +307,19 @@ class ZephyrThreadProvider(ThreadProvider):
             self._version = None
             self._all_threads = None
             self._curr_thread = None
+            self._thread_block_size = 0
             LOG.debug("_offsets, _all_threads, and _curr_thread are invalid")
         else:
             self._version = self._offsets["version"]
             self._all_threads = self._symbols["_kernel"] + self._offsets["k_threads"]
             self._curr_thread = self._symbols["_kernel"] + self._offsets["k_curr_thread"]
+            self._thread_block_size = max(self._offsets[name] for name in
+                    ('t_next_thread', 't_state', 't_prio', 't_stack_ptr', 't_name')) + 4
             LOG.debug("version = %d, _all_threads = 0x%08x, _curr_thread = 0x%08x", self._version, self._all_threads, self._curr_thread)
 
     def invalidate(self):
-        self._threads = {}
+        super(ZephyrThreadProvider, self).invalidate()
+        self._snapshot.invalidate()
 
     def event_handler(self, notification):
         if notification.event == Target.EVENT_POST_RESET:
@@ -325,22 +330,27 @@ class ZephyrThreadProvider(ThreadProvider):
             self._update()
 
     def _build_thread_list(self):
-        allThreads = TargetList(self._target_context, self._all_threads, self._offsets["t_next_thread"])
         newThreads = {}
 
-        currentThread = self._target_context.read32(self._curr_thread)
+        firstThread, currentThread = self._snapshot.read32_list([self._all_threads, self._curr_thread])
+        if None in (firstThread, currentThread):
+            raise exceptions.TransferError("failed to read Zephyr kernel state")
         LOG.debug("currentThread = 0x%08x", currentThread)
 
-        for threadBase in allThreads:
-            try:
-                # Reuse existing thread objects.
-                if threadBase in self._threads:
-                    t = self._threads[threadBase]
+        # Walk the thread list, then read the structs and names of all threads found.
+        allThreads = self._snapshot.walk_lists([firstThread], self._offsets["t_next_thread"])[0]
+        blocks = self._snapshot.read_blocks(allThreads, self._thread_block_size)
+        if self._version > 0:
+            self._snapshot.read_c_strings([struct.unpack_from("<I", block, self._offsets["t_name"])[0]
+                    for threadBase, block in zip(allThreads, blocks)
+                    if self._is_thread_block_changed(threadBase, block) and (block is not None)])
 
-                    # Ask the thread object to update its state and priority.
-                    t.update_info()
-                else:
-                    t = ZephyrThread(self._target_context, self, threadBase, self._offsets)
+        for threadBase, block in zip(allThreads, blocks):
+            try:
+                # Reuse existing thread objects. The thread object updates its state, priority,
+                # and name only if the thread struct changed.
+                t = self._get_thread_for_block(threadBase, block,
+                        lambda: ZephyrThread(self._target_context, self, threadBase, self._offsets))
 
                 # Set thread state.
                 if threadBase == currentThread:
@@ -357,7 +367,7 @@ class ZephyrThreadProvider(ThreadProvider):
             t = HandlerModeThread(self._target_context, self)
             newThreads[t.unique_id] = t
 
-        self._threads = newThreads
+        self._set_threads(newThreads)
 
     def get_threads(self):
         if not self.is_enabled:
@@ -67,8 +67,8 @@ class Flash_Kinetis(Flash):
         # Check if the data passed in contains the security bits
         if (address <= SECURITY_START and address + len(data) >= SECURITY_START + SECURITY_SIZE):
 
-            # convert data to a list so it can be modified
-            data = list(data)
+            # copy data to a bytearray so it can be modified
+            data = bytearray(data)
 
             # FPROT must be 0xff (erase protection disabled)
             for i in range(FPROT_ADDR, FPROT_ADDR_END):
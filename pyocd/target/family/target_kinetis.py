@@ -19,6 +19,7 @@ from ...coresight.cortex_m import CortexM
 from ...core import exceptions
 from ...core.target import Target
 from ...core.coresight_target import CoreSightTarget
+from ...flash.manifest import FlashManifest
 from ...utility.timeout import Timeout
 import logging
 from time import sleep
@@ -226,6 +227,8 @@ class Kinetis(CoreSightTarget):
         @return True Mass erase succeeded.
         @return False Mass erase failed or is disabled.
         """
+        FlashManifest.clear_for_session(self.session)
+
         # Read current reset state so we can restore it, then assert reset if needed.
         wasResetAsserted = self.dp.is_reset_asserted()
         if not wasResetAsserted:
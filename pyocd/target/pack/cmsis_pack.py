@@ -15,7 +15,7 @@
 # limitations under the License.
 
 from __future__ import print_function
-from xml.etree.ElementTree import ElementTree
+from xml.etree.ElementTree import (ElementTree, iterparse)
 import zipfile
 from collections import namedtuple
 import logging
@@ -51,6 +51,43 @@ class _DeviceInfo(object):
         self.algos = kwargs.get('algos', [])
         self.debugs = kwargs.get('debugs', [])
 
+class _DeviceNode(object):
+    """! @brief One level of the device hierarchy recorded while loading a PDSC.
+
+    Only the tag and attributes of the `<family>`, `<subFamily>`, `<device>`, or `<variant>`
+    element are kept, along with the `<memory>`, `<algorithm>`, and `<debug>` elements directly
+    within it. The node has the `tag` and `attrib` attributes of an XML element so it can be used
+    in place of one.
+    """
+    def __init__(self, tag, attrib, parent):
+        self.tag = tag
+        self.attrib = dict(attrib)
+        self.parent = parent
+        self.memories = []
+        self.algos = []
+        self.debugs = []
+
+    @property
+    def path(self):
+        """! @brief List of nodes from the family down to and including this node."""
+        nodes = []
+        node = self
+        while node is not None:
+            nodes.append(node)
+            node = node.parent
+        nodes.reverse()
+        return nodes
+
+## Tags of elements that define a level of the device hierarchy.
+_HIERARCHY_TAGS = ('family', 'subFamily', 'device', 'variant')
+
+## Map from tags of elements describing a device to the _DeviceNode list they are saved into.
+_DEVICE_ELEMENT_LISTS = {
+    'memory': 'memories',
+    'algorithm': 'algos',
+    'debug': 'debugs',
+    }
+
 class CmsisPack(object):
     """! @brief Wraps a CMSIS Device Family Pack.
     
@@ -63,10 +100,11 @@ class CmsisPack(object):
     family [-> subFamily] -> device [-> variant]
     ```
     
-    Internally, this class is responsible for collecting the device-related XML elements from each
-    of the levels of the hierarchy described above. It determines which elements belong to each
-    defined device and passes those to CmsisPackDevice. It is then CmsisPackDevice that performs
-    the parsing of each element type into pyOCD-compatible data.
+    The PDSC is read with a streaming parser. Only the levels of the hierarchy above, plus the
+    `<memory>`, `<algorithm>`, and `<debug>` elements within them, are kept; all other elements are
+    discarded as soon as they have been parsed. The elements that apply to a device are collected
+    from each level of its hierarchy on first use of that device. It is then CmsisPackDevice that
+    performs the parsing of each element type into pyOCD-compatible data.
     """
     def __init__(self, file_or_path):
         """! @brief Constructor.
@@ -98,20 +136,23 @@ class CmsisPack(object):
         else:
             raise MalformedCmsisPackError("CMSIS-Pack '{}' is missing a .pdsc file".format(file_or_path))
         
-        # Convert PDSC into an ElementTree.
-        with self._pack_file.open(self._pdscName) as pdscFile:
-            self._pdsc = ElementTree(file=pdscFile)
-
-        self._state_stack = []
+        self._pdsc = None
         self._devices = []
         
         # Extract devices.
-        for family in self._pdsc.iter('family'):
-            self._parse_devices(family)
+        with self._pack_file.open(self._pdscName) as pdscFile:
+            self._load_devices(pdscFile)
     
     @property
     def pdsc(self):
-        """! @brief Accessor for the ElementTree instance for the pack's PDSC file."""
+        """! @brief Accessor for the ElementTree instance for the pack's PDSC file.
+        
+        The devices are loaded without building an ElementTree for the whole PDSC, so the PDSC
+        is parsed again the first time this property is read.
+        """
+        if self._pdsc is None:
+            with self._pack_file.open(self._pdscName) as pdscFile:
+                self._pdsc = ElementTree(file=pdscFile)
         return self._pdsc
     
     @property
@@ -119,64 +160,69 @@ class CmsisPack(object):
         """! @brief A list of CmsisPackDevice objects for every part number defined in the pack."""
         return self._devices
     
-    def _parse_devices(self, parent):
-        # Extract device description elements we care about.
-        newState = _DeviceInfo(element=parent)
-        children = []
-        for elem in parent:
-            if elem.tag == 'memory':
-                newState.memories.append(elem)
-            elif elem.tag == 'algorithm':
-                newState.algos.append(elem)
-            elif elem.tag == 'debug':
-                newState.debugs.append(elem)
-            # Save any elements that we will recurse into.
-            elif elem.tag in ('subFamily', 'device', 'variant'):
-                children.append(elem)
-
-        # Push the new device description state onto the stack.
-        self._state_stack.append(newState)
+    def _load_devices(self, pdsc_file):
+        """! @brief Stream the PDSC and record the device hierarchy.
         
-        # Create a device object if this element defines one.
-        if parent.tag in ('device', 'variant'):
-            # Build device info from elements applying to this device.
-            deviceInfo = _DeviceInfo(element=parent,
-                                        families=self._extract_families(),
-                                        memories=self._extract_memories(),
-                                        algos=self._extract_algos(),
-                                        debugs=self._extract_debugs()
-                                        )
-            
-            dev = CmsisPackDevice(self, deviceInfo)
-            self._devices.append(dev)
+        A `<family>` element may appear anywhere. The other hierarchy levels and the device
+        description elements are only recognised directly within a hierarchy element.
+        """
+        # Stack of (element, node) for the open elements. The node is None for elements that
+        # are not part of the device hierarchy.
+        stack = []
+        for event, elem in iterparse(pdsc_file, events=('start', 'end')):
+            if event == 'start':
+                parent_node = stack[-1][1] if stack else None
+                node = None
+                if (elem.tag == 'family') or ((parent_node is not None)
+                        and (elem.tag in _HIERARCHY_TAGS)):
+                    node = _DeviceNode(elem.tag, elem.attrib, parent_node)
+                    if node.tag in ('device', 'variant'):
+                        self._devices.append(CmsisPackDevice(self, node))
+                stack.append((elem, node))
+            else:
+                stack.pop()
+                parent_node = stack[-1][1] if stack else None
+                if (parent_node is not None) and (elem.tag in _DEVICE_ELEMENT_LISTS):
+                    # Keep this element. It is detached from the tree when the parent is cleared.
+                    getattr(parent_node, _DEVICE_ELEMENT_LISTS[elem.tag]).append(elem)
+                else:
+                    elem.clear()
 
-        # Recursively process subelements.
-        for elem in children:
-            self._parse_devices(elem)
+    def _get_device_info(self, node):
+        """! @brief Collect the elements from each level of the hierarchy that apply to a device.
         
-        self._state_stack.pop()
+        @param self
+        @param node The _DeviceNode for the `<device>` or `<variant>`.
+        @return _DeviceInfo object.
+        """
+        path = node.path
+        return _DeviceInfo(element=node,
+                            families=self._extract_families(path),
+                            memories=self._extract_memories(path),
+                            algos=self._extract_algos(path),
+                            debugs=self._extract_debugs(path)
+                            )
 
-    def _extract_families(self):
+    def _extract_families(self, path):
         families = []
-        for state in self._state_stack:
-            elem = state.element
-            if elem.tag == 'family':
-                families += [elem.attrib['Dvendor'], elem.attrib['Dfamily']]
-            elif elem.tag == 'subFamily':
-                families += [elem.attrib['DsubFamily']]
+        for node in path:
+            if node.tag == 'family':
+                families += [node.attrib['Dvendor'], node.attrib['Dfamily']]
+            elif node.tag == 'subFamily':
+                families += [node.attrib['DsubFamily']]
         return families
 
-    def _extract_items(self, state_info_name, filter):
+    def _extract_items(self, path, state_info_name, filter):
         map = {}
-        for state in self._state_stack:
-            for elem in getattr(state, state_info_name):
+        for node in path:
+            for elem in getattr(node, state_info_name):
                 try:
                     filter(map, elem)
                 except (KeyError, ValueError) as err:
                     LOG.debug("error parsing CMSIS-Pack: " + str(err))
         return list(map.values())
 
-    def _extract_memories(self):
+    def _extract_memories(self, path):
         def filter(map, elem):
             if 'name' in elem.attrib:
                 name = elem.attrib['name']
@@ -189,9 +235,9 @@ class CmsisPack(object):
         
             map[name] = elem
         
-        return self._extract_items('memories', filter)
+        return self._extract_items(path, 'memories', filter)
 
-    def _extract_algos(self):
+    def _extract_algos(self, path):
         def filter(map, elem):
             # We only support Keil FLM style flash algorithms (for now).
             if ('style' in elem.attrib) and (elem.attrib['style'] != 'Keil'):
@@ -206,9 +252,9 @@ class CmsisPack(object):
             # An algo with the same range as an existing algo will override the previous.
             map[memrange] = elem
         
-        return self._extract_items('algos', filter)
+        return self._extract_items(path, 'algos', filter)
     
-    def _extract_debugs(self):
+    def _extract_debugs(self, path):
         def filter(map, elem):
             if 'Pname' in elem.attrib:
                 name = elem.attrib['Pname']
@@ -224,7 +270,7 @@ class CmsisPack(object):
                 map.clear()
                 map['*'] = elem
         
-        return self._extract_items('debugs', filter)
+        return self._extract_items(path, 'debugs', filter)
     
     def get_file(self, filename):
         """! @brief Return file-like object for a file within the pack.
@@ -270,24 +316,37 @@ class CmsisPackDevice(object):
     the PDSC.
     """
 
-    def __init__(self, pack, device_info):
+    def __init__(self, pack, node):
         """! @brief Constructor.
         @param self
         @param pack The CmsisPack object that contains this device.
-        @param device_info A _DeviceInfo object with the XML elements that describe this device.
+        @param node A _DeviceNode for the `<device>` or `<variant>` element of this device.
         """
         self._pack = pack
-        self._info = device_info
+        self._node = node
+        self._info = None
+        self._families = None
         
-        if device_info.element.tag == "device":
-            self._part = device_info.element.attrib['Dname']
-        elif device_info.element.tag == "variant":
-            self._part = device_info.element.attrib['Dvariant']
+        if node.tag == "device":
+            self._part = node.attrib['Dname']
+        elif node.tag == "variant":
+            self._part = node.attrib['Dvariant']
         
         self._regions = []
         self._saw_startup = False
         self._default_ram = None
+        self._built_memory_regions = False
+        self._built_flash_regions = False
         self._memory_map = None
+    
+    def _get_info(self):
+        """! @brief Return the _DeviceInfo with the XML elements that describe this device.
+        
+        The elements are collected from the device's hierarchy on first use.
+        """
+        if self._info is None:
+            self._info = self._pack._get_device_info(self._node)
+        return self._info
             
     def _build_memory_regions(self):
         """! @brief Creates memory region instances for the device.
@@ -295,8 +354,14 @@ class CmsisPackDevice(object):
         For each `<memory>` element in the device info, a memory region object is created and
         added to the `_regions` attribute. IROM or non-writable memories are created as RomRegions
         by this method. They will be converted to FlashRegions by _build_flash_regions().
+        
+        The regions are only built once, no matter how many times this method is called.
         """
-        for elem in self._info.memories:
+        if self._built_memory_regions:
+            return
+        self._built_memory_regions = True
+        
+        for elem in self._get_info().memories:
             try:
                 # Get the region name, type, and access permissions.
                 if 'name' in elem.attrib:
@@ -360,7 +425,15 @@ class CmsisPackDevice(object):
         flash algo can be found. If the flash has multiple sector sizes, then separate flash
         regions will be created for each sector size range. The flash algo is converted to a
         pyOCD-compatible flash algo dict by calling _get_pyocd_flash_algo().
+        
+        The memory regions are built first if required. The conversion is only performed once,
+        no matter how many times this method is called.
         """
+        if self._built_flash_regions:
+            return
+        self._built_flash_regions = True
+        self._build_memory_regions()
+        
         # Must have a default ram.
         if self._default_ram is None:
             LOG.warning("CMSIS-Pack device %s has no default RAM defined, cannot program flash" % self.part_number)
@@ -445,7 +518,7 @@ class CmsisPackDevice(object):
     
     def _find_matching_algo(self, region):
         """! @brief Searches for a flash algo covering the regions's address range.'"""
-        for algo in self._info.algos:
+        for algo in self._get_info().algos:
             # Both start and size are required attributes.
             algoStart = int(algo.attrib['start'], base=0)
             algoSize = int(algo.attrib['size'], base=0)
@@ -473,12 +546,21 @@ class CmsisPackDevice(object):
     @property
     def vendor(self):
         """! @brief Vendor or manufacturer name."""
-        return self._info.families[0].split(':')[0]
+        return self._get_families()[0].split(':')[0]
     
     @property
     def families(self):
         """! @brief List of families the device belongs to, ordered most generic to least."""
-        return [f for f in self._info.families[1:]]
+        return [f for f in self._get_families()[1:]]
+    
+    def _get_families(self):
+        """! @brief Vendor and family names, read without collecting the rest of the device info."""
+        if self._families is None:
+            if self._info is not None:
+                self._families = self._info.families
+            else:
+                self._families = self._pack._extract_families(self._node.path)
+        return self._families
     
     @property
     def memory_map(self):
@@ -502,7 +584,7 @@ class CmsisPackDevice(object):
         @todo Support multiple cores.
         """
         try:
-            svdPath = self._info.debugs[0].attrib['svd']
+            svdPath = self._get_info().debugs[0].attrib['svd']
             return self._pack.get_file(svdPath)
         except (KeyError, IndexError):
             return None
@@ -513,7 +595,7 @@ class CmsisPackDevice(object):
         @todo Support multiple cores.
         """
         try:
-            resetSequence = self._info.debugs[0].attrib['defaultResetSequence']
+            resetSequence = self._get_info().debugs[0].attrib['defaultResetSequence']
             if resetSequence == 'ResetHardware':
                 return Target.ResetType.HW
             elif resetSequence == 'ResetSystem':
@@ -526,7 +608,7 @@ class CmsisPackDevice(object):
             return Target.ResetType.SW
     
     def __repr__(self):
-        return "<%s@%x %s %s>" % (self.__class__.__name__, id(self), self.part_number, self._info)
+        return "<%s@%x %s %s>" % (self.__class__.__name__, id(self), self.part_number, self._node)
         
         
 
@@ -0,0 +1,185 @@
+# pyOCD debugger
+# Copyright (c) 2020 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import logging
+import os
+import tempfile
+from collections import namedtuple
+
+from .cmsis_pack import (CmsisPack, MalformedCmsisPackError)
+from ...utility.compatibility import FileNotFoundError_
+
+LOG = logging.getLogger(__name__)
+
+## @brief Name of the index file, placed in the cmsis-pack-manager data directory.
+INDEX_FILENAME = "pyocd_device_index.json"
+
+class PackDeviceRef(namedtuple("_PackDeviceRef", "part_number vendor families pack_path")):
+    """! @brief Summary of a device read from the pack device index.
+
+    The attributes have the same meaning as the same-named properties of CmsisPackDevice, plus
+    `pack_path` that is the path to the .pack file defining the device. Opening the pack is
+    required to get anything more.
+    """
+    pass
+
+class PackDeviceIndex(object):
+    """! @brief Persistent index of the devices defined in a set of CMSIS-Packs.
+
+    Finding a device by part number otherwise requires opening every pack and parsing its PDSC.
+    The index records the part number, vendor, and families of each device along with the pack
+    that defines it, and is saved as a JSON file. Each pack's entry is keyed by the pack's path
+    and is only valid while the pack's modification time and size are unchanged. When update()
+    sees a new or changed pack, only that pack is parsed again.
+
+    The index file is loaded on the first call to update(). If it is missing, unreadable, or
+    from a different version of the index, it is rebuilt.
+    """
+
+    ## Version of the index file format.
+    VERSION = 1
+
+    def __init__(self, path):
+        """! @brief Constructor.
+        @param self
+        @param path Path to the index file. It does not need to exist.
+        """
+        self._path = path
+        self._packs = None
+        self._devices = []
+
+    @property
+    def path(self):
+        """! @brief Path to the index file."""
+        return self._path
+
+    @property
+    def devices(self):
+        """! @brief List of PackDeviceRef objects for all indexed devices, sorted by part number."""
+        return self._devices
+
+    def find(self, part_number):
+        """! @brief Look up devices by part number.
+
+        @param self
+        @param part_number The part number to find. The comparison is case-insensitive.
+        @return List of PackDeviceRef objects. There is more than one entry if several packs
+            define the same part number.
+        """
+        part_number = part_number.lower()
+        return [dev for dev in self._devices if dev.part_number.lower() == part_number]
+
+    def update(self, pack_paths):
+        """! @brief Bring the index up to date with a set of packs.
+
+        Packs whose modification time or size differs from the index are parsed, and packs not
+        in `pack_paths` are removed from the index. The index file is rewritten if anything
+        changed.
+
+        @param self
+        @param pack_paths Sequence of paths to .pack files.
+        """
+        if self._packs is None:
+            self._packs = self._load()
+
+        changed = False
+        packs = {}
+        for pack_path in pack_paths:
+            try:
+                stat = os.stat(pack_path)
+            except OSError as err:
+                LOG.debug("skipping CMSIS-Pack %s: %s", pack_path, err)
+                continue
+
+            entry = self._packs.get(pack_path)
+            if (entry is None) or (entry['mtime'] != stat.st_mtime) or (entry['size'] != stat.st_size):
+                entry = self._scan_pack(pack_path, stat)
+                changed = True
+            packs[pack_path] = entry
+
+        if set(packs) != set(self._packs):
+            changed = True
+        self._packs = packs
+
+        self._devices = sorted((PackDeviceRef(part, vendor, families, pack_path)
+                                for pack_path, entry in self._packs.items()
+                                for part, vendor, families in entry['devices']),
+                                key=lambda dev: dev.part_number)
+
+        if changed:
+            self._save()
+
+    def _scan_pack(self, pack_path, stat):
+        """! @brief Create the index entry for one pack by parsing its PDSC."""
+        LOG.debug("Indexing CMSIS-Pack %s", pack_path)
+        devices = []
+        try:
+            pack = CmsisPack(pack_path)
+            for dev in pack.devices:
+                try:
+                    devices.append([dev.part_number, dev.vendor, dev.families])
+                except (KeyError, IndexError):
+                    pass
+        except (MalformedCmsisPackError, FileNotFoundError_) as err:
+            # Record the pack without devices so it isn't parsed again until it changes.
+            LOG.warning(err)
+        return {
+                'mtime': stat.st_mtime,
+                'size': stat.st_size,
+                'devices': devices,
+                }
+
+    def _load(self):
+        """! @brief Read the pack entries from the index file."""
+        try:
+            with open(self._path, 'r') as index_file:
+                data = json.load(index_file)
+            if data.get('version') == self.VERSION:
+                return data['packs']
+            LOG.debug("rebuilding CMSIS-Pack device index with version %s", data.get('version'))
+        except (IOError, OSError, ValueError, KeyError, AttributeError) as err:
+            LOG.debug("rebuilding CMSIS-Pack device index: %s", err)
+        return {}
+
+    def _save(self):
+        """! @brief Write the index file.
+
+        The data is written to a temporary file that then replaces the index file, so a reader
+        never sees a partial index. Failure to write is not an error, since the index can always
+        be rebuilt.
+        """
+        data = {
+                'version': self.VERSION,
+                'packs': self._packs,
+                }
+        try:
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(self._path) or None,
+                                                prefix=".pyocd_index")
+            try:
+                with os.fdopen(fd, 'w') as index_file:
+                    json.dump(data, index_file, separators=(',', ':'))
+                try:
+                    os.rename(temp_path, self._path)
+                except OSError:
+                    # Windows won't rename over an existing file.
+                    os.remove(self._path)
+                    os.rename(temp_path, self._path)
+            except Exception:
+                os.remove(temp_path)
+                raise
+        except (IOError, OSError) as err:
+            LOG.debug("failed to write CMSIS-Pack device index %s: %s", self._path, err)
@@ -20,6 +20,7 @@ import six
 import os
 
 from .cmsis_pack import (CmsisPack, MalformedCmsisPackError)
+from .pack_index import (PackDeviceIndex, INDEX_FILENAME)
 from ..family import FAMILIES
 from .. import TARGET
 from ...core.coresight_target import CoreSightTarget
@@ -59,9 +60,46 @@ class ManagedPacks(object):
                 results.append(pack)
         return results
 
+    ## Device index for the cmsis-pack-manager data directory, created on first use.
+    _device_index = None
+
+    @staticmethod
+    def get_device_index(cache=None):
+        """! @brief Return the PackDeviceIndex for installed packs.
+
+        The index is brought up to date with the currently installed packs on each call. Only
+        packs that were installed or changed since the index was last saved are parsed.
+        """
+        if not CPM_AVAILABLE:
+            return None
+        cache = cache or cmsis_pack_manager.Cache(True, True)
+        index_path = os.path.join(cache.data_path, INDEX_FILENAME)
+        index = ManagedPacks._device_index
+        if (index is None) or (index.path != index_path):
+            index = ManagedPacks._device_index = PackDeviceIndex(index_path)
+        index.update([os.path.join(cache.data_path, pack.get_pack_name())
+                        for pack in ManagedPacks.get_installed_packs(cache=cache)])
+        return index
+
+    @staticmethod
+    def get_installed_devices():
+        """! @brief Return a list of PackDeviceRef objects for installed pack targets.
+
+        The list comes from the device index, so no packs are opened unless they are new or have
+        changed. The list is sorted by part number.
+        """
+        index = ManagedPacks.get_device_index()
+        if index is None:
+            return []
+        return index.devices
+
     @staticmethod
     def get_installed_targets():
-        """! @brief Return a list of CmsisPackDevice objects for installed pack targets."""
+        """! @brief Return a list of CmsisPackDevice objects for installed pack targets.
+
+        Every installed pack is opened and parsed. Use get_installed_devices() where only the
+        part number, vendor, and families are needed.
+        """
         if not CPM_AVAILABLE:
             return []
         cache = cmsis_pack_manager.Cache(True, True)
@@ -79,12 +117,24 @@ class ManagedPacks(object):
         Targets are added to the `#TARGET` list. A case-insensitive comparison against the
         device part number is used to find the target to populate. If multiple packs are installed
         that provide the same part numbers, all matching targets will be populated.
+
+        The device index is used to find the packs defining the part number, so only those
+        packs are opened.
         """
+        index = ManagedPacks.get_device_index()
+        if index is None:
+            return
         device_name = device_name.lower()
-        targets = ManagedPacks.get_installed_targets()
-        for dev in targets:
-            if device_name == dev.part_number.lower():
-                PackTargets.populate_device(dev)
+        pack_paths = sorted(set(ref.pack_path for ref in index.find(device_name)))
+        for pack_path in pack_paths:
+            try:
+                pack = CmsisPack(pack_path)
+            except (MalformedCmsisPackError, FileNotFoundError_) as err:
+                LOG.warning(err)
+                continue
+            for dev in pack.devices:
+                if device_name == dev.part_number.lower():
+                    PackTargets.populate_device(dev)
 
 class _PackTargetMethods(object):
     """! @brief Container for methods added to the dynamically generated pack target subclass."""
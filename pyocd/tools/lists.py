@@ -88,7 +88,7 @@ class ListGenerator(object):
             'boards' : boards
             }
 
-        managed_targets = [dev.part_number.lower() for dev in pack_target.ManagedPacks.get_installed_targets()]
+        managed_targets = [dev.part_number.lower() for dev in pack_target.ManagedPacks.get_installed_devices()]
 
         for board_id, info in BOARD_ID_TO_INFO.items():
             # Filter by name.
@@ -161,7 +161,7 @@ class ListGenerator(object):
         
         if not source_filter or source_filter == 'pack':
             # Add targets from cmsis-pack-manager cache.
-            for dev in pack_target.ManagedPacks.get_installed_targets():
+            for dev in pack_target.ManagedPacks.get_installed_devices():
                 try:
                     # Filter by name.
                     if name_filter and name_filter not in dev.part_number.lower():
@@ -986,7 +986,7 @@ class PyOCDCommander(object):
         if flash_init_required:
             region.flash.init(region.flash.Operation.VERIFY)
 
-        data = bytearray(self.target.aps[self.selected_ap].read_memory_block8(addr, count))
+        data = self.target.aps[self.selected_ap].read_memory_bytes(addr, count)
 
         if flash_init_required:
             region.flash.cleanup()
@@ -1007,7 +1007,7 @@ class PyOCDCommander(object):
             if self.is_flash_write(addr, 8, data):
                 FlashLoader.program_binary_data(self.session, addr, data)
             else:
-                self.target.aps[self.selected_ap].write_memory_block8(addr, data)
+                self.target.aps[self.selected_ap].write_memory_bytes(addr, data)
             print("Loaded %d bytes to 0x%08x" % (len(data), addr))
 
     def handle_load(self, args):
@@ -1113,7 +1113,7 @@ class PyOCDCommander(object):
             chunk_size = min(end_addr - addr, CHUNK_SIZE)
             print("Read %d bytes @ 0x%08x" % (chunk_size, addr))
             
-            data = bytearray(self.target.aps[self.selected_ap].read_memory_block8(addr, chunk_size))
+            data = self.target.aps[self.selected_ap].read_memory_bytes(addr, chunk_size)
             
             offset = data.find(pattern)
             if offset != -1:
@@ -17,7 +17,6 @@
 import logging
 import threading
 import sys
-from time import sleep
 
 from .sink import TraceEventSink
 from .events import TraceITMEvent
@@ -25,6 +24,7 @@ from .swo import SWOParser
 from ..coresight.itm import ITM
 from ..coresight.tpiu import TPIU
 from ..core.target import Target
+from ..core import exceptions
 
 LOG = logging.getLogger(__name__)
 
@@ -64,32 +64,46 @@ class SWVEventSink(TraceEventSink):
 
         self._console.write(data)
 
-class SWVReader(threading.Thread):
-    """! @brief Sets up SWV and processes data in a background thread."""
+class SWVReader(object):
+    """! @brief Sets up SWV and processes data with a periodic task.
 
-    def __init__(self, session, core_number=0):
+    SWO data is read from the probe by a task that runs on the executor of the session's Reactor,
+    so the readers for all cores share one thread that serialises their probe accesses. The task
+    is rescheduled by a timer on the reactor after each read.
+    """
+
+    ## Time in seconds between reads of SWO data while the core is running.
+    POLL_INTERVAL = 0.001
+
+    ## Time in seconds between checks of whether the core is running again while it is halted.
+    HALTED_POLL_INTERVAL = 0.05
+
+    def __init__(self, session, core_number=0, run_monitor=None):
         """! @brief Constructor.
         @param self
         @param session The Session instance.
         @param core_number The number of the core being traced. Default is core 0.
+        @param run_monitor Optional RunStateMonitor for the core. If provided, SWO is read less
+            often while the core is halted and no data is pending.
         """
-        super(SWVReader, self).__init__()
-        self.name = "SWVReader"
-        self.daemon = True
         self._session = session
+        self._reactor = session.reactor
         self._core_number = core_number
-        self._shutdown_event = threading.Event()
         self._swo_clock = 0
+        self._run_monitor = run_monitor
+        self._lock = threading.Lock()
+        self._is_running = False
+        self._timer = None
         
         self._session.subscribe(self._reset_handler, Target.EVENT_POST_RESET, self._session.target.cores[core_number])
         
     def init(self, sys_clock, swo_clock, console):
-        """! @brief Configures trace graph and starts thread.
+        """! @brief Configures trace graph and starts reading SWO data.
         
         This method performs all steps required to start up SWV. It first calls the target's
         trace_start() method, which allows for target-specific trace initialization. Then it
         configures the TPIU and ITM modules. A simple trace data processing graph is created that
-        connects an SWVEventSink with a SWOParser. Finally, the reader thread is started.
+        connects an SWVEventSink with a SWOParser. Finally, the reader task is started.
         
         If the debug probe does not support SWO, a warning is printed but nothing else is done.
         
@@ -123,49 +137,70 @@ class SWVReader(threading.Thread):
         self._sink = SWVEventSink(console)
         self._parser.connect(self._sink)
         
-        self.start()
+        self._is_running = True
+        self._reactor.submit(self._start_swo)
     
     def stop(self):
         """! @brief Stops processing SWV data.
         
-        The reader thread is terminated first, then the ITM is disabled. The last step is to call
+        The reader task is stopped first, then the ITM is disabled. The last step is to call
         the target's trace_stop() method.
         
         Does nothing if the init() method did not complete successfully.
         """
-        if not self.is_alive():
-            return
+        with self._lock:
+            if not self._is_running:
+                return
+            self._is_running = False
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
 
-        self._shutdown_event.set()
-        self.join()
+        # Runs after any read already submitted to the executor.
+        self._reactor.submit_and_wait(self._stop_swo)
 
         itm = self._session.target.get_first_child_of_type(ITM)
         itm.disable()
         
         self._session.target.trace_stop()
-    
-    def run(self):
-        """! @brief SWV reader thread routine.
-        
-        Starts the probe receiving SWO data by calling DebugProbe.swo_start(). For as long as the
-        thread runs, it reads SWO data from the probe and passes it to the SWO parser created in
-        init(). When the thread is signaled to stop, it calls DebugProbe.swo_stop() before exiting.
-        """
+
+    def _start_swo(self):
+        """! @brief Start the probe receiving SWO data by calling DebugProbe.swo_start()."""
         # Stop SWO first in case the probe already had it started. Ignore if this fails.
         try:
             self._session.probe.swo_stop()
         except exceptions.ProbeError:
             pass
         self._session.probe.swo_start(self._swo_clock)
-        
-        while not self._shutdown_event.is_set():
-            data = self._session.probe.swo_read()
-            if data:
-                self._parser.parse(data)
-        
-            sleep(0.001)
-            
+        self._read()
+
+    def _stop_swo(self):
         self._session.probe.swo_stop()
+
+    def _read(self):
+        """! @brief Read SWO data from the probe and pass it to the SWO parser created in init().
+
+        Runs on the reactor's executor. Schedules the next read, unless stop() has been called.
+        """
+        if not self._is_running:
+            return
+        try:
+            data = self._session.probe.swo_read()
+        except exceptions.Error as err:
+            LOG.warning("Failed to read SWO data: %s", err)
+            data = None
+        if data:
+            self._parser.parse(data)
+            delay = self.POLL_INTERVAL
+        elif (self._run_monitor is not None) and not self._run_monitor.is_running:
+            # A halted core produces no trace output.
+            delay = self.HALTED_POLL_INTERVAL
+        else:
+            delay = self.POLL_INTERVAL
+
+        with self._lock:
+            if self._is_running:
+                self._timer = self._reactor.call_later(delay, self._reactor.submit, self._read)
     
     def _reset_handler(self, notification):
         """! @brief Reset notification handler.
@@ -173,6 +208,5 @@ class SWVReader(threading.Thread):
         If the target is reset while the SWV reader is running, then the Target::trace_start()
         method is called to reinit trace output.
         """
-        if self.is_alive():
+        if self._is_running:
             self._session.target.trace_start()
-
@@ -46,6 +46,23 @@ def u32le_list_to_byte_list(data):
         res.append((x >> 24) & 0xff)
     return res
 
+def u32le_list_to_bytes(data):
+    """! @brief Convert a word array into a bytearray.
+    
+    The conversion is done with a single struct call, so it is much faster than
+    u32le_list_to_byte_list() for large blocks.
+    """
+    return bytearray(struct.pack('<%dI' % len(data), *data))
+
+def bytes_to_u32le_list(data):
+    """! @brief Convert a bytes-like object to a list of 32-bit integers (little endian).
+    
+    The data may be any object supporting the buffer protocol, such as bytes, bytearray,
+    or memoryview. Its length must be a multiple of 4.
+    """
+    assert (len(data) % 4) == 0
+    return list(struct.unpack_from('<%dI' % (len(data) // 4), data))
+
 def u16le_list_to_byte_list(data):
     """! @brief Convert a halfword array into a byte array"""
     byteData = []
@@ -76,15 +76,23 @@ def msb(n):
         ndx += 1
     return ndx
 
+## Types compared with a single buffer comparison by same().
+_BUFFER_TYPES = (bytes, bytearray, memoryview)
+
 def same(d1, d2):
     """! @brief Test whether two sequences contain the same values.
     
     Unlike a simple equality comparison, this function works as expected when the two sequences
     are of different types, such as a list and bytearray. The sequences must return
     compatible types from indexing.
+    
+    If both sequences are bytes, bytearray, or memoryview objects, they are compared as buffers
+    without iterating in Python.
     """
     if len(d1) != len(d2):
         return False
+    if isinstance(d1, _BUFFER_TYPES) and isinstance(d2, _BUFFER_TYPES):
+        return memoryview(d1) == memoryview(d2)
     for i in range(len(d1)):
         if d1[i] != d2[i]:
             return False
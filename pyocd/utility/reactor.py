@@ -0,0 +1,311 @@
+# pyOCD debugger
+# Copyright (c) 2020 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+import collections
+import heapq
+import itertools
+import logging
+import select
+import socket
+import threading
+from time import time
+from six.moves import queue
+
+LOG = logging.getLogger(__name__)
+
+def _socket_pair():
+    """! @brief Return a pair of connected sockets.
+
+    socket.socketpair() is not available on Windows with Python 2, so a loopback TCP
+    connection is used instead.
+    """
+    if hasattr(socket, 'socketpair'):
+        return socket.socketpair()
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        listener.bind(('127.0.0.1', 0))
+        listener.listen(1)
+        a = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        a.connect(listener.getsockname())
+        b, _ = listener.accept()
+        return a, b
+    finally:
+        listener.close()
+
+class TimerHandle(object):
+    """! @brief Handle for a callback scheduled with Reactor.call_later()."""
+
+    def __init__(self, deadline, callback, args):
+        self.deadline = deadline
+        self._callback = callback
+        self._args = args
+        self.cancelled = False
+
+    def cancel(self):
+        """! @brief Prevent the callback from being called, if it has not been already."""
+        self.cancelled = True
+
+    def _run(self):
+        if not self.cancelled:
+            self._callback(*self._args)
+
+class Reactor(object):
+    """! @brief Event loop that serves the sockets and periodic tasks of a session.
+
+    A single thread waits with select() for any registered socket to become readable, and calls
+    the socket's callback. This replaces a thread per socket that polls with a short timeout.
+    Callbacks can also be scheduled to run on the reactor thread, immediately or after a delay,
+    from any thread.
+
+    Callbacks run on the reactor thread must not block. Work that accesses the debug probe is
+    passed to submit(), which runs it on a single executor thread, so that all such work for the
+    session is serialised without blocking the sockets.
+
+    All methods are thread-safe.
+    """
+
+    def __init__(self, name="reactor"):
+        """! @brief Constructor.
+        @param self
+        @param name Name used for the reactor and executor threads.
+        """
+        self._name = name
+        self._lock = threading.Lock()
+        self._readers = {}
+        self._timers = []
+        self._pending = collections.deque()
+        self._sequence = itertools.count()
+        self._thread = None
+        self._executor = None
+        self._executor_queue = queue.Queue()
+        self._wake_receive, self._wake_send = _socket_pair()
+        self._wake_receive.setblocking(False)
+        self._wake_send.setblocking(False)
+
+    @property
+    def is_running(self):
+        return self._thread is not None
+
+    @property
+    def in_reactor_thread(self):
+        """! @brief Whether the caller is running on the reactor thread."""
+        return threading.current_thread() is self._thread
+
+    def start(self):
+        """! @brief Start the reactor thread."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name=self._name)
+            self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """! @brief Stop the reactor and executor threads.
+
+        Callbacks that have not run yet are discarded. Registered sockets are not closed.
+        """
+        with self._lock:
+            thread, self._thread = self._thread, None
+            executor, self._executor = self._executor, None
+        if thread is not None:
+            self._wake()
+            if thread is not threading.current_thread():
+                thread.join()
+        if executor is not None:
+            self._executor_queue.put(None)
+            if executor is not threading.current_thread():
+                executor.join()
+        self._wake_receive.close()
+        self._wake_send.close()
+
+    def add_reader(self, sock, callback):
+        """! @brief Call a function on the reactor thread whenever a socket is readable.
+        @param self
+        @param sock A socket, or any object with a fileno() method usable with select().
+        @param callback Callable invoked with no parameters. It must read from the socket or
+            remove it, otherwise it is called again immediately.
+        """
+        with self._lock:
+            self._readers[sock.fileno()] = (sock, callback)
+        self._wake()
+
+    def remove_reader(self, sock):
+        """! @brief Stop watching a socket.
+
+        Once this method returns, the socket's callback is no longer running and will not be
+        called again, unless the caller is itself a callback running on the reactor thread.
+        The socket can then be closed.
+        """
+        with self._lock:
+            self._readers.pop(sock.fileno(), None)
+        if self.is_running and not self.in_reactor_thread:
+            self.call_and_wait(lambda: None)
+
+    def call_soon(self, callback, *args):
+        """! @brief Call a function on the reactor thread as soon as possible."""
+        with self._lock:
+            self._pending.append((callback, args))
+        self._wake()
+
+    def call_later(self, delay, callback, *args):
+        """! @brief Call a function on the reactor thread after a delay.
+        @return TimerHandle that can be used to cancel the call.
+        """
+        handle = TimerHandle(time() + delay, callback, args)
+        with self._lock:
+            heapq.heappush(self._timers, (handle.deadline, next(self._sequence), handle))
+        self._wake()
+        return handle
+
+    def call_and_wait(self, callback, *args):
+        """! @brief Call a function on the reactor thread and wait for it to return.
+
+        The function is called directly if the caller is the reactor thread or the reactor is
+        not running.
+
+        @return The function's return value.
+        """
+        if not self.is_running or self.in_reactor_thread:
+            return callback(*args)
+        return self._wait_for_call(self.call_soon, callback, args)
+
+    def submit(self, callback, *args):
+        """! @brief Run a function on the executor thread.
+
+        Functions are run one at a time, in the order they are submitted. Exceptions are logged.
+        """
+        with self._lock:
+            if self._executor is None:
+                self._executor = threading.Thread(target=self._run_executor,
+                                                    name=self._name + "-executor")
+                self._executor.daemon = True
+                self._executor.start()
+        self._executor_queue.put((callback, args))
+
+    def submit_and_wait(self, callback, *args):
+        """! @brief Run a function on the executor thread and wait for it to return.
+
+        Because the executor runs functions in order, this also waits for all functions submitted
+        before it. The function is called directly if the caller is the executor thread or the
+        reactor is not running.
+
+        @return The function's return value.
+        """
+        if not self.is_running or (threading.current_thread() is self._executor):
+            return callback(*args)
+        return self._wait_for_call(self.submit, callback, args)
+
+    def _wait_for_call(self, schedule, callback, args):
+        done = threading.Event()
+        result = []
+        def run():
+            try:
+                result.append(callback(*args))
+            finally:
+                done.set()
+        schedule(run)
+        # Give up if the reactor is stopped before the call runs.
+        while not done.wait(0.1):
+            if not self.is_running:
+                return None
+        return result[0] if result else None
+
+    def _wake(self):
+        try:
+            self._wake_send.send(b'x')
+        except socket.error:
+            # Either the wake socket's buffer is full, so the reactor will wake anyway, or the
+            # reactor has been stopped.
+            pass
+
+    def _drain_wake(self):
+        try:
+            while self._wake_receive.recv(4096):
+                pass
+        except socket.error:
+            pass
+
+    def _run(self):
+        LOG.debug("%s started", self._name)
+        while True:
+            with self._lock:
+                if self._thread is not threading.current_thread():
+                    break
+                readers = dict(self._readers)
+                if self._pending:
+                    timeout = 0
+                elif self._timers:
+                    timeout = max(0, self._timers[0][0] - time())
+                else:
+                    timeout = None
+
+            try:
+                readable, _, _ = select.select([self._wake_receive] + list(readers.keys()),
+                                                [], [], timeout)
+            except (select.error, socket.error, ValueError) as err:
+                # A socket was closed without being removed first.
+                LOG.debug("%s: select failed: %s", self._name, err)
+                with self._lock:
+                    for fileno in list(self._readers.keys()):
+                        if self._readers[fileno][0].fileno() != fileno:
+                            del self._readers[fileno]
+                continue
+
+            if self._wake_receive in readable:
+                self._drain_wake()
+
+            # Run calls from other threads.
+            while True:
+                with self._lock:
+                    if not self._pending:
+                        break
+                    callback, args = self._pending.popleft()
+                self._call(callback, args)
+
+            # Run timers that are due.
+            now = time()
+            while True:
+                with self._lock:
+                    if not self._timers or self._timers[0][0] > now:
+                        break
+                    handle = heapq.heappop(self._timers)[2]
+                self._call(handle._run, ())
+
+            # Call readers that are still registered.
+            for fileno in readable:
+                if fileno is self._wake_receive:
+                    continue
+                with self._lock:
+                    entry = self._readers.get(fileno)
+                if entry is not None:
+                    self._call(entry[1], ())
+        LOG.debug("%s stopped", self._name)
+
+    def _run_executor(self):
+        while True:
+            item = self._executor_queue.get()
+            if item is None:
+                break
+            self._call(*item)
+
+    def _call(self, callback, args):
+        try:
+            callback(*args)
+        except Exception as err:
+            LOG.error("%s: unexpected exception from %s: %s", self._name, callback, err,
+                    exc_info=True)
@@ -19,20 +19,21 @@ import logging
 import threading
 import socket
 from .sockets import ListenerSocket
+from .reactor import Reactor
 from .compatibility import to_bytes_safe
 
 LOG = logging.getLogger(__name__)
 
-class StreamServer(threading.Thread):
+class StreamServer(object):
     """! @brief File-like object that serves data over a TCP socket.
     
     The user can connect to the socket with telnet or netcat.
     
-    The server thread will automatically be started by the constructor. To shut down the
-    server and its thread, call the stop() method.
+    The listener and client sockets are served by a Reactor, so the server has no thread of its
+    own. The server is started by the constructor. To shut it down, call the stop() method.
     """
     
-    def __init__(self, port, serve_local_only=True, name=None, is_read_only=True):
+    def __init__(self, port, serve_local_only=True, name=None, is_read_only=True, reactor=None):
         """! @brief Constructor.
         
         Starts the server immediately.
@@ -46,8 +47,9 @@ class StreamServer(threading.Thread):
         @param is_read_only If the server is read-only, from the perspective of the client,
             then any incoming data sent by the client is discarded. Otherwise it is buffered so
             it can be read with the read() methods.
+        @param reactor Optional Reactor that serves the sockets, usually the session's reactor.
+            If not provided, the server creates and starts a reactor of its own.
         """
-        super(StreamServer, self).__init__()
         self.name = name
         self._name = name
         self._formatted_name = (name + " ") if (name is not None) else ""
@@ -61,57 +63,65 @@ class StreamServer(threading.Thread):
         self._buffer = bytearray()
         self._buffer_lock = threading.Lock()
         self.connected = None
-        self._shutdown_event = threading.Event()
-        self.daemon = True
-        self.start()
+        self._owns_reactor = reactor is None
+        if self._owns_reactor:
+            reactor = Reactor("%sserver" % self._formatted_name)
+            reactor.start()
+        self._reactor = reactor
+        self._reactor.add_reader(self._abstract_socket.listener, self._accept)
+        LOG.info("%sserver started on port %d", self._formatted_name, self._port)
     
     @property
     def port(self):
         return self._port
 
     def stop(self):
-        self._shutdown_event.set()
-        self.join()
+        self._reactor.call_and_wait(self._stop_serving)
+        self._abstract_socket.cleanup()
+        if self._owns_reactor:
+            self._reactor.stop()
+        LOG.info("%sserver stopped", self._formatted_name)
 
-    def run(self):
-        LOG.info("%sserver started on port %d", self._formatted_name, self._port)
-        self.connected = None
+    def _stop_serving(self):
+        self._reactor.remove_reader(self._abstract_socket.listener)
+        if self.connected is not None:
+            self._reactor.remove_reader(self.connected)
+            self.connected = None
+
+    def _accept(self):
+        """! @brief Reactor callback for a client connecting."""
+        conn = self._abstract_socket.accept()
+        if conn is None:
+            return
+        LOG.debug("%sclient connected", self._formatted_name)
+        # TODO support multiple client connections
+        self._reactor.remove_reader(self._abstract_socket.listener)
+        self.connected = conn
+        self._reactor.add_reader(conn, self._read)
+
+    def _read(self):
+        """! @brief Reactor callback for data from the client.
+
+        The incoming data is appended to our read buffer. When the client disconnects, the
+        server waits for a new connection.
+        """
         try:
-            while not self._shutdown_event.is_set():
-                # Wait for a client to connect.
-                # TODO support multiple client connections
-                while not self._shutdown_event.is_set():
-                    self.connected = self._abstract_socket.connect()
-                    if self.connected is not None:
-                        LOG.debug("%sclient connected", self._formatted_name)
-                        break
-
-                if self._shutdown_event.is_set():
-                    break
-
-                # Set timeout on new connection.
-                self._abstract_socket.set_timeout(0.1)
-
-                # Keep reading from the client until we either get a shutdown event, or
-                # the client disconnects. The incoming data is appended to our read buffer.
-                while not self._shutdown_event.is_set():
-                    try:
-                        data = self._abstract_socket.read()
-                        if len(data) == 0:
-                            # Client disconnected.
-                            self._abstract_socket.close()
-                            self.connected = None
-                            break
-
-                        if not self._is_read_only:
-                            self._buffer_lock.acquire()
-                            self._buffer += bytearray(data)
-                            self._buffer_lock.release()
-                    except socket.timeout:
-                        pass
-        finally:
-            self._abstract_socket.cleanup()
-        LOG.info("%sserver stopped", self._formatted_name)
+            data = self._abstract_socket.read()
+        except socket.error:
+            data = b''
+
+        if len(data) == 0:
+            # Client disconnected.
+            LOG.debug("%sclient disconnected", self._formatted_name)
+            self._reactor.remove_reader(self.connected)
+            self._abstract_socket.close()
+            self.connected = None
+            self._reactor.add_reader(self._abstract_socket.listener, self._accept)
+            return
+
+        if not self._is_read_only:
+            with self._buffer_lock:
+                self._buffer += bytearray(data)
 
     def write(self, data):
         """! @brief Write bytes into the connection."""
@@ -49,6 +49,20 @@ class ListenerSocket(object):
 
         return self.conn
 
+    def accept(self):
+        """! @brief Accept a pending connection.
+
+        Call this when the listener socket is readable, so it does not block.
+
+        @return The connected socket, or None if the connection could not be accepted.
+        """
+        self.conn = None
+        try:
+            self.conn, _ = self.listener.accept()
+        except socket.error:
+            pass
+        return self.conn
+
     def read(self, packet_size=None):
         if packet_size is None:
             packet_size = self.packet_size
@@ -14,7 +14,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from time import time
+from time import (time, sleep)
 
 class Timeout(object):
     """! @brief Timeout helper context manager.
@@ -73,3 +73,107 @@ class Timeout(object):
         self.check()
         return self._timed_out
 
+
+class PollBackoff(object):
+    """! @brief Adaptive polling interval for waiting on a condition in the target.
+    
+    Polling the target at full speed for the completion of a long operation burns a host CPU core
+    and USB bandwidth. This class spaces out the polls instead. The interval starts at
+    `min_interval` and doubles after every poll, capped at 1/8 of the expected duration of the
+    operation (or of the time elapsed so far, whichever is greater) and at `max_interval`. So the
+    condition is still detected shortly after it becomes true, with only a handful of polls.
+    
+    An optional timeout sets a deadline for the wait, measured from `start_time`. If an event is
+    provided, waits return early when it is set, for instance when the user asks to interrupt.
+    
+    @code
+    backoff = PollBackoff(expected_time=0.1, timeout=5)
+    while not operation_is_done():
+        if not backoff.wait():
+            print("Timed out!")
+            break
+    @endcode
+    """
+
+    ## Default shortest time between polls in seconds.
+    MIN_INTERVAL = 0.0002
+
+    ## Default longest time between polls in seconds.
+    MAX_INTERVAL = 0.1
+
+    def __init__(self, expected_time=None, timeout=None, min_interval=MIN_INTERVAL,
+            max_interval=MAX_INTERVAL, event=None, start_time=None):
+        """! @brief Constructor.
+        @param self
+        @param expected_time Estimated duration of the operation in seconds, or None if unknown.
+        @param timeout Maximum time to wait in seconds, or None to wait forever.
+        @param min_interval Shortest time between polls.
+        @param max_interval Longest time between polls.
+        @param event Optional threading.Event that ends the wait early when set.
+        @param start_time Time at which the operation started, as returned by time(). Defaults
+            to the current time.
+        """
+        self._expected_time = expected_time or 0
+        self._timeout = timeout
+        self._min_interval = min_interval
+        self._max_interval = max(min_interval, max_interval)
+        self._event = event
+        self._start = time() if (start_time is None) else start_time
+        self._interval = min_interval
+        self._timed_out = False
+
+    @property
+    def elapsed(self):
+        """! @brief Seconds since the start of the operation."""
+        return time() - self._start
+
+    @property
+    def did_time_out(self):
+        """! @brief Whether the deadline has passed."""
+        if (self._timeout is not None) and (self.elapsed > self._timeout):
+            self._timed_out = True
+        return self._timed_out
+
+    def reset(self):
+        """! @brief Restart the backoff from the minimum interval.
+        
+        The start time and deadline are not changed.
+        """
+        self._interval = self._min_interval
+
+    def wait(self):
+        """! @brief Sleep until the next poll should be made.
+        @return False if the deadline passed or the event is set, True to poll again.
+        """
+        elapsed = self.elapsed
+        if (self._timeout is not None) and (elapsed > self._timeout):
+            self._timed_out = True
+            return False
+
+        cap = min(self._max_interval, max(self._min_interval,
+                max(self._expected_time, elapsed) / 8.0))
+        delay = min(self._interval, cap)
+        if self._timeout is not None:
+            delay = min(delay, max(0, self._timeout - elapsed))
+        self._interval = min(self._interval * 2, cap)
+
+        if self._event is not None:
+            if self._event.wait(delay):
+                return False
+        else:
+            sleep(delay)
+        return True
+
+def wait_for(predicate, expected_time=None, timeout=None, **kwargs):
+    """! @brief Poll a predicate with adaptive backoff until it returns True.
+    
+    Additional keyword arguments are passed to PollBackoff.
+    
+    @return Boolean of whether the predicate became True before the deadline, or before the event
+        was set.
+    """
+    backoff = PollBackoff(expected_time, timeout, **kwargs)
+    while not predicate():
+        if not backoff.wait():
+            return predicate()
+    return True
@@ -0,0 +1,99 @@
+# pyOCD debugger
+# Copyright (c) 2020 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from __future__ import print_function
+
+import os, sys
+from time import time
+from random import randrange
+import argparse
+import logging
+
+parentdir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, parentdir)
+
+from pyocd.core.helpers import ConnectHelper
+from pyocd.probe.pydapaccess import DAPAccess
+from pyocd.probe.pydapaccess.dap_settings import DAPSettings
+from pyocd.core.memory_map import MemoryType
+from test_util import (get_session_options, get_target_test_params)
+
+## @brief Number of bytes transferred for each measurement.
+DEFAULT_TEST_SIZE = 64 * 1024
+
+def measure(unique_id, packet_count, pipelined, test_size):
+    """! @brief Measure RAM write and read throughput for one probe configuration.
+
+    @return Tuple of the actual packet count, write speed and read speed in bytes per second.
+    """
+    DAPSettings.max_packet_count = packet_count
+    DAPSettings.pipeline_transfers = pipelined
+    with ConnectHelper.session_with_chosen_probe(unique_id=unique_id, **get_session_options()) as session:
+        target = session.board.target
+        session.probe.set_clock(get_target_test_params(session)['test_clock'])
+        actual_packet_count = session.probe._link._packet_count
+
+        ram_region = target.get_memory_map().get_first_region_of_type(MemoryType.RAM)
+        test_size = min(test_size, ram_region.length) & ~3
+        data = [randrange(0, 0x100000000) for _ in range(test_size // 4)]
+
+        start = time()
+        target.write_memory_block32(ram_region.start, data)
+        target.flush()
+        write_speed = test_size / (time() - start)
+
+        start = time()
+        block = target.read_memory_block32(ram_region.start, test_size // 4)
+        read_speed = test_size / (time() - start)
+
+        if block != data:
+            raise RuntimeError("data read back does not match (packet count %d, %s)"
+                    % (actual_packet_count, "pipelined" if pipelined else "serial"))
+
+        return actual_packet_count, write_speed, read_speed
+
+def dap_pipeline_benchmark(unique_id, test_size=DEFAULT_TEST_SIZE, max_packet_count=8):
+    """! @brief Report throughput against the number of CMSIS-DAP packets in flight."""
+    format_str = "{:>10}{:>12}{:>18}{:>18}"
+    print("\n------ CMSIS-DAP packets in flight vs. throughput (%d bytes) ------" % test_size)
+    print(format_str.format("Packets", "Mode", "RAM Write Speed", "RAM Read Speed"))
+
+    packet_count = 1
+    last_count = None
+    while packet_count <= max_packet_count:
+        for pipelined in (False, True):
+            actual_count, write_speed, read_speed = measure(unique_id, packet_count, pipelined, test_size)
+            # Stop once the limit exceeds what the probe supports.
+            if (last_count is not None) and (actual_count == last_count) and not pipelined:
+                return
+            print(format_str.format(actual_count, "pipelined" if pipelined else "serial",
+                    "%.3f KB/s" % (write_speed / 1000.0), "%.3f KB/s" % (read_speed / 1000.0)))
+        last_count = actual_count
+        packet_count *= 2
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='pyOCD CMSIS-DAP pipelining benchmark')
+    parser.add_argument('-u', '--uid', help="Unique ID of the probe to use.")
+    parser.add_argument('-s', '--size', type=int, default=DEFAULT_TEST_SIZE,
+            help="Number of bytes to transfer for each measurement.")
+    parser.add_argument('-m', '--max-packets', type=int, default=8,
+            help="Largest packet count to measure.")
+    parser.add_argument('-d', '--debug', action="store_true", help='Enable debug logging')
+    parser.add_argument("-da", "--daparg", dest="daparg", nargs='+', help="Send setting to DAPAccess layer.")
+    args = parser.parse_args()
+    level = logging.DEBUG if args.debug else logging.INFO
+    logging.basicConfig(level=level)
+    DAPAccess.set_args(args.daparg)
+    dap_pipeline_benchmark(args.uid, args.size, args.max_packets)
@@ -0,0 +1,63 @@
+# pyOCD debugger
+# Copyright (c) 2020 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from __future__ import print_function
+
+import os, sys
+from time import time
+from random import Random
+import argparse
+
+parentdir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, parentdir)
+
+from pyocd.gdbserver.codec import (checksum, escape, unescape)
+
+## @brief Default size in bytes of the data passed to each function.
+DEFAULT_TEST_SIZE = 4 * 1024 * 1024
+
+def measure(fn, data, repeat):
+    """! @brief Return the best throughput in bytes per second of calling fn on data."""
+    best = None
+    for _ in range(repeat):
+        start = time()
+        fn(data)
+        elapsed = time() - start
+        if (best is None) or (elapsed < best):
+            best = elapsed
+    return len(data) / max(best, 1e-9)
+
+def gdb_codec_benchmark(test_size=DEFAULT_TEST_SIZE, repeat=5):
+    """! @brief Report throughput of the RSP payload encoding functions."""
+    rng = Random(0)
+    data = bytes(bytearray(rng.randrange(256) for _ in range(test_size)))
+    escaped = escape(data)
+
+    print("\n------ GDB RSP codec throughput (%d bytes, %d escaped) ------" % (len(data), len(escaped)))
+    format_str = "{:>10}{:>16}"
+    print(format_str.format("Function", "Throughput"))
+    for name, fn, arg in (("escape", escape, data),
+                          ("unescape", unescape, escaped),
+                          ("checksum", checksum, escaped)):
+        print(format_str.format(name, "%.3f MB/s" % (measure(fn, arg, repeat) / 1e6)))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='pyOCD GDB RSP codec benchmark')
+    parser.add_argument('-s', '--size', type=int, default=DEFAULT_TEST_SIZE,
+            help="Number of bytes of random data to encode.")
+    parser.add_argument('-r', '--repeat', type=int, default=5,
+            help="Number of times to repeat each measurement.")
+    args = parser.parse_args()
+    gdb_codec_benchmark(args.size, args.repeat)
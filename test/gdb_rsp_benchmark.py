@@ -0,0 +1,118 @@
+# pyOCD debugger
+# Copyright (c) 2020 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from __future__ import print_function
+
+import os, sys
+from time import time
+from random import (Random)
+import argparse
+import logging
+import socket
+import threading
+
+parentdir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, parentdir)
+
+from pyocd.gdbserver.gdbserver import (GDBServerPacketIO, checksum, escape)
+from pyocd.utility.reactor import Reactor
+
+## @brief Default number of bytes of flash data in the synthetic load session.
+DEFAULT_TEST_SIZE = 1024 * 1024
+
+## @brief Bytes of binary data in each vFlashWrite packet.
+PACKET_DATA_SIZE = 0x3f00
+
+class SocketPairAdapter(object):
+    """! @brief Presents one end of a socket pair with the interface of GDBServer's socket."""
+
+    def __init__(self, sock):
+        self._sock = sock
+        self.conn = sock
+        self.port = 0
+
+    def set_timeout(self, timeout):
+        self._sock.settimeout(timeout)
+
+    def read(self, size=4096):
+        return self._sock.recv(size)
+
+    def write(self, data):
+        return self._sock.send(data)
+
+def frame(data):
+    return b'$' + data + b'#' + checksum(data)
+
+def build_load_session(test_size, seed=0):
+    """! @brief Build the packets gdb sends for a `load` command of random data.
+    @return List of framed packets and the total number of bytes in them.
+    """
+    rng = Random(seed)
+    packets = [frame(b'vFlashErase:00000000,%08x' % test_size)]
+    for addr in range(0, test_size, PACKET_DATA_SIZE):
+        size = min(PACKET_DATA_SIZE, test_size - addr)
+        data = bytes(bytearray(rng.randrange(256) for _ in range(size)))
+        packets.append(frame(b'vFlashWrite:%x:' % addr + escape(data)))
+    packets.append(frame(b'vFlashDone'))
+    return packets, sum(len(p) for p in packets)
+
+def gdb_rsp_benchmark(test_size=DEFAULT_TEST_SIZE, chunk_size=65536):
+    """! @brief Measure packet receive throughput of the GDB server packet I/O thread."""
+    packets, total_bytes = build_load_session(test_size)
+    print("\n------ GDB RSP receive throughput (%d packets, %d bytes) ------"
+            % (len(packets), total_bytes))
+    stream = b''.join(packets)
+
+    server_sock, client_sock = socket.socketpair()
+    reactor = Reactor()
+    reactor.start()
+    io = GDBServerPacketIO(SocketPairAdapter(server_sock), reactor)
+    # Same as after QStartNoAckMode, as gdb uses for loading.
+    io.send_acks = False
+
+    def sender():
+        for i in range(0, len(stream), chunk_size):
+            client_sock.sendall(stream[i:i + chunk_size])
+
+    start = time()
+    send_thread = threading.Thread(target=sender)
+    send_thread.daemon = True
+    send_thread.start()
+    for expected in packets:
+        packet = io.receive()
+        if packet != expected:
+            raise RuntimeError("received packet does not match the one sent")
+    elapsed = time() - start
+
+    send_thread.join()
+    io.stop()
+    reactor.stop()
+    client_sock.close()
+    server_sock.close()
+
+    print("Received in %.3f s: %.3f MB/s, %.0f packets/s" % (elapsed,
+            total_bytes / elapsed / 1e6, len(packets) / elapsed))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='pyOCD GDB RSP framing benchmark')
+    parser.add_argument('-s', '--size', type=int, default=DEFAULT_TEST_SIZE,
+            help="Number of bytes of flash data to send.")
+    parser.add_argument('-c', '--chunk-size', type=int, default=65536,
+            help="Number of bytes written to the socket at a time.")
+    parser.add_argument('-d', '--debug', action="store_true", help='Enable debug logging')
+    args = parser.parse_args()
+    level = logging.DEBUG if args.debug else logging.INFO
+    logging.basicConfig(level=level)
+    gdb_rsp_benchmark(args.size, args.chunk_size)
@@ -0,0 +1,82 @@
+# pyOCD debugger
+# Copyright (c) 2020 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from __future__ import print_function
+
+import os, sys
+from time import time
+import argparse
+import logging
+
+parentdir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, parentdir)
+
+from pyocd.core.helpers import ConnectHelper
+from pyocd.gdbserver.context_facade import GDBDebugContextFacade
+from pyocd.gdbserver.gdbserver import GDBServer
+from test_util import (get_session_options, get_target_test_params)
+
+## @brief Default number of steps for each measurement.
+DEFAULT_STEP_COUNT = 100
+
+def gdb_requests(facade, context):
+    """! @brief Make the requests gdb typically sends after each single step."""
+    facade.get_t_response()
+    facade.get_register_context()
+    sp = context.read_core_register('sp')
+    pc = context.read_core_register('pc') & ~1
+    context.read_memory_bytes(sp, 64)
+    context.read_memory_bytes(pc, 4)
+    context.read_memory_bytes(pc - 4, 4)
+
+def measure(target, step_count, prefetch, stack_size):
+    """! @brief Return the average time in seconds of a step followed by gdb's requests."""
+    context = target.get_target_context()
+    facade = GDBDebugContextFacade(context)
+    reg_list = [reg.reg_num for reg in facade.register_list]
+
+    target.reset_and_halt()
+    start = time()
+    for _ in range(step_count):
+        target.step()
+        if prefetch:
+            context.prefetch(reg_list, stack_size, GDBServer.CODE_PREFETCH_SIZE)
+        gdb_requests(facade, context)
+    return (time() - start) / step_count
+
+def step_latency_benchmark(unique_id, step_count=DEFAULT_STEP_COUNT, stack_size=256):
+    """! @brief Report the latency of single steps with and without halt prefetch."""
+    with ConnectHelper.session_with_chosen_probe(unique_id=unique_id, **get_session_options()) as session:
+        target = session.board.target
+        session.probe.set_clock(get_target_test_params(session)['test_clock'])
+
+        print("\n------ Single step latency (%d steps) ------" % step_count)
+        for prefetch in (False, True):
+            latency = measure(target, step_count, prefetch, stack_size)
+            print("%-12s %.3f ms per step" % ("prefetch" if prefetch else "no prefetch",
+                    latency * 1000))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='pyOCD single step latency benchmark')
+    parser.add_argument('-u', '--uid', help="Unique ID of the probe to use.")
+    parser.add_argument('-n', '--steps', type=int, default=DEFAULT_STEP_COUNT,
+            help="Number of steps to measure.")
+    parser.add_argument('-s', '--stack-size', type=int, default=256,
+            help="Number of stack bytes to prefetch.")
+    parser.add_argument('-d', '--debug', action="store_true", help='Enable debug logging')
+    args = parser.parse_args()
+    level = logging.DEBUG if args.debug else logging.INFO
+    logging.basicConfig(level=level)
+    step_latency_benchmark(args.uid, args.steps, args.stack_size)
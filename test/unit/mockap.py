@@ -0,0 +1,170 @@
+# pyOCD debugger
+# Copyright (c) 2020 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import struct
+
+from pyocd.coresight.ap import (
+    MEM_AP_CSW,
+    MEM_AP_TAR,
+    MEM_AP_DRW,
+    MEM_AP_BD0,
+    MEM_AP_BD3,
+    CSW_ADDRINC,
+    CSW_SADDRINC,
+    CSW_SIZE,
+    )
+
+DHCSR = 0xE000EDF0
+DCRSR = 0xE000EDF4
+DCRDR = 0xE000EDF8
+S_REGRDY = (1 << 16)
+DCRSR_REGWnR = (1 << 16)
+
+class MockDebugCoreRegisters(object):
+    """! @brief Simulates the DHCSR, DCRSR and DCRDR registers of a halted Cortex-M core.
+    
+    Setting @a not_ready_reads to a nonzero value makes that many DHCSR reads following each
+    DCRSR write report S_REGRDY clear, as for a core register transfer that is slow to complete.
+    """
+
+    def __init__(self):
+        self.regs = {}
+        self.dcrdr = 0
+        self.not_ready_reads = 0
+        self._busy = 0
+        self.transfers = 0
+
+    def read(self, addr):
+        if addr == DHCSR:
+            if self._busy:
+                self._busy -= 1
+                return 0
+            return S_REGRDY
+        elif addr == DCRDR:
+            return self.dcrdr
+        return 0
+
+    def write(self, addr, value):
+        if addr == DCRSR:
+            self.transfers += 1
+            self._busy = self.not_ready_reads
+            reg = value & 0xffff
+            if value & DCRSR_REGWnR:
+                self.regs[reg] = self.dcrdr
+            else:
+                self.dcrdr = self.regs.get(reg, 0)
+        elif addr == DCRDR:
+            self.dcrdr = value
+
+class MockMemAPLink(object):
+    """! @brief Simulates the CSW, TAR, DRW and banked data registers of a MEM-AP.
+    
+    The MEM-AP is in front of a small RAM at address 0, plus the debug core registers.
+    Every AP register access is logged as a tuple of ('r' or 'w', register, count), and every DP
+    register access as ('r' or 'w', 'dp', address).
+    """
+
+    def __init__(self, size=0x800):
+        self.mem = bytearray(size)
+        self.core = MockDebugCoreRegisters()
+        self.csw = 0
+        self.tar = 0
+        self.log = []
+        ## Error raised by the next block read, if not None.
+        self.read_error = None
+        self.flush_count = 0
+
+    def get_memory_interface_for_ap(self, apsel):
+        return None
+
+    def _read_word(self, addr):
+        if addr >= DHCSR:
+            return self.core.read(addr)
+        return struct.unpack_from("<I", self.mem, addr)[0]
+
+    def _write_word(self, addr, value, lane, size):
+        if addr >= DHCSR:
+            self.core.write(addr, value)
+            return
+        data = bytearray(struct.pack("<I", value))
+        self.mem[addr + lane:addr + lane + size] = data[lane:lane + size]
+
+    def _drw(self, value=None):
+        size = 1 << (self.csw & CSW_SIZE)
+        if value is None:
+            result = self._read_word(self.tar & ~3)
+        else:
+            self._write_word(self.tar & ~3, value, self.tar & 3, size)
+            result = None
+        if (self.csw & CSW_ADDRINC) == CSW_SADDRINC:
+            # Auto-increment only operates on the bottom 10 bits of TAR.
+            self.tar = (self.tar & ~0x3ff) | ((self.tar + size) & 0x3ff)
+        return result
+
+    def read_dp(self, addr, now=True):
+        self.log.append(('r', 'dp', addr))
+        return 0 if now else (lambda: 0)
+
+    def write_dp(self, addr, data):
+        self.log.append(('w', 'dp', addr))
+
+    def read_ap(self, addr, now=True):
+        reg = addr & 0xfc
+        self.log.append(('r', reg, 1))
+        if reg == MEM_AP_DRW:
+            result = self._drw()
+        elif MEM_AP_BD0 <= reg <= MEM_AP_BD3:
+            result = self._read_word((self.tar & ~0xf) + (reg - MEM_AP_BD0))
+        elif reg == MEM_AP_CSW:
+            result = self.csw
+        elif reg == MEM_AP_TAR:
+            result = self.tar
+        else:
+            result = 0
+        return result if now else (lambda: result)
+
+    def write_ap(self, addr, data):
+        reg = addr & 0xfc
+        self.log.append(('w', reg, 1))
+        if reg == MEM_AP_DRW:
+            self._drw(data)
+        elif MEM_AP_BD0 <= reg <= MEM_AP_BD3:
+            self._write_word((self.tar & ~0xf) + (reg - MEM_AP_BD0), data, 0, 4)
+        elif reg == MEM_AP_CSW:
+            self.csw = data
+        elif reg == MEM_AP_TAR:
+            self.tar = data
+
+    def read_ap_multiple(self, addr, count=1, now=True):
+        assert (addr & 0xfc) == MEM_AP_DRW
+        if self.read_error is not None:
+            error, self.read_error = self.read_error, None
+            raise error
+        self.log.append(('r', MEM_AP_DRW, count))
+        result = [self._drw() for _ in range(count)]
+        return result if now else (lambda: result)
+
+    def write_ap_multiple(self, addr, values):
+        assert (addr & 0xfc) == MEM_AP_DRW
+        self.log.append(('w', MEM_AP_DRW, len(values)))
+        for v in values:
+            self._drw(v)
+
+    def flush(self):
+        self.flush_count += 1
+
+    def count(self, op, reg):
+        return len([x for x in self.log if x[0] == op and x[1] == reg])
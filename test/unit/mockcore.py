@@ -109,6 +109,9 @@ class MockCore(CoreSightCoreComponent):
     def read_memory_block32(self, addr, size):
         return conversion.byte_list_to_u32le_list(self.read_memory_block8(addr, size*4))
 
+    def read_memory_bytes(self, addr, size):
+        return bytearray(self.read_memory_block8(addr, size))
+
     def write_memory(self, addr, value, transfer_size=32):
         return True
 
@@ -123,4 +126,7 @@ class MockCore(CoreSightCoreComponent):
     def write_memory_block32(self, addr, data):
         return self.write_memory_block8(addr, conversion.u32le_list_to_byte_list(data))
 
+    def write_memory_bytes(self, addr, value):
+        return self.write_memory_block8(addr, value)
+
 
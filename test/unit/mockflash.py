@@ -0,0 +1,107 @@
+# pyOCD debugger
+# Copyright (c) 2020 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from binascii import crc32
+
+from pyocd.core.memory_map import FlashRegion
+from pyocd.flash.flash import Flash
+
+PAGE_SIZE = 0x100
+SECTOR_SIZE = 0x400
+FLASH_SIZE = 0x2000
+
+class MockSession(object):
+    def notify(self, *args, **kwargs):
+        pass
+
+class MockTarget(object):
+    def __init__(self, memory):
+        self.session = MockSession()
+        self.memory = memory
+        self.reads = []
+        self.reset_count = 0
+
+    def read_memory_bytes(self, addr, size):
+        self.reads.append((addr, size))
+        return bytearray(self.memory[addr:addr + size])
+
+    def reset_and_halt(self, reset_type=None):
+        self.reset_count += 1
+
+class MockFlash(Flash):
+    """! @brief Flash with simulated algo entry points that records the operations performed."""
+
+    def __init__(self, page_buffer_count):
+        self.memory = bytearray([0xff] * FLASH_SIZE)
+        self.buffers = {}
+        self.log = []
+        self.running = None
+        algo = {
+            'load_address': 0x20000000,
+            'instructions': [0] * 16,
+            'pc_init': 0x20000001,
+            'pc_unInit': 0x20000005,
+            'pc_eraseAll': 0x20000009,
+            'pc_erase_sector': 0x2000000d,
+            'pc_program_page': 0x20000011,
+            'begin_stack': 0x20001000,
+            'begin_data': 0x20002000,
+            'page_buffers': [0x20002000 + n * PAGE_SIZE for n in range(page_buffer_count)],
+            'static_base': 0x20000040,
+            'analyzer_supported': False,
+            }
+        super(MockFlash, self).__init__(MockTarget(self.memory), algo)
+        self.region = FlashRegion(start=0, length=FLASH_SIZE, blocksize=SECTOR_SIZE,
+                                    page_size=PAGE_SIZE)
+        self.region.flash = self
+
+    def init(self, operation, address=None, clock=0, reset=True):
+        self.log.append(('init', operation))
+        self._active_operation = operation
+
+    def uninit(self):
+        self.log.append(('uninit',))
+        self._active_operation = None
+
+    def cleanup(self):
+        self.uninit()
+        self.log.append(('cleanup',))
+
+    def erase_all(self):
+        self.log.append(('erase_all',))
+        self.memory[:] = bytearray([0xff] * FLASH_SIZE)
+
+    def erase_sector(self, address):
+        self.log.append(('erase_sector', address))
+        self.memory[address:address + SECTOR_SIZE] = bytearray([0xff] * SECTOR_SIZE)
+
+    def load_page_buffer(self, buffer_number, address, bytes):
+        assert self.running != buffer_number, "buffer overwritten while in use"
+        self.log.append(('load', buffer_number, address))
+        self.buffers[buffer_number] = bytearray(bytes)
+
+    def start_program_page_with_buffer(self, buffer_number, address):
+        self.log.append(('start', buffer_number, address))
+        self.running = buffer_number
+        self.memory[address:address + PAGE_SIZE] = self.buffers[buffer_number]
+
+    def compute_crcs(self, sectors):
+        return [crc32(self.memory[addr:addr + size]) & 0xffffffff for addr, size in sectors]
+
+    def wait_for_completion(self, timeout=None):
+        self.log.append(('wait',))
+        self.running = None
+        return 0
@@ -0,0 +1,194 @@
+# pyOCD debugger
+# Copyright (c) 2020 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import pytest
+
+from pyocd.core.target import Target
+from pyocd.debug.context import DebugContext
+from pyocd.gdbserver.agent_expression import (AgentExpression, AgentExpressionError)
+from pyocd.gdbserver.gdbserver import GDBServer
+from .mockcore import MockCore
+
+class RegisterInfo(object):
+    def __init__(self, reg_num):
+        self.reg_num = reg_num
+
+## gdb register numbers map directly to core register numbers for r0-r15.
+REGISTER_LIST = [RegisterInfo(i) for i in range(16)]
+
+@pytest.fixture
+def context():
+    return DebugContext(MockCore())
+
+def evaluate(context, code):
+    return AgentExpression(bytearray(code)).evaluate(context, REGISTER_LIST)
+
+class TestAgentExpression:
+    def test_from_packet(self):
+        expr = AgentExpression.from_packet(b'X3,220527')
+        assert expr.code == b'\x22\x05\x27'
+
+    @pytest.mark.parametrize("data", [b'X4,220527', b'3,220527', b'X3,22052', b'X3'])
+    def test_from_packet_invalid(self, data):
+        with pytest.raises(AgentExpressionError):
+            AgentExpression.from_packet(data)
+
+    def test_arithmetic(self, context):
+        # (7 - 9) * 3 == -6
+        assert evaluate(context, [0x22, 7, 0x22, 9, 0x03, 0x22, 3, 0x04, 0x27]) \
+                == (-6 & ((1 << 64) - 1))
+
+    def test_signed_ops(self, context):
+        # -7 / 2 truncates toward zero.
+        code = [0x22, 0xf9, 0x16, 8, 0x22, 2, 0x05, 0x16, 64, 0x27]
+        assert evaluate(context, code) == (-3 & ((1 << 64) - 1))
+        # -1 < 1 signed, but not unsigned.
+        assert evaluate(context, [0x22, 0xff, 0x16, 8, 0x22, 1, 0x14, 0x27]) == 1
+        assert evaluate(context, [0x22, 0xff, 0x16, 8, 0x22, 1, 0x15, 0x27]) == 0
+
+    def test_register(self, context):
+        context.write_core_register_raw(3, 0x1234)
+        # r3 == 0x1234
+        assert evaluate(context, [0x26, 0, 3, 0x23, 0x12, 0x34, 0x13, 0x27]) == 1
+        with pytest.raises(AgentExpressionError):
+            evaluate(context, [0x26, 0, 99, 0x27])
+
+    def test_memory(self, context):
+        context.core.ram[0:4] = b'\x78\x56\x34\x12'
+        assert evaluate(context, [0x24, 0x20, 0, 0, 0, 0x19, 0x27]) == 0x12345678
+        assert evaluate(context, [0x24, 0x20, 0, 0, 1, 0x18, 0x27]) == 0x3456
+        assert evaluate(context, [0x24, 0x20, 0, 0, 3, 0x17, 0x27]) == 0x12
+
+    def test_branches(self, context):
+        # if (1) push 5 else push 6
+        code = [0x22, 1, 0x20, 0, 10, 0x22, 6, 0x21, 0, 12, 0x22, 5, 0x27]
+        assert evaluate(context, code) == 5
+        code[1] = 0
+        assert evaluate(context, code) == 6
+
+    def test_stack_ops(self, context):
+        # 1 2 3 rot -> 2 3 1; swap -> 2 1 3; pick 2 -> 2 1 3 2; sub -> 2 1 1
+        code = [0x22, 1, 0x22, 2, 0x22, 3, 0x33, 0x2b, 0x32, 2, 0x03, 0x27]
+        assert evaluate(context, code) == 1
+        assert evaluate(context, [0x22, 4, 0x28, 0x04, 0x27]) == 16
+        assert evaluate(context, [0x23, 0x12, 0x34, 0x2a, 8, 0x27]) == 0x34
+
+    @pytest.mark.parametrize("code", [
+            [0x27],                 # empty stack
+            [0x02, 0x27],           # underflow
+            [0x22, 1, 0x22, 0, 0x05, 0x27], # division by zero
+            [0x01, 0x27],           # unsupported float op
+            [0x21, 0, 0],           # infinite loop
+            [0x22, 1],              # no end
+            [0x23, 1],              # truncated operand
+            ])
+    def test_errors(self, context, code):
+        with pytest.raises(AgentExpressionError):
+            evaluate(context, code)
+
+class MockTarget(object):
+    def __init__(self, core):
+        self.core = core
+        self.breakpoints = {}
+        self.log = []
+
+    def set_breakpoint(self, addr, type):
+        self.breakpoints[addr] = type
+        self.log.append(('set', addr))
+        return True
+
+    def remove_breakpoint(self, addr):
+        del self.breakpoints[addr]
+        self.log.append(('remove', addr))
+
+    def step(self, disable_interrupts):
+        self.log.append(('step',))
+        self.core.regs[15] += 2
+
+    def resume(self):
+        self.log.append(('resume',))
+
+class MockFacade(object):
+    register_list = REGISTER_LIST
+
+class MockMonitor(object):
+    def resumed(self, poll=True):
+        pass
+
+@pytest.fixture
+def server():
+    # Bypass the constructor, which opens a socket and starts the server thread.
+    server = GDBServer.__new__(GDBServer)
+    server.log = logging.getLogger(__name__)
+    server.target_context = DebugContext(MockCore())
+    server.target = MockTarget(server.target_context.core)
+    server.target_facade = MockFacade()
+    server._run_monitor = MockMonitor()
+    server.step_into_interrupt = False
+    server.non_stop = False
+    server._breakpoint_conditions = {}
+    return server
+
+class TestConditionalBreakpoints:
+    # The conditions compare r0 with a constant, e.g. 26000022051327 is 'r0 == 5'.
+
+    def test_insert_remove(self, server):
+        assert server.breakpoint(b'Z0,1000,2;X7,26000022051327#00')[1:3] == b'OK'
+        assert server.target.breakpoints == {0x1000: Target.BREAKPOINT_SW}
+        assert 0x1000 in server._breakpoint_conditions
+        # Sent again without conditions.
+        assert server.breakpoint(b'Z1,1000,2#00')[1:3] == b'OK'
+        assert 0x1000 not in server._breakpoint_conditions
+        server.breakpoint(b'Z1,1000,2;X7,26000022051327;cmds:0,X1,27#00')
+        assert server._breakpoint_conditions[0x1000][0] == Target.BREAKPOINT_HW
+        server.breakpoint(b'z1,1000,2#00')
+        assert server.target.breakpoints == {}
+        assert server._breakpoint_conditions == {}
+
+    def test_invalid_condition(self, server):
+        assert server.breakpoint(b'Z0,1000,2;X7,2600002205#00')[1:4] == b'E01'
+        assert server.target.breakpoints == {}
+
+    def test_condition_false(self, server):
+        server.breakpoint(b'Z0,1000,2;X7,26000022051327#00')
+        core = server.target_context.core
+        core.regs[15] = 0x1000
+        core.regs[0] = 4
+        assert server._check_breakpoint_condition() is False
+        assert server.target.log[-4:] == [('remove', 0x1000), ('step',), ('set', 0x1000),
+                ('resume',)]
+        assert server.target.breakpoints == {0x1000: Target.BREAKPOINT_SW}
+
+    def test_condition_true(self, server):
+        # Either condition being true stops.
+        server.breakpoint(b'Z0,1000,2;X7,26000022041327;X7,26000022051327#00')
+        core = server.target_context.core
+        core.regs[15] = 0x1000
+        core.regs[0] = 5
+        assert server._check_breakpoint_condition() is True
+        assert ('resume',) not in server.target.log
+
+    def test_other_address(self, server):
+        server.breakpoint(b'Z0,1000,2;X7,26000022041327#00')
+        server.target_context.core.regs[15] = 0x2000
+        assert server._check_breakpoint_condition() is True
+
+    def test_evaluation_error_stops(self, server):
+        # Reads past the end of the memory map.
+        server.breakpoint(b'Z0,1000,2;X7,24fffffff01927#00')
+        server.target_context.core.regs[15] = 0x1000
+        assert server._check_breakpoint_condition() is True
@@ -103,6 +103,12 @@ class TestConvertSessionOptions(object):
         # Valid hex int
         assert convert_session_options(['frequency=0x40']) == {'frequency': 64}
     
+    def test_float(self):
+        # Invalid float value is ignored and logged
+        assert convert_session_options(['flash.timeout=abc']) == {}
+        # Valid float
+        assert convert_session_options(['flash.timeout=2.5']) == {'flash.timeout': 2.5}
+    
     def test_str(self):
         # Ignore with no value
         assert convert_session_options(['test_binary']) == {}
@@ -0,0 +1,118 @@
+# pyOCD debugger
+# Copyright (c) 2020 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import io
+import pytest
+import zipfile
+
+from pyocd.target.pack.cmsis_pack import CmsisPack
+from pyocd.core.target import Target
+from pyocd.core.memory_map import MemoryType
+
+PDSC = """<?xml version="1.0" encoding="UTF-8"?>
+<package schemaVersion="1.4">
+  <vendor>Acme</vendor>
+  <devices>
+    <family Dfamily="Widget" Dvendor="Acme:1">
+      <description>A long description that is discarded.</description>
+      <debug svd="SVD/Widget.svd" defaultResetSequence="ResetProcessor"/>
+      <memory id="IRAM1" start="0x20000000" size="0x4000" default="1"/>
+      <subFamily DsubFamily="Widget1">
+        <memory name="ROM" access="rx" start="0x0" size="0x8000" startup="1"/>
+        <device Dname="WIDGET1A">
+          <feature type="Timer" n="4"/>
+          <debug svd="SVD/Widget1A.svd"/>
+          <variant Dvariant="WIDGET1A-X">
+            <memory name="RAM2" access="rwx" start="0x20004000" size="0x4000"/>
+          </variant>
+        </device>
+        <device Dname="WIDGET1B">
+          <debug defaultResetSequence="ResetHardware"/>
+        </device>
+      </subFamily>
+      <device Dname="WIDGET2">
+        <algorithm name="Flash/Widget2.FLM" start="0x0" size="0x10000"/>
+        <algorithm name="Flash/Other.FLM" start="0x0" size="0x10000" style="IAR"/>
+      </device>
+    </family>
+  </devices>
+  <boards>
+    <board name="Widget board">
+      <memory name="ignored" access="rw" start="0x60000000" size="0x1000"/>
+    </board>
+  </boards>
+  <components>
+    <component Cclass="Device"><files><file category="header" name="widget.h"/></files></component>
+  </components>
+</package>
+"""
+
+@pytest.fixture
+def pack():
+    data = io.BytesIO()
+    with zipfile.ZipFile(data, 'w') as z:
+        z.writestr("Acme.Widget_DFP.pdsc", PDSC)
+        z.writestr("SVD/Widget1A.svd", "<device/>")
+    return CmsisPack(zipfile.ZipFile(data, 'r'))
+
+def get_device(pack, part):
+    return [d for d in pack.devices if d.part_number == part].pop()
+
+class TestCmsisPack(object):
+    def test_devices(self, pack):
+        assert [d.part_number for d in pack.devices] == [
+            "WIDGET1A", "WIDGET1A-X", "WIDGET1B", "WIDGET2"]
+
+    def test_families(self, pack):
+        dev = get_device(pack, "WIDGET1A-X")
+        assert dev.vendor == "Acme"
+        assert dev.families == ["Widget", "Widget1"]
+        assert get_device(pack, "WIDGET2").families == ["Widget"]
+        # Reading families doesn't collect the rest of the device info.
+        assert dev._info is None
+
+    def test_memory_map(self, pack):
+        dev = get_device(pack, "WIDGET1A-X")
+        mm = dev.memory_map
+        rom = mm.get_boot_memory()
+        assert (rom.name, rom.start, rom.length) == ("ROM", 0, 0x8000)
+        # Memories are collected from every level of the hierarchy.
+        assert mm.get_region_for_address(0x20000000).name == "IRAM1"
+        ram = mm.get_region_for_address(0x20007000)
+        assert (ram.name, ram.type) == ("RAM2", MemoryType.RAM)
+        assert get_device(pack, "WIDGET1A").memory_map.get_region_for_address(0x20007000) is None
+        assert mm.get_region_for_address(0x60000000) is None
+        assert dev.memory_map is mm
+
+    def test_build_once(self, pack):
+        dev = get_device(pack, "WIDGET1B")
+        dev._build_memory_regions()
+        count = len(dev._regions)
+        dev._build_memory_regions()
+        assert len(dev._regions) == count == 2
+
+    def test_algos(self, pack):
+        algos = get_device(pack, "WIDGET2")._get_info().algos
+        assert [a.attrib['name'] for a in algos] == ["Flash/Widget2.FLM"]
+
+    def test_debug(self, pack):
+        dev = get_device(pack, "WIDGET1A")
+        assert dev.svd.read() == b"<device/>"
+        assert get_device(pack, "WIDGET1B").default_reset_type == Target.ResetType.HW
+        assert get_device(pack, "WIDGET2").default_reset_type == Target.ResetType.SW_VECTRESET
+
+    def test_pdsc(self, pack):
+        assert pack.pdsc.getroot().find('vendor').text == "Acme"
@@ -19,6 +19,8 @@ from pyocd.utility.conversion import (
     u32le_list_to_byte_list,
     u16le_list_to_byte_list,
     byte_list_to_u16le_list,
+    u32le_list_to_bytes,
+    bytes_to_u32le_list,
     u32_to_float32,
     float32_to_u32,
     u32_to_hex8le,
@@ -84,6 +86,17 @@ class TestConversionUtilities(object):
         ]
         assert u32le_list_to_byte_list(data) == list(range(32))
 
+    def test_u32le_list_to_bytes(self):
+        assert u32le_list_to_bytes([]) == bytearray()
+        result = u32le_list_to_bytes([0x03020100, 0x07060504])
+        assert isinstance(result, bytearray)
+        assert result == bytearray(range(8))
+
+    def test_bytes_to_u32le_list(self):
+        assert bytes_to_u32le_list(b'') == []
+        assert bytes_to_u32le_list(bytearray(range(8))) == [0x03020100, 0x07060504]
+        assert bytes_to_u32le_list(memoryview(bytearray(range(12)))[4:]) == [0x07060504, 0x0B0A0908]
+
     def test_u16leListToByteList(self):
         data = [0x3412, 0xFEAB]
         assert u16le_list_to_byte_list(data) == [
@@ -172,7 +185,7 @@ class TestGdbEscape(object):
     @pytest.mark.parametrize("data",
         [six.int2byte(x) for x in range(256) if (x not in ESCAPEES)])
     def test_unescape_passthrough(self, data):
-        assert unescape(data) == [six.byte2int(data)]
+        assert list(unescape(data)) == [six.byte2int(data)]
     
     @pytest.mark.parametrize(("expected", "data"), [
             (0x23, b'}\x03'),
@@ -181,8 +194,8 @@ class TestGdbEscape(object):
             (0x2a, b'}\x0a')
         ])
     def test_unescape_1(self, data, expected):
-        assert unescape(data) == [expected]
+        assert list(unescape(data)) == [expected]
     
     def test_unescape_2(self):
-        assert unescape(b'1234}\x0309}\x0axyz') == \
+        assert list(unescape(b'1234}\x0309}\x0axyz')) == \
             [0x31, 0x32, 0x33, 0x34, 0x23, 0x30, 0x39, 0x2a, 0x78, 0x79, 0x7a]
@@ -0,0 +1,103 @@
+# pyOCD debugger
+# Copyright (c) 2020 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+
+from pyocd.core import exceptions
+from pyocd.coresight.ap import (MEM_AP, MEM_AP_TAR)
+from pyocd.coresight.cortex_m import (CortexM, CORE_REGISTER)
+from pyocd.coresight.dap import DebugPort
+from .mockap import MockMemAPLink
+
+class MockSession(object):
+    def __init__(self):
+        self.options = {}
+
+    def subscribe(self, *args, **kwargs):
+        pass
+
+@pytest.fixture
+def link():
+    return MockMemAPLink()
+
+@pytest.fixture
+def core(link):
+    dp = DebugPort(link, None)
+    ap = MEM_AP(dp, 0)
+    dp.aps[0] = ap
+    core = CortexM(MockSession(), ap)
+    core.has_fpu = True
+    return core
+
+@pytest.fixture
+def batches(core, monkeypatch):
+    """! @brief Records the DCRSR selector list of each batched register read."""
+    calls = []
+    original = core._read_core_registers_dcrsr
+    def recording_read(dcrsr_list):
+        calls.append(list(dcrsr_list))
+        return original(dcrsr_list)
+    monkeypatch.setattr(core, '_read_core_registers_dcrsr', recording_read)
+    return calls
+
+class TestCoreRegisterTransfers:
+    def test_write_read(self, core, link):
+        regs = ['r0', 'r1', 'sp', 'pc', 'xpsr', 's3']
+        values = [0x10, 0x11, 0x20001000, 0x1234, 0x01000000, 0x3f800000]
+        core.write_core_registers_raw(regs, values)
+        assert core.read_core_registers_raw(regs) == values
+        # With banked data registers TAR only needs to be written once.
+        assert link.count('w', MEM_AP_TAR) == 1
+
+    def test_subregisters(self, core, link):
+        core.write_core_registers_raw(['primask', 'control'], [1, 2])
+        assert link.core.regs[CORE_REGISTER['cfbp']] == 0x02000001
+        assert core.read_core_registers_raw(['control', 'primask', 'basepri']) == [2, 1, 0]
+        core.write_core_register_raw('ipsr', 0x13)
+        assert core.read_core_register_raw('xpsr') == 0x13
+
+    def test_double(self, core, link):
+        core.write_core_registers_raw(['d1'], [0x1122334455667788])
+        assert link.core.regs[0x42] == 0x55667788
+        assert link.core.regs[0x43] == 0x11223344
+        assert core.read_core_registers_raw(['d1']) == [0x1122334455667788]
+
+    @pytest.mark.parametrize("not_ready", [1, 3])
+    def test_regrdy_retry(self, core, link, not_ready):
+        link.core.regs.update({n: 0x100 + n for n in range(16)})
+        link.core.not_ready_reads = not_ready
+        assert core.read_core_registers_raw(list(range(16))) == [0x100 + n for n in range(16)]
+        core.write_core_registers_raw(list(range(4)), [7, 8, 9, 10])
+        assert [link.core.regs[n] for n in range(4)] == [7, 8, 9, 10]
+
+    def test_regrdy_timeout(self, core, link):
+        link.core.not_ready_reads = 1000000
+        core.REGRDY_TIMEOUT = 0.05
+        with pytest.raises(exceptions.TimeoutError):
+            core.read_core_registers_raw(['r0'])
+
+    def test_double_one_batch(self, core, link, batches):
+        link.core.regs.update({0x42: 0x55667788, 0x43: 0x11223344, 0x45: 0x3f800000})
+        assert core.read_core_registers_raw(['r0', 'd1', 's5']) == [0, 0x1122334455667788, 0x3f800000]
+        assert batches == [[0, 0x42, 0x43, 0x45]]
+
+    def test_subregister_write_one_batch(self, core, link, batches):
+        link.core.regs.update({CORE_REGISTER['cfbp']: 0x01000000, CORE_REGISTER['xpsr']: 0x01000000})
+        core.write_core_registers_raw(['control', 'primask', 'apsr', 'r0'], [2, 1, 0x80000000, 5])
+        assert batches == [[CORE_REGISTER['cfbp'], CORE_REGISTER['xpsr']]]
+        assert link.core.regs[CORE_REGISTER['cfbp']] == 0x02000001
+        assert link.core.regs[CORE_REGISTER['xpsr']] == 0x81000000
+        assert link.core.regs[0] == 5
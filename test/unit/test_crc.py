@@ -0,0 +1,71 @@
+# pyOCD debugger
+# Copyright (c) 2020 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import pytest
+from random import Random
+
+from pyocd.debug.context import DebugContext
+from pyocd.debug.crc import (crc32_mpeg2, MemoryCRC)
+from pyocd.gdbserver.gdbserver import GDBServer
+from .mockcore import MockCore
+
+def bitwise_crc(data, crc=0xffffffff):
+    for b in bytearray(data):
+        crc ^= b << 24
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x04c11db7) if (crc & 0x80000000) else (crc << 1)
+            crc &= 0xffffffff
+    return crc
+
+class TestCRC32MPEG2:
+    def test_check_value(self):
+        assert crc32_mpeg2(b'123456789') == 0x0376e6e7
+
+    def test_empty(self):
+        assert crc32_mpeg2(b'') == 0xffffffff
+        assert crc32_mpeg2(b'', 0x1234) == 0x1234
+
+    @pytest.mark.parametrize("size", [1, 3, 64, 1000])
+    def test_random(self, size):
+        data = bytearray(Random(size).randrange(256) for _ in range(size))
+        assert crc32_mpeg2(data) == bitwise_crc(data)
+        # Computed in two parts.
+        assert crc32_mpeg2(data[size // 2:], crc32_mpeg2(data[:size // 2])) == bitwise_crc(data)
+
+@pytest.fixture
+def context():
+    core = MockCore()
+    core.ram[:] = bytearray(Random(0).randrange(256) for _ in range(len(core.ram)))
+    return DebugContext(core)
+
+class TestMemoryCRC:
+    def test_host(self, context):
+        crc = MemoryCRC(context)
+        crc.READ_CHUNK_SIZE = 0x30
+        ram = context.core.ram
+        assert crc.compute(0x20000000, len(ram)) == bitwise_crc(ram)
+        assert crc.compute(0x20000011, 0x101) == bitwise_crc(ram[0x11:0x112])
+
+    def test_qcrc(self, context):
+        server = GDBServer.__new__(GDBServer)
+        server.log = logging.getLogger(__name__)
+        server.target_context = context
+        ram = context.core.ram
+        assert server.handle_query(b'CRC:20000004,100#00') \
+                == server.create_rsp_packet(("C%08x" % bitwise_crc(ram[4:0x104])).encode())
+        # Missing length.
+        assert server.handle_query(b'CRC:20000000#00') == server.create_rsp_packet(b'E01')
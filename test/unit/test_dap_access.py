@@ -0,0 +1,203 @@
+# pyOCD debugger
+# Copyright (c) 2020 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+import struct
+import threading
+from six.moves import queue
+
+from pyocd.probe.pydapaccess.dap_access_cmsis_dap import (
+    DAPAccessCMSISDAP,
+    _Command,
+    READ,
+    AP_ACC,
+    )
+from pyocd.probe.pydapaccess.dap_access_api import DAPAccessIntf
+from pyocd.probe.pydapaccess.cmsis_dap_core import (Command, DAPTransferResponse)
+from pyocd.probe.pydapaccess.interface.interface import Interface
+
+class MockDAPInterface(Interface):
+    """! @brief Simulates the DAP_Transfer and DAP_TransferBlock commands of a CMSIS-DAP probe.
+
+    Each AP or DP register holds the last value written to it, except for AP register 0xC, which
+    returns an incrementing counter on every read so the order of reads can be checked.
+    """
+
+    def __init__(self, packet_count=4, packet_size=64):
+        super(MockDAPInterface, self).__init__()
+        self.packet_count = packet_count
+        self.packet_size = packet_size
+        self.responses = queue.Queue()
+        self.regs = {}
+        self.counter = 0
+        self.packets_written = 0
+        self.fault_on_packet = None
+        ## Event that read() waits on before returning a response, if not None.
+        self.read_gate = None
+
+    def get_serial_number(self):
+        return "mock"
+
+    def set_packet_count(self, count):
+        self.packet_count = count
+
+    def _access(self, request, value=None):
+        reg = request & 0xd
+        if request & READ:
+            if reg == (AP_ACC | 0xc):
+                self.counter += 1
+                return self.counter
+            return self.regs.get(reg, 0)
+        else:
+            self.regs[reg] = value
+            return None
+
+    def write(self, data):
+        data = bytearray(data)
+        self.packets_written += 1
+        fault = (self.packets_written == self.fault_on_packet)
+        ack = DAPTransferResponse.ACK_FAULT if fault else DAPTransferResponse.ACK_OK
+        response = bytearray()
+        if data[0] == Command.DAP_TRANSFER:
+            count = data[2]
+            pos = 3
+            for _ in range(count):
+                request = data[pos]
+                pos += 1
+                if request & READ:
+                    response += struct.pack("<I", self._access(request))
+                else:
+                    self._access(request, struct.unpack_from("<I", data, pos)[0])
+                    pos += 4
+            response = bytearray([Command.DAP_TRANSFER, 0 if fault else count, ack]) + response
+        elif data[0] == Command.DAP_TRANSFER_BLOCK:
+            count, request = struct.unpack_from("<HB", data, 2)
+            pos = 5
+            for _ in range(count):
+                if request & READ:
+                    response += struct.pack("<I", self._access(request))
+                else:
+                    self._access(request, struct.unpack_from("<I", data, pos)[0])
+                    pos += 4
+            response = bytearray([Command.DAP_TRANSFER_BLOCK]) \
+                        + bytearray(struct.pack("<HB", 0 if fault else count, ack)) + response
+        else:
+            assert False, "unexpected command 0x%02x" % data[0]
+        self.responses.put(response)
+
+    def read(self):
+        if self.read_gate is not None:
+            assert self.read_gate.wait(5)
+        return self.responses.get(timeout=5)
+
+@pytest.fixture(params=[False, True], ids=['serial', 'pipelined'])
+def dap(request):
+    iface = MockDAPInterface()
+    link = DAPAccessCMSISDAP(None, interface=iface)
+    link._packet_size = iface.packet_size
+    link._init_deferred_buffers()
+    link.set_deferred_transfer(True)
+    if request.param:
+        link._start_pipeline()
+    yield link
+    if request.param:
+        link._stop_pipeline()
+
+class TestDAPAccessTransfers:
+    def test_read_repeat(self, dap):
+        words = dap.reg_read_repeat(1000, DAPAccessIntf.REG.AP_0xC)
+        assert words == list(range(1, 1001))
+        assert dap._interface.packets_written > dap._interface.packet_count
+
+    def test_write_read(self, dap):
+        dap.write_reg(DAPAccessIntf.REG.AP_0x4, 0x20000000)
+        dap.write_reg(DAPAccessIntf.REG.DP_0x8, 0x12)
+        assert dap.read_reg(DAPAccessIntf.REG.AP_0x4) == 0x20000000
+        assert dap.read_reg(DAPAccessIntf.REG.DP_0x8) == 0x12
+
+    def test_write_repeat(self, dap):
+        dap.reg_write_repeat(300, DAPAccessIntf.REG.AP_0x4, list(range(300)))
+        dap.flush()
+        assert dap.read_reg(DAPAccessIntf.REG.AP_0x4) == 299
+
+    def test_futures(self, dap):
+        futures = [dap.read_reg(DAPAccessIntf.REG.AP_0xC, now=False) for _ in range(100)]
+        block = dap.reg_read_repeat(50, DAPAccessIntf.REG.AP_0xC, now=False)
+        dap.flush()
+        assert all(f.done() for f in futures)
+        assert [f() for f in futures] == list(range(1, 101))
+        assert block.result() == list(range(101, 151))
+
+    def test_fault(self, dap):
+        dap._interface.fault_on_packet = 2
+        with pytest.raises(DAPAccessIntf.TransferFaultError):
+            dap.reg_read_repeat(200, DAPAccessIntf.REG.AP_0xC)
+        # The link must be usable again after the error.
+        dap._interface.fault_on_packet = None
+        dap.write_reg(DAPAccessIntf.REG.AP_0x4, 0x1234)
+        assert dap.read_reg(DAPAccessIntf.REG.AP_0x4) == 0x1234
+
+@pytest.fixture
+def nondeferred_dap():
+    iface = MockDAPInterface()
+    link = DAPAccessCMSISDAP(None, interface=iface)
+    link._packet_size = iface.packet_size
+    link._init_deferred_buffers()
+    link._start_pipeline()
+    yield link
+    link._interface.read_gate = None
+    link._stop_pipeline()
+
+class TestNonDeferredPipelined:
+    def test_write_not_waited(self, nondeferred_dap):
+        iface = nondeferred_dap._interface
+        iface.read_gate = threading.Event()
+        nondeferred_dap.write_reg(DAPAccessIntf.REG.AP_0x4, 0x1234)
+        # The write was sent, but its response has not been read.
+        assert iface.packets_written == 1
+        assert len(nondeferred_dap._commands_to_read) == 1
+        iface.read_gate.set()
+        assert nondeferred_dap.read_reg(DAPAccessIntf.REG.AP_0x4) == 0x1234
+        assert iface.packets_written == 2
+
+    def test_write_fault_raised_by_read(self, nondeferred_dap):
+        nondeferred_dap._interface.fault_on_packet = 1
+        nondeferred_dap.write_reg(DAPAccessIntf.REG.AP_0x4, 0x1234)
+        with pytest.raises(DAPAccessIntf.TransferFaultError):
+            nondeferred_dap.read_reg(DAPAccessIntf.REG.AP_0x4)
+        nondeferred_dap._interface.fault_on_packet = None
+        nondeferred_dap.write_reg(DAPAccessIntf.REG.AP_0x4, 0x5678)
+        assert nondeferred_dap.read_reg(DAPAccessIntf.REG.AP_0x4) == 0x5678
+
+class TestCommandEncoding:
+    def test_transfer_block_write(self):
+        cmd = _Command(64)
+        cmd.add(3, AP_ACC | 0xc, [0x11223344, 0x55667788, 0x99aabbcc], 0)
+        buf = bytearray(b'\xee' * 64)
+        assert cmd.encode_data(buf) is buf
+        assert buf[:17] == bytearray([Command.DAP_TRANSFER_BLOCK, 0, 3, 0, AP_ACC | 0xc,
+                    0x44, 0x33, 0x22, 0x11, 0x88, 0x77, 0x66, 0x55, 0xcc, 0xbb, 0xaa, 0x99])
+
+    def test_transfer_mixed(self):
+        cmd = _Command(64)
+        cmd.add(1, AP_ACC | 0x4, [0x20000000], 0)
+        cmd.add(2, AP_ACC | 0xc | READ, None, 0)
+        buf = cmd.encode_data()
+        assert buf[:10] == bytearray([Command.DAP_TRANSFER, 0, 3, AP_ACC | 0x4, 0, 0, 0, 0x20,
+                    AP_ACC | 0xc | READ, AP_ACC | 0xc | READ])
+        response = bytearray([Command.DAP_TRANSFER, 3, DAPTransferResponse.ACK_OK,
+                    1, 0, 0, 0, 2, 0, 0, 0])
+        assert bytes(cmd.decode_data(response)) == bytes(response[3:])
@@ -0,0 +1,113 @@
+# pyOCD debugger
+# Copyright (c) 2020 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+
+from pyocd.flash.flash import Flash
+from pyocd.flash.flash_builder import FlashBuilder
+from .mockflash import (MockFlash, PAGE_SIZE)
+
+def program(flash, data, chip_erase="sector"):
+    fb = FlashBuilder(flash)
+    fb.log_performance = False
+    fb.add_data(0, data)
+    return fb.program(chip_erase=chip_erase, smart_flash=False)
+
+DATA = bytearray((i * 7) & 0xff for i in range(PAGE_SIZE * 5))
+
+class TestPipelinedProgram:
+    @pytest.mark.parametrize("chip_erase", ["sector", "chip"])
+    def test_double_buffer(self, chip_erase):
+        flash = MockFlash(2)
+        info = program(flash, DATA, chip_erase)
+        assert flash.memory[:len(DATA)] == DATA
+        ops = [op for op in flash.log if op[0] in ('load', 'start', 'wait')]
+        # The next page is loaded into the spare buffer before waiting for the current one.
+        assert ops[:7] == [
+            ('load', 0, 0x000),
+            ('start', 0, 0x000),
+            ('load', 1, 0x100),
+            ('wait',),
+            ('start', 1, 0x100),
+            ('load', 0, 0x200),
+            ('wait',),
+            ]
+        assert info.wait_time >= 0
+        assert info.load_time >= 0
+
+    def test_single_buffer(self):
+        flash = MockFlash(1)
+        program(flash, DATA)
+        assert flash.memory[:len(DATA)] == DATA
+        ops = [op for op in flash.log if op[0] in ('load', 'start', 'wait')]
+        assert ops[:6] == [
+            ('load', 0, 0x000),
+            ('start', 0, 0x000),
+            ('wait',),
+            ('load', 0, 0x100),
+            ('start', 0, 0x100),
+            ('wait',),
+            ]
+        # All pages are programmed with a single init.
+        assert sum(1 for op in flash.log if op == ('init', Flash.Operation.PROGRAM)) == 1
+
+    def test_page_data_packed(self):
+        flash = MockFlash(2)
+        fb = FlashBuilder(flash)
+        fb.add_data(0x100, list(DATA[:0x180]))
+        fb._build_sectors_and_pages(keep_unwritten=False)
+        # Pages are views of one image buffer, padded to the page size with the erased value.
+        assert all(isinstance(page.data, memoryview) for page in fb.page_list)
+        assert fb._image == DATA[:0x180] + bytearray(b'\xff' * 0x80)
+        assert fb.page_list[1].data == DATA[0x100:0x180] + bytearray(b'\xff' * 0x80)
+
+    def test_disabled(self):
+        flash = MockFlash(2)
+        fb = FlashBuilder(flash)
+        fb.log_performance = False
+        fb.enable_double_buffer(False)
+        fb.add_data(0, DATA)
+        flash.program_page = lambda addr, data: flash.memory.__setitem__(
+                slice(addr, addr + len(data)), bytearray(data))
+        fb.program(chip_erase="sector", smart_flash=False)
+        assert flash.memory[:len(DATA)] == DATA
+        assert not any(op[0] == 'start' for op in flash.log)
+
+    def test_crc_analysis(self):
+        flash = MockFlash(2)
+        flash.use_analyzer = True
+        program(flash, DATA)
+        del flash.log[:]
+        fb = FlashBuilder(flash)
+        fb.log_performance = False
+        fb.add_data(0, DATA)
+        info = fb.program(chip_erase="sector", smart_flash=True, fast_verify=True)
+        # Unchanged pages are detected by CRC and not programmed.
+        assert not any(op[0] in ('start', 'erase_sector') for op in flash.log)
+        assert info.analyze_type == FlashBuilder.FLASH_ANALYSIS_CRC32
+
+    def test_crc_worker_error(self):
+        flash = MockFlash(2)
+        flash.use_analyzer = True
+        fb = FlashBuilder(flash)
+        fb.log_performance = False
+        fb.add_data(0, DATA)
+        def fail(page_list):
+            raise ValueError("CRC failed")
+        fb._compute_page_crcs = fail
+        # The error from the worker thread is raised instead of every page being treated as changed.
+        with pytest.raises(ValueError):
+            fb.program(chip_erase="sector", smart_flash=True, fast_verify=True)
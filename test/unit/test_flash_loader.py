@@ -0,0 +1,99 @@
+# pyOCD debugger
+# Copyright (c) 2020 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+
+from pyocd.core.memory_map import (MemoryMap, RamRegion)
+from pyocd.flash.loader import StreamingFlashLoader
+from pyocd.utility.timeout import wait_for
+from .mockflash import (MockFlash, SECTOR_SIZE)
+
+class MockLoaderSession(object):
+    def __init__(self, flash):
+        self.options = {
+            'chip_erase': "sector",
+            'smart_flash': True,
+            'fast_program': False,
+            'keep_unwritten': True,
+            'hide_programming_progress': True,
+            'flash.manifest_dir': None,
+            'flash.manifest_spot_check': 1,
+            }
+        self.log_tracebacks = False
+        self.board = self
+        self.target = self
+        self.memory_map = MemoryMap(flash.region,
+                                    RamRegion(start=0x20000000, length=0x1000))
+
+@pytest.fixture
+def flash():
+    return MockFlash(2)
+
+@pytest.fixture
+def loader(flash):
+    return StreamingFlashLoader(MockLoaderSession(flash))
+
+DATA = bytearray((i * 13) & 0xff for i in range(SECTOR_SIZE * 4))
+
+class TestStreamingFlashLoader:
+    def test_program_before_commit(self, flash, loader):
+        for offset in range(0, SECTOR_SIZE + 0x200, 0x200):
+            loader.add_data(offset, DATA[offset:offset + 0x200])
+        # The first sector is complete and is programmed without waiting for commit().
+        assert wait_for(lambda: ('erase_sector', 0) in flash.log, timeout=5.0)
+        assert ('erase_sector', SECTOR_SIZE) not in flash.log
+        loader.add_data(SECTOR_SIZE + 0x200, DATA[SECTOR_SIZE + 0x200:])
+        loader.commit()
+        assert flash.memory[:len(DATA)] == DATA
+
+    def test_algo_kept_loaded(self, flash, loader):
+        for offset in range(0, len(DATA), SECTOR_SIZE):
+            loader.add_data(offset, DATA[offset:offset + SECTOR_SIZE])
+            if offset:
+                # Wait for the previous sector, so each sector is programmed in its own batch.
+                assert wait_for(lambda: ('erase_sector', offset - SECTOR_SIZE) in flash.log, timeout=5.0)
+        loader.commit()
+        # The algo is cleaned up and the target reset only once, by commit().
+        assert flash.log.count(('cleanup',)) == 1
+        assert flash.log[-1] == ('cleanup',)
+        assert flash.target.reset_count == 1
+        assert flash.memory[:len(DATA)] == DATA
+
+    def test_out_of_order(self, flash, loader):
+        loader.add_data(0, DATA[:0x100])
+        loader.add_data(SECTOR_SIZE * 2, DATA[SECTOR_SIZE * 2:])
+        assert wait_for(lambda: ('erase_sector', 0) in flash.log, timeout=5.0)
+        # Data for the already programmed sector must not erase what was written before.
+        loader.add_data(0x100, DATA[0x100:SECTOR_SIZE * 2])
+        loader.commit()
+        assert flash.memory[:len(DATA)] == DATA
+
+    def test_error(self, flash, loader):
+        def fail(address):
+            raise IOError("erase failed")
+        flash.erase_sector = fail
+        loader.add_data(0, DATA)
+        with pytest.raises(IOError):
+            loader.commit()
+        # The loader can be reused after an error.
+        del flash.erase_sector
+        loader.add_data(0, DATA)
+        loader.commit()
+        assert flash.memory[:len(DATA)] == DATA
+
+    def test_not_flash(self, loader):
+        with pytest.raises(ValueError):
+            loader.add_data(0x20000000, b'\x00' * 4)
@@ -0,0 +1,171 @@
+# pyOCD debugger
+# Copyright (c) 2020 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import pytest
+
+from pyocd.flash.flash import Flash
+from pyocd.flash.flash_builder import FlashBuilder
+from pyocd.flash.manifest import FlashManifest
+from .mockflash import (MockFlash, SECTOR_SIZE)
+
+DATA = bytearray((i * 13) & 0xff for i in range(SECTOR_SIZE * 4))
+
+@pytest.fixture(scope='function')
+def manifest_path(tmpdir):
+    return os.path.join(str(tmpdir), "manifests", "uid.json")
+
+def program(flash, manifest, data, spot_check=1):
+    fb = FlashBuilder(flash)
+    fb.log_performance = False
+    fb.manifest = manifest
+    fb.manifest_spot_check_count = spot_check
+    fb.add_data(0, data)
+    info = fb.program(chip_erase="sector")
+    assert flash.memory[:len(data)] == data
+    return info
+
+def ops(flash, name):
+    return [op for op in flash.log if op[0] == name]
+
+class TestFlashManifest:
+    def test_save_load(self, manifest_path):
+        flash = MockFlash(2)
+        manifest = FlashManifest(manifest_path, "mock")
+        manifest.update_sectors(flash.region, {0: 0x1234, 0x400: 0xffffffff})
+        manifest.save()
+        assert FlashManifest(manifest_path, "mock").get_sector_crcs(flash.region) \
+                == {0: 0x1234, 0x400: 0xffffffff}
+        # A manifest for another target is ignored.
+        assert FlashManifest(manifest_path, "other").get_sector_crcs(flash.region) == {}
+
+    def test_invalid_file(self, manifest_path):
+        os.makedirs(os.path.dirname(manifest_path))
+        with open(manifest_path, 'w') as f:
+            f.write("{not json")
+        assert FlashManifest(manifest_path, "mock").get_sector_crcs(MockFlash(2).region) == {}
+
+    def test_skip_analysis(self, manifest_path):
+        flash = MockFlash(2)
+        program(flash, FlashManifest(manifest_path, "mock"), DATA)
+        
+        # Reprogram with one changed sector.
+        new_data = bytearray(DATA)
+        new_data[SECTOR_SIZE * 2 + 5] ^= 0xff
+        del flash.log[:]
+        del flash.target.reads[:]
+        info = program(flash, FlashManifest(manifest_path, "mock", is_target_identified=True), new_data)
+        assert info.analyze_type == FlashBuilder.FLASH_ANALYSIS_MANIFEST
+        assert ops(flash, 'erase_sector') == [('erase_sector', SECTOR_SIZE * 2)]
+        # Only the spot check read target memory.
+        assert len(flash.target.reads) == 1
+        
+        # The manifest was updated with the new sector contents.
+        del flash.log[:]
+        program(flash, FlashManifest(manifest_path, "mock"), new_data)
+        assert ops(flash, 'erase_sector') == []
+
+    def test_stale_manifest(self, manifest_path):
+        flash = MockFlash(2)
+        program(flash, FlashManifest(manifest_path, "mock"), DATA)
+
+        # Change the flash behind the manifest's back.
+        flash.memory[:len(DATA)] = bytearray(b'\xff' * len(DATA))
+        del flash.log[:]
+        info = program(flash, FlashManifest(manifest_path, "mock"), DATA, spot_check=4)
+        assert info.analyze_type != FlashBuilder.FLASH_ANALYSIS_MANIFEST
+        assert len(ops(flash, 'erase_sector')) == 4
+
+    def test_unconfirmed_sectors_verified(self, manifest_path):
+        flash = MockFlash(2)
+        program(flash, FlashManifest(manifest_path, "mock"), DATA)
+
+        # A new session with the same probe can't assume the same target is connected, so every
+        # matching sector is checked.
+        manifest = FlashManifest(manifest_path, "mock")
+        del flash.log[:]
+        del flash.target.reads[:]
+        info = program(flash, manifest, DATA)
+        assert info.analyze_type == FlashBuilder.FLASH_ANALYSIS_MANIFEST
+        assert ops(flash, 'erase_sector') == []
+        assert len(flash.target.reads) == 4
+
+        # Once confirmed, only the spot check is needed for the rest of the session.
+        del flash.target.reads[:]
+        program(flash, manifest, DATA)
+        assert len(flash.target.reads) == 1
+
+    def test_probe_moved(self, manifest_path):
+        flash = MockFlash(2)
+        program(flash, FlashManifest(manifest_path, "mock"), DATA)
+
+        # The probe is moved to another board of the same type, with different contents in one
+        # sector. A single spot check of an identified target could miss it.
+        flash.memory[SECTOR_SIZE * 3] ^= 0xff
+        del flash.log[:]
+        info = program(flash, FlashManifest(manifest_path, "mock"), DATA, spot_check=1)
+        assert info.analyze_type != FlashBuilder.FLASH_ANALYSIS_MANIFEST
+        assert ops(flash, 'erase_sector') == [('erase_sector', SECTOR_SIZE * 3)]
+
+    def test_no_manifest_weight(self):
+        # Without a manifest, pages known to be the same still count towards the verify weight.
+        fb = FlashBuilder(MockFlash(2))
+        fb.add_data(0, DATA)
+        fb._build_sectors_and_pages(keep_unwritten=True)
+        for page in fb.page_list:
+            page.same = True
+        assert fb._compute_sector_erase_pages_weight_min() \
+                == sum(page.get_verify_weight() for page in fb.page_list)
+
+class MockManifestSession(object):
+    def __init__(self, tmpdir):
+        self.options = {
+            'flash.manifest_dir': str(tmpdir),
+            'flash.manifest_target_id': "board1",
+            }
+        self.project_dir = str(tmpdir)
+        self.board = self
+        self.unique_id = "probe1"
+        self.target_type = "mock"
+
+class TestManifestErase:
+    @pytest.fixture
+    def flash(self, tmpdir):
+        flash = MockFlash(2)
+        flash.target.session = MockManifestSession(tmpdir)
+        flash._call_function_and_wait = lambda *args, **kwargs: 0
+        flash._active_operation = flash.Operation.ERASE
+        manifest = FlashManifest.for_session(flash.target.session)
+        manifest.update_sectors(flash.region, {0: 1, SECTOR_SIZE: 2})
+        manifest.save()
+        return flash
+
+    def test_erase_sector(self, flash):
+        Flash.erase_sector(flash, SECTOR_SIZE)
+        manifest = FlashManifest.for_session(flash.target.session)
+        assert manifest.get_sector_crcs(flash.region) == {0: 1}
+        # The change is saved.
+        assert FlashManifest(manifest.path, "mock").get_sector_crcs(flash.region) == {0: 1}
+
+    def test_erase_all(self, flash):
+        Flash.erase_all(flash)
+        manifest = FlashManifest.for_session(flash.target.session)
+        assert FlashManifest(manifest.path, "mock").get_sector_crcs(flash.region) == {}
+
+    def test_clear_for_session(self, flash):
+        FlashManifest.clear_for_session(flash.target.session)
+        manifest = FlashManifest.for_session(flash.target.session)
+        assert FlashManifest(manifest.path, "mock").get_sector_crcs(flash.region) == {}
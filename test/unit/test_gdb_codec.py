@@ -0,0 +1,79 @@
+# pyOCD debugger
+# Copyright (c) 2020 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from random import Random
+import pytest
+
+from pyocd.gdbserver.codec import (checksum, escape, unescape, frame)
+
+def reference_escape(data):
+    result = bytearray()
+    for c in bytearray(data):
+        if c in bytearray(b'#$}*'):
+            result += bytearray([0x7d, c ^ 0x20])
+        else:
+            result.append(c)
+    return bytes(result)
+
+def random_data(seed, size):
+    rng = Random(seed)
+    # Bias towards the escaped characters so every size has plenty of them.
+    alphabet = bytearray(range(256)) + bytearray(b'#$}*' * 32)
+    return bytes(bytearray(rng.choice(alphabet) for _ in range(size)))
+
+class TestGdbCodec:
+    @pytest.mark.parametrize("seed", range(20))
+    def test_round_trip(self, seed):
+        data = random_data(seed, Random(seed).randrange(0, 2000))
+        escaped = escape(data)
+        assert escaped == reference_escape(data)
+        for c in b'#$*':
+            assert c not in bytearray(escaped)
+        assert unescape(escaped) == bytearray(data)
+
+    def test_buffer_types(self):
+        data = b'ab}#$*cd'
+        assert escape(bytearray(data)) == escape(memoryview(data)) == escape(data)
+        assert unescape(memoryview(escape(data))) == bytearray(data)
+
+    def test_consecutive_escapes(self):
+        assert escape(b'}}##') == b'}]}]}\x03}\x03'
+        assert unescape(b'}]}]}\x03}\x03') == bytearray(b'}}##')
+
+    def test_escaped_escape(self):
+        # Any byte may be escaped, including the escape character producing 0x5d.
+        assert unescape(b'a}}b') == bytearray(b'a]b')
+        assert unescape(b'}}}}') == bytearray(b']]')
+        data = b']}]}}'
+        assert unescape(b''.join(b'}' + bytes(bytearray([c ^ 0x20])) for c in bytearray(data))) \
+            == bytearray(data)
+        assert unescape(b'ab}') == bytearray(b'ab')
+
+    def test_empty(self):
+        assert escape(b'') == b''
+        assert unescape(b'') == bytearray()
+        assert checksum(b'') == b'00'
+
+    @pytest.mark.parametrize("seed", range(5))
+    def test_checksum(self, seed):
+        data = random_data(seed, 1000)
+        expected = ("%02x" % (sum(bytearray(data)) % 256)).encode()
+        assert checksum(data) == expected
+        assert checksum(bytearray(data)) == expected
+        assert checksum(memoryview(data)) == expected
+
+    def test_frame(self):
+        assert frame(b'OK') == b'$OK#9a'
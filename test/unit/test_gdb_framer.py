@@ -0,0 +1,92 @@
+# pyOCD debugger
+# Copyright (c) 2020 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+
+from pyocd.gdbserver.framer import RSPFramer
+from pyocd.gdbserver.gdbserver import checksum
+
+def frame(data):
+    return b'$' + data + b'#' + checksum(data)
+
+class Recorder(object):
+    def __init__(self):
+        self.events = []
+        self.framer = RSPFramer(
+            lambda packet, good: self.events.append(('packet', packet, good)),
+            lambda c: self.events.append(('ack', c)),
+            lambda: self.events.append(('interrupt',)))
+
+@pytest.fixture
+def rec():
+    return Recorder()
+
+class TestRSPFramer:
+    def test_packet(self, rec):
+        rec.framer.feed(frame(b'qSupported'))
+        assert rec.events == [('packet', frame(b'qSupported'), True)]
+        assert rec.framer.pending_bytes == 0
+
+    @pytest.mark.parametrize("chunk_size", [1, 2, 3, 7])
+    def test_split(self, rec, chunk_size):
+        data = frame(b'm20000000,100') + frame(b'g')
+        for i in range(0, len(data), chunk_size):
+            rec.framer.feed(data[i:i + chunk_size])
+        assert rec.events == [
+            ('packet', frame(b'm20000000,100'), True),
+            ('packet', frame(b'g'), True),
+            ]
+
+    def test_bad_checksum(self, rec):
+        rec.framer.feed(b'$g#00$g#zz' + frame(b'c'))
+        assert rec.events == [
+            ('packet', b'$g#00', False),
+            ('packet', b'$g#zz', False),
+            ('packet', frame(b'c'), True),
+            ]
+
+    def test_acks_and_interrupt(self, rec):
+        rec.framer.feed(b'+' + frame(b'c') + b'-\x03junk+')
+        assert rec.events == [
+            ('ack', b'+'),
+            ('packet', frame(b'c'), True),
+            ('ack', b'-'),
+            ('interrupt',),
+            ('ack', b'+'),
+            ]
+
+    def test_binary_in_packet(self, rec):
+        # Ctrl-C, acks, and '$' within a packet body are data.
+        data = b'X0,4:\x03+-$'
+        rec.framer.feed(frame(data))
+        assert rec.events == [('packet', frame(data), True)]
+
+    def test_many_packets(self, rec):
+        rec.framer.COMPACT_THRESHOLD = 64
+        packets = [frame(b'M%x,4:%08x' % (i * 4, i)) for i in range(1000)]
+        data = b''.join(packets)
+        for i in range(0, len(data), 100):
+            rec.framer.feed(data[i:i + 100])
+        assert [e[1] for e in rec.events] == packets
+        assert all(e[2] for e in rec.events)
+        assert len(rec.framer._buffer) < 200
+
+    def test_reset(self, rec):
+        rec.framer.feed(b'$partial')
+        assert rec.framer.pending_bytes == 8
+        rec.framer.reset()
+        rec.framer.feed(frame(b's'))
+        assert rec.events == [('packet', frame(b's'), True)]
@@ -0,0 +1,69 @@
+# pyOCD debugger
+# Copyright (c) 2020 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import pytest
+
+from pyocd.gdbserver.gdbserver import (GDBServer, checksum, unescape)
+from .mockcore import MockCore
+
+class MockContext(object):
+    def __init__(self, core):
+        self.core = core
+
+    def read_memory_bytes(self, addr, size):
+        return self.core.read_memory_bytes(addr, size)
+
+    def flush(self):
+        pass
+
+@pytest.fixture
+def server():
+    # Bypass the constructor, which opens a socket and starts the server thread.
+    server = GDBServer.__new__(GDBServer)
+    server.log = logging.getLogger(__name__)
+    server.packet_size = 0x100
+    server.target_context = MockContext(MockCore())
+    return server
+
+def payload(packet):
+    assert packet[:1] == b'$' and packet[-3:-2] == b'#'
+    assert packet[-2:] == checksum(packet[1:-3])
+    return packet[1:-3]
+
+class TestGDBServerMemory:
+    def test_read_hex(self, server):
+        server.target_context.core.ram[:4] = b'\x01\x23\x45\x67'
+        assert payload(server.get_memory(b'20000000,4')) == b'01234567'
+
+    def test_read_binary(self, server):
+        data = bytearray(b'\x00#$}*\xff')
+        server.target_context.core.ram[:len(data)] = data
+        resp = payload(server.get_memory_binary(b'20000000,%x' % len(data)))
+        assert resp[:1] == b'b'
+        assert bytearray(unescape(resp[1:])) == data
+
+    def test_read_binary_empty(self, server):
+        assert payload(server.get_memory_binary(b'20000000,0')) == b'b'
+
+    def test_read_binary_truncated(self, server):
+        # Escaping doubles the size of this data, so not all of it fits in one packet.
+        server.target_context.core.ram[:0x100] = b'}' * 0x100
+        resp = payload(server.get_memory_binary(b'20000000,100'))
+        assert len(resp) + 4 <= server.packet_size
+        data = bytearray(unescape(resp[1:]))
+        assert 0 < len(data) < 0x100
+        assert data == b'}' * len(data)
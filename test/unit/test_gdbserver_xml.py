@@ -0,0 +1,148 @@
+# pyOCD debugger
+# Copyright (c) 2020 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import pytest
+
+from pyocd.gdbserver.gdbserver import (GDBServer, unescape)
+from .mockcore import MockCore
+
+class MockThread(object):
+    def __init__(self, unique_id, name, description):
+        self.unique_id = unique_id
+        self.name = name
+        self.description = description
+
+class MockThreadProvider(object):
+    def __init__(self, threads):
+        self.threads = threads
+        self.is_enabled = True
+        self.current_thread = threads[0]
+        self.generation = 0
+        self.get_threads_count = 0
+
+    def get_threads(self):
+        self.get_threads_count += 1
+        return self.threads
+
+class MockContext(object):
+    def __init__(self, core):
+        self.core = core
+
+@pytest.fixture
+def server():
+    # Bypass the constructor, which opens a socket and starts the server thread.
+    server = GDBServer.__new__(GDBServer)
+    server.log = logging.getLogger(__name__)
+    server.packet_size = 0x40
+    server.target_context = MockContext(MockCore())
+    server.report_core = False
+    server.thread_provider = MockThreadProvider([MockThread(i, "thread%d" % i, "Ready")
+            for i in range(1, 5)])
+    server._xml_cache = {}
+    server._thread_xml_fragments = {}
+    return server
+
+def read_document(server, query):
+    """! @brief Read an XML document in chunks as gdb does."""
+    data = b''
+    while True:
+        resp = server.handle_query_xml(query, len(data), server.packet_size)
+        data += bytes(unescape(resp[1:]))
+        if resp[:1] == b'l':
+            return data
+
+class TestThreadsXML:
+    def test_generated_once_per_stop(self, server):
+        provider = server.thread_provider
+        first = read_document(server, b'threads')
+        assert first.count(b'<thread ') == 4
+        assert first.endswith(b'</threads>')
+        # The document spans several packets but is only generated once.
+        assert len(first) > server.packet_size
+        assert provider.get_threads_count == 1
+
+        # Reading again at the same stop is served from the cache.
+        assert read_document(server, b'threads') == first
+        assert provider.get_threads_count == 1
+
+        # The core running doesn't cause the document to be generated again unless the thread
+        # provider reports a change to the threads.
+        server.target_context.core.run_token += 1
+        assert read_document(server, b'threads') == first
+        assert provider.get_threads_count == 1
+
+        provider.threads[1].description = "Blocked"
+        provider.generation += 1
+        second = read_document(server, b'threads')
+        assert provider.get_threads_count == 2
+        assert b'>Blocked<' in second
+        assert second.count(b'<thread ') == 4
+
+    def test_consistent_chunks(self, server):
+        first = read_document(server, b'threads')
+        server.target_context.core.run_token += 1
+        server.thread_provider.threads[0].name = "main"
+        server.thread_provider.generation += 1
+        # gdb started reading before the core ran, so later chunks are from the old document.
+        resp = server.handle_query_xml(b'threads', 16, server.packet_size)
+        assert bytes(unescape(resp[1:])) == first[16:16 + len(resp) - 1]
+
+    def test_unchanged_threads_reused(self, server):
+        read_document(server, b'threads')
+        fragments = dict(server._thread_xml_fragments)
+        server.target_context.core.run_token += 1
+        server.thread_provider.threads[2].name = "worker"
+        server.thread_provider.generation += 1
+        read_document(server, b'threads')
+        for unique_id, entry in server._thread_xml_fragments.items():
+            if unique_id == 3:
+                assert entry is not fragments[unique_id]
+                assert b'name="worker"' in entry[1]
+            else:
+                assert entry is fragments[unique_id]
+
+    def test_removed_thread(self, server):
+        read_document(server, b'threads')
+        server.target_context.core.run_token += 1
+        server.thread_provider.threads.pop(0)
+        server.thread_provider.generation += 1
+        doc = read_document(server, b'threads')
+        assert doc.count(b'<thread ') == 3
+        assert b'id="1"' not in doc
+        assert 1 not in server._thread_xml_fragments
+
+    def test_thread_order(self, server):
+        # Threads are listed in the provider's order, not by ID.
+        threads = server.thread_provider.threads
+        threads.reverse()
+        threads.insert(2, MockThread(0x100, "new", "Ready"))
+        doc = read_document(server, b'threads')
+        ids = [int(part.split(b'"')[0], 16) for part in doc.split(b'<thread id="')[1:]]
+        assert ids == [t.unique_id for t in threads]
+
+class TestStaticXML:
+    def test_memory_map_cached(self, server):
+        calls = []
+        class Facade(object):
+            def get_memory_map_xml(self):
+                calls.append(1)
+                return b'<?xml version="1.0"?><memory-map>' + b'x' * 100 + b'</memory-map>'
+        server.target_facade = Facade()
+        doc = read_document(server, b'memory_map')
+        server.target_context.core.run_token += 1
+        assert read_document(server, b'memory_map') == doc
+        assert len(calls) == 1
@@ -0,0 +1,28 @@
+# pyOCD debugger
+# Copyright (c) 2020 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from pyocd.utility.mask import same
+
+class TestSame:
+    def test_buffers(self):
+        assert same(b'abc', bytearray(b'abc'))
+        assert same(memoryview(b'xabc')[1:], b'abc')
+        assert not same(b'abd', bytearray(b'abc'))
+        assert not same(b'ab', b'abc')
+
+    def test_sequences(self):
+        assert same([1, 2, 3], bytearray([1, 2, 3]))
+        assert not same([1, 2, 4], bytearray([1, 2, 3]))
@@ -0,0 +1,169 @@
+# pyOCD debugger
+# Copyright (c) 2020 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+
+from pyocd.core import exceptions
+from pyocd.coresight.ap import (
+    MEM_AP,
+    MEM_AP_CSW,
+    MEM_AP_TAR,
+    MEM_AP_DRW,
+    )
+from pyocd.coresight.dap import (DebugPort, DP_CTRL_STAT, DP_SELECT)
+from .mockap import MockMemAPLink
+
+@pytest.fixture
+def link():
+    return MockMemAPLink()
+
+@pytest.fixture
+def ap(link):
+    dp = DebugPort(link, None)
+    ap = MEM_AP(dp, 0)
+    dp.aps[0] = ap
+    return ap
+
+class TestMemAPShadowState:
+    def test_read_write_sizes(self, ap):
+        ap.write32(0x100, 0x12345678)
+        ap.write16(0x106, 0xabcd)
+        ap.write8(0x105, 0xef)
+        assert ap.read32(0x100) == 0x12345678
+        assert ap.read16(0x106) == 0xabcd
+        assert ap.read8(0x105) == 0xef
+        assert ap.read_memory_bytes(0x100, 8) == bytearray([0x78, 0x56, 0x34, 0x12, 0, 0xef, 0xcd, 0xab])
+
+    def test_redundant_writes_dropped(self, ap, link):
+        ap.write32(0x100, 1)
+        ap.write32(0x104, 2)
+        ap.write32(0x108, 3)
+        assert link.count('w', MEM_AP_CSW) == 1
+        # TAR auto-increments, so only the first write needs to set it.
+        assert link.count('w', MEM_AP_TAR) == 1
+        assert ap.read32(0x10c) == 0
+        assert link.count('w', MEM_AP_TAR) == 1
+        assert ap.read32(0x100) == 1
+        assert link.count('w', MEM_AP_TAR) == 2
+
+    def test_size_change_tracks_increment(self, ap, link):
+        ap.write8(0x201, 0xaa)
+        ap.write8(0x202, 0xbb)
+        ap.write16(0x204, 0xccdd)
+        assert link.count('w', MEM_AP_TAR) == 2
+        assert ap.read32(0x200) == 0x00bbaa00
+
+    def test_page_boundary(self, ap, link):
+        ap.write32(0x3fc, 1)
+        ap.write32(0x400, 2)
+        # The TAR wrap at the auto-increment boundary is implementation defined.
+        assert link.count('w', MEM_AP_TAR) == 2
+        assert ap.read32(0x400) == 2
+
+    def test_block_then_single(self, ap, link):
+        ap.write_memory_block32(0x100, [1, 2, 3, 4])
+        ap.write32(0x110, 5)
+        assert link.count('w', MEM_AP_TAR) == 1
+        assert ap.read_memory_block32(0x100, 5) == [1, 2, 3, 4, 5]
+
+    def test_error_invalidates(self, ap, link):
+        ap.write32(0x100, 1)
+        ap.dp._handle_error(Exception(), 0)
+        ap.write32(0x104, 2)
+        assert link.count('w', MEM_AP_CSW) == 2
+        assert link.count('w', MEM_AP_TAR) == 2
+
+    def test_raw_access_invalidates(self, ap, link):
+        ap.write32(0x100, 1)
+        ap.write32(0x104, 2)
+        # TAR is changed behind the AP's back, so it must be written again for the next access.
+        ap.dp.write_ap(MEM_AP_TAR, 0x200)
+        ap.write32(0x108, 3)
+        assert ap.read32(0x108) == 3
+        assert ap.read32(0x200) == 0
+        ap.dp.read_ap(MEM_AP_DRW)
+        assert ap.read32(0x204) == 0
+        # Every access after a raw access writes TAR again.
+        assert link.count('w', MEM_AP_TAR) == 6
+
+class TestMemAPCoalescing:
+    def test_consecutive_reads_merged(self, ap, link):
+        ap.write_memory_block32(0x100, list(range(16)))
+        del link.log[:]
+        cbs = [ap.read32(0x100 + 4 * i, now=False) for i in range(8)]
+        assert [cb() for cb in cbs] == list(range(8))
+        assert link.log == [('w', MEM_AP_TAR, 1), ('r', MEM_AP_DRW, 8)]
+
+    def test_runs_split(self, ap, link):
+        ap.write_memory_block32(0x3f0, list(range(8)))
+        del link.log[:]
+        cbs = [ap.read32(addr, now=False) for addr in (0x3f0, 0x3f4, 0x3fc, 0x400, 0x404)]
+        assert [cb() for cb in cbs] == [0, 1, 3, 4, 5]
+        assert link.count('r', MEM_AP_DRW) == 3
+
+    def test_pending_reads_issued_before_other_access(self, ap):
+        ap.write32(0x100, 0x11)
+        cb = ap.read32(0x100, now=False)
+        ap.write32(0x100, 0x22)
+        assert cb() == 0x11
+        assert ap.read32(0x100) == 0x22
+
+    def test_pending_reads_issued_before_dp_access(self, ap, link):
+        cb = ap.read32(0x100, now=False)
+        ap.dp.write_dp(DP_SELECT, 0)
+        ap.dp.read_dp(DP_CTRL_STAT)
+        assert link.log[-3:] == [('r', MEM_AP_DRW, 1), ('w', 'dp', DP_SELECT), ('r', 'dp', DP_CTRL_STAT)]
+        assert cb() == 0
+
+    def test_pending_reads_issued_before_other_ap(self, ap, link):
+        other = MEM_AP(ap.dp, 1)
+        ap.dp.aps[1] = other
+        cb = ap.read32(0x100, now=False)
+        other.write_reg(MEM_AP_CSW, 0)
+        assert link.log[-2:] == [('r', MEM_AP_DRW, 1), ('w', MEM_AP_CSW, 1)]
+        # A run of deferred reads on the other AP also issues the first AP's reads first.
+        cb = ap.read32(0x104, now=False)
+        other_cb = other.read32(0x200, now=False)
+        assert link.log[-1] == ('r', MEM_AP_DRW, 1)
+        other_cb()
+        assert link.count('r', MEM_AP_DRW) == 3
+
+    def test_issue_error_reported_by_every_read(self, ap, link):
+        cbs = [ap.read32(0x100 + 4 * i, now=False) for i in range(3)]
+        link.read_error = exceptions.TransferError("failed")
+        with pytest.raises(exceptions.TransferError):
+            ap.write32(0x200, 1)
+        for cb in cbs:
+            with pytest.raises(exceptions.TransferError):
+                cb()
+        # Later accesses are unaffected.
+        ap.write32(0x200, 1)
+        assert ap.read32(0x200) == 1
+
+    def test_flush_issues_pending_reads(self, ap, link):
+        cb = ap.read32(0x100, now=False)
+        link.read_error = exceptions.TransferError("failed")
+        with pytest.raises(exceptions.TransferError):
+            ap.dp.flush()
+        assert link.flush_count == 0
+        with pytest.raises(exceptions.TransferError):
+            cb()
+
+        cb = ap.read32(0x104, now=False)
+        ap.dp.flush()
+        assert link.flush_count == 1
+        assert ('r', MEM_AP_DRW, 1) in link.log
+        assert cb() == 0
@@ -14,7 +14,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from pyocd.debug.cache import MemoryCache
+from pyocd.debug.cache import (MemoryCache, CachingDebugContext)
 from pyocd.debug.context import DebugContext
 from pyocd.core import memory_map
 from pyocd.utility import conversion
@@ -107,27 +107,28 @@ class TestMemoryCache:
     def test_16_no_mem_region(self, mockcore, memcache):
         assert memcache.read_memory_block8(0x30000000, 4) == [0x55] * 4
         # Make sure we didn't cache anything.
-        assert memcache._cache.overlap(0x30000000, 0x30000004) == set()
+        assert memcache.size == 0
 
     def test_17_noncacheable_region_read(self, mockcore, memcache):
         mockcore.write_memory_block8(0x20000410, [90, 91, 92, 93])
         assert memcache.read_memory_block8(0x20000410, 4) == [90, 91, 92, 93]
         # Make sure we didn't cache anything.
-        assert memcache._cache.overlap(0x20000410, 0x20000414) == set()
+        assert memcache.size == 0
 
     def test_18_noncacheable_region_write(self, mockcore, memcache):
         memcache.write_memory_block8(0x20000410, [1, 2, 3, 4])
         mockcore.write_memory_block8(0x20000410, [90, 91, 92, 93])
         assert memcache.read_memory_block8(0x20000410, 4) == [90, 91, 92, 93]
         # Make sure we didn't cache anything.
-        assert memcache._cache.overlap(0x20000410, 0x20000414) == set()
+        assert memcache.size == 0
 
     def test_19_write_into_cached(self, mockcore, memcache):
         mockcore.write_memory_block8(4, [1, 2, 3, 4, 5, 6, 7, 8])
         assert memcache.read_memory_block8(4, 8) == [1, 2, 3, 4, 5, 6, 7, 8]
         memcache.write_memory_block8(6, [128, 129, 130, 131])
         assert memcache.read_memory_block8(4, 8) == [1, 2, 128, 129, 130, 131, 7, 8]
-        assert len(list(memcache._cache.overlap(4, 12))[0].data) == 8
+        assert len(memcache._extents) == 1
+        assert len(memcache._extents[0].data) == 8
 
     def test_20_empty_read(self, memcache):
         assert memcache.read_memory_block8(128, 0) == []
@@ -179,7 +180,160 @@ class TestMemoryCache:
         block = memcache.read_memory_block8(0x2000007e, 4)
         assert block == data[0x7e:0x82]
 
-     
 
-# TODO test read32/16/8 with and without callbacks
+    def test_27_bytes(self, memcache):
+        data = bytearray(n % 256 for n in range(300))
+        memcache.write_memory_bytes(0x20000000, memoryview(data)[:200])
+        memcache.write_memory_bytes(0x20000000 + 200, bytes(data[200:]))
+        block = memcache.read_memory_bytes(0x20000000, 300)
+        assert isinstance(block, bytearray)
+        assert block == data
+        assert memcache.read_memory_bytes(0x20000003, 5) == data[3:8]
+        assert memcache.read_memory_block8(0x20000000, 300) == list(data)
+
+    def test_28_bytes_uncacheable(self, mockcore, memcache):
+        memcache.write_memory_bytes(0x20000400, b'\x01\x02\x03')
+        assert mockcore.ram2[:3] == bytearray([1, 2, 3])
+        assert memcache.read_memory_bytes(0x20000400, 3) == bytearray([1, 2, 3])
+
+    def test_29_coalesce(self, mockcore, memcache):
+        # Many small adjacent and overlapping reads collapse into one extent.
+        for offset in range(0, 256, 4):
+            memcache.read_memory_bytes(0x20000000 + offset, 8)
+        assert len(memcache._extents) == 1
+        assert memcache._extents[0].begin == 0x20000000
+        assert memcache.size == 260
+        # Separate ranges stay separate until the gap is filled.
+        memcache.read_memory_bytes(0x20000200, 4)
+        assert len(memcache._extents) == 2
+        memcache.read_memory_bytes(0x20000100, 0x100)
+        assert len(memcache._extents) == 1
+        assert memcache.size == 0x204
+
+    def test_30_result_not_shared(self, memcache):
+        memcache.write_memory_bytes(0x20000000, bytearray([1, 2, 3, 4]))
+        block = memcache.read_memory_bytes(0x20000000, 4)
+        block[0] = 99
+        assert memcache.read_memory_bytes(0x20000000, 4) == bytearray([1, 2, 3, 4])
+
+    def test_31_metrics(self, mockcore, memcache):
+        memcache.read_memory_bytes(0x20000000, 8)
+        memcache.read_memory_bytes(0x20000004, 8)
+        assert memcache.metrics.reads == 2
+        assert memcache.metrics.hits == 4
+        assert memcache.metrics.misses == 12
+
+    def test_32_evict_lru(self, mockcore):
+        memcache = MemoryCache(DebugContext(mockcore), mockcore, size_limit=64)
+        memcache.read_memory_bytes(0x20000000, 32)
+        memcache.read_memory_bytes(0x20000100, 32)
+        # Use the first extent so the second is least recently used.
+        memcache.read_memory_bytes(0x20000000, 4)
+        memcache.read_memory_bytes(0x20000200, 16)
+        assert memcache.size == 48
+        assert [e.begin for e in memcache._extents] == [0x20000000, 0x20000200]
+        assert memcache.metrics.evictions == 1
+        assert memcache.metrics.evicted_bytes == 32
+        # Evicted data is read again from the target.
+        mockcore.write_memory_block8(0x20000100, [7])
+        assert memcache.read_memory_bytes(0x20000100, 1) == bytearray([7])
+
+    def test_33_larger_than_limit(self, mockcore):
+        memcache = MemoryCache(DebugContext(mockcore), mockcore, size_limit=64)
+        data = bytearray(range(128))
+        mockcore.write_memory_block8(0x20000000, data)
+        assert memcache.read_memory_bytes(0x20000000, 128) == data
+        assert memcache.size == 0
+
+class CountingContext(DebugContext):
+    def __init__(self, parent):
+        super(CountingContext, self).__init__(parent)
+        self.memory_reads = []
+        self.register_reads = 0
+
+    def read_memory_bytes(self, addr, size):
+        self.memory_reads.append((addr, size))
+        return super(CountingContext, self).read_memory_bytes(addr, size)
+
+    def read_core_registers_raw(self, reg_list):
+        self.register_reads += 1
+        return super(CountingContext, self).read_core_registers_raw(reg_list)
+
+class MockOptions(object):
+    def __init__(self):
+        self.options = {'cache.memory_limit': 1024 * 1024}
+
+@pytest.fixture(scope='function')
+def counting(mockcore):
+    mockcore.session = MockOptions()
+    return CountingContext(mockcore)
+
+class TestPrefetch:
+    def test_prefetch(self, mockcore, counting):
+        mockcore.regs[13] = 0x20000100
+        mockcore.regs[15] = 0x00000081
+        context = CachingDebugContext(counting)
+        context.prefetch(list(range(16)), stack_size=0x40, code_size=0x20)
+        assert counting.register_reads == 1
+        assert counting.memory_reads == [(0x20000100, 0x40), (0x70, 0x20)]
+        # Requests a debugger makes after the halt are served from the caches.
+        assert context.read_core_registers_raw(list(range(16)))[13] == 0x20000100
+        context.read_memory_bytes(0x20000110, 0x10)
+        context.read_memory_bytes(0x80, 2)
+        assert counting.register_reads == 1
+        assert len(counting.memory_reads) == 2
+
+    def test_prefetch_clipped_to_region(self, mockcore, counting):
+        # The stack is near the end of the cacheable ram region, and the PC is invalid.
+        mockcore.regs[13] = 0x200003f0
+        mockcore.regs[15] = 0xe0000000
+        context = CachingDebugContext(counting)
+        context.prefetch([], stack_size=0x100, code_size=0x20)
+        assert counting.memory_reads == [(0x200003f0, 0x10)]
+
+class DeferredContext(DebugContext):
+    """! @brief Context whose read_memory() supports deferred reads, and records them."""
+
+    def __init__(self, parent):
+        super(DeferredContext, self).__init__(parent)
+        self.deferred = []
+
+    def read_memory(self, addr, transfer_size=32, now=True):
+        data = self.read_memory_bytes(addr, transfer_size // 8)
+        value = conversion.byte_list_to_u32le_list(data + bytearray(4 - len(data)))[0]
+        if now:
+            return value
+        self.deferred.append(addr)
+        return lambda: value
+
+class TestDeferredRead:
+    def test_deferred_miss(self, mockcore):
+        mockcore.write_memory_block32(0x20000000, [0x11111111, 0x22222222])
+        context = DeferredContext(mockcore)
+        memcache = MemoryCache(context, mockcore)
+        cbs = [memcache.read_memory(0x20000000, 32, now=False), memcache.read_memory(0x20000004, 16, now=False)]
+        assert context.deferred == [0x20000000, 0x20000004]
+        assert [cb() for cb in cbs] == [0x11111111, 0x2222]
+        # The values were cached when the callbacks were called.
+        assert memcache.read_memory(0x20000000, 32, now=False)() == 0x11111111
+        assert memcache.read_memory(0x20000004, 16) == 0x2222
+        assert context.deferred == [0x20000000, 0x20000004]
+
+    def test_deferred_write_before_callback(self, mockcore):
+        context = DeferredContext(mockcore)
+        memcache = MemoryCache(context, mockcore)
+        cb = memcache.read_memory(0x20000000, 32, now=False)
+        memcache.write_memory(0x20000000, 0x12345678)
+        assert cb() == 0
+        assert memcache.read_memory(0x20000000) == 0x12345678
+
+    def test_deferred_uncacheable(self, mockcore):
+        mockcore.write_memory_block32(0x20000400, [0x33333333])
+        context = DeferredContext(mockcore)
+        memcache = MemoryCache(context, mockcore)
+        assert memcache.read_memory(0x20000400, 32, now=False)() == 0x33333333
+        assert memcache.read_memory(0x20000400, 32, now=False)() == 0x33333333
+        assert context.deferred == [0x20000400, 0x20000400]
+
+# TODO test read8 with and without callbacks
 
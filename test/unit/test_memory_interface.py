@@ -0,0 +1,84 @@
+# pyOCD debugger
+# Copyright (c) 2020 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+
+from pyocd.core.memory_interface import MemoryInterface
+from pyocd.utility import conversion
+
+class RamMemory(MemoryInterface):
+    """! @brief Memory interface backed by a bytearray that records the access sizes used."""
+
+    def __init__(self, size=64):
+        self.ram = bytearray(size)
+        self.accesses = []
+
+    def write_memory(self, addr, data, transfer_size=32):
+        self.accesses.append(transfer_size)
+        count = transfer_size // 8
+        for i in range(count):
+            self.ram[addr + i] = (data >> (8 * i)) & 0xff
+
+    def read_memory(self, addr, transfer_size=32, now=True):
+        self.accesses.append(transfer_size)
+        count = transfer_size // 8
+        return sum(self.ram[addr + i] << (8 * i) for i in range(count))
+
+    def write_memory_block32(self, addr, data):
+        assert (addr & 3) == 0
+        self.accesses.append('block')
+        self.ram[addr:addr + len(data) * 4] = conversion.u32le_list_to_byte_list(data)
+
+    def read_memory_block32(self, addr, size):
+        assert (addr & 3) == 0
+        self.accesses.append('block')
+        return conversion.byte_list_to_u32le_list(self.ram[addr:addr + size * 4])
+
+@pytest.fixture
+def ram():
+    mem = RamMemory()
+    mem.ram[:] = bytearray(range(64))
+    return mem
+
+class TestMemoryBytes:
+    @pytest.mark.parametrize(("addr", "size"), [
+            (0, 0), (0, 16), (1, 1), (1, 2), (3, 9), (2, 13), (5, 40),
+        ])
+    def test_read(self, ram, addr, size):
+        data = ram.read_memory_bytes(addr, size)
+        assert isinstance(data, bytearray)
+        assert data == bytearray(range(addr, addr + size))
+        assert data == bytearray(ram.read_memory_block8(addr, size))
+
+    @pytest.mark.parametrize("data_type", [bytes, bytearray, memoryview, list])
+    @pytest.mark.parametrize(("addr", "size"), [
+            (0, 16), (1, 1), (3, 9), (2, 13), (5, 40),
+        ])
+    def test_write(self, addr, size, data_type):
+        mem = RamMemory()
+        data = bytearray(range(0x80, 0x80 + size))
+        if data_type is list:
+            mem.write_memory_bytes(addr, list(data))
+        else:
+            mem.write_memory_bytes(addr, data_type(data))
+        assert mem.ram[addr:addr + size] == data
+        assert mem.ram[:addr] == bytearray(addr)
+        assert mem.ram[addr + size:] == bytearray(64 - addr - size)
+
+    def test_aligned_uses_block(self, ram):
+        ram.read_memory_bytes(0, 32)
+        ram.write_memory_bytes(8, bytearray(16))
+        assert ram.accesses == ['block', 'block']
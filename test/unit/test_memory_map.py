@@ -308,6 +308,13 @@ class TestMemoryRegion:
         a = RamRegion(name='a', start=0x1000, length=0x2000)
         b = RamRegion(name='a', start=0x1000, length=0x2000)
         assert a == b
+    
+    def test_is_erased(self, flash):
+        assert flash.is_erased([0xff] * 16)
+        assert not flash.is_erased([0xff] * 15 + [0])
+        assert flash.is_erased(bytearray(b'\xff' * 16))
+        assert not flash.is_erased(b'\xff' * 15 + b'\x00')
+        assert flash.is_erased(memoryview(bytearray(b'\x00\xff\xff'))[1:])
 
 
 # MemoryMap test cases.
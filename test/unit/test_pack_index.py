@@ -0,0 +1,115 @@
+# pyOCD debugger
+# Copyright (c) 2020 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import pytest
+import zipfile
+
+from pyocd.target.pack import pack_index
+from pyocd.target.pack.pack_index import (PackDeviceIndex, PackDeviceRef)
+
+PDSC_TEMPLATE = """<?xml version="1.0" encoding="UTF-8"?>
+<package>
+  <devices>
+    <family Dfamily="{family}" Dvendor="Acme:1">
+      <memory name="FLASH" access="rx" start="0" size="0x10000" default="1" startup="1"/>
+      {devices}
+    </family>
+  </devices>
+</package>
+"""
+
+def make_pack(path, family, parts):
+    devices = "".join('<device Dname="{}"/>'.format(part) for part in parts)
+    with zipfile.ZipFile(path, 'w') as pack:
+        pack.writestr("Acme.{}.pdsc".format(family),
+                        PDSC_TEMPLATE.format(family=family, devices=devices))
+    return path
+
+@pytest.fixture
+def packs(tmpdir):
+    return [
+        make_pack(str(tmpdir.join("a.pack")), "Alpha", ["ALPHA1", "alpha2"]),
+        make_pack(str(tmpdir.join("b.pack")), "Beta", ["BETA1"]),
+        ]
+
+@pytest.fixture
+def index_path(tmpdir):
+    return str(tmpdir.join(pack_index.INDEX_FILENAME))
+
+@pytest.fixture
+def scans(monkeypatch):
+    calls = []
+    original = PackDeviceIndex._scan_pack
+    def counting_scan_pack(self, pack_path, stat):
+        calls.append(pack_path)
+        return original(self, pack_path, stat)
+    monkeypatch.setattr(PackDeviceIndex, '_scan_pack', counting_scan_pack)
+    return calls
+
+class TestPackDeviceIndex(object):
+    def test_build(self, packs, index_path):
+        index = PackDeviceIndex(index_path)
+        index.update(packs)
+        assert [d.part_number for d in index.devices] == ["ALPHA1", "BETA1", "alpha2"]
+        assert index.find("beta1") == [PackDeviceRef("BETA1", "Acme", ["Beta"], packs[1])]
+        assert [d.pack_path for d in index.find("ALPHA2")] == [packs[0]]
+        assert index.find("gamma") == []
+        assert os.path.isfile(index_path)
+
+    def test_reload_without_parsing(self, packs, index_path, scans):
+        PackDeviceIndex(index_path).update(packs)
+        assert len(scans) == 2
+        index = PackDeviceIndex(index_path)
+        index.update(packs)
+        assert len(scans) == 2
+        assert index.find("alpha1")[0].families == ["Alpha"]
+
+    def test_changed_pack(self, packs, index_path, scans):
+        PackDeviceIndex(index_path).update(packs)
+        make_pack(packs[1], "Beta", ["BETA1", "BETA2"])
+        index = PackDeviceIndex(index_path)
+        index.update(packs)
+        assert scans == packs + [packs[1]]
+        assert [d.part_number for d in index.find("beta2")] == ["BETA2"]
+
+    def test_removed_pack(self, packs, index_path):
+        index = PackDeviceIndex(index_path)
+        index.update(packs)
+        index.update(packs[:1])
+        assert index.find("beta1") == []
+        reloaded = PackDeviceIndex(index_path)
+        reloaded.update(packs[:1])
+        assert [d.part_number for d in reloaded.devices] == ["ALPHA1", "alpha2"]
+
+    def test_bad_index_file(self, packs, index_path, scans):
+        with open(index_path, 'w') as f:
+            f.write("{not json")
+        index = PackDeviceIndex(index_path)
+        index.update(packs)
+        assert len(index.devices) == 3
+        assert len(scans) == 2
+
+    def test_bad_pack(self, tmpdir, packs, index_path, scans):
+        bad = str(tmpdir.join("bad.pack"))
+        with open(bad, 'wb') as f:
+            f.write(b"not a zip")
+        PackDeviceIndex(index_path).update(packs + [bad])
+        index = PackDeviceIndex(index_path)
+        index.update(packs + [bad])
+        assert len(index.devices) == 3
+        # The bad pack is recorded and not parsed again.
+        assert scans.count(bad) == 1
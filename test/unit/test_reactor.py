@@ -0,0 +1,172 @@
+# pyOCD debugger
+# Copyright (c) 2020 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import socket
+import threading
+from time import (sleep, time)
+import pytest
+
+from pyocd.gdbserver.gdbserver import (GDBServerPacketIO, ConnectionClosedException, checksum)
+from pyocd.utility.reactor import Reactor
+from pyocd.utility.server import StreamServer
+
+@pytest.fixture
+def reactor():
+    reactor = Reactor("test-reactor")
+    reactor.start()
+    yield reactor
+    reactor.stop()
+
+def wait_until(predicate, timeout=5.0):
+    deadline = time() + timeout
+    while not predicate():
+        assert time() < deadline, "timed out"
+        sleep(0.001)
+
+class TestReactor:
+    def test_reader(self, reactor):
+        a, b = socket.socketpair()
+        received = []
+        reactor.add_reader(a, lambda: received.append(a.recv(100)))
+        b.sendall(b'hello')
+        wait_until(lambda: received == [b'hello'])
+        reactor.remove_reader(a)
+        b.sendall(b'more')
+        sleep(0.05)
+        assert received == [b'hello']
+        a.close()
+        b.close()
+
+    def test_call_soon_and_later(self, reactor):
+        calls = []
+        reactor.call_later(0.05, calls.append, 'late')
+        cancelled = reactor.call_later(0.01, calls.append, 'cancelled')
+        reactor.call_later(0.02, calls.append, 'early')
+        reactor.call_soon(calls.append, 'soon')
+        cancelled.cancel()
+        wait_until(lambda: len(calls) == 3)
+        assert calls == ['soon', 'early', 'late']
+
+    def test_call_and_wait(self, reactor):
+        assert reactor.call_and_wait(lambda: reactor.in_reactor_thread) is True
+        assert not reactor.in_reactor_thread
+
+    def test_submit_in_order(self, reactor):
+        calls = []
+        for i in range(10):
+            reactor.submit(calls.append, i)
+        assert reactor.submit_and_wait(lambda: list(calls)) == list(range(10))
+
+    def test_exception_logged(self, reactor):
+        def fail():
+            raise RuntimeError("test")
+        reactor.call_soon(fail)
+        assert reactor.call_and_wait(lambda: 1) == 1
+
+    def test_not_running(self):
+        reactor = Reactor()
+        assert reactor.call_and_wait(lambda: 2) == 2
+        reactor.stop()
+
+class TestStreamServer:
+    def test_read_write(self, reactor):
+        server = StreamServer(0, is_read_only=False, reactor=reactor)
+        try:
+            assert server.read() is None
+            client = socket.create_connection(('localhost', server.port))
+            wait_until(lambda: server.connected is not None)
+            client.sendall(b'abc')
+            wait_until(lambda: len(server._buffer) == 3)
+            assert server.read() == b'abc'
+            server.write(b'xyz')
+            assert client.recv(3) == b'xyz'
+
+            # Reconnect after the client disconnects.
+            client.close()
+            wait_until(lambda: server.connected is None)
+            client = socket.create_connection(('localhost', server.port))
+            wait_until(lambda: server.connected is not None)
+            client.close()
+        finally:
+            server.stop()
+
+    def test_own_reactor(self):
+        server = StreamServer(0)
+        client = socket.create_connection(('localhost', server.port))
+        wait_until(lambda: server.connected is not None)
+        server.stop()
+        client.close()
+
+class SocketAdapter(object):
+    def __init__(self, sock):
+        self.conn = sock
+        self.port = 0
+
+    def set_timeout(self, timeout):
+        self.conn.settimeout(timeout)
+
+    def read(self, size=4096):
+        return self.conn.recv(size)
+
+    def write(self, data):
+        return self.conn.send(data)
+
+def frame(data):
+    return b'$' + data + b'#' + checksum(data)
+
+class TestPacketIO:
+    def test_receive(self, reactor):
+        a, b = socket.socketpair()
+        io = GDBServerPacketIO(SocketAdapter(a), reactor)
+        assert io.receive(block=False) is None
+        assert io.receive(timeout=0.01) is None
+        b.sendall(frame(b'g') + frame(b'?'))
+        assert io.receive() == frame(b'g')
+        assert io.receive() == frame(b'?')
+        assert b.recv(2) == b'++'
+
+        b.close()
+        with pytest.raises(ConnectionClosedException):
+            io.receive()
+        a.close()
+
+    def test_stop_wakes_receiver(self, reactor):
+        a, b = socket.socketpair()
+        io = GDBServerPacketIO(SocketAdapter(a), reactor)
+        result = []
+        def receiver():
+            try:
+                io.receive()
+            except ConnectionClosedException:
+                result.append('closed')
+        thread = threading.Thread(target=receiver)
+        thread.start()
+        io.stop()
+        thread.join(5.0)
+        assert result == ['closed']
+        a.close()
+        b.close()
+
+    def test_interrupt(self, reactor):
+        a, b = socket.socketpair()
+        woken = threading.Event()
+        io = GDBServerPacketIO(SocketAdapter(a), reactor, woken.set)
+        b.sendall(b'\x03')
+        assert woken.wait(5.0)
+        assert io.interrupt_event.is_set()
+        io.stop()
+        a.close()
+        b.close()
@@ -0,0 +1,319 @@
+# pyOCD debugger
+# Copyright (c) 2020 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+import struct
+
+from pyocd.core import exceptions
+from pyocd.debug.context import DebugContext
+from pyocd.rtos.common import (TargetSnapshot, StackFrameCache, decode_stacked_registers,
+    read_c_string)
+from pyocd.rtos.freertos import (FreeRTOSThread, FreeRTOSThreadProvider)
+
+RAM = 0x20000000
+
+class RecordingContext(DebugContext):
+    """! @brief Context over the mock core's RAM that counts round trips to the target.
+
+    Deferred reads are queued until one of their callbacks is called, when all queued reads
+    complete as one round trip.
+    """
+
+    def __init__(self, parent):
+        super(RecordingContext, self).__init__(parent)
+        self.rounds = 0
+        self.faults = set()
+        self._pending = 0
+
+    def _flush(self):
+        if self._pending:
+            self.rounds += 1
+            self._pending = 0
+
+    def _read_word(self, addr):
+        if addr in self.faults:
+            raise exceptions.TransferFaultError()
+        return struct.unpack_from("<I", self.core.ram, addr - RAM)[0]
+
+    def read_memory(self, addr, transfer_size=32, now=True):
+        assert transfer_size == 32
+        if now:
+            self._flush()
+            self.rounds += 1
+            return self._read_word(addr)
+        self._pending += 1
+        def read_cb():
+            self._flush()
+            return self._read_word(addr)
+        return read_cb
+
+    def read_memory_bytes(self, addr, size):
+        self._flush()
+        self.rounds += 1
+        return super(RecordingContext, self).read_memory_bytes(addr, size)
+
+    def read_memory_block8(self, addr, size):
+        return list(self.read_memory_bytes(addr, size))
+
+    def read_memory_block32(self, addr, size):
+        self._flush()
+        self.rounds += 1
+        if any(addr <= fault < addr + size * 4 for fault in self.faults):
+            raise exceptions.TransferFaultError()
+        return super(RecordingContext, self).read_memory_block32(addr, size)
+
+class MockTarget(object):
+    def __init__(self, context):
+        self.context = context
+        self.run_token = 1
+        self.session = self
+        self.notifications = []
+
+    def get_target_context(self):
+        return self.context
+
+    def subscribe(self, *args):
+        pass
+
+    def notify(self, event, source=None, data=None):
+        self.notifications.append((event, data))
+
+@pytest.fixture(scope='function')
+def context(mockcore):
+    return RecordingContext(mockcore)
+
+@pytest.fixture(scope='function')
+def target(context):
+    return MockTarget(context)
+
+def write32(context, addr, *values):
+    struct.pack_into("<%dI" % len(values), context.core.ram, addr - RAM, *values)
+
+def write_bytes(context, addr, data):
+    context.core.ram[addr - RAM:addr - RAM + len(data)] = data
+
+class TestTargetSnapshot:
+    def test_read32_list(self, context, target):
+        write32(context, RAM, 1, 2, 3, 4)
+        snapshot = TargetSnapshot(context, target)
+        assert snapshot.read32_list([RAM + 8, RAM, RAM + 8, RAM + 12]) == [3, 1, 3, 4]
+        assert context.rounds == 1
+        assert snapshot.read32(RAM + 4) == 2
+        assert snapshot.read32_list([RAM, RAM + 4]) == [1, 2]
+        assert context.rounds == 2
+
+    def test_run_token(self, context, target):
+        snapshot = TargetSnapshot(context, target)
+        assert snapshot.read32(RAM) == 0
+        write32(context, RAM, 5)
+        assert snapshot.read32(RAM) == 0
+        target.run_token += 1
+        assert snapshot.read32(RAM) == 5
+
+    def test_fault(self, context, target):
+        write32(context, RAM, 1, 2)
+        context.faults.add(RAM + 4)
+        snapshot = TargetSnapshot(context, target)
+        assert snapshot.read32_list([RAM, RAM + 4]) == [1, None]
+        with pytest.raises(exceptions.TransferError):
+            snapshot.read32(RAM + 4)
+
+    def test_blocks(self, context, target):
+        write_bytes(context, RAM + 0x10, bytearray(range(32)))
+        snapshot = TargetSnapshot(context, target)
+        assert snapshot.read_blocks([RAM + 0x10, RAM + 0x20], 8) == [
+                bytearray(range(8)), bytearray(range(16, 24))]
+        assert snapshot.read_block(RAM + 0x10, 4) == bytearray(range(4))
+        assert context.rounds == 2
+
+    def test_c_strings(self, context, target):
+        long_name = b"a fairly long thread name that crosses chunks"
+        write_bytes(context, RAM + 0x1c, b"idle\0")
+        write_bytes(context, RAM + 0x40, long_name + b"\0")
+        snapshot = TargetSnapshot(context, target)
+        assert snapshot.read_c_strings([RAM + 0x1c, 0, RAM + 0x40]) == [
+                "idle", "", long_name.decode()]
+        assert snapshot.read_c_string(RAM + 0x40) == read_c_string(context, RAM + 0x40)
+
+    def test_walk_lists(self, context, target):
+        # List 0: 0x100 -> 0x110 -> 0x120 -> null, with next pointers at offset 4.
+        write32(context, RAM + 0x104, RAM + 0x110)
+        write32(context, RAM + 0x114, RAM + 0x120)
+        # List 1: circular 0x200 -> 0x210 -> 0x200, with next pointers at offset 0 and
+        # object pointers at offset 8.
+        write32(context, RAM + 0x200, RAM + 0x210, 0, 0x1000)
+        write32(context, RAM + 0x210, RAM + 0x200, 0, 0x2000)
+        snapshot = TargetSnapshot(context, target)
+        assert snapshot.walk_lists([RAM + 0x100, 0], 4) == [
+                [RAM + 0x100, RAM + 0x110, RAM + 0x120], []]
+        assert snapshot.walk_lists([RAM + 0x200], 0, object_offset=8) == [[0x1000, 0x2000]]
+        assert snapshot.walk_lists([RAM + 0x100], 4, counts=[2]) == [[RAM + 0x100, RAM + 0x110]]
+
+    def test_walk_lists_batched(self, context, target):
+        # Four lists of three nodes each, walked with one round trip per level.
+        heads = []
+        for i in range(4):
+            nodes = [RAM + 0x100 + i * 0x40 + j * 0x10 for j in range(3)]
+            for node, next_node in zip(nodes, nodes[1:] + [0]):
+                write32(context, node, next_node)
+            heads.append(nodes[0])
+        snapshot = TargetSnapshot(context, target)
+        lists = snapshot.walk_lists(heads, 0)
+        assert [len(l) for l in lists] == [3, 3, 3, 3]
+        assert context.rounds == 3
+
+class TestStackedRegisters:
+    TABLE = {4: 0, 5: 4, 0: 8, 15: 12}
+
+    def test_frame_cache(self, context):
+        write32(context, RAM + 0x40, *range(8))
+        cache = StackFrameCache(context)
+        assert cache.read(RAM + 0x40, 32) == list(range(8))
+        assert cache.read(RAM + 0x40, 16) == list(range(4))
+        assert context.rounds == 1
+        context.core.run_token += 1
+        assert cache.read(RAM + 0x40, 16) == list(range(4))
+        assert context.rounds == 2
+        # Falls back to the minimum size if the full frame can't be read.
+        context.faults.add(RAM + 0x1a0)
+        assert cache.read(RAM + 0x180, 0x40, 0x10) == [0] * 4
+        assert cache.read(RAM + 0x1a0, 0x10) is None
+        assert cache.read(RAM + 0x182, 0x10) is None
+
+    def test_decode(self, context):
+        context.core.regs[1] = 0x1111
+        frame = [0x44, 0x55, 0x00, 0xff]
+        assert decode_stacked_registers(context, [0, 1, 4, 13, 15], 0x1000, frame, self.TABLE,
+                8, 8, False) == [0x00, 0x1111, 0x44, 0x1010, 0xff]
+
+    def test_decode_in_exception(self, context):
+        # The software frame isn't on the stack, so r4 and r5 are live.
+        context.core.regs[4] = 0x4444
+        frame = [0x00, 0xff]
+        assert decode_stacked_registers(context, [0, 4, 13, 15], 0x1000, frame, self.TABLE,
+                8, 8, True) == [0x00, 0x4444, 0x1008, 0xff]
+
+    def test_unreadable_frame(self, context):
+        assert decode_stacked_registers(context, [0, 15], 0x1000, None, self.TABLE,
+                8, 8, False) == [0, 0]
+
+class MockSymbols(object):
+    def __init__(self, symbols):
+        self.symbols = symbols
+
+    def get_symbol_value(self, name):
+        return self.symbols.get(name)
+
+class TestFreeRTOS:
+    SYMBOLS = {
+        'pxReadyTasksLists': RAM + 0x00, # 2 priorities
+        'xDelayedTaskList1': RAM + 0x28,
+        'xDelayedTaskList2': RAM + 0x3c,
+        'xPendingReadyList': RAM + 0x50,
+        'uxCurrentNumberOfTasks': RAM + 0x64,
+        'pxCurrentTCB': RAM + 0x68,
+        'uxTopReadyPriority': RAM + 0x6c,
+        'xSchedulerRunning': RAM + 0x70,
+        }
+
+    def add_list(self, context, list_addr, tcbs, node_base):
+        """! @brief Write a list, following the layout used by the provider's list walk."""
+        nodes = [node_base + i * 0x10 for i in range(len(tcbs))]
+        write32(context, list_addr, len(tcbs))
+        write32(context, list_addr + 16, nodes[0] if nodes else 0)
+        for node, tcb, next_node in zip(nodes, tcbs, nodes[1:] + [list_addr + 8]):
+            write32(context, node + 8, next_node, tcb)
+
+    def add_tcb(self, context, tcb, name, priority, sp):
+        write32(context, tcb, sp)
+        write32(context, tcb + 44, priority)
+        write_bytes(context, tcb + 52, name + b"\0")
+
+    TCBS = [RAM + 0x200 + i * 0x50 for i in range(4)]
+
+    @pytest.fixture(scope='function')
+    def provider(self, context, target):
+        tcbs = self.TCBS
+        for i, tcb in enumerate(tcbs):
+            self.add_tcb(context, tcb, b"task%d" % i, i & 1, RAM + 0x3f0 - i * 0x10)
+        self.add_list(context, self.SYMBOLS['pxReadyTasksLists'] + 20, [tcbs[0], tcbs[1]], RAM + 0x80)
+        self.add_list(context, self.SYMBOLS['xDelayedTaskList1'], [tcbs[2]], RAM + 0xc0)
+        self.add_list(context, self.SYMBOLS['xPendingReadyList'], [tcbs[3]], RAM + 0xe0)
+        write32(context, self.SYMBOLS['uxCurrentNumberOfTasks'], 4, tcbs[1], 1, 1)
+
+        provider = FreeRTOSThreadProvider(target)
+        assert provider.init(MockSymbols(self.SYMBOLS))
+        provider.read_from_target = True
+        return provider
+
+    def test_thread_list(self, context, target, provider):
+        tcbs = self.TCBS
+        threads = {t.unique_id: t for t in provider.get_threads()}
+        assert sorted(threads) == tcbs
+        assert [threads[t].name for t in tcbs] == ["task0", "task1", "task2", "task3"]
+        assert [threads[t].state for t in tcbs] == [FreeRTOSThread.READY, FreeRTOSThread.RUNNING,
+                FreeRTOSThread.BLOCKED, FreeRTOSThread.READY]
+        assert threads[tcbs[2]].get_stack_pointer() == RAM + 0x3d0
+
+        # Reading the list again without the target running doesn't access the target.
+        rounds = context.rounds
+        provider.get_threads()
+        threads[tcbs[3]].get_stack_pointer()
+        assert context.rounds - rounds <= 1 # Only the scheduler running check.
+
+    def test_incremental_update(self, context, target, provider):
+        tcbs = self.TCBS
+        threads = {t.unique_id: t for t in provider.get_threads()}
+        assert len(target.notifications) == 1
+        assert target.notifications[0][1].added == set(tcbs)
+        generation = provider.generation
+
+        # Resume and halt with only task 2's priority changed.
+        provider.read_from_target = False
+        target.run_token += 1
+        write32(context, tcbs[2] + 44, 7)
+        provider.read_from_target = True
+        updated = {t.unique_id: t for t in provider.get_threads()}
+        assert all(updated[t] is threads[t] for t in tcbs)
+        assert updated[tcbs[2]].priority == 7
+        assert provider.generation == generation + 1
+        changes = target.notifications[-1][1]
+        assert (changes.added, changes.removed, changes.updated) == (set(), set(), {tcbs[2]})
+
+        # Another stop with nothing changed doesn't send a notification.
+        target.run_token += 1
+        provider.get_threads()
+        assert provider.generation == generation + 1
+        assert len(target.notifications) == 2
+
+    def test_thread_registers(self, context, target, provider):
+        # Thread 0 is not running. Its stack has a basic frame with the exception return LR,
+        # as saved when the core has an FPU.
+        sp = RAM + 0x100
+        write32(context, self.TCBS[0], sp)
+        write32(context, sp, *([0x40 + i for i in range(8)] + [0xfffffffd]
+                + [0x100 + i for i in range(8)]))
+        target.run_token += 1
+        thread = provider.get_thread(self.TCBS[0])
+        rounds = context.rounds
+        regs = thread.context.read_core_registers_raw(list(range(17)))
+        assert regs[4:12] == [0x40 + i for i in range(8)]
+        assert regs[0:4] == [0x100, 0x101, 0x102, 0x103]
+        assert regs[12:17] == [0x104, sp + 0x44, 0x105, 0x106, 0x107]
+        # Reads of the scheduler state and current thread for is_current(), and one of the frame.
+        assert context.rounds - rounds == 3
+        thread.context.read_core_registers_raw(list(range(17)))
+        assert context.rounds - rounds == 5
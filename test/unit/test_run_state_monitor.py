@@ -0,0 +1,142 @@
+# pyOCD debugger
+# Copyright (c) 2020 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+from time import (sleep, time)
+import pytest
+
+from pyocd.core import exceptions
+from pyocd.core.target import Target
+from pyocd.debug.run_state_monitor import RunStateMonitor
+from pyocd.utility.notification import Notifier
+
+class MockCore(object):
+    def __init__(self, session):
+        self.session = session
+        self.state = Target.TARGET_HALTED
+        self.polls = 0
+        self.fail = False
+
+    def get_state(self):
+        self.polls += 1
+        if self.fail:
+            raise exceptions.TransferError("mock error")
+        return self.state
+
+    def resume(self):
+        self.state = Target.TARGET_RUNNING
+        self.session.notify(Target.EVENT_POST_RUN, self, Target.RUN_TYPE_RESUME)
+
+    def halt(self):
+        self.state = Target.TARGET_HALTED
+        self.session.notify(Target.EVENT_POST_HALT, self, Target.HALT_REASON_USER)
+
+@pytest.fixture
+def core():
+    return MockCore(Notifier())
+
+@pytest.fixture
+def monitor(core):
+    monitor = RunStateMonitor(core.session, core, max_interval=0.02)
+    monitor.start()
+    assert monitor.wait_for_halt(timeout=0)
+    yield monitor
+    monitor.stop()
+
+def resume(core, monitor):
+    core.resume()
+    monitor.resumed()
+
+class TestRunStateMonitor:
+    def test_detect_halt(self, core, monitor):
+        resume(core, monitor)
+        assert monitor.is_running
+        assert not monitor.wait_for_halt(timeout=0.05)
+        # The core halts without a notification, such as at a breakpoint.
+        core.state = Target.TARGET_HALTED
+        start = time()
+        assert monitor.wait_for_halt(timeout=5.0)
+        assert time() - start < 0.5
+        assert monitor.state == Target.TARGET_HALTED
+
+    def test_backoff(self, core, monitor):
+        resume(core, monitor)
+        sleep(0.3)
+        core.polls = 0
+        sleep(0.2)
+        # Once the core has run for a while, polls are made at the maximum interval of 20 ms.
+        assert 0 < core.polls <= 15
+
+    def test_halt_notification(self, core, monitor):
+        resume(core, monitor)
+        core.halt()
+        assert not monitor.is_running
+        assert monitor.wait_for_halt(timeout=0)
+
+    def test_sleeping_is_running(self, core, monitor):
+        resume(core, monitor)
+        core.state = Target.TARGET_SLEEPING
+        assert not monitor.wait_for_halt(timeout=0.1)
+
+    def test_event(self, core, monitor):
+        resume(core, monitor)
+        event = threading.Event()
+        timer = threading.Timer(0.05, lambda: (event.set(), monitor.wake()))
+        timer.start()
+        start = time()
+        assert not monitor.wait_for_halt(timeout=5.0, event=event)
+        assert time() - start < 1.0
+        timer.join()
+
+    def test_error(self, core, monitor):
+        resume(core, monitor)
+        core.fail = True
+        assert monitor.wait_for_halt(timeout=5.0)
+        assert monitor.state is None
+
+    def test_wait_for_running(self, core, monitor):
+        threading.Timer(0.05, resume, (core, monitor)).start()
+        assert monitor.wait_for_running(timeout=5.0)
+
+    def test_idle_until_resumed(self, core, monitor):
+        # Running the core by other means, such as a flash algorithm, doesn't start polling.
+        core.resume()
+        sleep(0.1)
+        assert core.polls == 0
+        assert not monitor.is_running
+
+    def test_halted_stops_polling(self, core, monitor):
+        resume(core, monitor)
+        sleep(0.05)
+        monitor.halted()
+        polls = core.polls
+        assert polls > 0
+        assert monitor.wait_for_halt(timeout=0)
+        sleep(0.1)
+        assert core.polls == polls
+
+    def test_resumed_without_polling(self, core, monitor):
+        core.resume()
+        monitor.resumed(poll=False)
+        sleep(0.1)
+        assert monitor.is_running
+        assert core.polls == 0
+        monitor.halted()
+        assert not monitor.is_running
+
+    def test_default_max_interval(self):
+        # Halt latency after a long run is no worse than polling every 10 ms.
+        assert RunStateMonitor.MAX_INTERVAL <= 0.01
@@ -14,9 +14,10 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from pyocd.utility.timeout import Timeout
+from pyocd.utility.timeout import (Timeout, PollBackoff, wait_for)
 from time import (time, sleep)
 import pytest
+import threading
 
 class TestTimeout:
     def test_no_timeout(self):
@@ -64,3 +65,42 @@ class TestTimeout:
         assert not timedout
         assert not to.did_time_out
 
+
+class TestPollBackoff:
+    def test_interval_grows(self):
+        polls = [0]
+        def done():
+            polls[0] += 1
+            return polls[0] > 5
+        s = time()
+        assert wait_for(done, expected_time=0.08)
+        # Intervals double from the minimum, capped at 1/8 of the expected time.
+        assert (time() - s) < 0.05
+
+    def test_few_polls(self):
+        polls = [0]
+        s = time()
+        def done():
+            polls[0] += 1
+            return (time() - s) >= 0.2
+        assert wait_for(done, expected_time=0.2)
+        # Busy polling would take many thousands of polls.
+        assert polls[0] < 30
+
+    def test_timeout(self):
+        s = time()
+        assert not wait_for(lambda: False, timeout=0.05)
+        assert (time() - s) >= 0.05
+        backoff = PollBackoff(timeout=0.01)
+        while backoff.wait():
+            pass
+        assert backoff.did_time_out
+
+    def test_event(self):
+        event = threading.Event()
+        backoff = PollBackoff(min_interval=1, max_interval=1, event=event)
+        event.set()
+        s = time()
+        assert not backoff.wait()
+        assert (time() - s) < 0.5
+        assert not backoff.did_time_out